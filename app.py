@@ -1,12 +1,25 @@
 import os
-import random
+import hmac
 import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from fastapi import FastAPI, Form
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, Form, Depends, Header, HTTPException
+from fastapi.responses import JSONResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 from driver_pool import driver_pool
+from proxy_manager import proxy_manager, proxy_key, proxy_url
+from circuit_breaker import circuit_breakers, CircuitOpenError
+from scrapers.http_cache import http_cache
+from session_vault import session_vault, SessionExpiredError, ReplayPayloadError
+from profiler import profiler
+from artifacts import artifact_store
+from canary import canary
+from scrapers import date_normalizer
+from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
+import metrics
+import tracing
+import log_setup
 
 import config
 import driver_setup
@@ -18,18 +31,30 @@ from typing import Tuple, Optional
 import logging
 import time
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-)
+# Log đi qua hàng đợi, thread listener ghi JSON ra stdout (không ghi đồng bộ trên thread của request)
+log_setup.configure_logging()
+logger = logging.getLogger(__name__)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Code chạy khi App KHỞI ĐỘNG
+    if config.THREAD_POOL_WORKERS:
+        # Executor của asyncio.to_thread (Selenium, scraper API)
+        asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=config.THREAD_POOL_WORKERS))
     driver_pool.initialize() 
+    refresher = asyncio.create_task(refresh_sessions_loop()) if config.HYBRID_REPLAY_ENABLED else None
+    # Canary đi qua cùng đường scrape (pool, proxy) với request thật, nhưng không tính vào circuit breaker
+    canary_task = asyncio.create_task(canary.run_forever(run_scraping_task_with_strategy)) \
+        if config.CANARY_ENABLED and canary.targets else None
     yield
     # Code chạy khi App TẮT
+    if refresher:
+        refresher.cancel()
+    if canary_task:
+        canary_task.cancel()
     driver_pool.shutdown()
+    proxy_manager.shutdown()
+    await browser_setup.browser_pool.shutdown()
 
 app = FastAPI(lifespan=lifespan)
 
@@ -46,49 +71,120 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Các request /api/v1/track đang chạy (request_id -> hãng tàu, mã, thời điểm bắt đầu) cho /admin/status
+_in_flight = {}
+
 # Tạo thư mục output nếu chưa có
 if not os.path.exists("output"):
     os.makedirs("output")
     
+async def _to_thread(func, *args):
+    """asyncio.to_thread, kèm span thời gian chờ trong hàng đợi của thread pool (executor.queue_wait)."""
+    t_submitted = time.time()
+
+    def run():
+        tracing.record_span("executor.queue_wait", t_submitted)
+        with profiler.attach():
+            return func(*args)
+    return await asyncio.to_thread(run)
+
 def run_selenium_task_sync(scraper_name, tracking_number, scraper_config, proxy_info):
     # Hàm này chạy toàn bộ vòng đời của một driver: Tạo -> Scrape -> Thoát
     driver = None
+    # Mỗi proxy có Driver Pool riêng; không có proxy thì dùng pool mặc định
+    pool = proxy_manager.get_driver_pool(proxy_info) if proxy_info else driver_pool
     try:
-        print(f"[{scraper_name}] Đang lấy driver từ Pool...")
+        logger.info("[%s] Đang lấy driver từ Pool...", scraper_name)
         # 1. Lấy driver từ Pool (Sẽ chờ nếu cả 4 driver đều đang bận)
-        driver = driver_pool.get_driver()
+        driver = pool.get_driver(carrier=scraper_name)
         
         # 2. Scrape như bình thường
         scraper_instance = scrapers.get_scraper(scraper_name, driver, scraper_config)
-        data, error = scraper_instance.scrape(tracking_number)
+        if proxy_info:
+            scraper_instance.http_proxy = proxy_url(proxy_info)
+        with tracing.span("scraper.scrape", carrier=scraper_name):
+            data, error = scraper_instance.scrape(tracking_number)
+        url_template = _replay_url_template(scraper_name, scraper_instance, data, tracking_number)
+        if url_template:
+            # Thu thập phiên để các lượt tra cứu sau đi qua HTTP
+            with tracing.span("session_vault.harvest"):
+                session_vault.harvest_selenium(scraper_name, proxy_key(proxy_info), driver,
+                                               scraper_instance.captured_request_headers, url_template)
         return data, error
         
     except Exception as e:
-        print(f"[{scraper_name}] Lỗi trong luồng Selenium: {e}")
+        logger.error("[%s] Lỗi trong luồng Selenium: %s", scraper_name, e)
         return None, str(e)
         
     finally:
         # 3. Trả driver về Pool
         if driver:
-            print(f"[{scraper_name}] Đang trả driver về Pool.")
-            driver_pool.return_driver(driver)
+            logger.info("[%s] Đang trả driver về Pool.", scraper_name)
+            pool.return_driver(driver)
 
 # Đổi thành async def
 async def run_scraping_task(scraper_name: str, tracking_number: str) -> Tuple[Optional[N8nTrackingInfo], Optional[str]]:
     """
     Trả về dữ liệu thô và thông báo lỗi.
     """
-    selected_proxy = None
-    if config.PROXY_LIST:
-        selected_proxy = random.choice(config.PROXY_LIST)
+    data, error, _ = await run_scraping_task_with_strategy(scraper_name, tracking_number)
+    return data, error
+
+async def run_scraping_task_with_strategy(scraper_name: str, tracking_number: str) -> Tuple[Optional[N8nTrackingInfo], Optional[str], str]:
+    """
+    Như run_scraping_task, kèm chiến lược thực sự được dùng ('replay' khi tra cứu bằng phiên trong
+    session_vault) để canary so thời gian giữa các lượt cùng chiến lược.
+    """
+    # Chọn proxy (sticky theo hãng tàu, ưu tiên proxy khỏe) và ghi nhận kết quả để chấm điểm
+    selected_proxy = proxy_manager.acquire(scraper_name)
+    t_start = time.time()
+    data, error = None, None
+    # Chiến lược thực sự được dùng ('replay' khi tra cứu bằng phiên trong session_vault)
+    strategy = SCRAPER_STRATEGY.get(scraper_name, "unknown")
+    metrics.REQUESTS_IN_PROGRESS.labels(scraper_name).inc()
+    try:
+        data, error, strategy = await _run_scraping_task(scraper_name, tracking_number, selected_proxy)
+        return data, error, strategy
+    except Exception as e:
+        error = str(e)
+        raise
+    finally:
+        metrics.REQUESTS_IN_PROGRESS.labels(scraper_name).dec()
+        if not error and data:
+            outcome = "success"
+        else:
+            outcome = "error" if _is_carrier_failure(error) else "not_found"
+        metrics.observe_request(scraper_name, strategy, outcome, time.time() - t_start)
+        if selected_proxy:
+            proxy_manager.report(
+                scraper_name,
+                selected_proxy,
+                success=not _is_carrier_failure(error),
+                latency=time.time() - t_start
+            )
 
+async def _run_scraping_task(scraper_name: str, tracking_number: str, selected_proxy: Optional[dict]) -> Tuple[Optional[N8nTrackingInfo], Optional[str], str]:
     strategy = SCRAPER_STRATEGY.get(scraper_name)
     scraper_config = config.SCRAPER_CONFIGS.get(scraper_name, {})
-    
+
+    # Hãng tàu cần trình duyệt nhưng đã có phiên còn hạn trong vault -> tra cứu qua HTTP
+    if _replay_enabled(scraper_name):
+        harvested = session_vault.get(scraper_name, proxy_key(selected_proxy))
+        if harvested:
+            with metrics.scrape_context(scraper_name, "replay"):
+                result = await _run_replay_task(scraper_name, tracking_number, scraper_config, selected_proxy, harvested)
+            if result is not None:
+                return result + ("replay",)
+
+    with metrics.scrape_context(scraper_name, strategy):
+        data, error = await _dispatch_scraping_task(scraper_name, strategy, tracking_number, scraper_config, selected_proxy)
+    return data, error, strategy
+
+async def _dispatch_scraping_task(scraper_name, strategy, tracking_number, scraper_config, selected_proxy):
     if strategy == "selenium":
         # Dùng asyncio.to_thread để không chặn FastAPI
-        print(f"[{scraper_name}] Đang chuyển tác vụ Selenium sang thread pool...")
-        data, error = await asyncio.to_thread(
+        logger.info("[%s] Đang chuyển tác vụ Selenium sang thread pool...", scraper_name)
+        data, error = await _to_thread(
             run_selenium_task_sync, 
             scraper_name, 
             tracking_number, 
@@ -99,57 +195,147 @@ async def run_scraping_task(scraper_name: str, tracking_number: str) -> Tuple[Op
 
     elif strategy == "playwright":
         start_browser_time = time.time()
-        print(f"[{scraper_name}] Chiến lược: Playwright. Đang khởi tạo trình duyệt async...")
-        p, browser = await browser_setup.create_playwright_context(selected_proxy)
+        logger.info("[%s] Chiến lược: Playwright. Đang lấy trình duyệt từ Browser Pool...", scraper_name)
+        # Mỗi proxy giữ một trình duyệt riêng; mỗi request chỉ tạo context/page mới
+        with tracing.span("browser_pool.get_browser"):
+            browser = await browser_setup.browser_pool.get_browser(proxy_key(selected_proxy), selected_proxy)
         if not browser:
             return None, "Không khởi tạo được trình duyệt Playwright"
-        page = await browser_setup.create_page_context(browser)
+        with tracing.span("browser.create_page"):
+            page = await browser_setup.create_page_context(browser)
         if not page:
-            # Dọn dẹp nếu tạo page lỗi
-            await browser.close()
-            await p.stop()
             return None, "Không khởi tạo được trang Playwright"
-        print(f"Trình duyệt/trang Playwright khởi tạo sau {time.time() - start_browser_time:.2f} giây.")
+        logger.info("Trình duyệt/trang Playwright khởi tạo sau %.2f giây.", time.time() - start_browser_time)
         try:
             scraper_instance = scrapers.get_scraper(scraper_name, page, scraper_config)
-            data, error = await scraper_instance.scrape(tracking_number)
+            with tracing.span("scraper.scrape", carrier=scraper_name):
+                data, error = await scraper_instance.scrape(tracking_number)
+            url_template = _replay_url_template(scraper_name, scraper_instance, data, tracking_number)
+            if url_template:
+                try:
+                    await session_vault.harvest_playwright(scraper_name, proxy_key(selected_proxy), page,
+                                                           scraper_instance.captured_request_headers, url_template)
+                except Exception as e:
+                    logger.warning("[%s] Không thu thập được phiên Playwright: %s", scraper_name, e)
             return data, error
         finally:
-            print(f"[{scraper_name}] Đang dọn dẹp trình duyệt và context Playwright...")
-            try:
-                if page:
-                    context = page.context
-                    await page.close()
-                    if context:
-                        await context.close()
-            except Exception as e:
-                print(f"[{scraper_name}] Lỗi khi đóng page/context: {e}")
-            try:
-                if browser:
-                    await browser.close()
-            except Exception as e:
-                print(f"[{scraper_name}] Lỗi khi đóng trình duyệt: {e}")
+            logger.info("[%s] Đang dọn dẹp context Playwright...", scraper_name)
             try:
-                if p:
-                    await p.stop()
+                with tracing.span("browser.close_page"):
+                    if page:
+                        context = page.context
+                        await page.close()
+                        if context:
+                            await context.close()
             except Exception as e:
-                print(f"[{scraper_name}] Lỗi khi dừng playwright: {e}")
+                logger.warning("[%s] Lỗi khi đóng page/context: %s", scraper_name, e)
 
     elif strategy == "api":
         scraper_instance = scrapers.get_scraper(scraper_name, None, scraper_config)
+        if selected_proxy:
+            # Dùng connection pool riêng của proxy được chọn
+            scraper_instance.use_proxy(proxy_url(selected_proxy), proxy_manager.get_http_adapter(selected_proxy))
         try:
-            data, error = await asyncio.to_thread(scraper_instance.scrape, tracking_number)
+            with tracing.span("scraper.scrape", carrier=scraper_name):
+                data, error = await _to_thread(scraper_instance.scrape, tracking_number)
             return data, error
         finally:
             if hasattr(scraper_instance, 'close'):
                 try:
                     scraper_instance.close()
-                    print(f"[{scraper_name}] Đã đóng session API scraper.")
+                    logger.info("[%s] Đã đóng session API scraper.", scraper_name)
                 except Exception as e:
-                    print(f"[{scraper_name}] Lỗi khi đóng API scraper: {e}")
+                    logger.warning("[%s] Lỗi khi đóng API scraper: %s", scraper_name, e)
 
     return None, f"Strategy not found: {scraper_name}"
 
+def _replay_enabled(scraper_name: str) -> bool:
+    return config.HYBRID_REPLAY_ENABLED and scraper_name in scrapers.REPLAY_SCRAPERS
+
+def _replay_url_template(scraper_name, scraper_instance, data, tracking_number):
+    # Chỉ thu thập phiên khi kết quả đến từ request API đã bắt được (không phải từ DOM dự phòng)
+    if not data or not _replay_enabled(scraper_name) or not scraper_instance.captured_request_headers:
+        return None
+    return session_vault.replay_url_template(scraper_instance.captured_request_url, tracking_number)
+
+async def _run_replay_task(scraper_name, tracking_number, scraper_config, selected_proxy, harvested):
+    """
+    Tra cứu bằng HTTP với phiên đã thu thập từ trình duyệt.
+    Trả về None (để quay lại trình duyệt) khi phiên bị từ chối hoặc scraper HTTP lỗi.
+    """
+    scraper_instance = scrapers.get_replay_scraper(scraper_name, scraper_config)
+    if selected_proxy:
+        scraper_instance.use_proxy(proxy_url(selected_proxy), proxy_manager.get_http_adapter(selected_proxy))
+    scraper_instance.use_session(harvested)
+    try:
+        logger.info("[%s] Chiến lược: phát lại phiên qua HTTP (lần %d).", scraper_name, harvested.replays)
+        with tracing.span("scraper.replay", carrier=scraper_name, replays=harvested.replays):
+            return await _to_thread(scraper_instance.scrape, tracking_number)
+    except SessionExpiredError as e:
+        metrics.REPLAY_FALLBACKS.labels(scraper_name, "session_expired").inc()
+        session_vault.invalidate(scraper_name, proxy_key(selected_proxy), e.reason)
+    except ReplayPayloadError as e:
+        # Không trả 'không tìm thấy' từ request phát lại; bỏ phiên để trình duyệt thu thập lại
+        metrics.REPLAY_FALLBACKS.labels(scraper_name, "bad_payload").inc()
+        session_vault.invalidate(scraper_name, proxy_key(selected_proxy), e.reason)
+    except Exception as e:
+        metrics.REPLAY_FALLBACKS.labels(scraper_name, "error").inc()
+        logger.warning("[%s] Lỗi khi phát lại phiên qua HTTP, chuyển sang trình duyệt: %s", scraper_name, e)
+    finally:
+        scraper_instance.close()
+    return None
+
+def _refresh_selenium_session(scraper_name, scraper_config, proxy_info):
+    # Mở trang chủ hãng tàu trên driver của pool và thu thập lại cookie (header cũ được giữ lại)
+    pool = proxy_manager.get_driver_pool(proxy_info) if proxy_info else driver_pool
+    driver = pool.get_driver(carrier=f"{scraper_name} (làm mới phiên)")
+    try:
+        driver.get(scraper_config['url'])
+        session_vault.harvest_selenium(scraper_name, proxy_key(proxy_info), driver)
+    finally:
+        pool.return_driver(driver)
+
+async def _refresh_playwright_session(scraper_name, scraper_config, proxy_info):
+    browser = await browser_setup.browser_pool.get_browser(proxy_key(proxy_info), proxy_info)
+    page = await browser_setup.create_page_context(browser) if browser else None
+    if not page:
+        raise RuntimeError("Không khởi tạo được trang Playwright")
+    try:
+        await page.goto(scraper_config['url'], wait_until="domcontentloaded")
+        await session_vault.harvest_playwright(scraper_name, proxy_key(proxy_info), page)
+    finally:
+        context = page.context
+        await page.close()
+        await context.close()
+
+async def refresh_sessions_loop():
+    """Định kỳ dùng trình duyệt làm mới các phiên đang được dùng và sắp hết hạn trong session_vault."""
+    while True:
+        await asyncio.sleep(config.SESSION_VAULT_REFRESH_INTERVAL_SECONDS)
+        for scraper_name, key in session_vault.due_for_refresh():
+            scraper_config = config.SCRAPER_CONFIGS.get(scraper_name, {})
+            proxy_info = proxy_manager.proxies.get(key) if key else None
+            try:
+                logger.info("[%s] Đang làm mới phiên HTTP bằng trình duyệt (proxy %s)...", scraper_name, key)
+                if SCRAPER_STRATEGY.get(scraper_name) == "selenium":
+                    await asyncio.to_thread(_refresh_selenium_session, scraper_name, scraper_config, proxy_info)
+                else:
+                    await _refresh_playwright_session(scraper_name, scraper_config, proxy_info)
+            except Exception as e:
+                logger.warning("[%s] Lỗi khi làm mới phiên: %s", scraper_name, e)
+
+def _is_carrier_failure(error: Optional[str]) -> bool:
+    """
+    Phân loại lỗi cho circuit breaker: chỉ tính là lỗi của hãng tàu khi trang/API
+    timeout, lỗi kết nối, lỗi HTTP hoặc không parse được. "Không tìm thấy" (mã sai)
+    nghĩa là hãng tàu vẫn phản hồi bình thường.
+    """
+    if not error:
+        return False
+    if "timeout" in error.lower():
+        return True
+    return "Không tìm thấy" not in error and "returned no data" not in error
+
 # --- Endpoint để lấy danh sách services ---
 @app.get("/api/v1/services")
 async def get_available_services():
@@ -157,11 +343,200 @@ async def get_available_services():
     API endpoint để lấy danh sách tất cả các service_name khả dụng.
     """
     available_services = list(scrapers.SCRAPERS.keys())
-    return JSONResponse(content={"services": available_services})
+    return JSONResponse(content={
+        "services": available_services,
+        # Trạng thái circuit breaker của từng hãng tàu (closed / open / half_open)
+        "circuit_breakers": circuit_breakers.snapshot(available_services),
+        # Tình trạng proxy theo từng hãng tàu và proxy đang được gán (sticky)
+        "proxies": proxy_manager.snapshot(),
+        # Phiên trình duyệt đang được phát lại qua HTTP và số lần thu thập/phát lại/bị từ chối
+        "sessions": session_vault.snapshot(),
+    })
+
+# --- Gauge của các pool cho /metrics (đọc tại thời điểm scrape) ---
+def _driver_pool_samples():
+    pools = {"default": driver_pool.stats(), **proxy_manager.driver_pool_stats()}
+    return [
+        (f"scraper_driver_pool_{name}", f"Driver Pool: số driver ({name})", {"proxy": key}, value)
+        for key, stats in pools.items() for name, value in stats.items()
+    ]
+
+def _browser_pool_samples():
+    samples = []
+    for key, stats in browser_setup.browser_pool.stats().items():
+        samples.append(("scraper_browser_connected", "Trình duyệt Playwright còn kết nối", {"proxy": key}, int(stats["connected"])))
+        samples.append(("scraper_browser_contexts", "Số context Playwright đang mở", {"proxy": key}, stats["contexts"]))
+    return samples
+
+def _circuit_breaker_samples():
+    return [
+        ("scraper_circuit_breaker_open", "Circuit breaker của hãng tàu đang mở (1) hoặc không (0)",
+         {"carrier": name, "state": state["state"]}, int(state["state"] != "closed"))
+        for name, state in circuit_breakers.snapshot().items()
+    ]
+
+def _session_vault_samples():
+    return [
+        ("scraper_session_vault_sessions", "Số phiên trình duyệt còn hạn trong session_vault", {"carrier": carrier}, len(sessions))
+        for carrier, sessions in session_vault.snapshot()["sessions"].items()
+    ]
+
+metrics.pool_collector.register("driver_pool", _driver_pool_samples)
+metrics.pool_collector.register("browser_pool", _browser_pool_samples)
+metrics.pool_collector.register("circuit_breakers", _circuit_breaker_samples)
+metrics.pool_collector.register("session_vault", _session_vault_samples)
+
+# --- Endpoint Prometheus ---
+@app.get("/metrics")
+async def get_metrics():
+    """
+    Metrics định dạng Prometheus: histogram thời gian theo hãng tàu / chiến lược / giai đoạn
+    (scraper_phase_seconds), tổng thời gian tra cứu (scraper_request_seconds) và gauge của các pool.
+    """
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+# --- Endpoint thống kê cache HTTP có điều kiện ---
+@app.get("/api/v1/cache/stats")
+async def get_cache_stats():
+    """
+    Thống kê cache ETag/Last-Modified theo từng hãng tàu: số request, số lần 304,
+    số byte nhận về (đã nén / sau giải nén) và thời gian ước tính tiết kiệm được.
+    """
+    return JSONResponse(content=http_cache.stats())
+
+# --- Xác thực endpoint quản trị /admin/* ---
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Dependency chung của /admin/*: header X-Admin-Token phải khớp ADMIN_TOKEN (để trống -> tắt /admin/*)."""
+    if not config.ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Endpoint quản trị chưa được bật (ADMIN_TOKEN).")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, config.ADMIN_TOKEN):
+        raise HTTPException(status_code=401, detail="Sai hoặc thiếu X-Admin-Token.")
+
+def require_admin_write(x_admin_token: Optional[str] = Header(None)):
+    """Như require_admin, thêm điều kiện ADMIN_WRITE_ENABLED cho endpoint thay đổi trạng thái."""
+    require_admin(x_admin_token)
+    if not config.ADMIN_WRITE_ENABLED:
+        raise HTTPException(status_code=403, detail="Endpoint quản trị thay đổi trạng thái chưa được bật (ADMIN_WRITE_ENABLED).")
+
+# --- Endpoint quản trị profiler lấy mẫu cho request chậm ---
+@app.get("/admin/profiler", dependencies=[Depends(require_admin)])
+async def get_profiler_status():
+    """
+    Trạng thái profiler (bật/tắt, ngưỡng, chu kỳ lấy mẫu) và tóm tắt các profile đã lưu
+    (thời gian request, số mẫu, giây CPU, thời gian từng giai đoạn).
+    """
+    return JSONResponse(content=profiler.status())
+
+@app.post("/admin/profiler", dependencies=[Depends(require_admin_write)])
+async def configure_profiler(
+    enabled: Optional[bool] = Form(None),
+    threshold_seconds: Optional[float] = Form(None),
+    interval_seconds: Optional[float] = Form(None),
+):
+    """Bật/tắt profiler hoặc đổi ngưỡng/chu kỳ lấy mẫu khi đang chạy, không cần khởi động lại."""
+    profiler.configure(enabled=enabled, threshold=threshold_seconds, interval=interval_seconds)
+    return JSONResponse(content=profiler.status())
+
+@app.get("/admin/profiler/profiles/{profile_id}", dependencies=[Depends(require_admin)])
+async def get_profile(profile_id: str, format: str = "json", kind: str = "wall"):
+    """
+    Một profile đã lưu. format=json: các stack/hàm tốn thời gian nhất (wall và CPU);
+    format=collapsed: toàn bộ stack dạng collapsed (kind=wall|cpu) để vẽ flame graph (flamegraph.pl, speedscope).
+    """
+    profile = profiler.get(profile_id)
+    if profile is None:
+        return JSONResponse(status_code=404, content={"Message": f"Không tìm thấy profile '{profile_id}'."})
+    if format == "collapsed":
+        return Response(content=profile.collapsed(kind), media_type="text/plain")
+    return JSONResponse(content=profile.to_dict())
+
+@app.delete("/admin/profiler/profiles", dependencies=[Depends(require_admin_write)])
+async def clear_profiles():
+    profiler.clear()
+    return JSONResponse(content=profiler.status())
+
+# --- Endpoint quản trị: trạng thái tức thời của các pool và hàng đợi ---
+def _executor_stats():
+    # Executor mặc định của asyncio.to_thread (chỉ có sau lần to_thread đầu tiên nếu không đặt THREAD_POOL_WORKERS)
+    executor = getattr(asyncio.get_running_loop(), "_default_executor", None)
+    if not isinstance(executor, ThreadPoolExecutor):
+        return None
+    return {
+        "max_workers": executor._max_workers,
+        "threads": len(executor._threads),
+        "queued": executor._work_queue.qsize(),
+    }
+
+@app.get("/admin/status", dependencies=[Depends(require_admin)])
+async def get_admin_status():
+    """
+    Trạng thái tức thời để dashboard poll (chỉ đọc bộ nhớ và /proc, không gọi trình duyệt):
+    từng driver của các Driver Pool (tuổi, số lần dùng, hãng tàu đang dùng, RSS), trình duyệt/context Playwright,
+    executor và các hàng đợi nền, request đang chạy, cache, tình trạng proxy, circuit breaker và phiên đã thu thập.
+    """
+    now = time.time()
+    profiler_status = profiler.status()
+    profiler_status["profiles"] = len(profiler_status["profiles"])
+    return JSONResponse(content={
+        "driver_pools": {"default": driver_pool.snapshot(), **proxy_manager.driver_pool_snapshots()},
+        "browser_pool": browser_setup.browser_pool.stats(),
+        "executor": _executor_stats(),
+        "queues": {
+            "log": log_setup.stats(),
+            "artifacts": artifact_store.stats(),
+        },
+        "in_flight": sorted(
+            ({**request, "request_id": request_id, "elapsed_s": round(now - request["started_at"], 2)}
+             for request_id, request in list(_in_flight.items())),
+            key=lambda request: -request["elapsed_s"],
+        ),
+        "caches": {
+            "http": http_cache.stats(),
+            "date_normalizer": date_normalizer.cache_info(),
+        },
+        "proxies": proxy_manager.snapshot(),
+        "circuit_breakers": circuit_breakers.snapshot(),
+        "sessions": session_vault.snapshot(),
+        "profiler": profiler_status,
+        # Hãng tàu đang bị canary đánh dấu (chi tiết tại /admin/canary)
+        "canary_flagged": {carrier: reasons for carrier, reasons in canary.flags.items() if reasons},
+    })
+
+@app.get("/admin/canary", dependencies=[Depends(require_admin)])
+async def get_canary_status():
+    """
+    Kết quả canary của từng hãng tàu: lượt cuối, trung vị thời gian gần đây so với baseline trượt,
+    tỷ lệ thành công gần đây và lý do bị đánh dấu ('slower', 'failing').
+    """
+    return JSONResponse(content=canary.status())
 
 # --- Endpoint để thực hiện scrape web ---
 @app.post("/api/v1/track", response_model=Result)
-async def track(bl_number: str = Form(...), service_name: str = Form(...)):
+async def track(response: Response, bl_number: str = Form(...), service_name: str = Form(...)):
+    # Mỗi request là một trace; mã trace trả về trong header X-Trace-Id để tra cứu trong exporter
+    with tracing.start_trace("track", carrier=service_name, tracking_number=bl_number) as root, \
+            log_setup.request_context(carrier=service_name, tracking_number=bl_number) as request_id:
+        _in_flight[request_id] = {
+            "carrier": service_name,
+            "tracking_number": bl_number,
+            "strategy": SCRAPER_STRATEGY.get(service_name),
+            "started_at": time.time(),
+        }
+        try:
+            # Profile chỉ được giữ lại khi request chậm hơn ngưỡng của profiler
+            with profiler.profile_request(carrier=service_name, tracking_number=bl_number):
+                result = await _track(bl_number, service_name)
+        finally:
+            _in_flight.pop(request_id, None)
+        headers = (result if isinstance(result, Response) else response).headers
+        # Mã tương quan của mọi dòng log của request (trường request_id)
+        headers["X-Request-Id"] = request_id
+        if root is not None:
+            root.set_attribute("status", result.status_code if isinstance(result, Response) else result.Status)
+            headers["X-Trace-Id"] = root.trace.trace_id
+        return result
+
+async def _track(bl_number: str, service_name: str):
     if service_name not in scrapers.SCRAPERS.keys():
         return Result(
             Error=True,
@@ -170,7 +545,34 @@ async def track(bl_number: str = Form(...), service_name: str = Form(...)):
             MessageStatus="Bad Request"
         )
 
-    data, error = await run_scraping_task(service_name, bl_number)
+    # Fail-fast nếu breaker của hãng tàu đang mở
+    breaker = circuit_breakers.get(service_name)
+    try:
+        breaker.before_request()
+    except CircuitOpenError as e:
+        response_content = Result(
+            Error=True,
+            Message=str(e),
+            Status=503,
+            MessageStatus="Service Unavailable",
+            Service=service_name
+        ).model_dump(exclude_none=True)
+        return JSONResponse(
+            status_code=503,
+            content=response_content,
+            headers={"Retry-After": str(int(e.retry_after) + 1)}
+        )
+
+    try:
+        data, error = await run_scraping_task(service_name, bl_number)
+    except Exception as e:
+        breaker.record_failure(str(e))
+        raise
+
+    if _is_carrier_failure(error):
+        breaker.record_failure(error)
+    else:
+        breaker.record_success()
 
     if error or not data:
         message = error or f"Không tìm thấy thông tin cho mã '{bl_number}' trên trang {service_name}."
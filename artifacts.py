@@ -0,0 +1,192 @@
+import os
+import gzip
+import json
+import time
+import queue
+import base64
+import random
+import logging
+import threading
+import collections
+from datetime import datetime
+
+import config
+import tracing
+import log_setup
+
+logger = logging.getLogger(__name__)
+
+
+class ArtifactStore:
+    """
+    Lưu ảnh chụp màn hình + DOM của lượt tra cứu lỗi (vd: timeout) để debug.
+
+    Trên thread của request chỉ lấy dữ liệu thô từ trình duyệt (ảnh JPEG base64 qua CDP, page_source); giải mã,
+    nén và ghi file do một worker nền làm, nên driver được trả về pool sớm hơn.
+    Giới hạn: mỗi hãng tàu tối đa max_per_carrier artifact mỗi window_seconds (kèm tỷ lệ lấy mẫu sample_rate),
+    và tổng dung lượng thư mục không vượt quota_bytes (xóa artifact cũ nhất trước).
+    """
+    def __init__(self, directory, max_per_carrier, window_seconds, sample_rate, quota_bytes, queue_size):
+        self.directory = directory
+        self.max_per_carrier = max_per_carrier
+        self.window_seconds = window_seconds
+        self.sample_rate = sample_rate
+        self.quota_bytes = quota_bytes
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._recent = collections.defaultdict(collections.deque)  # hãng tàu -> thời điểm các lần lưu gần đây
+        self._counts = collections.Counter()
+        self._lock = threading.Lock()
+        self._files = None  # [(mtime, đường dẫn, kích thước)] trong thư mục, nạp lười ở worker
+        self._total_bytes = 0
+        self._worker = None
+
+    def should_capture(self, carrier):
+        """Quyết định lấy mẫu theo hãng tàu (gọi trước khi chụp để không tốn round-trip trình duyệt)."""
+        now = time.time()
+        with self._lock:
+            recent = self._recent[carrier]
+            while recent and recent[0] < now - self.window_seconds:
+                recent.popleft()
+            if len(recent) >= self.max_per_carrier or random.random() >= self.sample_rate:
+                self._counts["skipped"] += 1
+                return False
+            recent.append(now)
+            return True
+
+    def capture_selenium(self, carrier, tracking_number, driver, reason):
+        """Chụp nhanh từ WebDriver và đưa việc ghi file cho worker. Trả về tiền tố đường dẫn artifact hoặc None."""
+        if not self.should_capture(carrier):
+            return None
+        try:
+            try:
+                # Ảnh JPEG mã hóa trong trình duyệt nhanh hơn PNG của save_screenshot
+                screenshot = driver.execute_cdp_cmd("Page.captureScreenshot", {"format": "jpeg", "quality": 60})["data"]
+                extension = "jpg"
+            except Exception:
+                screenshot, extension = driver.get_screenshot_as_base64(), "png"
+            html, url = driver.page_source, driver.current_url
+        except Exception as e:
+            logger.warning("[Artifacts] Không chụp được trang của '%s' / '%s': %s", carrier, tracking_number, e)
+            return None
+        return self._submit(carrier, tracking_number, reason, screenshot, extension, html, url)
+
+    async def capture_playwright(self, carrier, tracking_number, page, reason):
+        if not self.should_capture(carrier):
+            return None
+        try:
+            screenshot = await page.screenshot(type="jpeg", quality=60)
+            html, url = await page.content(), page.url
+        except Exception as e:
+            logger.warning("[Artifacts] Không chụp được trang của '%s' / '%s': %s", carrier, tracking_number, e)
+            return None
+        return self._submit(carrier, tracking_number, reason, screenshot, "jpg", html, url)
+
+    def _submit(self, carrier, tracking_number, reason, screenshot, extension, html, url):
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+        safe_number = "".join(c if c.isalnum() or c in "-_" else "_" for c in tracking_number)
+        prefix = os.path.join(self.directory, carrier, f"{timestamp}_{safe_number}_{reason}")
+        job = {
+            "prefix": prefix,
+            "screenshot": screenshot,
+            "extension": extension,
+            "html": html,
+            "meta": {
+                "carrier": carrier,
+                "tracking_number": tracking_number,
+                "reason": reason,
+                "url": url,
+                "request_id": log_setup.current_request_id(),
+                "trace_id": tracing.current_trace_id(),
+                "captured_at": datetime.now().isoformat(timespec="seconds"),
+            },
+        }
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            with self._lock:
+                self._counts["dropped"] += 1
+            logger.warning("[Artifacts] Hàng đợi ghi artifact đầy, bỏ artifact của '%s' / '%s'.", carrier, tracking_number)
+            return None
+        self._ensure_worker()
+        return prefix
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="artifact-writer", daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            try:
+                self._write(job)
+            except Exception as e:
+                logger.error("[Artifacts] Lỗi khi ghi artifact %s: %s", job["prefix"], e)
+            finally:
+                self._queue.task_done()
+
+    def _write(self, job):
+        if self._files is None:
+            self._scan()
+        os.makedirs(os.path.dirname(job["prefix"]), exist_ok=True)
+        screenshot = job["screenshot"]
+        contents = {
+            f"{job['prefix']}.{job['extension']}": base64.b64decode(screenshot) if isinstance(screenshot, str) else screenshot,
+            f"{job['prefix']}.html.gz": gzip.compress((job["html"] or "").encode("utf-8"), compresslevel=6),
+            f"{job['prefix']}.json": json.dumps(job["meta"], ensure_ascii=False, indent=2).encode("utf-8"),
+        }
+        for path, data in contents.items():
+            with open(path, "wb") as f:
+                f.write(data)
+            self._files.append((time.time(), path, len(data)))
+            self._total_bytes += len(data)
+        with self._lock:
+            self._counts["saved"] += 1
+        logger.info("[Artifacts] Đã lưu artifact %s (%d bytes).", job["prefix"], sum(len(d) for d in contents.values()))
+        self._enforce_quota()
+
+    def _scan(self):
+        self._files = []
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                self._files.append((stat.st_mtime, path, stat.st_size))
+        self._files.sort()
+        self._total_bytes = sum(size for _, _, size in self._files)
+
+    def _enforce_quota(self):
+        # Xóa file cũ nhất cho tới khi tổng dung lượng dưới quota
+        while self._total_bytes > self.quota_bytes and self._files:
+            _, path, size = self._files.pop(0)
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            self._total_bytes -= size
+            with self._lock:
+                self._counts["evicted_files"] += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                **{name: self._counts[name] for name in ("saved", "skipped", "dropped", "evicted_files")},
+                "queued": self._queue.qsize(),
+                "disk_bytes": self._total_bytes,
+                "quota_bytes": self.quota_bytes,
+            }
+
+
+# Khởi tạo một instance toàn cục (Singleton)
+artifact_store = ArtifactStore(
+    directory=config.ARTIFACTS_DIR,
+    max_per_carrier=config.ARTIFACTS_MAX_PER_CARRIER,
+    window_seconds=config.ARTIFACTS_WINDOW_SECONDS,
+    sample_rate=config.ARTIFACTS_SAMPLE_RATE,
+    quota_bytes=config.ARTIFACTS_QUOTA_MB * 1024 * 1024,
+    queue_size=config.ARTIFACTS_QUEUE_SIZE,
+)
@@ -0,0 +1,322 @@
+"""
+Benchmark và kiểm tra golden cho scrapers/date_normalizer.py.
+
+- Kiểm tra bộ chuẩn hóa mới với toàn bộ định dạng ngày đang gặp trong các scraper (GOLDEN_CASES).
+- So sánh kết quả với các hàm _format_date cũ (LEGACY_FORMATTERS, chép nguyên từ scraper trước khi refactor).
+- Đo thời gian: hàm cũ, bộ chuẩn hóa mới khi cache trống và khi cache đã nóng.
+
+Chạy từ thư mục gốc của repo:
+    python -m benchmarks.date_normalizer_bench [--number 20000]
+"""
+import sys
+import time
+import logging
+import argparse
+from datetime import datetime
+
+from scrapers import date_normalizer
+
+# --- Các hàm _format_date cũ (bỏ phần log) ---
+
+def _legacy_tailwind(date_str):
+    if not date_str or not isinstance(date_str, str):
+        return None
+    month_to_number = {
+        'Jan': '01', 'Feb': '02', 'Mar': '03', 'Apr': '04',
+        'May': '05', 'Jun': '06', 'Jul': '07', 'Aug': '08',
+        'Sep': '09', 'Oct': '10', 'Nov': '11', 'Dec': '12'
+    }
+    for mon_str, mon_num in month_to_number.items():
+        if mon_str in date_str:
+            date_str = date_str.replace(mon_str, mon_num)
+            break
+    if "ETD:" in date_str: date_str = date_str.replace("ETD:", "").strip()
+    if "ETA:" in date_str: date_str = date_str.replace("ETA:", "").strip()
+    for fmt in ('%d-%b-%Y %H:%M', '%d/%m/%Y %I:%M %p'):
+        try:
+            return datetime.strptime(date_str, fmt).strftime('%d/%m/%Y')
+        except ValueError:
+            continue
+    return date_str
+
+
+def _legacy_split(fmt, sep, on_invalid, keep_original):
+    # IAL, COSCO, HEUNG-A, SNK, YML, SITC, CSL, UNIFEEDER, TRANSLINER, GOLSTAR, ONE
+    def formatter(date_str):
+        if not date_str or not isinstance(date_str, str):
+            return on_invalid
+        try:
+            date_part = date_str.split(sep)[0]
+            if not date_part:
+                return ""
+            return datetime.strptime(date_part, fmt).strftime('%d/%m/%Y')
+        except (ValueError, IndexError):
+            return date_str if keep_original else ""
+    return formatter
+
+
+def _legacy_emc(date_str):
+    if not date_str or not isinstance(date_str, str):
+        return None
+    try:
+        return datetime.strptime(date_str.strip().title(), '%b-%d-%Y').strftime('%d/%m/%Y')
+    except (ValueError, IndexError):
+        return date_str
+
+
+def _legacy_msc(date_str):
+    if not date_str or not isinstance(date_str, str):
+        return ""
+    try:
+        datetime.strptime(date_str, '%d/%m/%Y')
+        return date_str
+    except (ValueError, TypeError):
+        return ""
+
+
+def _legacy_compact(date_str):
+    # KMTC, PAN: 'YYYYMMDDHHMM'
+    if not date_str or not isinstance(date_str, str) or len(date_str) < 8:
+        return ""
+    try:
+        return datetime.strptime(date_str[:8], '%Y%m%d').strftime('%d/%m/%Y')
+    except (ValueError, IndexError):
+        return ""
+
+
+def _legacy_sealead(date_str):
+    if not date_str or not isinstance(date_str, str):
+        return ""
+    try:
+        return datetime.strptime(date_str.strip(), '%B %d, %Y').strftime('%d/%m/%Y')
+    except ValueError:
+        try:
+            date_part = date_str.strip().split(" ")[0]
+            return datetime.strptime(date_part, '%Y-%m-%d').strftime('%d/%m/%Y')
+        except ValueError:
+            return ""
+
+
+def _legacy_osl(date_str):
+    if not date_str or not isinstance(date_str, str):
+        return ""
+    try:
+        return datetime.strptime(date_str.split(", ")[1], '%d-%b-%Y').strftime('%d/%m/%Y')
+    except (ValueError, IndexError):
+        return ""
+
+
+def _legacy_zim(date_str):
+    if not date_str or not isinstance(date_str, str):
+        return ""
+    try:
+        return datetime.fromisoformat(date_str.replace('Z', '+00:00')).strftime('%d/%m/%Y')
+    except (ValueError, TypeError):
+        return ""
+
+
+def _legacy_pil(date_str):
+    if not date_str or not isinstance(date_str, str):
+        return ""
+    cleaned_date_str = date_str.strip().lstrip('*').strip()
+    for fmt in ('%d-%b-%Y %H:%M:%S', '%d-%b-%Y'):
+        try:
+            return datetime.strptime(cleaned_date_str, fmt).strftime('%d/%m/%Y')
+        except ValueError:
+            continue
+    return date_str
+
+
+def _legacy_maersk(date_str):
+    if not date_str:
+        return None
+    try:
+        clean_date_str = date_str.split('(')[0].strip()
+        return datetime.strptime(clean_date_str, '%d %b %Y %H:%M').strftime('%d/%m/%Y')
+    except (ValueError, IndexError):
+        try:
+            return datetime.strptime(clean_date_str, '%d %b %Y').strftime('%d/%m/%Y')
+        except (ValueError, IndexError):
+            return date_str
+
+
+LEGACY_FORMATTERS = {
+    "IAL": _legacy_split('%Y/%m/%d', " ", None, True),
+    "Tailwind": _legacy_tailwind,
+    "COSCO": _legacy_split('%Y-%m-%d', " ", None, True),
+    "EMC": _legacy_emc,
+    "MSK": _legacy_maersk,
+    "MSC": _legacy_msc,
+    "CSL": _legacy_split('%d/%m/%Y', " ", "", False),
+    "PIL": _legacy_pil,
+    "SNK": _legacy_split('%Y-%m-%d', " ", "", False),
+    "HEUNG-A": _legacy_split('%Y-%m-%d', " ", "", False),
+    "UNIFEEDER": _legacy_split('%Y-%m-%d', "T", "", False),
+    "KMTC": _legacy_compact,
+    "SITC": _legacy_split('%Y-%m-%d', " ", "", False),
+    "GOLSTAR": _legacy_split('%Y-%m-%d', "T", "", False),
+    "YML": _legacy_split('%Y/%m/%d', " ", "", False),
+    "ONE": _legacy_split('%Y-%m-%d', "T", "", False),
+    "OSL": _legacy_osl,
+    "PAN": _legacy_compact,
+    "SEALEAD": _legacy_sealead,
+    "TRANSLINER": _legacy_split('%Y-%m-%d', "T", "", False),
+    "ZIM": _legacy_zim,
+}
+
+# --- Golden cases: (hãng, đầu vào, kết quả mong đợi) ---
+GOLDEN_CASES = [
+    ("IAL", "2025/10/04 20:30:00", "04/10/2025"),
+    ("IAL", "2025/10/04", "04/10/2025"),
+    ("IAL", "N/A", "N/A"),
+    ("IAL", "", None),
+    ("Tailwind", "14-Oct-2025 06:51", "14/10/2025"),
+    ("Tailwind", "ETD: 01/10/2025 11:18 am", "01/10/2025"),
+    ("Tailwind", "ETA: 05/11/2025 02:00 PM", "05/11/2025"),
+    ("Tailwind", "TBA", "TBA"),
+    ("Tailwind", None, None),
+    ("COSCO", "2025-09-21 10:00:00", "21/09/2025"),
+    ("COSCO", "2025-09-21 10:00 CST", "21/09/2025"),
+    ("COSCO", "-", "-"),
+    ("EMC", "SEP-21-2025", "21/09/2025"),
+    ("EMC", " Oct-05-2025 ", "05/10/2025"),
+    ("EMC", "To be advised", "To be advised"),
+    ("MSK", "24 Oct 2025 09:00", "24/10/2025"),
+    ("MSK", "24 Oct 2025", "24/10/2025"),
+    ("MSK", "24 Oct 2025 09:00 (Estimated)", "24/10/2025"),
+    ("MSK", "", None),
+    ("MSC", "05/10/2025", "05/10/2025"),
+    ("MSC", "2025-10-05", ""),
+    ("MSC", "5/10/2025", "5/10/2025"),
+    ("MSC", " 05/10/2025", ""),
+    ("CSL", "05/10/2025 13:45", "05/10/2025"),
+    ("CSL", "05/10/2025", "05/10/2025"),
+    ("CSL", "", ""),
+    ("PIL", "21-Sep-2025 10:00:00", "21/09/2025"),
+    ("PIL", "*21-Sep-2025", "21/09/2025"),
+    ("PIL", " * 21-Sep-2025 ", "21/09/2025"),
+    ("PIL", "Pending", "Pending"),
+    ("SNK", "2025-10-04 20:30", "04/10/2025"),
+    ("SNK", "2025-10-04", "04/10/2025"),
+    ("SNK", "2025/10/04", ""),
+    ("HEUNG-A", "2025-10-04 20:30", "04/10/2025"),
+    ("UNIFEEDER", "2025-10-04T20:30:00", "04/10/2025"),
+    ("UNIFEEDER", "2025-10-04T20:30:00+07:00", "04/10/2025"),
+    ("UNIFEEDER", "T20:30", ""),
+    ("KMTC", "202510042030", "04/10/2025"),
+    ("KMTC", "20251004", "04/10/2025"),
+    ("KMTC", "2025100", ""),
+    ("KMTC", "20251341", ""),
+    ("SITC", "2025-10-04 20:30", "04/10/2025"),
+    ("SITC", " 2025-10-04", ""),
+    ("GOLSTAR", "2025-10-04T20:30:00.000", "04/10/2025"),
+    ("YML", "2025/10/04 20:30", "04/10/2025"),
+    ("YML", "To Be Advised", ""),
+    ("ONE", "2025-10-04T20:30:00.000Z", "04/10/2025"),
+    ("OSL", "Saturday, 04-Oct-2025", "04/10/2025"),
+    ("OSL", "04-Oct-2025", ""),
+    ("PAN", "202510042030", "04/10/2025"),
+    ("PAN", "", ""),
+    ("SEALEAD", "October 4, 2025", "04/10/2025"),
+    ("SEALEAD", " October 04, 2025 ", "04/10/2025"),
+    ("SEALEAD", "2025-10-04 20:30:00", "04/10/2025"),
+    ("SEALEAD", "Oct 4, 2025", ""),
+    ("SEALEAD", "October 4, 2025 (ETA)", ""),
+    ("SEALEAD", "2025-10-04\t20:30", ""),
+    ("SEALEAD", "2025-10-04\n", "04/10/2025"),
+    ("TRANSLINER", "2025-10-04T20:30:00Z", "04/10/2025"),
+    ("ZIM", "2025-08-11T19:55:00", "11/08/2025"),
+    ("ZIM", "2025-08-11T19:55:00Z", "11/08/2025"),
+    ("ZIM", "2025-08-11", "11/08/2025"),
+    ("ZIM", "11/08/2025", ""),
+    ("ZIM", "20250811", "11/08/2025"),
+    ("ZIM", "2025-08-11 19:55:00+07:00", "11/08/2025"),
+    ("ZIM", "2025-08-11Tfoo", ""),
+]
+
+# Các khác biệt có chủ đích so với hàm cũ
+INTENDED_DIFFERENCES = {
+    # Hàm cũ thay 'Oct' -> '10' trước khi parse bằng '%d-%b-%Y', nên không bao giờ parse được định dạng này
+    ("Tailwind", "14-Oct-2025 06:51"),
+    # Hàm cũ không loại bỏ khoảng trắng trước dấu '*'
+    ("PIL", " * 21-Sep-2025 "),
+}
+
+
+def check_golden():
+    failures = 0
+    for carrier, value, expected in GOLDEN_CASES:
+        result = date_normalizer.format_date(carrier, value)
+        if result != expected:
+            failures += 1
+            print(f"[GOLDEN FAIL] {carrier} {value!r}: {result!r} != {expected!r}")
+        legacy = LEGACY_FORMATTERS[carrier](value)
+        if legacy != result and (carrier, value) not in INTENDED_DIFFERENCES:
+            print(f"[KHÁC HÀM CŨ] {carrier} {value!r}: mới={result!r} cũ={legacy!r}")
+    print(f"Golden cases: {len(GOLDEN_CASES) - failures}/{len(GOLDEN_CASES)} đạt")
+    return failures
+
+
+def _time(func, values, number):
+    start = time.perf_counter()
+    for _ in range(number):
+        for value in values:
+            func(value)
+    return time.perf_counter() - start
+
+
+def run_benchmark(number):
+    by_carrier = {}
+    for carrier, value, _ in GOLDEN_CASES:
+        by_carrier.setdefault(carrier, []).append(value)
+
+    print(f"\n{'Hãng':<12}{'cũ (µs)':>10}{'mới-lạnh (µs)':>16}{'mới-nóng (µs)':>16}{'x nóng':>9}")
+    total_legacy = total_cold = total_warm = 0.0
+    for carrier, values in by_carrier.items():
+        calls = number * len(values)
+        legacy = _time(LEGACY_FORMATTERS[carrier], values, number)
+
+        # Lạnh: xóa cache trước mỗi lượt để đo chi phí regex + dựng datetime
+        def cold(value, carrier=carrier):
+            date_normalizer._parse_cached.cache_clear()
+            return date_normalizer.format_date(carrier, value)
+        clear_cost = _time(lambda v: date_normalizer._parse_cached.cache_clear(), values, number)
+        cold_time = max(0.0, _time(cold, values, number) - clear_cost)
+
+        warm_time = _time(lambda v, carrier=carrier: date_normalizer.format_date(carrier, v), values, number)
+
+        total_legacy += legacy
+        total_cold += cold_time
+        total_warm += warm_time
+        print(f"{carrier:<12}{legacy / calls * 1e6:>10.2f}{cold_time / calls * 1e6:>16.2f}"
+              f"{warm_time / calls * 1e6:>16.2f}{legacy / warm_time:>9.1f}")
+
+    print(f"{'TỔNG':<12}{total_legacy:>9.3f}s{total_cold:>15.3f}s{total_warm:>15.3f}s{total_legacy / total_warm:>9.1f}")
+
+    # Batch API: chuẩn hóa toàn bộ trường ngày của một lô hàng
+    shipment = {"BookingNo": "X", "Etd": "2025-10-04T20:30:00.000Z", "Atd": "2025-10-05T01:00:00.000Z",
+                "Eta": "2025-10-20T08:00:00.000Z", "Ata": "", "EtdTransit": "2025-10-10T00:00:00.000Z",
+                "AtdTransit": "", "EtaTransit": "2025-10-09T00:00:00.000Z", "AtaTransit": ""}
+    start = time.perf_counter()
+    for _ in range(number):
+        date_normalizer.normalize_shipment_dates("ONE", shipment)
+    batch = time.perf_counter() - start
+    print(f"\nnormalize_shipment_dates (8 trường): {batch / number * 1e6:.2f} µs/lô hàng")
+    print(f"Cache: {date_normalizer.cache_info()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--number", type=int, default=20000, help="Số lượt lặp cho mỗi hãng")
+    args = parser.parse_args()
+
+    # Tắt cảnh báo "Không thể phân tích định dạng ngày" trong lúc đo
+    logging.basicConfig(level=logging.ERROR)
+
+    failures = check_golden()
+    run_benchmark(args.number)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Benchmark đọc bảng lịch trình COSCO trong Selenium: find_elements/.text cho từng ô (cách cũ)
+so với scrapers/dom_snapshot.py (một execute_script trả về JSON), kiểm tra hai cách cho cùng dữ liệu.
+
+Trang kết quả giả (cùng cấu trúc với spec COSCO_RESULT) được sinh với số chặng tùy chọn và
+mở bằng Chrome headless từ driver_setup.create_driver() (cần Chrome + chromedriver).
+
+Chạy từ thư mục gốc của repo:
+    python -m benchmarks.dom_snapshot_bench [--number 5] [--rows 1 4 20]
+"""
+import os
+import sys
+import time
+import logging
+import argparse
+import tempfile
+
+import config
+from driver_setup import create_driver
+from scrapers import dom_snapshot
+from scrapers.selenium.cosco_scraper import COSCO_RESULT
+
+
+def _schedule_cell(expected, actual):
+    return (f"<td><div><span>Expected:</span><span>{expected}</span></div>"
+            f"<div><span>Actual:</span><span>{actual}</span></div></td>")
+
+
+def make_page(rows):
+    body = []
+    for i in range(rows):
+        body.append(
+            f"<tr><td>{i + 1}</td><td>VESSEL {i} 0{i}1E</td><td>PORT {i}</td>"
+            + _schedule_cell(f"2026-01-{i + 1:02d} 10:00:00", "Not yet")
+            + f"<td>PORT {i + 1}</td>"
+            + _schedule_cell(f"2026-01-{i + 5:02d} 10:00:00", f"2026-01-{i + 6:02d} 08:00:00")
+            + "<td>-</td></tr>"
+        )
+    return (
+        "<html><body><div class='ct-side-bar'><span class='side-bar-title'><span>BKG#\"6420000000\"</span></span></div>"
+        "<div class='booking-status'>Confirmed</div><div class='ant-table-content'><table><tbody>"
+        + "".join(body) + "</tbody></table></div></body></html>"
+    )
+
+
+def _time(func, number):
+    start = time.perf_counter()
+    for _ in range(number):
+        result = func()
+    return (time.perf_counter() - start) / number, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--number", type=int, default=5, help="Số lượt lặp cho mỗi kích thước")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1, 4, 20], help="Số chặng của bảng lịch trình")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.ERROR)
+
+    driver = create_driver()
+    mismatches = 0
+    try:
+        print(f"{'Chặng':>6}{'find_elements (s)':>20}{'execute_script (s)':>20}{'x':>8}")
+        for rows in args.rows:
+            with tempfile.NamedTemporaryFile("w", suffix=".html", delete=False, encoding="utf-8") as f:
+                f.write(make_page(rows))
+            try:
+                driver.get("file://" + f.name)
+                config.SELENIUM_JS_EXTRACTION_ENABLED = False
+                elements_time, expected = _time(lambda: dom_snapshot.snapshot(driver, COSCO_RESULT), args.number)
+                config.SELENIUM_JS_EXTRACTION_ENABLED = True
+                script_time, result = _time(lambda: dom_snapshot.snapshot(driver, COSCO_RESULT), args.number)
+            finally:
+                os.unlink(f.name)
+            if result != expected:
+                mismatches += 1
+                print(f"[KHÁC] {rows} chặng: execute_script={result!r} find_elements={expected!r}")
+            print(f"{rows:>6}{elements_time:>20.3f}{script_time:>20.3f}{elements_time / script_time:>8.1f}")
+    finally:
+        driver.quit()
+
+    print("Kết quả: " + ("hai cách cho cùng dữ liệu" if not mismatches else f"{mismatches} trường hợp khác nhau"))
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+Benchmark thời gian parse + trích xuất trang BL Detail của cổng ebiz (Sinokor, Heung-A).
+
+So sánh cách cũ (BeautifulSoup trên response.text + find/select_one) với
+scrapers/ebiz_extractor.py (lxml từ bytes + XPath biên dịch sẵn) và chế độ đọc theo luồng
+(extract_bl_detail_response, dừng khi các section cần thiết đã đóng), đồng thời kiểm tra
+các cách cho ra cùng dữ liệu thô trên các fixture đã lưu.
+
+--trailer-kb chèn thêm phần chrome giả (script, link...) trước </body> để mô phỏng trang thật,
+nơi bảng dữ liệu chỉ chiếm một phần nhỏ của response.
+
+Chạy từ thư mục gốc của repo:
+    python -m benchmarks.ebiz_extractor_bench [--number 200] [--trailer-kb 200] [fixture.html ...]
+"""
+import os
+import sys
+import time
+import logging
+import argparse
+
+from bs4 import BeautifulSoup
+
+from scrapers import ebiz_extractor, extraction
+from scrapers.extraction_specs import EBIZ_BL_DETAIL
+
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+DEFAULT_FIXTURES = ["ebiz_bl_detail.html", "ebiz_not_found.html"]
+
+
+def _text_safe(soup_element, selector):
+    if not soup_element:
+        return ""
+    target = soup_element.select_one(selector)
+    return ' '.join(target.stripped_strings) if target else ""
+
+
+def _labeled_value(soup, label):
+    label_tag = soup.find('label', string=lambda text: text and label in text)
+    if label_tag:
+        group_div = label_tag.find_parent('div', class_='form-group')
+        if group_div:
+            value_div = group_div.find_next_sibling('div')
+            if value_div:
+                return _text_safe(value_div, 'span')
+    return ""
+
+
+def legacy_extract(content):
+    """Trích xuất theo cách cũ của SinokorScraper/HeungALineScraper (BeautifulSoup)."""
+    soup = BeautifulSoup(content.decode("utf-8"), 'lxml')
+    page = {
+        "found": False, "error_message": "", "bl_no": "", "booking_status": "",
+        "etd_raw": "", "eta_raw": "", "pol_terminal": "", "pod_terminal": "", "events": [],
+    }
+    schedule_panel = soup.select_one("#divSchedule")
+    if not schedule_panel:
+        error_alert = soup.select_one('#e-alert-message')
+        page["error_message"] = error_alert.get_text(strip=True) if error_alert else ""
+        return page
+    page["found"] = True
+    page["bl_no"] = _labeled_value(soup, 'B/L No.')
+    page["booking_status"] = _labeled_value(soup, 'B/K Status')
+    page["etd_raw"] = _text_safe(schedule_panel, "li.col-sm-8 .col-sm-6:nth-child(1)")
+    page["eta_raw"] = _text_safe(schedule_panel, "li.col-sm-8 .col-sm-6:nth-child(2)")
+    page["pol_terminal"] = _text_safe(schedule_panel.select_one("li.col-sm-8 .col-sm-6:nth-child(1)"), "a")
+    page["pod_terminal"] = _text_safe(schedule_panel.select_one("li.col-sm-8 .col-sm-6:nth-child(2)"), "span:not([class])")
+
+    tbody = soup.select_one("#divDetailInfo .splitTable table tbody")
+    current_event_group = ""
+    for row in (tbody.find_all("tr", recursive=False) if tbody else []):
+        header_th = row.find("th", class_="firstTh")
+        if header_th:
+            current_event_group = header_th.get_text(strip=True)
+            continue
+        cells = row.find_all("td", recursive=False)
+        if len(cells) < 3:
+            continue
+        first_col, location, date_text = [c.get_text(strip=True) for c in cells[:3]]
+        if date_text:
+            page["events"].append({"description": f"{current_event_group}: {first_col}",
+                                   "location": location, "date": date_text})
+    return page
+
+
+class FixtureResponse:
+    """Response giả trả nội dung fixture theo từng chunk (thay cho requests với stream=True)."""
+    headers = {}
+
+    def __init__(self, content):
+        self.content = content
+
+    def iter_content(self, chunk_size):
+        for start in range(0, len(self.content), chunk_size):
+            yield self.content[start:start + chunk_size]
+
+    def close(self):
+        pass
+
+
+def _with_trailer(content, trailer_kb):
+    # Chèn chrome giả trước </body> (kích thước xấp xỉ trailer_kb KB)
+    block = b'<div class="menu"><a href="#">link</a><script>var x = 1;</script></div>\n'
+    trailer = block * (trailer_kb * 1024 // len(block))
+    return content.replace(b"</body>", trailer + b"</body>", 1) if b"</body>" in content else content + trailer
+
+
+def _extract_stream(content):
+    return ebiz_extractor.extract_bl_detail_response(FixtureResponse(content))
+
+
+def _time(func, content, number):
+    start = time.perf_counter()
+    for _ in range(number):
+        func(content)
+    return (time.perf_counter() - start) / number
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("fixtures", nargs="*", help="File HTML đã lưu (mặc định: benchmarks/fixtures/ebiz_*.html)")
+    parser.add_argument("--number", type=int, default=200, help="Số lượt lặp cho mỗi fixture")
+    parser.add_argument("--trailer-kb", type=int, default=200, help="Kích thước chrome giả chèn cuối trang (KB, 0 = tắt)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.ERROR)
+
+    paths = args.fixtures or [os.path.join(FIXTURE_DIR, name) for name in DEFAULT_FIXTURES]
+    mismatches = 0
+    print(f"{'Fixture':<28}{'KB':>7}{'BeautifulSoup (ms)':>20}{'lxml XPath (ms)':>18}"
+          f"{'stream (ms)':>14}{'KB đã đọc':>12}{'x':>7}")
+    for path in paths:
+        with open(path, "rb") as f:
+            content = _with_trailer(f.read(), args.trailer_kb)
+
+        expected = legacy_extract(content)
+        for mode, func in (("lxml", ebiz_extractor.extract_bl_detail), ("stream", _extract_stream)):
+            result = func(content)
+            if result != expected:
+                mismatches += 1
+                for key in expected:
+                    if expected[key] != result.get(key):
+                        print(f"[KHÁC] {os.path.basename(path)} '{key}': {mode}={result.get(key)!r} bs4={expected[key]!r}")
+
+        _, bytes_read, _ = extraction.parse_html_stream(FixtureResponse(content), EBIZ_BL_DETAIL.stop_after)
+        legacy_time = _time(legacy_extract, content, args.number)
+        lxml_time = _time(ebiz_extractor.extract_bl_detail, content, args.number)
+        stream_time = _time(_extract_stream, content, args.number)
+        print(f"{os.path.basename(path):<28}{len(content) / 1024:>7.1f}{legacy_time * 1000:>20.3f}"
+              f"{lxml_time * 1000:>18.3f}{stream_time * 1000:>14.3f}{bytes_read / 1024:>12.1f}"
+              f"{legacy_time / stream_time:>7.1f}")
+
+    print("Kết quả trích xuất: " + ("giống nhau trên mọi fixture" if not mismatches else f"{mismatches} kết quả khác nhau"))
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
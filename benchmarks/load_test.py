@@ -0,0 +1,280 @@
+"""
+Load test cho /api/v1/track trên các hãng tàu chạy bằng fixture đã ghi (python -m replay record ...).
+
+- Chạy server fixture (replay/server.py) và app (uvicorn) trong một tiến trình con với SCRAPER_CONFIGS
+  trỏ về server fixture -> không cần mạng, kết quả lặp lại được giữa các commit.
+- Gửi request theo tốc độ cố định (open-loop, req/s) cho từng mức trong --rates, xoay vòng các fixture.
+- Mỗi mức báo cáo: throughput, độ trễ p50/p95/p99, tỷ lệ lỗi, thời gian chờ Driver Pool trung bình
+  (scraper_driver_pool_wait_seconds từ /metrics); theo thời gian: RSS của app (kể cả Chrome con), số request đang chạy.
+- Kết quả lưu JSON (kèm commit và cấu hình pool/executor) để so sánh giữa các commit bằng --compare.
+
+Cấu hình pool/executor của app qua --env, vd: --env DRIVER_POOL_SIZE=2 --env THREAD_POOL_WORKERS=16.
+App hiện chưa có endpoint batch; chỉ /api/v1/track được đo.
+
+Chạy từ thư mục gốc của repo:
+    python -m benchmarks.load_test [--carriers ZIM ONE] [--rates 1 2 5] [--duration 30] [--output FILE]
+    python -m benchmarks.load_test --compare output/load_test/a.json output/load_test/b.json
+"""
+import os
+import sys
+import json
+import math
+import time
+import socket
+import logging
+import argparse
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import requests
+from prometheus_client.parser import text_string_to_metric_families
+
+import config
+import procfs
+from replay.server import FixtureServer, list_fixtures, rewrite_configs
+
+# Biến môi trường của app được ghi vào kết quả (cấu hình cần tinh chỉnh)
+_TUNABLES = ("DRIVER_POOL_SIZE", "PROXY_DRIVER_POOL_SIZE", "THREAD_POOL_WORKERS",
+             "HYBRID_REPLAY_ENABLED", "BROWSER_NETWORK_CAPTURE_ENABLED")
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    # Nearest-rank
+    return values[max(0, math.ceil(q / 100 * len(values)) - 1)]
+
+
+def _scrape_metrics(base_url):
+    """Tổng/đếm thời gian chờ Driver Pool và số request đang chạy từ /metrics."""
+    text = requests.get(f"{base_url}/metrics", timeout=5).text
+    values = {"driver_wait_sum": 0.0, "driver_wait_count": 0.0, "in_progress": 0.0}
+    for family in text_string_to_metric_families(text):
+        for sample in family.samples:
+            if sample.name == "scraper_driver_pool_wait_seconds_sum":
+                values["driver_wait_sum"] += sample.value
+            elif sample.name == "scraper_driver_pool_wait_seconds_count":
+                values["driver_wait_count"] += sample.value
+            elif sample.name == "scraper_requests_in_progress":
+                values["in_progress"] += sample.value
+    return values
+
+
+class _Sampler(threading.Thread):
+    """Lấy mẫu RSS và /metrics của app theo chu kỳ trong suốt lượt chạy."""
+    def __init__(self, pid, base_url, interval, t_zero):
+        super().__init__(daemon=True)
+        self.pid, self.base_url, self.interval, self.t_zero = pid, base_url, interval, t_zero
+        self.samples = []
+        self._stop_event = threading.Event()
+
+    def sample(self):
+        point = {"t": round(time.time() - self.t_zero, 2), "rss_mb": round(procfs.tree_rss_bytes(self.pid) / 2**20, 1)}
+        try:
+            point.update(_scrape_metrics(self.base_url))
+        except Exception:
+            pass
+        self.samples.append(point)
+        return point
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            self.sample()
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+def _start_app(port, replay_url, env_overrides):
+    env = {**os.environ, **env_overrides}
+    process = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.load_test", "--serve-app", str(port), "--replay-url", replay_url],
+        env=env,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 120
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"App dừng khi khởi động (exit code {process.returncode})")
+        try:
+            requests.get(f"{base_url}/api/v1/services", timeout=2)
+            return process, base_url
+        except requests.RequestException:
+            time.sleep(0.5)
+    process.terminate()
+    raise RuntimeError("App không sẵn sàng sau 120s")
+
+
+def _serve_app(port, replay_url):
+    """Tiến trình con: app với mọi URL của SCRAPER_CONFIGS trỏ về server fixture."""
+    import uvicorn
+    config.SCRAPER_CONFIGS.update(rewrite_configs(config.SCRAPER_CONFIGS, replay_url))
+    import app
+    uvicorn.run(app.app, host="127.0.0.1", port=port, log_level="warning")
+
+
+def _send(base_url, carrier, number, timeout):
+    t_start = time.time()
+    try:
+        response = requests.post(f"{base_url}/api/v1/track",
+                                 data={"bl_number": number, "service_name": carrier}, timeout=timeout)
+        status = response.status_code
+    except requests.RequestException as e:
+        status = type(e).__name__
+    return {"start": t_start, "latency": time.time() - t_start, "status": status}
+
+
+def _run_stage(base_url, targets, rate, duration, max_in_flight, timeout, sampler):
+    """Gửi request đều đặn `rate` req/s trong `duration` giây; chờ tất cả hoàn tất."""
+    total = max(1, int(rate * duration))
+    metrics_before = sampler.sample()
+    t_start = time.time()
+    with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+        futures = []
+        for i in range(total):
+            delay = t_start + i / rate - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            carrier, number = targets[i % len(targets)]
+            futures.append(executor.submit(_send, base_url, carrier, number, timeout))
+        results = [future.result() for future in futures]
+    elapsed = time.time() - t_start
+    metrics_after = sampler.sample()
+
+    latencies = [r["latency"] for r in results]
+    errors = sum(1 for r in results if r["status"] != 200)
+    # Độ trễ bắt đầu gửi so với lịch: > 0 khi --max-in-flight không đủ để giữ tốc độ
+    send_lag = max(r["start"] - (t_start + i / rate) for i, r in enumerate(results))
+    waits = metrics_after.get("driver_wait_count", 0) - metrics_before.get("driver_wait_count", 0)
+    wait_sum = metrics_after.get("driver_wait_sum", 0) - metrics_before.get("driver_wait_sum", 0)
+    statuses = {}
+    for r in results:
+        statuses[str(r["status"])] = statuses.get(str(r["status"]), 0) + 1
+    return {
+        "rate": rate,
+        "requests": total,
+        "elapsed_s": round(elapsed, 2),
+        "throughput_rps": round(total / elapsed, 3),
+        "latency_s": {
+            "p50": _percentile(latencies, 50),
+            "p95": _percentile(latencies, 95),
+            "p99": _percentile(latencies, 99),
+            "max": max(latencies),
+        },
+        "error_rate": round(errors / total, 4),
+        "statuses": statuses,
+        "driver_pool_wait_mean_s": round(wait_sum / waits, 4) if waits else None,
+        "max_send_lag_s": round(send_lag, 3),
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except Exception:
+        return None
+
+
+def compare(paths):
+    runs = []
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            runs.append(json.load(f))
+    print(f"{'Commit':<10}{'req/s':>8}{'thr/s':>9}{'p50':>8}{'p95':>8}{'p99':>8}{'lỗi':>8}{'chờ driver':>12}")
+    for run in runs:
+        for stage in run["stages"]:
+            latency = stage["latency_s"]
+            wait = stage["driver_pool_wait_mean_s"]
+            print(f"{str(run['commit']):<10}{stage['rate']:>8}{stage['throughput_rps']:>9.2f}"
+                  f"{latency['p50']:>8.2f}{latency['p95']:>8.2f}{latency['p99']:>8.2f}"
+                  f"{stage['error_rate']:>8.1%}{(f'{wait:.3f}' if wait is not None else '-'):>12}")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--carriers", nargs="*", help="Chỉ dùng fixture của các hãng này (mặc định: tất cả)")
+    parser.add_argument("--rates", nargs="+", type=float, default=[1, 2, 5], help="Các mức tải (req/s)")
+    parser.add_argument("--duration", type=float, default=30, help="Thời gian mỗi mức tải (giây)")
+    parser.add_argument("--max-in-flight", type=int, default=64, help="Số request đồng thời tối đa của client")
+    parser.add_argument("--timeout", type=float, default=120, help="Timeout mỗi request (giây)")
+    parser.add_argument("--sample-interval", type=float, default=1.0, help="Chu kỳ lấy mẫu RSS/metrics (giây)")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="Biến môi trường cho app (vd: DRIVER_POOL_SIZE=2)")
+    parser.add_argument("--output", help="File JSON kết quả (mặc định: output/load_test/<thời điểm>-<commit>.json)")
+    parser.add_argument("--compare", nargs="+", metavar="FILE", help="So sánh các file kết quả đã lưu")
+    parser.add_argument("--serve-app", type=int, metavar="PORT", help=argparse.SUPPRESS)
+    parser.add_argument("--replay-url", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve_app:
+        _serve_app(args.serve_app, args.replay_url)
+        return 0
+    if args.compare:
+        return compare(args.compare)
+    logging.basicConfig(level=logging.ERROR)
+
+    targets = [(carrier, number) for carrier, number, _ in list_fixtures(config.REPLAY_FIXTURES_DIR)
+               if not args.carriers or carrier in args.carriers]
+    if not targets:
+        print(f"Không có fixture nào trong {config.REPLAY_FIXTURES_DIR} (ghi bằng: python -m replay record ...).")
+        return 2
+    env_overrides = dict(item.split("=", 1) for item in args.env)
+
+    fixture_server = FixtureServer(config.REPLAY_FIXTURES_DIR)
+    replay_url = fixture_server.start()
+    process, base_url = _start_app(_free_port(), replay_url, env_overrides)
+    t_zero = time.time()
+    sampler = _Sampler(process.pid, base_url, args.sample_interval, t_zero)
+    sampler.start()
+    stages = []
+    try:
+        print(f"{'req/s':>8}{'thr/s':>9}{'p50':>8}{'p95':>8}{'p99':>8}{'lỗi':>8}{'chờ driver':>12}{'RSS (MB)':>10}")
+        for rate in args.rates:
+            stage = _run_stage(base_url, targets, rate, args.duration, args.max_in_flight, args.timeout, sampler)
+            stage["rss_mb"] = sampler.samples[-1]["rss_mb"]
+            stages.append(stage)
+            latency, wait = stage["latency_s"], stage["driver_pool_wait_mean_s"]
+            print(f"{rate:>8}{stage['throughput_rps']:>9.2f}{latency['p50']:>8.2f}{latency['p95']:>8.2f}"
+                  f"{latency['p99']:>8.2f}{stage['error_rate']:>8.1%}"
+                  f"{(f'{wait:.3f}' if wait is not None else '-'):>12}{stage['rss_mb']:>10.1f}")
+    finally:
+        sampler.stop()
+        process.terminate()
+        process.wait(timeout=60)
+        fixture_server.stop()
+
+    commit = _git_commit()
+    result = {
+        "commit": commit,
+        "started": datetime.fromtimestamp(t_zero).isoformat(timespec="seconds"),
+        "targets": [f"{carrier}/{number}" for carrier, number in targets],
+        "settings": {
+            **{name: os.environ.get(name) for name in _TUNABLES if os.environ.get(name) is not None},
+            **env_overrides,
+            "duration_s": args.duration,
+            "max_in_flight": args.max_in_flight,
+        },
+        "stages": stages,
+        "timeline": sampler.samples,
+    }
+    output = args.output or os.path.join("output", "load_test", f"{datetime.now():%Y%m%d-%H%M%S}-{commit}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    print(f"Đã lưu kết quả: {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,216 @@
+"""
+Microbenchmark các hàm trích xuất/chuẩn hóa thuần Python của scraper API trên fixture đã ghi
+(python -m replay record ...), để bắt regression CPU/bộ nhớ trước khi deploy.
+
+- Chạy scraper một lần trên server fixture (replay/server.py), ghi lại tham số của mọi lời gọi hàm chuẩn hóa
+  (NORMALIZERS) trong lượt tra cứu đó.
+- Gọi lại các lời gọi đó --number lần: thời gian mỗi lượt (trung bình, p50, p95; đầu vào được sao chép ngoài
+  phần đo), rồi --alloc-number lần dưới tracemalloc: bộ nhớ cấp phát đỉnh và bộ nhớ còn giữ lại mỗi lượt.
+- Kiểm tra kết quả chuẩn hóa khớp <mã>.expected.json của fixture.
+- --cold xóa cache của date_normalizer trước mỗi lượt (mặc định đo khi cache đã nóng, như trong app).
+- --output lưu kết quả JSON; --baseline so với file đã lưu và trả exit code 1 khi thời gian trung bình
+  của một fixture tăng quá --threshold.
+
+Chạy từ thư mục gốc của repo:
+    python -m benchmarks.normalizer_bench [--carriers SITC ONE] [--number 2000] [--baseline FILE] [--output FILE]
+"""
+import sys
+import copy
+import json
+import time
+import logging
+import argparse
+import tracemalloc
+import statistics
+
+import config
+import scrapers
+from scrapers import date_normalizer
+from replay.server import FixtureServer, list_fixtures, rewrite_configs, mount_rewriting_adapter
+
+# Hàm trích xuất/chuẩn hóa (không gọi mạng) của từng scraper API
+NORMALIZERS = {
+    "MSC": "_extract_and_normalize_data_api",
+    "ONE": "_extract_and_normalize_data_api",
+    "SITC": "_extract_and_normalize_data_api",
+    "ZIM": "_extract_and_normalize_data_api",
+    "GOLSTAR": "_extract_and_normalize_data_api",
+    "UNIFEEDER": "_extract_and_normalize_data_api",
+    "TRANSLINER": "_extract_and_normalize_data_api",
+    "SNK": "_extract_and_normalize_data",
+    "HEUNG-A": "_extract_and_normalize_data",
+    "CSL": "_extract_and_normalize_data",
+    "KMTC": "_extract_and_normalize_data",
+    "PAN": "_extract_and_normalize_data",
+    "SEALEAD": "_extract_and_normalize_data",
+    "OSL": "_extract_and_normalize_data",
+    "PIL": "_normalize_data",
+    "YML": "_extract_and_normalize",
+}
+
+
+def _copy(value):
+    # Hàm chuẩn hóa có thể sửa đầu vào -> mỗi lượt dùng một bản sao (nếu sao chép được)
+    try:
+        return copy.deepcopy(value)
+    except Exception:
+        return value
+
+
+def _serialize(data):
+    return data.model_dump() if hasattr(data, "model_dump") else data
+
+
+def capture_calls(carrier, tracking_number, scraper_config, base_url):
+    """
+    Chạy scraper trên server fixture. Trả về (hàm chuẩn hóa, [(args, kwargs)], kết quả lời gọi chuẩn hóa cuối,
+    kết quả scrape).
+    """
+    scraper = scrapers.get_scraper(carrier, None, scraper_config)
+    mount_rewriting_adapter(scraper.session, base_url)
+    normalizer = getattr(scraper, NORMALIZERS[carrier])
+    calls, returned = [], [None]
+
+    def capture(*args, **kwargs):
+        calls.append(_copy((args, kwargs)))
+        returned[0] = normalizer(*args, **kwargs)
+        return returned[0]
+    setattr(scraper, NORMALIZERS[carrier], capture)
+    try:
+        data, error = scraper.scrape(tracking_number)
+    finally:
+        scraper.close()
+    return normalizer, calls, _copy(returned[0]), data
+
+
+def _run_once(normalizer, calls, cold):
+    """Một lượt: gọi lại mọi lời gọi đã ghi. Trả về (thời gian ns, kết quả của lời gọi cuối)."""
+    inputs = [_copy(call) for call in calls]
+    if cold:
+        date_normalizer.cache_clear()
+    result = None
+    t_start = time.perf_counter_ns()
+    for args, kwargs in inputs:
+        result = normalizer(*args, **kwargs)
+    return time.perf_counter_ns() - t_start, result
+
+
+def _measure_allocations(normalizer, calls, number, cold):
+    peaks, retained = [], []
+    tracemalloc.start()
+    try:
+        for _ in range(number):
+            inputs = [_copy(call) for call in calls]
+            if cold:
+                date_normalizer.cache_clear()
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            results = [normalizer(*args, **kwargs) for args, kwargs in inputs]
+            current, peak = tracemalloc.get_traced_memory()
+            peaks.append(peak - before)
+            retained.append(current - before)
+            del results, inputs
+    finally:
+        tracemalloc.stop()
+    return statistics.mean(peaks), statistics.mean(retained)
+
+
+def bench_fixture(carrier, tracking_number, expected, scraper_config, base_url, number, alloc_number, cold):
+    normalizer, calls, normalized, scraped = capture_calls(carrier, tracking_number, scraper_config, base_url)
+    if not calls:
+        return {"carrier": carrier, "tracking_number": tracking_number, "error": "hàm chuẩn hóa không được gọi"}
+
+    for _ in range(min(50, number)):
+        _run_once(normalizer, calls, cold)
+    times, result = [], None
+    for _ in range(number):
+        elapsed, result = _run_once(normalizer, calls, cold)
+        times.append(elapsed / 1000)
+    peak, retained = _measure_allocations(normalizer, calls, alloc_number, cold)
+    times.sort()
+    return {
+        "carrier": carrier,
+        "tracking_number": tracking_number,
+        "calls_per_lookup": len(calls),
+        "mean_us": round(statistics.mean(times), 2),
+        "p50_us": round(times[len(times) // 2], 2),
+        "p95_us": round(times[min(len(times) - 1, int(len(times) * 0.95))], 2),
+        "alloc_peak_kib": round(peak / 1024, 2),
+        "alloc_retained_kib": round(retained / 1024, 2),
+        # Gọi lại cho cùng kết quả như lúc scrape, và kết quả scrape giống kết quả đã ghi cùng fixture
+        "matches_expected": _serialize(result) == _serialize(normalized) and _serialize(scraped) == expected["data"],
+    }
+
+
+def _regressions(results, baseline_path, threshold):
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {(r["carrier"], r["tracking_number"]): r for r in json.load(f)["results"] if "mean_us" in r}
+    regressions = []
+    for r in results:
+        old = baseline.get((r["carrier"], r["tracking_number"]))
+        if old and "mean_us" in r and r["mean_us"] > old["mean_us"] * (1 + threshold):
+            regressions.append((r, old))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--carriers", nargs="*", help="Chỉ chạy các hãng này (mặc định: mọi hãng có fixture)")
+    parser.add_argument("--number", type=int, default=2000, help="Số lượt đo thời gian mỗi fixture")
+    parser.add_argument("--alloc-number", type=int, default=200, help="Số lượt đo bộ nhớ (tracemalloc) mỗi fixture")
+    parser.add_argument("--cold", action="store_true", help="Xóa cache date_normalizer trước mỗi lượt")
+    parser.add_argument("--output", help="Lưu kết quả JSON")
+    parser.add_argument("--baseline", help="File kết quả JSON để so sánh")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Tỷ lệ tăng thời gian coi là regression")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.ERROR)
+
+    fixtures = [
+        (carrier, number, path) for carrier, number, path in list_fixtures(config.REPLAY_FIXTURES_DIR)
+        if carrier in NORMALIZERS and (not args.carriers or carrier in args.carriers)
+    ]
+    if not fixtures:
+        print(f"Không có fixture của scraper API nào trong {config.REPLAY_FIXTURES_DIR} "
+              f"(ghi bằng: python -m replay record <hãng> <mã>).")
+        return 2
+
+    server = FixtureServer(config.REPLAY_FIXTURES_DIR)
+    base_url = server.start()
+    scraper_configs = rewrite_configs(config.SCRAPER_CONFIGS, base_url)
+    results = []
+    print(f"{'Hãng':<12}{'Mã':<22}{'gọi':>5}{'TB (µs)':>11}{'p50':>10}{'p95':>10}"
+          f"{'đỉnh (KiB)':>12}{'giữ (KiB)':>11}  Kết quả")
+    try:
+        for carrier, number, path in fixtures:
+            with open(path, encoding="utf-8") as f:
+                expected = json.load(f)
+            try:
+                r = bench_fixture(carrier, number, expected, scraper_configs.get(carrier, {}), base_url,
+                                  args.number, args.alloc_number, args.cold)
+            except Exception as e:
+                r = {"carrier": carrier, "tracking_number": number, "error": f"{type(e).__name__}: {e}"}
+            results.append(r)
+            if "error" in r:
+                print(f"{carrier:<12}{number:<22}  LỖI: {r['error']}")
+                continue
+            print(f"{carrier:<12}{number:<22}{r['calls_per_lookup']:>5}{r['mean_us']:>11.1f}{r['p50_us']:>10.1f}"
+                  f"{r['p95_us']:>10.1f}{r['alloc_peak_kib']:>12.1f}{r['alloc_retained_kib']:>11.1f}  "
+                  f"{'OK' if r['matches_expected'] else 'KHÁC'}")
+    finally:
+        server.stop()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"cold": args.cold, "number": args.number, "results": results}, f, ensure_ascii=False, indent=2)
+        print(f"Đã lưu kết quả: {args.output}")
+
+    failed = sum(1 for r in results if "error" in r or not r["matches_expected"])
+    regressions = _regressions(results, args.baseline, args.threshold) if args.baseline else []
+    for r, old in regressions:
+        print(f"[REGRESSION] {r['carrier']} {r['tracking_number']}: {old['mean_us']:.1f} -> {r['mean_us']:.1f} µs")
+    print(f"Kết quả: {len(results) - failed}/{len(results)} fixture khớp, {len(regressions)} regression")
+    return 1 if failed or regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
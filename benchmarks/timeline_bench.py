@@ -0,0 +1,294 @@
+"""
+Benchmark engine timeline (scrapers/timeline.py) với vòng lặp Python cũ của các scraper.
+
+Sinh lô hàng nhiều chặng / nhiều container theo hai kiểu dữ liệu:
+  - ebiz (Sinokor, Heung-A): 'Departure: <tàu>' / 'Arrival: <tàu>', địa điểm dạng 'TÊN (MÃ)'
+  - PIL: 'Vessel Loading' / 'Vessel Discharge' với cờ Actual/Estimated ('*'), gộp sự kiện của nhiều container
+so sánh kết quả (chuỗi ngày thô) của logic cũ và engine (cả nhánh Python lẫn nhánh numpy),
+rồi đo thời gian cho từng kích thước.
+
+Thêm các tình huống cố định trên benchmarks/fixtures/ebiz_bl_detail.html (POL là tên terminal khác
+địa điểm của sự kiện, POL không có mã, POL trống). Ở đây engine cố ý khác logic cũ; các khác biệt
+được liệt kê trong INTENDED_DIFFS và bench lỗi nếu kết quả khác ngoài danh sách đó.
+
+Chạy từ thư mục gốc của repo:
+    python -m benchmarks.timeline_bench [--number 200]
+"""
+import os
+import re
+import sys
+import time
+import random
+import logging
+import argparse
+from datetime import date, datetime, timedelta
+
+from scrapers import ebiz_extractor, timeline
+
+TODAY = date(2026, 6, 15)
+PORTS = [("HOCHIMINH", "VNSGN"), ("SINGAPORE", "SGSIN"), ("KAOHSIUNG", "TWKHH"), ("BUSAN", "KRPUS"),
+         ("SHANGHAI", "CNSHA"), ("PORT KELANG", "MYPKG"), ("LAEM CHABANG", "THLCH"), ("TOKYO", "JPTYO")]
+EBIZ_FIXTURE = os.path.join(os.path.dirname(__file__), "fixtures", "ebiz_bl_detail.html")
+
+# Khác biệt có chủ ý so với logic cũ trên fixture ebiz (tên tình huống -> {trường: (engine, cũ)}).
+# Sự kiện của fixture ghi địa điểm 'BUSAN (KRPUS)', còn POL của trang là terminal 'BUSAN NEW PORT (KRPUS)'.
+INTENDED_DIFFS = {
+    # Logic cũ chỉ loại sự kiện POL khỏi transit khi nguyên chuỗi POL nằm trong địa điểm, nên cảng xếp
+    # hàng BUSAN bị báo là cảng transit; engine so khớp theo mã (KRPUS) như khi tìm Atd.
+    "fixture (POL là terminal)": {
+        "TransitPort": ("SHANGHAI (CNSHA)", "BUSAN (KRPUS), SHANGHAI (CNSHA)"),
+    },
+    # POL không có mã và không khớp sự kiện nào: logic cũ mất Atd và báo BUSAN là transit;
+    # engine coi địa điểm rời cảng đầu tiên là POL.
+    "POL không có mã": {
+        "Atd": ("2025-09-04 THU 05:00", ""),
+        "TransitPort": ("SHANGHAI (CNSHA)", "BUSAN (KRPUS), SHANGHAI (CNSHA)"),
+    },
+    # POL trống: logic cũ loại mọi sự kiện rời cảng khỏi transit ('' nằm trong mọi chuỗi) nên
+    # không có AtdTransit; engine coi địa điểm rời cảng đầu tiên là POL.
+    "POL trống": {
+        "AtdTransit": ("2025-09-07 SUN 18:00", ""),
+    },
+}
+
+
+# --- Logic cũ (trích từ SinokorScraper/HeungALineScraper, PilScraper trước khi dùng timeline engine) ---
+
+def _legacy_ebiz_parse(date_str):
+    match = re.search(r'(\d{4}-\d{2}-\d{2})\s+[A-Z]{3}\s+(\d{2}:\d{2})', date_str or "")
+    if not match:
+        return None, None
+    return datetime.strptime(f"{match.group(1)} {match.group(2)}", '%Y-%m-%d %H:%M'), date_str
+
+
+def _legacy_ebiz_find(events, keyword, location):
+    match = re.search(r'\((.*?)\)', location)
+    code = match.group(1).lower() if match else location.lower()
+    for event in events:
+        if keyword.lower() in event["description"].lower().split(':')[0] and code in event["location"].lower():
+            return event
+    return None
+
+
+def legacy_ebiz(events, pol, pod, today):
+    today_dt = datetime.combine(today, datetime.max.time())
+    result = dict.fromkeys(timeline.TIMELINE_FIELDS, "")
+    atd_event = _legacy_ebiz_find(events, "Departure", pol)
+    if atd_event:
+        dt_obj, raw = _legacy_ebiz_parse(atd_event["date"])
+        if dt_obj and dt_obj <= today_dt:
+            result["Atd"] = raw
+        elif dt_obj:
+            result["Etd"] = raw
+    ata_event = _legacy_ebiz_find(events, "Arrival", pod)
+    if ata_event:
+        dt_obj, raw = _legacy_ebiz_parse(ata_event["date"])
+        if dt_obj and dt_obj <= today_dt:
+            result["Ata"] = raw
+        elif dt_obj:
+            result["Eta"] = raw
+
+    ports, future_etd = [], []
+    for event in events:
+        desc = event["description"].lower().split(':')[0].strip()
+        loc = event["location"]
+        if pol.lower() in loc.lower() and "departure" in desc or pod.lower() in loc.lower() and "arrival" in desc:
+            continue
+        if "departure" in desc or "arrival" in desc:
+            if loc and loc not in ports:
+                ports.append(loc)
+            dt_obj, raw = _legacy_ebiz_parse(event["date"])
+            if not dt_obj:
+                continue
+            if "arrival" in desc:
+                if dt_obj <= today_dt:
+                    result["AtaTransit"] = result["AtaTransit"] or raw
+                elif not result["AtaTransit"] and not result["EtaTransit"]:
+                    result["EtaTransit"] = raw
+            if "departure" in desc:
+                if dt_obj <= today_dt:
+                    result["AtdTransit"] = raw
+                else:
+                    future_etd.append((dt_obj, raw))
+    result["TransitPort"] = ", ".join(ports)
+    if future_etd:
+        result["EtdTransit"] = sorted(future_etd)[0][1]
+    return result
+
+
+def legacy_pil(events, pol, pod, today):
+    result = dict.fromkeys(timeline.TIMELINE_FIELDS, "")
+    for event in events:
+        cleaned = event["date"].strip().lstrip('*').strip()
+        parsed = None
+        for fmt in ('%d-%b-%Y %H:%M:%S', '%d-%b-%Y'):
+            try:
+                parsed = datetime.strptime(cleaned, fmt)
+                break
+            except ValueError:
+                continue
+        event["parsed_datetime"] = parsed or datetime.min
+    events = sorted(events, key=lambda x: x["parsed_datetime"])
+
+    def find(keyword, location, last):
+        matches = [e for e in events if keyword in e["description"].lower()
+                   and location.lower() in e["location"].lower() and e["type"] == "Actual"]
+        return (matches[-1] if last else matches[0])["date"] if matches else ""
+
+    result["Atd"] = find("vessel loading", pol, last=True)
+    result["Ata"] = find("vessel discharge", pod, last=False)
+    ports, future_etd = [], []
+    for event in events:
+        loc, desc = event["location"], event["description"].lower()
+        if not loc or pol.lower() in loc.lower() or pod.lower() in loc.lower():
+            continue
+        simple_loc = loc.split(',')[0].strip()
+        if simple_loc not in ports:
+            ports.append(simple_loc)
+        if "vessel discharge" in desc and event["type"] == "Actual" and not result["AtaTransit"]:
+            result["AtaTransit"] = event["date"]
+        if "vessel loading" in desc and event["type"] == "Actual":
+            result["AtdTransit"] = event["date"]
+        if "vessel loading" in desc and event["type"] == "Estimated" and event["parsed_datetime"] != datetime.min:
+            if event["parsed_datetime"].date() > today:
+                future_etd.append((event["parsed_datetime"].date(), simple_loc, event["date"]))
+    result["TransitPort"] = ", ".join(ports)
+    if future_etd:
+        result["EtdTransit"] = sorted(future_etd)[0][2]
+    return result
+
+
+# --- Sinh dữ liệu ---
+
+def _route(rng, legs):
+    ports = rng.sample(PORTS, legs + 1)
+    start = TODAY + timedelta(days=rng.randint(-25, -5))
+    schedule = []
+    for i in range(legs):
+        depart = start + timedelta(days=i * 9)
+        schedule.append((ports[i], ports[i + 1], depart, depart + timedelta(days=4)))
+    return schedule
+
+
+def make_ebiz_case(rng, legs, containers):
+    schedule = _route(rng, legs)
+    events = []
+
+    def fmt(day):
+        return f"{day:%Y-%m-%d} {day:%a}".upper() + f" {rng.randint(0, 23):02d}:00"
+
+    for i, (pol, pod, depart, arrive) in enumerate(schedule):
+        events.append({"description": f"Departure: VSL{i} 0{i}1E", "location": f"{pol[0]} ({pol[1]})", "date": fmt(depart)})
+        events.append({"description": f"Arrival: VSL{i} 0{i}1E", "location": f"{pod[0]} ({pod[1]})", "date": fmt(arrive)})
+    for c in range(containers):
+        for move in ("Empty Pick-up", "Gate In", "Gate Out"):
+            events.append({"description": f"Container Movement: SKLU{c:07d} {move}",
+                           "location": f"{schedule[0][0][0]} ({schedule[0][0][1]})", "date": fmt(schedule[0][2])})
+    pol, pod = schedule[0][0], schedule[-1][1]
+    return events, f"{pol[0]} ({pol[1]})", f"{pod[0]} ({pod[1]})"
+
+
+def make_pil_case(rng, legs, containers):
+    schedule = _route(rng, legs)
+    events = []
+    for c in range(containers):
+        for i, (pol, pod, depart, arrive) in enumerate(schedule):
+            for name, port, day in (("Vessel Loading", pol, depart), ("Vessel Discharge", pod, arrive)):
+                estimated = day > TODAY
+                events.append({"date": ("*" if estimated else "") + f"{day:%d-%b-%Y} 1{c % 10}:00:00",
+                               "description": name, "location": f"{port[0]}, {port[1][:2]}",
+                               "type": "Estimated" if estimated else "Actual"})
+        events.append({"date": f"{schedule[0][2] - timedelta(days=2):%d-%b-%Y} 08:00:00",
+                       "description": "Empty Container Release", "location": f"{schedule[0][0][0]}, {schedule[0][0][1][:2]}",
+                       "type": "Actual"})
+    pol, pod = schedule[0][0], schedule[-1][1]
+    return events, pol[0], pod[0]
+
+
+def _time(func, number):
+    start = time.perf_counter()
+    for _ in range(number):
+        func()
+    return (time.perf_counter() - start) / number
+
+
+def _derive(carrier, events, pol, pod, numpy_min_events):
+    # Ép engine chạy nhánh Python (numpy_min_events lớn) hoặc nhánh numpy (0)
+    saved = timeline.NUMPY_MIN_EVENTS
+    timeline.NUMPY_MIN_EVENTS = numpy_min_events
+    try:
+        return timeline.Timeline.from_events(carrier, events).derive(timeline.get_rules(carrier), pol, pod, TODAY)
+    finally:
+        timeline.NUMPY_MIN_EVENTS = saved
+
+
+def check_fixture():
+    """So engine với logic cũ trên fixture ebiz; trả về số tình huống khác ngoài INTENDED_DIFFS."""
+    with open(EBIZ_FIXTURE, encoding="utf-8") as f:
+        page = ebiz_extractor.extract_bl_detail(f.read())
+    pod = page["pod_terminal"]
+    scenarios = {
+        "fixture (POL là terminal)": page["pol_terminal"],
+        "POL không có mã": "BUSAN NEW PORT",
+        "POL trống": "",
+    }
+    unexpected = 0
+    for name, pol in scenarios.items():
+        expected = legacy_ebiz([dict(e) for e in page["events"]], pol, pod, TODAY)
+        results = [_derive("SNK", page["events"], pol, pod, limit) for limit in (sys.maxsize, 0)]
+        diffs = {key: (results[0][key], expected[key]) for key in timeline.TIMELINE_FIELDS
+                 if results[0][key] != expected[key]}
+        if results[0] != results[1] or diffs != INTENDED_DIFFS.get(name, {}):
+            unexpected += 1
+            print(f"[KHÁC NGOÀI DỰ KIẾN] {name} (POL={pol!r}): python={results[0]} numpy={results[1]} cũ={expected}")
+            continue
+        for key, (engine_value, legacy_value) in diffs.items():
+            print(f"[CHỦ Ý] {name} (POL={pol!r}) '{key}': engine={engine_value!r} cũ={legacy_value!r}")
+    return unexpected
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--number", type=int, default=200, help="Số lượt lặp cho mỗi kích thước")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.ERROR)
+    rng = random.Random(args.seed)
+
+    cases = [
+        ("SNK", make_ebiz_case, legacy_ebiz, legs, containers)
+        for legs in (1, 3) for containers in (1, 20, 100)
+    ] + [
+        ("PIL", make_pil_case, legacy_pil, legs, containers)
+        for legs in (1, 3) for containers in (1, 20, 100)
+    ]
+
+    mismatches = check_fixture()
+    print(f"{'Hãng':<6}{'Chặng':>6}{'Cont':>6}{'Sự kiện':>9}{'Cũ (ms)':>10}{'Python (ms)':>13}"
+          f"{'numpy (ms)':>12}{'Engine (ms)':>13}{'x':>7}")
+    for carrier, make_case, legacy, legs, containers in cases:
+        events, pol, pod = make_case(rng, legs, containers)
+        rules = timeline.get_rules(carrier)
+        expected = legacy([dict(e) for e in events], pol, pod, TODAY)
+        for backend, limit in (("python", sys.maxsize), ("numpy", 0)):
+            result = _derive(carrier, events, pol, pod, limit)
+            if result != expected:
+                mismatches += 1
+                for key in timeline.TIMELINE_FIELDS:
+                    if result[key] != expected[key]:
+                        print(f"[KHÁC] {carrier} {legs} chặng/{containers} cont ({backend}) '{key}': "
+                              f"engine={result[key]!r} cũ={expected[key]!r}")
+
+        legacy_time = _time(lambda: legacy([dict(e) for e in events], pol, pod, TODAY), args.number)
+        python_time = _time(lambda: _derive(carrier, events, pol, pod, sys.maxsize), args.number)
+        numpy_time = _time(lambda: _derive(carrier, events, pol, pod, 0), args.number)
+        engine_time = _time(lambda: timeline.Timeline.from_events(carrier, events).derive(rules, pol, pod, TODAY), args.number)
+        print(f"{carrier:<6}{legs:>6}{containers:>6}{len(events):>9}{legacy_time * 1000:>10.3f}{python_time * 1000:>13.3f}"
+              f"{numpy_time * 1000:>12.3f}{engine_time * 1000:>13.3f}{legacy_time / engine_time:>7.1f}")
+
+    print("Kết quả: " + ("giống logic cũ (ngoài các khác biệt có chủ ý)" if not mismatches
+                         else f"{mismatches} trường hợp khác nhau"))
+    sys.exit(1 if mismatches else 0)
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,5 @@
+import asyncio
+import time
 import logging
 from playwright.async_api import async_playwright, PlaywrightContextManager, Browser, Page
 from playwright_stealth import Stealth
@@ -47,9 +49,10 @@ async def create_playwright_context(proxy_config: Optional[dict] = None) -> Tupl
             await p.stop()
         return None, None
 
-async def create_page_context(browser: Browser) -> Optional[Page]:
+async def create_page_context(browser: Browser, **context_options) -> Optional[Page]:
     """
     Tạo một BrowserContext và Page mới, áp dụng stealth (Async).
+    context_options được truyền thêm cho browser.new_context (vd: record_har_path khi ghi fixture).
     """
     if not browser:
         return None
@@ -63,7 +66,8 @@ async def create_page_context(browser: Browser) -> Optional[Page]:
             locale='en-US',
             timezone_id='America/New_York',
             ignore_https_errors=True,
-            java_script_enabled=True
+            java_script_enabled=True,
+            **context_options
         )
         
         await context.route("**/*.{png,jpg,jpeg,gif,svg,css,woff,woff2}", lambda route: route.abort())
@@ -81,4 +85,66 @@ async def create_page_context(browser: Browser) -> Optional[Page]:
             await page.close()
         if context:
             await context.close()
-        return None
\ No newline at end of file
+        return None
+
+class BrowserPool:
+    """
+    Giữ một trình duyệt Playwright đang chạy cho mỗi proxy (khóa 'host:port', None = không proxy).
+    Mỗi request chỉ tạo BrowserContext/Page mới trên trình duyệt có sẵn thay vì khởi động lại trình duyệt.
+    """
+    def __init__(self):
+        self._browsers = {} # key -> (playwright, browser)
+        self._started = {} # key -> thời điểm khởi động trình duyệt
+        self._lock = asyncio.Lock()
+
+    async def get_browser(self, key, proxy_config: Optional[dict] = None) -> Optional[Browser]:
+        async with self._lock:
+            entry = self._browsers.get(key)
+            if entry:
+                p, browser = entry
+                if browser.is_connected():
+                    return browser
+                logger.warning(f"Trình duyệt Playwright cho '{key}' đã mất kết nối, đang khởi tạo lại...")
+                try:
+                    await p.stop()
+                except Exception:
+                    pass
+                del self._browsers[key]
+
+            p, browser = await create_playwright_context(proxy_config)
+            if not browser:
+                return None
+            self._browsers[key] = (p, browser)
+            self._started[key] = time.time()
+            return browser
+
+    def stats(self):
+        # Số trình duyệt, context và page đang mở theo từng proxy
+        now = time.time()
+        return {
+            str(key): {
+                "connected": browser.is_connected(),
+                "contexts": len(browser.contexts),
+                "pages": sum(len(context.pages) for context in browser.contexts),
+                "age_s": round(now - self._started.get(key, now), 1),
+            }
+            for key, (p, browser) in self._browsers.items()
+        }
+
+    async def shutdown(self):
+        async with self._lock:
+            for key, (p, browser) in list(self._browsers.items()):
+                try:
+                    await browser.close()
+                except Exception as e:
+                    logger.warning(f"Lỗi khi đóng trình duyệt Playwright '{key}': {e}")
+                try:
+                    await p.stop()
+                except Exception:
+                    pass
+            self._browsers.clear()
+            self._started.clear()
+
+
+# Khởi tạo một instance toàn cục (Singleton)
+browser_pool = BrowserPool()
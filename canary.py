@@ -0,0 +1,245 @@
+"""
+Canary tổng hợp: định kỳ tra cứu một mã đã biết chắc có dữ liệu của từng hãng tàu qua đường scrape bình thường
+(app.run_scraping_task_with_strategy: scrapers.get_scraper, Driver Pool / Browser Pool, proxy), ghi thời gian,
+kết quả và chiến lược, rồi so các lượt gần đây với baseline trượt của chính hãng tàu đó. Hãng tàu chậm đi (bot wall mới, trang nặng hơn)
+hoặc lỗi liên tục bị đánh dấu trước khi người dùng bị ảnh hưởng.
+
+Trong app: bật bằng CANARY_ENABLED, mã tra cứu lấy từ CANARY_TRACKING_NUMBERS, xem kết quả tại /admin/canary (header X-Admin-Token, xem ADMIN_TOKEN).
+Trong CI (phát lại fixture, không cần mạng), chạy từ thư mục gốc của repo:
+    python -m canary --replay [--rounds 3] [--carriers SITC ONE] [--history FILE]
+(mặc định ghi lịch sử vào CANARY_REPLAY_HISTORY_FILE, tách khỏi lịch sử của app). Exit code 1 khi có hãng tàu bị đánh dấu.
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+import statistics
+import collections
+
+import config
+import metrics
+import log_setup
+
+logger = logging.getLogger(__name__)
+
+
+def _median(values):
+    return statistics.median(values) if values else None
+
+
+class CanaryScheduler:
+    """
+    Lịch sử các lượt canary của mỗi hãng tàu (tối đa baseline_runs + recent_runs lượt). recent_runs lượt cuối được
+    so với các lượt trước đó (baseline): trung vị thời gian của lượt thành công tăng quá drift_ratio lần -> 'slower';
+    tỷ lệ thành công của recent_runs lượt cuối dưới min_success_rate -> 'failing'.
+    Thời gian chỉ được so giữa các lượt cùng chiến lược với lượt mới nhất: phát lại phiên qua HTTP (replay) nhanh
+    hơn trình duyệt nhiều, chuyển qua lại giữa hai đường không phải là hãng tàu chậm đi.
+    """
+    def __init__(self, targets, interval, baseline_runs, recent_runs, drift_ratio, min_success_rate, history_file=None):
+        self.targets = dict(targets)  # hãng tàu -> mã tra cứu
+        self.interval = interval
+        self.recent_runs = recent_runs
+        self.drift_ratio = drift_ratio
+        self.min_success_rate = min_success_rate
+        self.history_file = history_file
+        self.runs = collections.defaultdict(lambda: collections.deque(maxlen=baseline_runs + recent_runs))
+        self.flags = {}  # hãng tàu -> danh sách lý do đang bị đánh dấu
+
+    def load(self):
+        if not self.history_file or not os.path.exists(self.history_file):
+            return
+        try:
+            with open(self.history_file, encoding="utf-8") as f:
+                history = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning("[Canary] Không đọc được lịch sử %s: %s", self.history_file, e)
+            return
+        for carrier, runs in history.items():
+            self.runs[carrier].extend(runs)
+        logger.info("[Canary] Đã nạp lịch sử của %d hãng tàu từ %s", len(history), self.history_file)
+
+    def save(self):
+        if not self.history_file:
+            return
+        os.makedirs(os.path.dirname(self.history_file) or ".", exist_ok=True)
+        with open(self.history_file, "w", encoding="utf-8") as f:
+            json.dump({carrier: list(runs) for carrier, runs in self.runs.items()}, f, ensure_ascii=False)
+
+    async def run_carrier(self, carrier, runner):
+        """Một lượt canary của hãng tàu qua runner(carrier, mã) -> (data, error, chiến lược)."""
+        tracking_number = self.targets[carrier]
+        t_start = time.time()
+        with log_setup.request_context(carrier=carrier, tracking_number=tracking_number, canary=True):
+            try:
+                data, error, strategy = await runner(carrier, tracking_number)
+            except Exception as e:
+                data, error, strategy = None, f"{type(e).__name__}: {e}", None
+        run = {
+            "ts": t_start,
+            "latency_s": round(time.time() - t_start, 3),
+            "success": bool(data) and not error,
+            "error": error if not data or error else None,
+            "strategy": strategy,
+        }
+        self.runs[carrier].append(run)
+        metrics.CANARY_RUNS.labels(carrier, "success" if run["success"] else "error").inc()
+        evaluation = self.evaluate(carrier)
+        self._update_flag(carrier, evaluation)
+        logger.info("[Canary] %s: %s sau %.2fs qua '%s' (tỷ lệ thời gian so với baseline: %s)", carrier,
+                    "thành công" if run["success"] else f"lỗi ({run['error']})", run["latency_s"],
+                    strategy, evaluation["latency_ratio"])
+        return run
+
+    def evaluate(self, carrier):
+        runs = list(self.runs[carrier])
+        recent = runs[-self.recent_runs:]
+        # Thời gian: chỉ các lượt thành công cùng chiến lược với lượt thành công mới nhất
+        # (lượt ghi trước khi có trường 'strategy' được coi là một nhóm riêng)
+        successes = [r for r in runs if r["success"]]
+        strategy = successes[-1].get("strategy") if successes else None
+        same = [r["latency_s"] for r in successes if r.get("strategy") == strategy]
+        recent_latency = _median(same[-self.recent_runs:])
+        baseline_latency = _median(same[:-self.recent_runs])
+        # Cần ít nhất recent_runs lượt thành công trong baseline mới so thời gian
+        enough_baseline = len(same) - self.recent_runs >= self.recent_runs
+        ratio = round(recent_latency / baseline_latency, 2) if enough_baseline and recent_latency and baseline_latency else None
+        success_rate = sum(1 for r in recent if r["success"]) / len(recent) if recent else None
+
+        reasons = []
+        if ratio is not None and ratio > self.drift_ratio:
+            reasons.append("slower")
+        if len(recent) >= self.recent_runs and success_rate < self.min_success_rate:
+            reasons.append("failing")
+        return {
+            "runs": len(runs),
+            "strategy": strategy,
+            "recent_latency_s": recent_latency,
+            "baseline_latency_s": baseline_latency,
+            "latency_ratio": ratio,
+            "recent_success_rate": round(success_rate, 2) if success_rate is not None else None,
+            "flagged": reasons,
+        }
+
+    def _update_flag(self, carrier, evaluation):
+        reasons, previous = evaluation["flagged"], self.flags.get(carrier, [])
+        if reasons and reasons != previous:
+            logger.warning("[Canary] Đánh dấu '%s' (%s): thời gian gần đây %s s / baseline %s s, tỷ lệ thành công %s",
+                           carrier, ", ".join(reasons), evaluation["recent_latency_s"],
+                           evaluation["baseline_latency_s"], evaluation["recent_success_rate"])
+        elif previous and not reasons:
+            logger.info("[Canary] '%s' đã trở lại bình thường.", carrier)
+        self.flags[carrier] = reasons
+        metrics.CANARY_FLAGGED.labels(carrier).set(int(bool(reasons)))
+        if evaluation["latency_ratio"] is not None:
+            metrics.CANARY_LATENCY_RATIO.labels(carrier).set(evaluation["latency_ratio"])
+
+    async def run_round(self, runner, carriers=None):
+        # Tuần tự từng hãng tàu: canary không chiếm nhiều driver/trình duyệt cùng lúc với traffic thật
+        for carrier in carriers or list(self.targets):
+            await self.run_carrier(carrier, runner)
+        try:
+            self.save()
+        except OSError as e:
+            logger.warning("[Canary] Không lưu được lịch sử %s: %s", self.history_file, e)
+
+    async def run_forever(self, runner):
+        """Vòng lặp nền của app: một lượt cho mọi hãng tàu mỗi interval giây."""
+        self.load()
+        logger.info("[Canary] Bắt đầu: %d hãng tàu, mỗi %.0fs", len(self.targets), self.interval)
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.run_round(runner)
+            except Exception as e:
+                logger.error("[Canary] Lỗi trong lượt canary: %s", e)
+
+    def status(self):
+        carriers = {}
+        for carrier, tracking_number in self.targets.items():
+            runs = self.runs.get(carrier)
+            carriers[carrier] = {
+                "tracking_number": tracking_number,
+                "last_run": runs[-1] if runs else None,
+                **self.evaluate(carrier),
+            }
+        return {"enabled": config.CANARY_ENABLED, "interval_s": self.interval, "carriers": carriers}
+
+
+def _build(targets, history_file):
+    return CanaryScheduler(
+        targets=targets,
+        interval=config.CANARY_INTERVAL_SECONDS,
+        baseline_runs=config.CANARY_BASELINE_RUNS,
+        recent_runs=config.CANARY_RECENT_RUNS,
+        drift_ratio=config.CANARY_LATENCY_DRIFT_RATIO,
+        min_success_rate=config.CANARY_MIN_SUCCESS_RATE,
+        history_file=history_file,
+    )
+
+
+# Khởi tạo một instance toàn cục (Singleton)
+canary = _build(config.CANARY_TRACKING_NUMBERS, config.CANARY_HISTORY_FILE)
+
+
+async def _run_cli(scheduler, rounds):
+    # Import muộn: app khởi tạo logging và các pool, chỉ cần khi thực sự chạy canary
+    import app
+    logging.getLogger().setLevel(logging.WARNING)
+    try:
+        for _ in range(rounds):
+            await scheduler.run_round(app.run_scraping_task_with_strategy)
+    finally:
+        app.driver_pool.shutdown()
+        app.proxy_manager.shutdown()
+        await app.browser_setup.browser_pool.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--replay", action="store_true",
+                        help="Phát lại fixture của REPLAY_FIXTURES_DIR (mã đầu tiên của mỗi hãng) thay vì trang thật")
+    parser.add_argument("--carriers", nargs="*", help="Chỉ chạy các hãng này")
+    parser.add_argument("--rounds", type=int, default=1, help="Số lượt cho mỗi hãng tàu")
+    parser.add_argument("--history", help="File lịch sử (baseline) đọc và ghi lại (mặc định: CANARY_HISTORY_FILE, "
+                                          "hoặc CANARY_REPLAY_HISTORY_FILE với --replay)")
+    args = parser.parse_args()
+    history_file = args.history or (config.CANARY_REPLAY_HISTORY_FILE if args.replay else config.CANARY_HISTORY_FILE)
+
+    server = None
+    if args.replay:
+        from replay.server import FixtureServer, list_fixtures, rewrite_configs
+        targets = {}
+        for carrier, number, _ in list_fixtures(config.REPLAY_FIXTURES_DIR):
+            targets.setdefault(carrier, number)
+        server = FixtureServer(config.REPLAY_FIXTURES_DIR)
+        config.SCRAPER_CONFIGS.update(rewrite_configs(config.SCRAPER_CONFIGS, server.start()))
+    else:
+        targets = dict(config.CANARY_TRACKING_NUMBERS)
+    if args.carriers:
+        targets = {carrier: number for carrier, number in targets.items() if carrier in args.carriers}
+    if not targets:
+        print("Không có hãng tàu nào để chạy canary (CANARY_TRACKING_NUMBERS hoặc fixture của --replay).")
+        return 2
+
+    scheduler = _build(targets, history_file)
+    scheduler.load()
+    try:
+        asyncio.run(_run_cli(scheduler, args.rounds))
+    finally:
+        if server:
+            server.stop()
+
+    status = scheduler.status()["carriers"]
+    print(f"{'Hãng':<12}{'lượt':>6}{'chiến lược':>12}{'gần đây (s)':>13}{'baseline (s)':>14}{'tỷ lệ':>8}{'thành công':>12}  Đánh dấu")
+    for carrier, s in status.items():
+        fmt = lambda value, spec: format(value, spec) if value is not None else "-"
+        print(f"{carrier:<12}{s['runs']:>6}{s['strategy'] or '-':>12}{fmt(s['recent_latency_s'], '.2f'):>13}{fmt(s['baseline_latency_s'], '.2f'):>14}"
+              f"{fmt(s['latency_ratio'], '.2f'):>8}{fmt(s['recent_success_rate'], '.0%'):>12}  {', '.join(s['flagged']) or '-'}")
+    return 1 if any(s["flagged"] for s in status.values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
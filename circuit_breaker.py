@@ -0,0 +1,152 @@
+import threading
+import time
+import logging
+from collections import deque
+
+import config
+
+logger = logging.getLogger(__name__)
+
+# Các trạng thái của circuit breaker
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Lỗi trả về ngay lập tức khi breaker của hãng tàu đang mở."""
+    def __init__(self, name, retry_after):
+        self.name = name
+        self.retry_after = retry_after
+        super().__init__(
+            f"Hãng tàu '{name}' tạm thời không khả dụng (circuit breaker đang mở). "
+            f"Thử lại sau {retry_after:.0f} giây."
+        )
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker cho một hãng tàu.
+    - closed: cho phép mọi request, ghi nhận kết quả trong cửa sổ trượt.
+    - open: từ chối ngay lập tức cho đến khi hết open_duration.
+    - half_open: chỉ cho phép MỘT request thăm dò; thành công -> closed, thất bại -> open.
+    """
+    def __init__(self, name, failure_rate_threshold=0.5, window_size=20,
+                 min_requests=5, open_duration=60):
+        self.name = name
+        self.failure_rate_threshold = failure_rate_threshold
+        self.window_size = window_size
+        self.min_requests = min_requests
+        self.open_duration = open_duration
+
+        self._lock = threading.Lock()
+        self._state = STATE_CLOSED
+        self._outcomes = deque(maxlen=window_size) # True = thành công, False = lỗi
+        self._opened_at = None
+        self._probe_in_flight = False
+        self._probe_started_at = None
+        self._last_error = None
+
+    def _failure_rate(self):
+        if not self._outcomes:
+            return 0.0
+        failures = sum(1 for ok in self._outcomes if not ok)
+        return failures / len(self._outcomes)
+
+    def _open(self, now):
+        self._state = STATE_OPEN
+        self._opened_at = now
+        self._probe_in_flight = False
+        logger.warning("[CircuitBreaker] Mở breaker cho '%s' (tỷ lệ lỗi: %.0f%%, lỗi cuối: %s)",
+                       self.name, self._failure_rate() * 100, self._last_error)
+
+    def before_request(self):
+        """
+        Gọi trước khi scrape. Raise CircuitOpenError nếu breaker đang mở
+        hoặc đang có một request thăm dò khác chạy.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self._state == STATE_OPEN:
+                elapsed = now - self._opened_at
+                if elapsed < self.open_duration:
+                    raise CircuitOpenError(self.name, self.open_duration - elapsed)
+                # Hết thời gian mở -> chuyển sang half-open và cho phép request này làm probe
+                self._state = STATE_HALF_OPEN
+                self._probe_in_flight = True
+                self._probe_started_at = now
+                logger.info("[CircuitBreaker] '%s' chuyển sang half-open, gửi request thăm dò.", self.name)
+                return
+            if self._state == STATE_HALF_OPEN:
+                # Probe bị treo quá lâu (vd: client ngắt kết nối) -> cho phép probe mới
+                if self._probe_in_flight and now - self._probe_started_at < self.open_duration:
+                    raise CircuitOpenError(self.name, self.open_duration - (now - self._probe_started_at))
+                self._probe_in_flight = True
+                self._probe_started_at = now
+
+    def record_success(self):
+        with self._lock:
+            if self._state == STATE_HALF_OPEN:
+                logger.info("[CircuitBreaker] Request thăm dò '%s' thành công, đóng breaker.", self.name)
+                self._state = STATE_CLOSED
+                self._outcomes.clear()
+                self._probe_in_flight = False
+                self._opened_at = None
+            self._outcomes.append(True)
+
+    def record_failure(self, error=None):
+        with self._lock:
+            now = time.monotonic()
+            self._last_error = error
+            if self._state == STATE_HALF_OPEN:
+                logger.warning("[CircuitBreaker] Request thăm dò '%s' thất bại, mở lại breaker.", self.name)
+                self._open(now)
+                return
+            if self._state == STATE_OPEN:
+                return
+            self._outcomes.append(False)
+            if len(self._outcomes) >= self.min_requests and self._failure_rate() >= self.failure_rate_threshold:
+                self._open(now)
+
+    def snapshot(self):
+        """Trạng thái hiện tại của breaker (dùng cho endpoint /api/v1/services)."""
+        with self._lock:
+            retry_after = 0.0
+            if self._state == STATE_OPEN and self._opened_at is not None:
+                retry_after = max(0.0, self.open_duration - (time.monotonic() - self._opened_at))
+            return {
+                "state": self._state,
+                "failure_rate": round(self._failure_rate(), 3),
+                "window_requests": len(self._outcomes),
+                "retry_after": round(retry_after, 1),
+                "last_error": self._last_error if self._state != STATE_CLOSED else None,
+            }
+
+
+class CircuitBreakerRegistry:
+    """Quản lý breaker theo từng hãng tàu (tạo lười khi cần)."""
+    def __init__(self, **breaker_kwargs):
+        self._breaker_kwargs = breaker_kwargs
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    def get(self, name):
+        with self._lock:
+            breaker = self._breakers.get(name)
+            if breaker is None:
+                breaker = CircuitBreaker(name, **self._breaker_kwargs)
+                self._breakers[name] = breaker
+            return breaker
+
+    def snapshot(self, names=None):
+        names = names if names is not None else list(self._breakers.keys())
+        return {name: self.get(name).snapshot() for name in names}
+
+
+# Khởi tạo một instance toàn cục (Singleton)
+circuit_breakers = CircuitBreakerRegistry(
+    failure_rate_threshold=config.CIRCUIT_BREAKER_FAILURE_RATE,
+    window_size=config.CIRCUIT_BREAKER_WINDOW_SIZE,
+    min_requests=config.CIRCUIT_BREAKER_MIN_REQUESTS,
+    open_duration=config.CIRCUIT_BREAKER_OPEN_SECONDS,
+)
@@ -9,6 +9,112 @@ MAX_RETRIES = 3
 DELAY_BETWEEN_REQUESTS = (3, 7)
 RETRY_DELAY_EXPONENT_BASE = 2
 
+# --- Cấu hình Circuit Breaker (theo từng hãng tàu) ---
+# Breaker mở khi tỷ lệ lỗi trong cửa sổ trượt >= ngưỡng (và có đủ số request tối thiểu)
+CIRCUIT_BREAKER_FAILURE_RATE = float(os.getenv("CIRCUIT_BREAKER_FAILURE_RATE", "0.5"))
+CIRCUIT_BREAKER_WINDOW_SIZE = int(os.getenv("CIRCUIT_BREAKER_WINDOW_SIZE", "20"))
+CIRCUIT_BREAKER_MIN_REQUESTS = int(os.getenv("CIRCUIT_BREAKER_MIN_REQUESTS", "5"))
+# Thời gian (giây) breaker giữ trạng thái mở trước khi cho request thăm dò
+CIRCUIT_BREAKER_OPEN_SECONDS = float(os.getenv("CIRCUIT_BREAKER_OPEN_SECONDS", "60"))
+
+# --- Cấu hình cache HTTP có điều kiện (ETag/Last-Modified) cho API hãng tàu ---
+HTTP_CACHE_MAX_ENTRIES = int(os.getenv("HTTP_CACHE_MAX_ENTRIES", "1000"))
+
+# --- Cấu hình bộ chuẩn hóa ngày (scrapers/date_normalizer.py) ---
+# Số chuỗi ngày (theo từng hãng) được nhớ kết quả phân tích
+DATE_NORMALIZER_CACHE_SIZE = int(os.getenv("DATE_NORMALIZER_CACHE_SIZE", "4096"))
+
+# --- Cấu hình parse HTML theo luồng (scrapers/extraction.py) ---
+# Ngừng đọc response khi các section cần thiết của trang đã đóng (chỉ áp dụng cho spec có stop_after)
+HTML_STREAMING_ENABLED = os.getenv("HTML_STREAMING_ENABLED", "true").lower() == "true"
+HTML_STREAM_CHUNK_SIZE = int(os.getenv("HTML_STREAM_CHUNK_SIZE", "16384"))
+
+# --- Cấu hình đọc DOM cho scraper Selenium (scrapers/dom_snapshot.py) ---
+# Đọc cả bảng bằng một lần execute_script (trả về JSON) thay vì find_element cho từng ô
+SELENIUM_JS_EXTRACTION_ENABLED = os.getenv("SELENIUM_JS_EXTRACTION_ENABLED", "true").lower() == "true"
+# Chu kỳ poll của scrapers/readiness.py khi chờ nhiều điều kiện cùng lúc (banner / kết quả / lỗi)
+SELENIUM_READINESS_POLL_SECONDS = float(os.getenv("SELENIUM_READINESS_POLL_SECONDS", "0.05"))
+
+# --- Cấu hình bắt payload JSON từ trình duyệt (scrapers/network_capture.py) ---
+# Selenium: bật performance log (CDP) khi tạo driver; Playwright: listener page.on("response").
+# Payload API tracking được dùng ngay khi về tới, không chờ trang render (đọc DOM nếu không bắt được)
+BROWSER_NETWORK_CAPTURE_ENABLED = os.getenv("BROWSER_NETWORK_CAPTURE_ENABLED", "true").lower() == "true"
+
+# --- Cấu hình log (log_setup.py): hàng đợi + thread listener, định dạng JSON có request_id ---
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()  # 'json' hoặc 'text'
+# Hàng đợi đầy (listener không ghi kịp) -> bỏ bản ghi thay vì chặn request
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+# Giới hạn độ dài mỗi tham số (payload JSON/HTML) và toàn bộ message của một bản ghi
+LOG_MAX_ARG_CHARS = int(os.getenv("LOG_MAX_ARG_CHARS", "1000"))
+LOG_MAX_MESSAGE_CHARS = int(os.getenv("LOG_MAX_MESSAGE_CHARS", "4000"))
+# Tỷ lệ request được ghi log dưới WARNING (INFO/DEBUG); WARNING trở lên luôn được ghi
+LOG_INFO_SAMPLE_RATE = float(os.getenv("LOG_INFO_SAMPLE_RATE", "1.0"))
+
+# --- Cấu hình tracing (tracing.py) ---
+# Exporter cho trace của từng request: 'none' (tắt), 'console' (log cây span), 'file' (JSONL tại TRACING_FILE)
+TRACING_EXPORTER = os.getenv("TRACING_EXPORTER", "none").lower()
+TRACING_FILE = os.getenv("TRACING_FILE", "output/traces.jsonl")
+
+# --- Cấu hình endpoint quản trị /admin/* ---
+# Mọi endpoint /admin/* yêu cầu header 'X-Admin-Token' bằng giá trị này; để trống -> tắt toàn bộ /admin/*
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+# Endpoint /admin/* thay đổi trạng thái (POST/DELETE, vd: bật profiler, xóa profile) phải bật riêng
+ADMIN_WRITE_ENABLED = os.getenv("ADMIN_WRITE_ENABLED", "false").lower() == "true"
+
+# --- Cấu hình profiler lấy mẫu cho request chậm (profiler.py, bật/tắt lúc chạy qua /admin/profiler) ---
+PROFILER_ENABLED = os.getenv("PROFILER_ENABLED", "false").lower() == "true"
+# Chỉ giữ profile của request chạy lâu hơn ngưỡng này (giây)
+PROFILER_SLOW_THRESHOLD_SECONDS = float(os.getenv("PROFILER_SLOW_THRESHOLD_SECONDS", "15"))
+PROFILER_INTERVAL_SECONDS = float(os.getenv("PROFILER_INTERVAL_SECONDS", "0.01"))
+PROFILER_MAX_PROFILES = int(os.getenv("PROFILER_MAX_PROFILES", "20"))
+
+# --- Cấu hình lưu ảnh chụp/DOM khi scrape lỗi (artifacts.py) ---
+ARTIFACTS_DIR = os.getenv("ARTIFACTS_DIR", "output/artifacts")
+# Mỗi hãng tàu tối đa ARTIFACTS_MAX_PER_CARRIER artifact trong ARTIFACTS_WINDOW_SECONDS giây,
+# và chỉ lấy mẫu một tỷ lệ ARTIFACTS_SAMPLE_RATE số lần lỗi
+ARTIFACTS_MAX_PER_CARRIER = int(os.getenv("ARTIFACTS_MAX_PER_CARRIER", "5"))
+ARTIFACTS_WINDOW_SECONDS = float(os.getenv("ARTIFACTS_WINDOW_SECONDS", "3600"))
+ARTIFACTS_SAMPLE_RATE = float(os.getenv("ARTIFACTS_SAMPLE_RATE", "1.0"))
+# Tổng dung lượng tối đa của ARTIFACTS_DIR; vượt quá -> xóa artifact cũ nhất
+ARTIFACTS_QUOTA_MB = int(os.getenv("ARTIFACTS_QUOTA_MB", "200"))
+ARTIFACTS_QUEUE_SIZE = int(os.getenv("ARTIFACTS_QUEUE_SIZE", "20"))
+
+# --- Cấu hình canary tổng hợp (canary.py) ---
+# Định kỳ tra cứu một mã đã biết chắc có dữ liệu của từng hãng tàu qua đường scrape bình thường,
+# so thời gian/tỷ lệ thành công với baseline trượt để phát hiện hãng tàu chậm đi (bot wall mới, trang nặng hơn)
+CANARY_ENABLED = os.getenv("CANARY_ENABLED", "false").lower() == "true"
+# Danh sách 'HÃNG=MÃ' cách nhau bởi dấu phẩy, vd: "MSC=MEDU1234567,ONE=ONEYHCMU12345678"
+CANARY_TRACKING_NUMBERS = dict(
+    item.strip().split("=", 1) for item in os.getenv("CANARY_TRACKING_NUMBERS", "").split(",") if "=" in item
+)
+CANARY_INTERVAL_SECONDS = float(os.getenv("CANARY_INTERVAL_SECONDS", "900"))
+# Số lượt gần nhất được giữ làm baseline cho mỗi hãng tàu, và số lượt cuối dùng để so với baseline
+CANARY_BASELINE_RUNS = int(os.getenv("CANARY_BASELINE_RUNS", "48"))
+CANARY_RECENT_RUNS = int(os.getenv("CANARY_RECENT_RUNS", "3"))
+# Hãng tàu bị đánh dấu khi trung vị thời gian gần đây > baseline * tỷ lệ này, hoặc tỷ lệ thành công gần đây thấp hơn ngưỡng
+CANARY_LATENCY_DRIFT_RATIO = float(os.getenv("CANARY_LATENCY_DRIFT_RATIO", "1.5"))
+CANARY_MIN_SUCCESS_RATE = float(os.getenv("CANARY_MIN_SUCCESS_RATE", "0.67"))
+# Lịch sử các lượt canary, giữ qua các lần khởi động (và giữa các lần chạy CI)
+CANARY_HISTORY_FILE = os.getenv("CANARY_HISTORY_FILE", "output/canary_history.json")
+# Lịch sử riêng của `python -m canary --replay` (fixture cục bộ), không lẫn vào baseline của hãng tàu thật
+CANARY_REPLAY_HISTORY_FILE = os.getenv("CANARY_REPLAY_HISTORY_FILE", "output/canary_replay_history.json")
+
+# --- Cấu hình bộ ghi/phát lại offline (python -m replay) ---
+# Mỗi hãng tàu một thư mục con: <mã>.har (các exchange HTTP) và <mã>.expected.json (kết quả chuẩn hóa)
+REPLAY_FIXTURES_DIR = os.getenv("REPLAY_FIXTURES_DIR", "replay/fixtures")
+
+# --- Cấu hình phát lại phiên trình duyệt qua HTTP (session_vault.py) ---
+# Hãng tàu trong scrapers.REPLAY_SCRAPERS: trình duyệt thu thập cookie/header, các lượt tra cứu sau đi qua
+# HTTP client cho tới khi phiên hết hạn (tối đa TTL hoặc hạn sớm nhất của cookie) hoặc bị từ chối
+HYBRID_REPLAY_ENABLED = os.getenv("HYBRID_REPLAY_ENABLED", "true").lower() == "true"
+SESSION_VAULT_TTL_SECONDS = float(os.getenv("SESSION_VAULT_TTL_SECONDS", "900"))
+# Cookie sống ngắn hơn khoảng này (vd: _gat_* của analytics, 60s) không rút ngắn hạn của phiên
+SESSION_VAULT_MIN_COOKIE_TTL_SECONDS = float(os.getenv("SESSION_VAULT_MIN_COOKIE_TTL_SECONDS", "300"))
+# Phiên đã được dùng và sắp hết hạn (trong khoảng này) được trình duyệt làm mới định kỳ
+SESSION_VAULT_REFRESH_MARGIN_SECONDS = float(os.getenv("SESSION_VAULT_REFRESH_MARGIN_SECONDS", "120"))
+SESSION_VAULT_REFRESH_INTERVAL_SECONDS = float(os.getenv("SESSION_VAULT_REFRESH_INTERVAL_SECONDS", "60"))
+
 # --- Cấu hình Proxy (Đọc từ biến môi trường) ---
 PROXY_USER = os.getenv("PROXY_USER_NAME")
 PROXY_PASS = os.getenv("PROXY_PASSWORD")
@@ -24,6 +130,17 @@ PROXY_LIST = []
 # else:
 #     print("Proxy username or password not found in .env file. Running without proxy.")
 
+# Số driver Selenium tối đa của Driver Pool mặc định (không proxy)
+DRIVER_POOL_SIZE = int(os.getenv("DRIVER_POOL_SIZE", "4"))
+# Số thread của executor mặc định (asyncio.to_thread: Selenium, scraper API); 0 -> mặc định của asyncio
+THREAD_POOL_WORKERS = int(os.getenv("THREAD_POOL_WORKERS", "0"))
+# Số driver Selenium tối đa cho mỗi proxy (mỗi proxy có Driver Pool riêng)
+PROXY_DRIVER_POOL_SIZE = int(os.getenv("PROXY_DRIVER_POOL_SIZE", "2"))
+# Proxy bị coi là không khỏe với một hãng tàu khi tỷ lệ thành công (EWMA) thấp hơn ngưỡng
+# hoặc lỗi liên tiếp quá số lần cho phép -> hãng tàu đó được chuyển sang proxy khác
+PROXY_MIN_SUCCESS_RATE = float(os.getenv("PROXY_MIN_SUCCESS_RATE", "0.5"))
+PROXY_MAX_CONSECUTIVE_FAILURES = int(os.getenv("PROXY_MAX_CONSECUTIVE_FAILURES", "3"))
+
 
 # --- Cấu hình Scraper ---
 SCRAPER_CONFIGS = {
@@ -36,6 +153,9 @@ SCRAPER_CONFIGS = {
     #},
     "MSK": {
         "url": "https://www.maersk.com/tracking/",
+        # API JSON mà trang tracking gọi để render kết quả
+        # (phát lại đúng URL đã bắt được bằng phiên từ trình duyệt: scrapers/api/maersk_http_scraper.py)
+        "capture_url_pattern": r"api\.maersk\.com/synergy/tracking/",
     },
     "MSC": {
         "url": "https://www.msc.com/en/track-a-shipment",
@@ -55,6 +175,9 @@ SCRAPER_CONFIGS = {
         "get_n_url": "https://www.pilship.com/wp-content/themes/hello-theme-child-master/pil-api/common/get-n.php",
         "track_url": "https://www.pilship.com/wp-content/themes/hello-theme-child-master/pil-api/trackntrace-containertnt.php",
         "track_container_url": "https://www.pilship.com/wp-content/themes/hello-theme-child-master/pil-api/trackntrace-containertnt-trace.php",
+        # Lấy sự kiện của tất cả container trên B/L (song song, tối đa max_container_workers request cùng lúc)
+        "fetch_all_containers": True,
+        "max_container_workers": 4,
     },
     "SNK": {
         "url": "https://ebiz.sinokor.co.kr/BLDetail?blno=",
@@ -95,12 +218,22 @@ SCRAPER_CONFIGS = {
         "url": "https://ecomm.one-line.com/one-ecom/manage-shipment/cargo-tracking?trakNoParam=",
         "search_url": "https://ecomm.one-line.com/api/v1/edh/containers/track-and-trace/search",
         "events_url": "https://ecomm.one-line.com/api/v1/edh/containers/track-and-trace/cop-events",
+        "fetch_all_containers": True,
+        "max_container_workers": 4,
     },
     "COSCO": {
-        "url": "https://elines.coscoshipping.com/ebusiness/cargotracking"
+        "url": "https://elines.coscoshipping.com/ebusiness/cargotracking",
+        # API JSON mà iframe cargo tracking gọi để render kết quả
+        # (phát lại đúng URL đã bắt được bằng phiên từ trình duyệt: scrapers/api/cosco_http_scraper.py)
+        "capture_url_pattern": r"/ebtracking/public/(booking|bill)/",
     },
     "EMC": {
-        "url": "https://ct.shipmentlink.com/servlet/TDB1_CargoTracking.do"
+        "url": "https://ct.shipmentlink.com/servlet/TDB1_CargoTracking.do",
+        "fetch_all_containers": True,
+        # Tải trang 'Container Moves' của các container song song bằng HTTP (cookie của driver) thay vì mở popup;
+        # nếu không được thì mở popup của các container theo nhóm để trình duyệt tải song song
+        "popup_http_fetch": os.getenv("EMC_POPUP_HTTP_FETCH", "true").lower() == "true",
+        "max_container_workers": 4,
     },
     "OSL": {
         "url": "https://star-liners.com/track-my-shipment/",
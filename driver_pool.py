@@ -1,60 +1,172 @@
 import queue
 import logging
+import threading
 import time
 from driver_setup import create_driver
+import config
+import metrics
+import tracing
+import procfs
 
 logger = logging.getLogger(__name__)
 
 class DriverPool:
-    def __init__(self, size=4):
+    def __init__(self, size=4, proxy_config=None):
         self.size = size
+        self.proxy_config = proxy_config
         self.drivers = queue.Queue(maxsize=size)
-        
+        self._created = 0 # Số driver đã tạo (đang trong pool hoặc đang được dùng)
+        self._lock = threading.Lock()
+        # Thông tin từng driver (id(driver) -> thời điểm tạo, số lần dùng, hãng tàu đang dùng) cho /admin/status
+        self._info = {}
+        # Nhãn của pool trong metrics: 'host:port' của proxy hoặc 'default'
+        self._label = f"{proxy_config['host']}:{proxy_config['port']}" if proxy_config else "default"
+
+    def _create_driver(self):
+        driver = create_driver(proxy_config=self.proxy_config)
+        process = getattr(getattr(driver, "service", None), "process", None)
+        with self._lock:
+            self._info[id(driver)] = {
+                "created_at": time.time(), "uses": 0, "carrier": None, "checked_out_at": None,
+                "pid": getattr(process, "pid", None),
+            }
+        return driver
+
+    def _forget(self, driver):
+        with self._lock:
+            self._info.pop(id(driver), None)
+
+    def _replace_driver(self):
+        # Tạo driver thay thế cho driver hỏng; nếu lỗi thì giải phóng slot để lần sau tạo lại
+        try:
+            return self._create_driver()
+        except Exception:
+            with self._lock:
+                self._created -= 1
+            raise
+
     def initialize(self):
         """Khởi tạo sẵn các driver"""
         logger.info(f"Đang khởi tạo Pool với {self.size} drivers...")
         for _ in range(self.size):
             try:
-                driver = create_driver()
+                driver = self._create_driver()
+                with self._lock:
+                    self._created += 1
                 self.drivers.put(driver)
             except Exception as e:
                 logger.error(f"Lỗi khởi tạo driver ban đầu: {e}")
         logger.info("Driver Pool đã sẵn sàng!")
 
-    def get_driver(self):
-        """Lấy một driver từ pool. Nếu pool trống, sẽ block chờ đến khi có driver trả về."""
-        driver = self.drivers.get() # Block cho đến khi có driver
+    def get_driver(self, carrier=None):
+        """
+        Lấy một driver từ pool. Nếu pool trống nhưng chưa tạo đủ `size` driver thì tạo mới
+        (khởi tạo lười), ngược lại sẽ block chờ đến khi có driver trả về.
+        `carrier` chỉ dùng để hiển thị driver đang phục vụ hãng tàu nào (/admin/status).
+        """
+        t_start = time.time()
+        with tracing.span("driver_pool.get_driver", idle=self.drivers.qsize()):
+            try:
+                driver = self._get_driver()
+            finally:
+                metrics.DRIVER_POOL_WAIT_SECONDS.labels(self._label).observe(time.time() - t_start)
+        with self._lock:
+            info = self._info.get(id(driver))
+            if info is not None:
+                info["uses"] += 1
+                info["carrier"] = carrier
+                info["checked_out_at"] = time.time()
+        return driver
+
+    def _get_driver(self):
+        try:
+            driver = self.drivers.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                can_create = self._created < self.size
+                if can_create:
+                    self._created += 1
+            if can_create:
+                try:
+                    with tracing.span("driver.create"):
+                        return self._create_driver()
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+            with tracing.span("driver_pool.wait"):
+                driver = self.drivers.get() # Block cho đến khi có driver
         
         # Kiểm tra sức khỏe driver (Health Check)
         try:
             # Thử ping nhẹ vào browser xem còn sống không
-            driver.title 
+            with tracing.span("driver.health_check"):
+                driver.title 
             return driver
         except Exception:
             logger.warning("Phát hiện Driver chết, đang tạo lại...")
+            self._forget(driver)
             try:
                 driver.quit()
             except: 
                 pass
-            return create_driver() # Tạo mới bù vào
+            return self._replace_driver() # Tạo mới bù vào
 
     def return_driver(self, driver):
         """Trả driver về pool sau khi dùng xong"""
+        with tracing.span("driver_pool.return_driver"):
+            self._return_driver(driver)
+
+    def _return_driver(self, driver):
         try:
             # Dọn dẹp session để không bị lẫn lộn giữa các request
             driver.delete_all_cookies()
             # Mở trang trắng để nhẹ ram
             driver.get("about:blank")
+            if config.BROWSER_NETWORK_CAPTURE_ENABLED:
+                # Xả performance log để buffer không tăng dần qua các request
+                try:
+                    driver.get_log("performance")
+                except Exception:
+                    pass
         except Exception as e:
             logger.warning(f"Lỗi khi dọn dẹp driver: {e}. Sẽ tạo mới thay thế.")
+            self._forget(driver)
             try:
                 driver.quit()
             except: 
                 pass
-            driver = create_driver()
-            
+            driver = self._replace_driver()
+
+        with self._lock:
+            info = self._info.get(id(driver))
+            if info is not None:
+                info["carrier"] = info["checked_out_at"] = None
         self.drivers.put(driver)
 
+    def stats(self):
+        # Số driver tối đa, đã tạo và đang rảnh trong pool
+        with self._lock:
+            created = self._created
+        return {"size": self.size, "created": created, "idle": self.drivers.qsize()}
+
+    def snapshot(self):
+        """stats() kèm tuổi, số lần dùng, hãng tàu đang dùng và RSS (chromedriver + Chrome) của từng driver."""
+        now = time.time()
+        with self._lock:
+            infos = [dict(info) for info in self._info.values()]
+        drivers = []
+        for info in sorted(infos, key=lambda i: i["created_at"]):
+            rss = procfs.tree_rss_bytes(info["pid"])
+            drivers.append({
+                "age_s": round(now - info["created_at"], 1),
+                "uses": info["uses"],
+                "carrier": info["carrier"],
+                "busy_s": round(now - info["checked_out_at"], 1) if info["checked_out_at"] else None,
+                "rss_mb": round(rss / 1024 / 1024, 1) if rss else None,
+            })
+        return {**self.stats(), "drivers": drivers}
+
     def shutdown(self):
         """Tắt toàn bộ driver khi tắt app"""
         logger.info("Đang đóng toàn bộ drivers...")
@@ -67,6 +179,9 @@ class DriverPool:
                     driver.quit()
             except Exception:
                 pass
+        with self._lock:
+            self._created = 0
+            self._info.clear()
 
 # Khởi tạo một instance toàn cục (Singleton)
-driver_pool = DriverPool(size=4)
\ No newline at end of file
+driver_pool = DriverPool(size=config.DRIVER_POOL_SIZE)
\ No newline at end of file
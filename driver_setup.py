@@ -8,6 +8,8 @@ from selenium.webdriver.chrome.service import Service
 from webdriver_manager.chrome import ChromeDriverManager
 from selenium.webdriver.chrome.options import Options
 
+import config
+
 # Logger để debug
 logger = logging.getLogger(__name__)
 
@@ -30,6 +32,11 @@ def create_driver(proxy_config=None, page_load_strategy='eager'):
     options.add_argument('--disable-gpu')
     options.add_argument("--window-size=1920,1080")
 
+    if config.BROWSER_NETWORK_CAPTURE_ENABLED:
+        # Performance log chứa sự kiện CDP Network.* -> scraper bắt được payload JSON của API tracking
+        options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+        options.add_experimental_option("perfLoggingPrefs", {"enableNetwork": True, "enablePage": False})
+
     user_agent = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/108.0.0.0 Safari/537.36"
     options.add_argument(f'user-agent={user_agent}')
 
@@ -0,0 +1,192 @@
+import sys
+import copy
+import json
+import uuid
+import queue
+import random
+import atexit
+import logging
+import reprlib
+import contextvars
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+import config
+import tracing
+
+# Request hiện tại: mã tương quan, quyết định lấy mẫu log INFO và các trường gắn vào mọi bản ghi (vd: hãng tàu).
+# asyncio.to_thread, StepRunner và _fetch_concurrently sao chép context sang thread -> log của worker cũng mang mã này
+_request = contextvars.ContextVar("log_request", default=None)
+
+# Payload lớn (dict/list JSON của API, HTML) được rút gọn với chi phí giới hạn, không dựng chuỗi đầy đủ rồi mới cắt
+_payload_repr = reprlib.Repr()
+_payload_repr.maxlevel = 4
+_payload_repr.maxdict = _payload_repr.maxlist = _payload_repr.maxtuple = _payload_repr.maxset = 20
+_payload_repr.maxstring = _payload_repr.maxother = 200
+
+_listener = None
+_handler = None
+
+_UVICORN_LOGGERS = ("uvicorn", "uvicorn.error", "uvicorn.access")
+
+
+@contextmanager
+def request_context(request_id=None, **fields):
+    """
+    Gắn mã tương quan (request_id) và các trường (vd: carrier) vào mọi bản ghi log trong khối with.
+    Log dưới WARNING của request chỉ được ghi với xác suất LOG_INFO_SAMPLE_RATE (quyết định một lần cho cả request).
+    """
+    context = {
+        "request_id": request_id or uuid.uuid4().hex[:16],
+        "sampled": random.random() < config.LOG_INFO_SAMPLE_RATE,
+        "fields": fields,
+    }
+    token = _request.set(context)
+    try:
+        yield context["request_id"]
+    finally:
+        _request.reset(token)
+
+
+def current_request_id():
+    context = _request.get()
+    return context["request_id"] if context else None
+
+
+def _cap(value):
+    limit = config.LOG_MAX_ARG_CHARS
+    if isinstance(value, str):
+        return value if len(value) <= limit else f"{value[:limit]}... [+{len(value) - limit} ký tự]"
+    if isinstance(value, bytes):
+        return repr(value) if len(value) <= limit else f"{value[:limit]!r}... [+{len(value) - limit} bytes]"
+    if isinstance(value, (dict, list, tuple, set)):
+        return _payload_repr.repr(value)
+    return value
+
+
+def _cap_args(msg, args):
+    if isinstance(args, dict):
+        # LogRecord bỏ lớp tuple khi đối số duy nhất là dict: chỉ là mapping khi message dùng '%(tên)s',
+        # còn với '%s' (vd: logger.error("... Response: %s", data)) thì cả dict là payload cần rút gọn
+        if "%(" in str(msg):
+            return {key: _cap(value) for key, value in args.items()}
+        return (_cap(args),)
+    return tuple(_cap(value) for value in args)
+
+
+class _SamplingFilter(logging.Filter):
+    def filter(self, record):
+        context = _request.get()
+        return context is None or context["sampled"] or record.levelno >= logging.WARNING
+
+
+class _RequestQueueHandler(QueueHandler):
+    """
+    Đưa bản ghi vào hàng đợi (không chặn): ở thread gọi log chỉ nội suy message (args có thể bị sửa sau đó)
+    với payload đã rút gọn và gắn trường của request; định dạng JSON và ghi ra stream do thread listener làm.
+    Hàng đợi đầy -> bỏ bản ghi và đếm (dropped) thay vì chặn request.
+    """
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        if record.args:
+            record.args = _cap_args(record.msg, record.args)
+        message = record.getMessage()
+        limit = config.LOG_MAX_MESSAGE_CHARS
+        if len(message) > limit:
+            message = f"{message[:limit]}... [+{len(message) - limit} ký tự]"
+        record.msg, record.args = message, None
+        context = _request.get()
+        record.request_id = context["request_id"] if context else None
+        record.fields = context["fields"] if context else {}
+        record.trace_id = tracing.current_trace_id()
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    """Mỗi bản ghi là một dòng JSON."""
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "thread": record.threadName,
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        if getattr(record, "trace_id", None):
+            entry["trace_id"] = record.trace_id
+        entry.update(getattr(record, "fields", None) or {})
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        if record.stack_info:
+            entry["stack"] = self.formatStack(record.stack_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] %(message)s")
+
+    def format(self, record):
+        if getattr(record, "request_id", None) is None:
+            record.request_id = "-"
+        return super().format(record)
+
+
+def configure_logging():
+    """
+    Thay handler của root logger (và của các logger uvicorn) bằng hàng đợi + thread listener ghi ra stdout
+    (LOG_FORMAT 'json' hoặc 'text').
+    Gọi nhiều lần chỉ cấu hình một lần.
+    """
+    global _listener, _handler
+    if _listener is not None:
+        return
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(JsonFormatter() if config.LOG_FORMAT == "json" else TextFormatter())
+    _handler = _RequestQueueHandler(queue.Queue(maxsize=config.LOG_QUEUE_SIZE))
+    _handler.addFilter(_SamplingFilter())
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_handler)
+    root.setLevel(config.LOG_LEVEL)
+    # uvicorn (dictConfig mặc định, chạy trước khi import app) gắn StreamHandler riêng với propagate=False
+    # cho log server và access log: bỏ đi để các log này cũng qua hàng đợi và JsonFormatter
+    for name in _UVICORN_LOGGERS:
+        server_logger = logging.getLogger(name)
+        for handler in list(server_logger.handlers):
+            server_logger.removeHandler(handler)
+        server_logger.propagate = True
+
+    _listener = QueueListener(_handler.queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    # Ghi nốt các bản ghi còn trong hàng đợi khi tiến trình thoát
+    atexit.register(shutdown)
+
+
+def shutdown():
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def stats():
+    """Số bản ghi đang chờ trong hàng đợi và số bản ghi bị bỏ do hàng đợi đầy."""
+    if _handler is None:
+        return {"queued": 0, "dropped": 0}
+    return {"queued": _handler.queue.qsize(), "dropped": _handler.dropped}
@@ -0,0 +1,125 @@
+import time
+import logging
+import contextvars
+from contextlib import contextmanager
+
+from prometheus_client import Counter, Gauge, Histogram, REGISTRY
+from prometheus_client.core import GaugeMetricFamily
+
+import tracing
+from profiler import profiler
+
+logger = logging.getLogger(__name__)
+
+# Các giai đoạn chuẩn mà scraper báo cáo (tham số `phase` của observe)
+PHASES = ("navigation", "cookie", "search", "wait", "extract", "normalize", "http")
+
+# Bucket (giây): từ thao tác DOM vài mili giây tới lượt tra cứu trình duyệt ~1 phút
+_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+
+PHASE_SECONDS = Histogram(
+    "scraper_phase_seconds",
+    "Thời gian của từng giai đoạn scrape theo hãng tàu và chiến lược",
+    ["carrier", "strategy", "phase"],
+    buckets=_BUCKETS,
+)
+REQUEST_SECONDS = Histogram(
+    "scraper_request_seconds",
+    "Tổng thời gian một lượt tra cứu theo hãng tàu, chiến lược và kết quả",
+    ["carrier", "strategy", "outcome"],
+    buckets=_BUCKETS,
+)
+REQUESTS_IN_PROGRESS = Gauge(
+    "scraper_requests_in_progress",
+    "Số lượt tra cứu đang chạy theo hãng tàu",
+    ["carrier"],
+)
+DRIVER_POOL_WAIT_SECONDS = Histogram(
+    "scraper_driver_pool_wait_seconds",
+    "Thời gian lấy driver từ Driver Pool (chờ driver rảnh, tạo mới hoặc thay driver hỏng)",
+    ["proxy"],
+    buckets=_BUCKETS,
+)
+REPLAY_FALLBACKS = Counter(
+    "scraper_replay_fallbacks_total",
+    "Số lần phát lại phiên qua HTTP thất bại và phải quay lại trình duyệt",
+    ["carrier", "reason"],
+)
+CANARY_RUNS = Counter(
+    "scraper_canary_runs_total",
+    "Số lượt canary theo hãng tàu và kết quả",
+    ["carrier", "outcome"],
+)
+CANARY_LATENCY_RATIO = Gauge(
+    "scraper_canary_latency_ratio",
+    "Trung vị thời gian các lượt canary gần đây so với baseline trượt của hãng tàu",
+    ["carrier"],
+)
+CANARY_FLAGGED = Gauge(
+    "scraper_canary_flagged",
+    "Hãng tàu đang bị canary đánh dấu chậm đi hoặc lỗi (1) hay không (0)",
+    ["carrier"],
+)
+
+# (hãng tàu, chiến lược) của lượt tra cứu hiện tại; asyncio.to_thread và StepRunner sao chép context sang thread
+_labels = contextvars.ContextVar("scrape_labels", default=("unknown", "unknown"))
+
+
+@contextmanager
+def scrape_context(carrier, strategy):
+    """Gán nhãn hãng tàu/chiến lược cho các giai đoạn được báo cáo bên trong khối with."""
+    token = _labels.set((carrier, strategy))
+    try:
+        yield
+    finally:
+        _labels.reset(token)
+
+
+def observe(phase, t_start, **attributes):
+    """
+    Ghi thời gian của một giai đoạn (tính từ t_start = time.time()) vào histogram và trả về số giây,
+    để dùng trực tiếp trong log: logger.info("-> (Thời gian) Gọi API: %.2fs", metrics.observe("http", t_start))
+    Giai đoạn cũng được ghi thành span (kèm attributes) nếu request đang được trace, và vào profile nếu
+    request đang được profile.
+    """
+    end = time.time()
+    elapsed = end - t_start
+    carrier, strategy = _labels.get()
+    PHASE_SECONDS.labels(carrier, strategy, phase).observe(elapsed)
+    tracing.record_span(phase, t_start, end, **attributes)
+    profiler.record_phase(phase, elapsed)
+    return elapsed
+
+
+def observe_request(carrier, strategy, outcome, seconds):
+    REQUEST_SECONDS.labels(carrier, strategy, outcome).observe(seconds)
+
+
+class PoolCollector:
+    """Gauge của các pool và trạng thái dùng chung, đọc tại thời điểm Prometheus scrape /metrics."""
+    def __init__(self):
+        self._sources = {}
+
+    def register(self, name, func):
+        """func() -> list[(tên metric, mô tả, {nhãn: giá trị}, giá trị)]"""
+        self._sources[name] = func
+
+    def collect(self):
+        families = {}
+        for name, func in self._sources.items():
+            try:
+                samples = func()
+            except Exception as e:
+                logger.warning("[Metrics] Không đọc được '%s': %s", name, e)
+                continue
+            for metric, documentation, labels, value in samples:
+                family = families.get(metric)
+                if family is None:
+                    family = families[metric] = GaugeMetricFamily(metric, documentation, labels=list(labels))
+                family.add_metric([str(v) for v in labels.values()], value)
+        return list(families.values())
+
+
+# Khởi tạo một instance toàn cục (Singleton); app.py đăng ký các nguồn (driver pool, browser pool, ...)
+pool_collector = PoolCollector()
+REGISTRY.register(pool_collector)
@@ -0,0 +1,23 @@
+import os
+
+
+def tree_rss_bytes(pid):
+    """
+    RSS của tiến trình và toàn bộ tiến trình con (chromedriver -> Chrome) đọc từ /proc.
+    Tiến trình đã thoát hoặc không đọc được bị bỏ qua; trả về 0 nếu không đọc được gì (vd: không phải Linux).
+    """
+    if not pid:
+        return 0
+    total, pending = 0, [pid]
+    page_size = os.sysconf("SC_PAGE_SIZE")
+    while pending:
+        current = pending.pop()
+        try:
+            with open(f"/proc/{current}/statm") as f:
+                total += int(f.read().split()[1]) * page_size
+            for task in os.listdir(f"/proc/{current}/task"):
+                with open(f"/proc/{current}/task/{task}/children") as f:
+                    pending.extend(int(child) for child in f.read().split())
+        except (FileNotFoundError, ProcessLookupError, PermissionError, ValueError):
+            continue
+    return total
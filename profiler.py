@@ -0,0 +1,271 @@
+import os
+import sys
+import time
+import uuid
+import asyncio
+import logging
+import threading
+import contextvars
+import collections
+from functools import lru_cache
+from contextlib import contextmanager
+
+import config
+import tracing
+
+logger = logging.getLogger(__name__)
+
+# Số frame tối đa của một stack được ghi
+_MAX_DEPTH = 96
+_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Profile của request hiện tại; asyncio.to_thread, StepRunner và _fetch_concurrently sao chép context sang thread
+_current_profile = contextvars.ContextVar("current_profile", default=None)
+
+
+@lru_cache(maxsize=4096)
+def _short_path(filename):
+    # Đường dẫn tương đối với repo, hoặc '<gói>/<file>' với thư viện (site-packages, stdlib)
+    if filename.startswith(_ROOT):
+        return os.path.relpath(filename, _ROOT)
+    return "/".join(filename.replace("\\", "/").split("/")[-2:])
+
+
+def _stack(frame):
+    """Stack dạng 'gốc;...;lá' (định dạng collapsed của flamegraph.pl / speedscope)."""
+    names = []
+    while frame is not None and len(names) < _MAX_DEPTH:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({_short_path(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+def _thread_cpu_time(ident):
+    try:
+        return time.clock_gettime(time.pthread_getcpuclockid(ident))
+    except (AttributeError, OSError, OverflowError):
+        # Nền tảng không hỗ trợ đồng hồ CPU theo thread, hoặc thread đã kết thúc
+        return None
+
+
+class Profile:
+    """Mẫu stack (wall: số mẫu, CPU: giây CPU) và thời gian các giai đoạn của một request."""
+    def __init__(self, attributes):
+        self.profile_id = uuid.uuid4().hex[:12]
+        self.attributes = attributes
+        self.trace_id = tracing.current_trace_id()
+        self.start = time.time()
+        self.end = None
+        self.wall = collections.Counter()
+        self.cpu = collections.Counter()
+        self.phases = collections.Counter()
+        self.samples = 0
+        self._lock = threading.Lock()
+
+    @property
+    def duration(self):
+        return (self.end or time.time()) - self.start
+
+    def add_sample(self, stack, cpu_seconds):
+        with self._lock:
+            self.samples += 1
+            self.wall[stack] += 1
+            if cpu_seconds:
+                self.cpu[stack] += cpu_seconds
+
+    def add_phase(self, phase, seconds):
+        with self._lock:
+            self.phases[phase] += seconds
+
+    def summary(self):
+        return {
+            "profile_id": self.profile_id,
+            "trace_id": self.trace_id,
+            "attributes": self.attributes,
+            "start": self.start,
+            "duration_s": round(self.duration, 3),
+            "samples": self.samples,
+            "cpu_s": round(sum(self.cpu.values()), 3),
+            "phases_s": {phase: round(seconds, 3) for phase, seconds in self.phases.items()},
+        }
+
+    def collapsed(self, kind="wall"):
+        """Văn bản collapsed: mỗi dòng '<stack> <giá trị>' (CPU tính theo micro giây)."""
+        if kind == "cpu":
+            return "\n".join(f"{stack} {int(seconds * 1e6)}" for stack, seconds in self.cpu.most_common())
+        return "\n".join(f"{stack} {count}" for stack, count in self.wall.most_common())
+
+    def to_dict(self, top=50):
+        """Tóm tắt kèm các stack nhiều mẫu nhất và các hàm (lá) tốn thời gian nhất."""
+        def leaves(counter):
+            totals = collections.Counter()
+            for stack, value in counter.items():
+                totals[stack.rsplit(";", 1)[-1]] += value
+            return totals.most_common(top)
+        return {
+            **self.summary(),
+            "wall_top_stacks": self.wall.most_common(top),
+            "wall_top_functions": leaves(self.wall),
+            "cpu_top_stacks": [(stack, round(seconds, 4)) for stack, seconds in self.cpu.most_common(top)],
+            "cpu_top_functions": [(name, round(seconds, 4)) for name, seconds in leaves(self.cpu)],
+        }
+
+
+class SamplingProfiler:
+    """
+    Profiler lấy mẫu cho request chậm: khi bật, mỗi request có một Profile; một thread nền đọc stack
+    (sys._current_frames) của các thread đang làm việc cho request theo chu kỳ interval. Khi request kết thúc,
+    profile chỉ được giữ lại nếu thời gian vượt threshold. Khi tắt, chỉ tốn một lần đọc contextvar mỗi điểm gắn.
+
+    Thread được gắn với request qua attach() (app._to_thread, StepRunner, _fetch_concurrently); phần chạy trên
+    event loop (Playwright) được gán theo task asyncio đang chạy của request.
+    """
+    def __init__(self, enabled, threshold, interval, max_profiles):
+        self.enabled = enabled
+        self.threshold = threshold
+        self.interval = interval
+        self.profiles = collections.OrderedDict()
+        self.max_profiles = max_profiles
+        self._threads = {}  # ident thread -> profile
+        self._tasks = {}    # task asyncio -> (loop, ident thread của loop, profile)
+        self._active = 0
+        self._cpu_last = {}
+        self._lock = threading.Lock()
+        self._sampler = None
+
+    def configure(self, enabled=None, threshold=None, interval=None):
+        """Đổi cấu hình khi đang chạy (áp dụng cho các request bắt đầu sau thời điểm này)."""
+        with self._lock:
+            if enabled is not None:
+                self.enabled = enabled
+            if threshold is not None:
+                self.threshold = threshold
+            if interval is not None:
+                self.interval = max(0.001, interval)
+        logger.info("[Profiler] enabled=%s, threshold=%.2fs, interval=%.3fs", self.enabled, self.threshold, self.interval)
+
+    @contextmanager
+    def profile_request(self, **attributes):
+        """Profile một request (gọi trong coroutine của request trên event loop)."""
+        if not self.enabled:
+            yield None
+            return
+        profile = Profile(attributes)
+        token = _current_profile.set(profile)
+        task = asyncio.current_task()
+        with self._lock:
+            if task is not None:
+                self._tasks[task] = (asyncio.get_running_loop(), threading.get_ident(), profile)
+            self._active += 1
+            self._ensure_sampler()
+        try:
+            yield profile
+        finally:
+            _current_profile.reset(token)
+            profile.end = time.time()
+            with self._lock:
+                self._tasks.pop(task, None)
+                self._active -= 1
+                if profile.duration >= self.threshold:
+                    self.profiles[profile.profile_id] = profile
+                    while len(self.profiles) > self.max_profiles:
+                        self.profiles.popitem(last=False)
+            if profile.duration >= self.threshold:
+                logger.info("[Profiler] Request chậm (%.2fs >= %.2fs), đã lưu profile %s (%d mẫu): %s",
+                            profile.duration, self.threshold, profile.profile_id, profile.samples, attributes)
+
+    @contextmanager
+    def attach(self):
+        """Gắn thread hiện tại với profile của request hiện tại (nếu có) trong khối with."""
+        profile = _current_profile.get()
+        if profile is None:
+            yield
+            return
+        ident = threading.get_ident()
+        with self._lock:
+            previous = self._threads.get(ident)
+            self._threads[ident] = profile
+        try:
+            yield
+        finally:
+            with self._lock:
+                if previous is not None:
+                    # attach lồng nhau: trả lại profile trước đó của thread
+                    self._threads[ident] = previous
+                else:
+                    del self._threads[ident]
+                    self._cpu_last.pop(ident, None)
+
+    def record_phase(self, phase, seconds):
+        profile = _current_profile.get()
+        if profile is not None:
+            profile.add_phase(phase, seconds)
+
+    def _ensure_sampler(self):
+        if self._sampler is None or not self._sampler.is_alive():
+            self._sampler = threading.Thread(target=self._run, name="profiler-sampler", daemon=True)
+            self._sampler.start()
+
+    def _run(self):
+        # Chạy khi còn request đang được profile; tự dừng khi không còn
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if self._active == 0:
+                    self._sampler = None
+                    self._cpu_last.clear()
+                    return
+                targets = dict(self._threads)
+                tasks = list(self._tasks.items())
+            for task, (loop, loop_ident, profile) in tasks:
+                try:
+                    if asyncio.current_task(loop) is task:
+                        targets.setdefault(loop_ident, profile)
+                except Exception:
+                    pass
+            if targets:
+                self._sample(targets)
+
+    def _sample(self, targets):
+        frames = sys._current_frames()
+        for ident, profile in targets.items():
+            frame = frames.get(ident)
+            if frame is None:
+                continue
+            cpu_now = _thread_cpu_time(ident)
+            cpu_last = self._cpu_last.get(ident)
+            if cpu_now is not None:
+                self._cpu_last[ident] = cpu_now
+            cpu_delta = cpu_now - cpu_last if cpu_now is not None and cpu_last is not None else 0.0
+            profile.add_sample(_stack(frame), cpu_delta)
+
+    def status(self):
+        with self._lock:
+            profiles = [profile.summary() for profile in reversed(self.profiles.values())]
+            active = self._active
+        return {
+            "enabled": self.enabled,
+            "threshold_s": self.threshold,
+            "interval_s": self.interval,
+            "max_profiles": self.max_profiles,
+            "active_requests": active,
+            "profiles": profiles,
+        }
+
+    def get(self, profile_id):
+        with self._lock:
+            return self.profiles.get(profile_id)
+
+    def clear(self):
+        with self._lock:
+            self.profiles.clear()
+
+
+# Khởi tạo một instance toàn cục (Singleton)
+profiler = SamplingProfiler(
+    enabled=config.PROFILER_ENABLED,
+    threshold=config.PROFILER_SLOW_THRESHOLD_SECONDS,
+    interval=config.PROFILER_INTERVAL_SECONDS,
+    max_profiles=config.PROFILER_MAX_PROFILES,
+)
@@ -0,0 +1,204 @@
+import threading
+import time
+import logging
+from urllib.parse import quote
+
+from requests.adapters import HTTPAdapter
+
+import config
+from driver_pool import DriverPool
+
+logger = logging.getLogger(__name__)
+
+
+def proxy_key(proxy_config):
+    # Khóa định danh proxy dạng 'host:port'
+    if not proxy_config:
+        return None
+    return f"{proxy_config['host']}:{proxy_config['port']}"
+
+
+def proxy_url(proxy_config):
+    # URL proxy có kèm thông tin xác thực, dùng cho requests
+    user = quote(str(proxy_config.get('user') or ''), safe='')
+    password = quote(str(proxy_config.get('password') or ''), safe='')
+    auth = f"{user}:{password}@" if user else ""
+    return f"http://{auth}{proxy_config['host']}:{proxy_config['port']}"
+
+
+class ProxyHealth:
+    # Tình trạng của một cặp (proxy, hãng tàu): độ trễ và tỷ lệ thành công (EWMA)
+    def __init__(self):
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.success_rate = 1.0
+        self.latency = None
+        self.last_used = None
+
+    def update(self, success, latency, alpha):
+        self.requests += 1
+        self.last_used = time.time()
+        self.success_rate = (1 - alpha) * self.success_rate + alpha * (1.0 if success else 0.0)
+        if success:
+            self.consecutive_failures = 0
+            if latency is not None:
+                self.latency = latency if self.latency is None else (1 - alpha) * self.latency + alpha * latency
+        else:
+            self.failures += 1
+            self.consecutive_failures += 1
+
+    def as_dict(self):
+        return {
+            "requests": self.requests,
+            "failures": self.failures,
+            "consecutive_failures": self.consecutive_failures,
+            "success_rate": round(self.success_rate, 3),
+            "latency": round(self.latency, 3) if self.latency is not None else None,
+        }
+
+
+class ProxyManager:
+    """
+    Quản lý danh sách proxy:
+    - Theo dõi độ trễ và tỷ lệ thành công theo từng cặp (proxy, hãng tàu).
+    - Gán cố định (sticky) một proxy cho mỗi hãng tàu khi proxy đó còn hoạt động tốt,
+      chỉ đổi sang proxy khỏe nhất khi proxy hiện tại bị đánh giá là không khỏe.
+    - Mỗi proxy có connection pool HTTP riêng (HTTPAdapter) và Driver Pool riêng.
+    """
+    def __init__(self, proxies, driver_pool_size=2, min_success_rate=0.5,
+                 max_consecutive_failures=3, ewma_alpha=0.3, recovery_seconds=300):
+        self.proxies = {proxy_key(p): p for p in proxies}
+        self.driver_pool_size = driver_pool_size
+        self.min_success_rate = min_success_rate
+        self.max_consecutive_failures = max_consecutive_failures
+        self.ewma_alpha = ewma_alpha
+        self.recovery_seconds = recovery_seconds
+
+        self._lock = threading.Lock()
+        self._health = {}        # (proxy_key, carrier) -> ProxyHealth
+        self._sticky = {}        # carrier -> proxy_key
+        self._adapters = {}      # proxy_key -> HTTPAdapter
+        self._driver_pools = {}  # proxy_key -> DriverPool
+
+    def _get_health(self, key, carrier):
+        health = self._health.get((key, carrier))
+        if health is None:
+            health = ProxyHealth()
+            self._health[(key, carrier)] = health
+        return health
+
+    def _is_healthy(self, health):
+        if (health.consecutive_failures < self.max_consecutive_failures
+                and health.success_rate >= self.min_success_rate):
+            return True
+        # Cho proxy không khỏe một cơ hội thử lại sau một khoảng thời gian không được dùng
+        return health.last_used is not None and time.time() - health.last_used > self.recovery_seconds
+
+    def _score(self, health):
+        # Điểm càng cao càng tốt: ưu tiên tỷ lệ thành công, sau đó độ trễ thấp.
+        # Proxy chưa dùng cho hãng này (latency None) được đánh giá lạc quan để được thử.
+        latency = health.latency if health.latency is not None else 0.0
+        return health.success_rate / (1.0 + latency)
+
+    def acquire(self, carrier):
+        """Chọn proxy cho một request của hãng tàu. Trả về dict proxy hoặc None nếu không có proxy."""
+        if not self.proxies:
+            return None
+        with self._lock:
+            sticky_key = self._sticky.get(carrier)
+            if sticky_key in self.proxies and self._is_healthy(self._get_health(sticky_key, carrier)):
+                return self.proxies[sticky_key]
+
+            candidates = [(key, self._get_health(key, carrier)) for key in self.proxies]
+            healthy = [(key, h) for key, h in candidates if self._is_healthy(h)]
+            # Nếu tất cả proxy đều không khỏe, vẫn chọn proxy có điểm cao nhất
+            pool = healthy or candidates
+            best_key = max(pool, key=lambda item: self._score(item[1]))[0]
+
+            if best_key != sticky_key:
+                logger.info("[ProxyManager] Gán proxy %s cho hãng '%s' (trước đó: %s)", best_key, carrier, sticky_key)
+            self._sticky[carrier] = best_key
+            return self.proxies[best_key]
+
+    def report(self, carrier, proxy_config, success, latency=None):
+        """Ghi nhận kết quả một request qua proxy để cập nhật điểm sức khỏe."""
+        key = proxy_key(proxy_config)
+        if key is None:
+            return
+        with self._lock:
+            health = self._get_health(key, carrier)
+            health.update(success, latency, self.ewma_alpha)
+            if not self._is_healthy(health) and self._sticky.get(carrier) == key:
+                logger.warning("[ProxyManager] Proxy %s không còn ổn định cho hãng '%s' (%s), sẽ đổi proxy.",
+                               key, carrier, health.as_dict())
+                del self._sticky[carrier]
+
+    def get_http_adapter(self, proxy_config):
+        """HTTPAdapter (connection pool) dùng chung cho mọi request đi qua proxy này."""
+        key = proxy_key(proxy_config)
+        with self._lock:
+            adapter = self._adapters.get(key)
+            if adapter is None:
+                adapter = HTTPAdapter(pool_connections=20, pool_maxsize=20)
+                self._adapters[key] = adapter
+            return adapter
+
+    def get_driver_pool(self, proxy_config):
+        """Driver Pool riêng của proxy này (tạo lười, driver được khởi tạo khi cần)."""
+        key = proxy_key(proxy_config)
+        with self._lock:
+            pool = self._driver_pools.get(key)
+            if pool is None:
+                logger.info("[ProxyManager] Tạo Driver Pool (size=%d) cho proxy %s", self.driver_pool_size, key)
+                pool = DriverPool(size=self.driver_pool_size, proxy_config=proxy_config)
+                self._driver_pools[key] = pool
+            return pool
+
+    def driver_pool_stats(self):
+        """Thống kê Driver Pool của từng proxy (chỉ các pool đã được tạo)."""
+        with self._lock:
+            pools = dict(self._driver_pools)
+        return {key: pool.stats() for key, pool in pools.items()}
+
+    def driver_pool_snapshots(self):
+        """DriverPool.snapshot() của từng proxy (chỉ các pool đã được tạo)."""
+        with self._lock:
+            pools = dict(self._driver_pools)
+        return {key: pool.snapshot() for key, pool in pools.items()}
+
+    def snapshot(self):
+        """Tình trạng các proxy theo từng hãng tàu và proxy đang được gán."""
+        with self._lock:
+            health = {}
+            for (key, carrier), h in self._health.items():
+                health.setdefault(key, {})[carrier] = h.as_dict()
+            return {
+                "proxies": list(self.proxies.keys()),
+                "sticky": dict(self._sticky),
+                "health": health,
+            }
+
+    def shutdown(self):
+        """Đóng toàn bộ connection pool và Driver Pool của các proxy."""
+        with self._lock:
+            adapters = list(self._adapters.values())
+            pools = list(self._driver_pools.values())
+            self._adapters.clear()
+            self._driver_pools.clear()
+        for adapter in adapters:
+            try:
+                adapter.close()
+            except Exception:
+                pass
+        for pool in pools:
+            pool.shutdown()
+
+
+# Khởi tạo một instance toàn cục (Singleton)
+proxy_manager = ProxyManager(
+    config.PROXY_LIST,
+    driver_pool_size=config.PROXY_DRIVER_POOL_SIZE,
+    min_success_rate=config.PROXY_MIN_SUCCESS_RATE,
+    max_consecutive_failures=config.PROXY_MAX_CONSECUTIVE_FAILURES,
+)
@@ -0,0 +1,7 @@
+"""
+Ghi/phát lại offline các lượt tra cứu của scraper (xem replay/__main__.py).
+
+- har: đọc/ghi entry HAR 1.2.
+- recorder: ghi exchange HTTP của session requests và của WebDriver (Selenium, qua CDP).
+- server: server HTTP cục bộ phát lại fixture, đổi URL của SCRAPER_CONFIGS sang server.
+"""
@@ -0,0 +1,199 @@
+"""
+Bộ ghi/phát lại offline cho các scraper: ghi các exchange HTTP thật của một lượt tra cứu thành fixture HAR,
+sau đó chạy lại scraper trên một server cục bộ phát lại fixture (không cần mạng, kết quả ổn định để so sánh).
+
+- record: tra cứu thật, ghi <REPLAY_FIXTURES_DIR>/<hãng>/<mã>.har và <mã>.expected.json (kết quả chuẩn hóa).
+    + Scraper API: hook response của session requests.
+    + Selenium: sự kiện CDP Network.* trong performance log + Network.getResponseBody (replay/recorder.py).
+    + Playwright: HAR có sẵn của BrowserContext (record_har_path).
+- serve: chỉ chạy server fixture (vd: để mở trang đã ghi bằng trình duyệt và debug selector).
+- run: chạy server, đổi mọi URL trong SCRAPER_CONFIGS (và URL viết cứng của scraper API, qua RewritingAdapter)
+  sang server, chạy lại từng fixture và so sánh với kết quả đã ghi.
+
+Chạy từ thư mục gốc của repo:
+    python -m replay record EMC EGLV123456789 [EGLV...]
+    python -m replay serve [--port 8765]
+    python -m replay run [--carrier EMC] [--number EGLV123456789]
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+
+import config
+import scrapers
+from scrapers import SCRAPER_STRATEGY
+
+from .recorder import Recording, RecordingDriver
+from .server import FixtureServer, list_fixtures, rewrite_configs, mount_rewriting_adapter
+
+# Tùy chọn cho các lượt ghi/phát lại: lưu lượng phải đi qua kênh ghi được (trình duyệt hoặc session của scraper API).
+# EMC: session HTTP phụ tải trang Container Moves được tạo giữa chừng, không ghi được -> mở popup bằng trình duyệt.
+HARNESS_CONFIG_OVERRIDES = {
+    "EMC": {"popup_http_fetch": False},
+}
+
+
+def _fixture_paths(carrier, tracking_number):
+    directory = os.path.join(config.REPLAY_FIXTURES_DIR, carrier)
+    base = os.path.join(directory, tracking_number)
+    return directory, f"{base}.har", f"{base}.expected.json"
+
+
+def _scraper_config(carrier, scraper_configs):
+    return {**scraper_configs.get(carrier, {}), **HARNESS_CONFIG_OVERRIDES.get(carrier, {})}
+
+
+def _serialize(data):
+    return data.model_dump() if hasattr(data, "model_dump") else data
+
+
+def _scrape(carrier, tracking_number, scraper_config, base_url=None, recording=None, har_path=None):
+    """Chạy một lượt tra cứu theo chiến lược của hãng. Trả về (data, error) như scraper."""
+    strategy = SCRAPER_STRATEGY.get(carrier)
+    if strategy == "api":
+        scraper = scrapers.get_scraper(carrier, None, scraper_config)
+        if recording:
+            recording.attach_session(scraper.session)
+        if base_url:
+            mount_rewriting_adapter(scraper.session, base_url)
+        try:
+            return scraper.scrape(tracking_number)
+        finally:
+            scraper.close()
+
+    if strategy == "selenium":
+        from driver_setup import create_driver
+        driver = create_driver()
+        try:
+            if recording:
+                driver = RecordingDriver(driver, recording)
+            data, error = scrapers.get_scraper(carrier, driver, scraper_config).scrape(tracking_number)
+            if recording:
+                driver.flush()
+            return data, error
+        finally:
+            driver.quit()
+
+    if strategy == "playwright":
+        return asyncio.run(_scrape_playwright(carrier, tracking_number, scraper_config, har_path))
+
+    return None, f"Strategy not found: {carrier}"
+
+
+async def _scrape_playwright(carrier, tracking_number, scraper_config, har_path=None):
+    import browser_setup
+    p, browser = await browser_setup.create_playwright_context()
+    if not browser:
+        return None, "Không khởi tạo được trình duyệt Playwright"
+    context_options = {"record_har_path": har_path, "record_har_content": "embed"} if har_path else {}
+    page = await browser_setup.create_page_context(browser, **context_options)
+    try:
+        if not page:
+            return None, "Không khởi tạo được trang Playwright"
+        return await scrapers.get_scraper(carrier, page, scraper_config).scrape(tracking_number)
+    finally:
+        if page:
+            # HAR chỉ được ghi ra file khi đóng context
+            await page.context.close()
+        await browser.close()
+        await p.stop()
+
+
+def record(carrier, tracking_numbers):
+    if carrier not in scrapers.SCRAPERS:
+        print(f"Hãng tàu không tồn tại: '{carrier}'. Có sẵn: {list(scrapers.SCRAPERS)}")
+        return 2
+    scraper_config = _scraper_config(carrier, config.SCRAPER_CONFIGS)
+    for tracking_number in tracking_numbers:
+        directory, har_path, expected_path = _fixture_paths(carrier, tracking_number)
+        os.makedirs(directory, exist_ok=True)
+        recording = Recording(carrier, tracking_number)
+        playwright = SCRAPER_STRATEGY.get(carrier) == "playwright"
+        t_start = time.time()
+        data, error = _scrape(carrier, tracking_number, scraper_config, recording=recording,
+                              har_path=har_path if playwright else None)
+        if not playwright:
+            recording.save(har_path)
+        with open(expected_path, "w", encoding="utf-8") as f:
+            json.dump({"carrier": carrier, "tracking_number": tracking_number,
+                       "data": _serialize(data), "error": error}, f, ensure_ascii=False, indent=2)
+        print(f"[{carrier}] {tracking_number}: {'có dữ liệu' if data else f'lỗi: {error}'} "
+              f"({time.time() - t_start:.2f}s) -> {har_path}")
+    return 0
+
+
+def run(carrier=None, tracking_number=None):
+    fixtures = list_fixtures(config.REPLAY_FIXTURES_DIR, carrier, tracking_number)
+    if not fixtures:
+        print(f"Không có fixture nào trong {config.REPLAY_FIXTURES_DIR}.")
+        return 2
+
+    server = FixtureServer(config.REPLAY_FIXTURES_DIR)
+    base_url = server.start()
+    scraper_configs = rewrite_configs(config.SCRAPER_CONFIGS, base_url)
+    failures = 0
+    print(f"{'Hãng':<12}{'Mã':<24}{'Kết quả':<10}{'Thời gian (s)':>14}")
+    try:
+        for name, number, expected_path in fixtures:
+            with open(expected_path, encoding="utf-8") as f:
+                expected = json.load(f)
+            t_start = time.time()
+            try:
+                data, error = _scrape(name, number, _scraper_config(name, scraper_configs), base_url=base_url)
+            except Exception as e:
+                data, error = None, f"{type(e).__name__}: {e}"
+            elapsed = time.time() - t_start
+            actual = _serialize(data)
+            # Thông báo lỗi có thể chứa URL của server cục bộ -> chỉ so sánh có/không có lỗi
+            passed = actual == expected["data"] and bool(error) == bool(expected["error"])
+            failures += not passed
+            print(f"{name:<12}{number:<24}{'OK' if passed else 'KHÁC':<10}{elapsed:>14.2f}")
+            if not passed:
+                print(f"    mong đợi: {expected['data']!r} (lỗi: {expected['error']!r})")
+                print(f"    thực tế:  {actual!r} (lỗi: {error!r})")
+    finally:
+        server.stop()
+    print(f"Kết quả: {len(fixtures) - failures}/{len(fixtures)} fixture khớp")
+    return 1 if failures else 0
+
+
+def serve(port):
+    server = FixtureServer(config.REPLAY_FIXTURES_DIR, port=port)
+    print(f"Server fixture: {server.base_url}/<host>/<path> (Ctrl+C để dừng)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m replay", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    record_parser = commands.add_parser("record", help="Tra cứu thật và ghi fixture")
+    record_parser.add_argument("carrier")
+    record_parser.add_argument("tracking_numbers", nargs="+")
+    serve_parser = commands.add_parser("serve", help="Chạy server fixture")
+    serve_parser.add_argument("--port", type=int, default=8765)
+    run_parser = commands.add_parser("run", help="Chạy lại scraper trên fixture và so sánh kết quả")
+    run_parser.add_argument("--carrier")
+    run_parser.add_argument("--number")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    if args.command == "record":
+        return record(args.carrier, args.tracking_numbers)
+    if args.command == "serve":
+        return serve(args.port)
+    return run(args.carrier, args.number)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,106 @@
+import json
+import time
+import base64
+from datetime import datetime, timezone
+
+# Loại nội dung lưu dạng text trong HAR (còn lại lưu base64)
+_TEXT_TYPES = ("text/", "json", "javascript", "xml", "x-www-form-urlencoded")
+
+# Header response không phát lại: body trong HAR đã được giải nén và server tự tính độ dài
+SKIPPED_RESPONSE_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "connection"}
+
+
+def _headers(headers):
+    return [{"name": name, "value": str(value)} for name, value in (headers or {}).items()]
+
+
+def _content(body, mime_type):
+    if body is None:
+        body = b""
+    content = {"size": len(body), "mimeType": mime_type or ""}
+    if any(t in (mime_type or "") for t in _TEXT_TYPES):
+        try:
+            content["text"] = body.decode("utf-8")
+            return content
+        except UnicodeDecodeError:
+            pass
+    content["text"] = base64.b64encode(body).decode("ascii")
+    content["encoding"] = "base64"
+    return content
+
+
+def make_entry(method, url, request_headers, request_body, status, response_headers, body,
+               started=None, elapsed_ms=0.0, mime_type=None):
+    """Một entry HAR 1.2 (request + response) từ dữ liệu thô."""
+    response_headers = dict(response_headers or {})
+    mime_type = mime_type or next(
+        (value for name, value in response_headers.items() if name.lower() == "content-type"), ""
+    )
+    request = {
+        "method": method,
+        "url": url,
+        "httpVersion": "HTTP/1.1",
+        "headers": _headers(request_headers),
+        "queryString": [],
+        "cookies": [],
+        "headersSize": -1,
+        "bodySize": len(request_body or ""),
+    }
+    if request_body:
+        if isinstance(request_body, bytes):
+            request_body = request_body.decode("utf-8", errors="replace")
+        request_content_type = next(
+            (value for name, value in (request_headers or {}).items() if name.lower() == "content-type"), ""
+        )
+        request["postData"] = {"mimeType": request_content_type, "text": request_body}
+    return {
+        "startedDateTime": datetime.fromtimestamp(started or 0, timezone.utc).isoformat(),
+        "time": round(elapsed_ms, 2),
+        "request": request,
+        "response": {
+            "status": status,
+            "statusText": "",
+            "httpVersion": "HTTP/1.1",
+            "headers": _headers(response_headers),
+            "cookies": [],
+            "content": _content(body, mime_type),
+            "redirectURL": "",
+            "headersSize": -1,
+            "bodySize": len(body or b""),
+        },
+        "cache": {},
+        "timings": {"send": 0, "wait": round(elapsed_ms, 2), "receive": 0},
+    }
+
+
+def entry_from_response(response):
+    """Entry HAR từ một requests.Response (body đã được requests giải nén)."""
+    request = response.request
+    return make_entry(
+        request.method, request.url, request.headers, request.body,
+        response.status_code, response.headers, response.content,
+        started=time.time() - response.elapsed.total_seconds(), elapsed_ms=response.elapsed.total_seconds() * 1000,
+    )
+
+
+def write(path, entries, creator="cargo-web-scraper"):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"log": {"version": "1.2", "creator": {"name": creator, "version": "1"}, "entries": entries}},
+                  f, ensure_ascii=False, indent=1)
+
+
+def load_entries(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)["log"]["entries"]
+
+
+def body_bytes(entry):
+    content = entry["response"].get("content", {})
+    text = content.get("text") or ""
+    if content.get("encoding") == "base64":
+        return base64.b64decode(text)
+    return text.encode("utf-8")
+
+
+def request_body(entry):
+    return (entry["request"].get("postData") or {}).get("text") or ""
@@ -0,0 +1,112 @@
+import json
+import time
+import base64
+import logging
+import threading
+
+from . import har
+
+logger = logging.getLogger(__name__)
+
+
+class Recording:
+    """Các exchange HTTP của một lượt tra cứu (carrier, mã), ghi ra một file HAR."""
+    def __init__(self, carrier, tracking_number):
+        self.carrier = carrier
+        self.tracking_number = tracking_number
+        self.entries = []
+        self._lock = threading.Lock()
+
+    def add(self, entry):
+        with self._lock:
+            self.entries.append(entry)
+
+    def attach_session(self, session):
+        """Ghi mọi response của session requests (ApiScraper.session, session phụ của scraper)."""
+        def on_response(response, *args, **kwargs):
+            try:
+                self.add(har.entry_from_response(response))
+            except Exception as e:
+                logger.warning("[Recorder] Không ghi được response %s: %s", response.url, e)
+            return response
+        session.hooks["response"].append(on_response)
+        return session
+
+    def save(self, path):
+        har.write(path, sorted(self.entries, key=lambda entry: entry["startedDateTime"]))
+        logger.info("[Recorder] Đã ghi %d exchange của '%s' / '%s' vào %s",
+                    len(self.entries), self.carrier, self.tracking_number, path)
+
+
+class RecordingDriver:
+    """
+    Bọc WebDriver (Selenium) để ghi lại các exchange HTTP của trình duyệt thành entry HAR.
+
+    Đọc sự kiện CDP Network.* từ performance log (driver phải bật 'goog:loggingPrefs', xem
+    driver_setup.create_driver) và lấy body ngay khi response tải xong (trước khi trang đổi và body bị giải phóng).
+    Các lời gọi get_log("performance") của scraper (network capture) vẫn nhận đủ sự kiện.
+    """
+    def __init__(self, driver, recording):
+        self._driver = driver
+        self._recording = recording
+        self._requests = {}   # requestId -> dict thông tin request/response
+
+    def __getattr__(self, name):
+        return getattr(self._driver, name)
+
+    def get_log(self, log_type):
+        entries = self._driver.get_log(log_type)
+        if log_type == "performance":
+            self._consume(entries)
+        return entries
+
+    def flush(self):
+        """Đọc phần performance log còn lại (gọi sau khi scrape xong)."""
+        try:
+            self.get_log("performance")
+        except Exception as e:
+            logger.warning("[Recorder] Không đọc được performance log: %s", e)
+
+    def _consume(self, entries):
+        for entry in entries:
+            message = json.loads(entry["message"])["message"]
+            method, params = message.get("method"), message.get("params", {})
+            request_id = params.get("requestId")
+            if method == "Network.requestWillBeSent":
+                request = params.get("request", {})
+                if not request.get("url", "").startswith("http"):
+                    continue
+                self._requests[request_id] = {
+                    "method": request.get("method", "GET"),
+                    "url": request.get("url"),
+                    "headers": request.get("headers", {}),
+                    "body": request.get("postData"),
+                    "started": params.get("wallTime") or time.time(),
+                }
+            elif method == "Network.responseReceived" and request_id in self._requests:
+                response = params.get("response", {})
+                self._requests[request_id].update({
+                    "status": response.get("status", 0),
+                    "response_headers": response.get("headers", {}),
+                    "mime_type": response.get("mimeType", ""),
+                })
+            elif method == "Network.loadingFinished" and request_id in self._requests:
+                exchange = self._requests.pop(request_id)
+                if "status" in exchange:
+                    self._recording.add(self._entry(request_id, exchange))
+
+    def _entry(self, request_id, exchange):
+        body = b""
+        try:
+            result = self._driver.execute_cdp_cmd("Network.getResponseBody", {"requestId": request_id})
+            body = result.get("body", "")
+            body = base64.b64decode(body) if result.get("base64Encoded") else body.encode("utf-8")
+        except Exception:
+            # Redirect, response không có body hoặc body đã bị giải phóng
+            pass
+        return har.make_entry(
+            exchange["method"], exchange["url"], exchange["headers"], exchange["body"],
+            exchange["status"], exchange["response_headers"], body,
+            started=exchange["started"], elapsed_ms=(time.time() - exchange["started"]) * 1000,
+            mime_type=exchange["mime_type"],
+        )
@@ -0,0 +1,231 @@
+import os
+import re
+import copy
+import glob
+import logging
+import threading
+from urllib.parse import urlsplit, parse_qsl
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from requests.adapters import HTTPAdapter
+
+from . import har
+
+logger = logging.getLogger(__name__)
+
+# Địa chỉ trên server cục bộ: http://127.0.0.1:PORT/<host gốc>/<path gốc>?<query gốc>
+_HOST_SEGMENT = re.compile(r"^[a-z0-9-]+(\.[a-z0-9-]+)+(:\d+)?$", re.IGNORECASE)
+
+
+def rewrite_url(url, base_url):
+    """https://host/path?q -> <base_url>/host/path?q. URL không phải http(s) hoặc đã trỏ về base_url giữ nguyên."""
+    if not isinstance(url, str) or not url.startswith(("http://", "https://")) or url.startswith(base_url):
+        return url
+    parts = urlsplit(url)
+    rewritten = f"{base_url}/{parts.netloc}{parts.path or '/'}"
+    if parts.query:
+        rewritten += f"?{parts.query}"
+    if parts.fragment:
+        rewritten += f"#{parts.fragment}"
+    return rewritten
+
+
+def rewrite_configs(scraper_configs, base_url):
+    """Bản sao của SCRAPER_CONFIGS với mọi URL trỏ về server cục bộ."""
+    def walk(value):
+        if isinstance(value, dict):
+            return {key: walk(item) for key, item in value.items()}
+        if isinstance(value, list):
+            return [walk(item) for item in value]
+        return rewrite_url(value, base_url)
+    return walk(copy.deepcopy(scraper_configs))
+
+
+class RewritingAdapter(HTTPAdapter):
+    """Adapter requests chuyển mọi request (kể cả URL viết cứng trong scraper) tới server cục bộ."""
+    def __init__(self, base_url, **kwargs):
+        self.base_url = base_url
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        request.url = rewrite_url(request.url, self.base_url)
+        # Không đi qua proxy khi phát lại
+        kwargs["proxies"] = {}
+        return super().send(request, **kwargs)
+
+
+def mount_rewriting_adapter(session, base_url):
+    adapter = RewritingAdapter(base_url)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.proxies.clear()
+    session.trust_env = False
+    return session
+
+
+def list_fixtures(fixtures_dir, carrier=None, tracking_number=None):
+    """[(hãng, mã, đường dẫn <mã>.expected.json)] của các fixture đã ghi, lọc theo hãng/mã nếu có."""
+    if not os.path.isdir(fixtures_dir):
+        return []
+    found = []
+    for name in sorted(os.listdir(fixtures_dir)):
+        directory = os.path.join(fixtures_dir, name)
+        if (carrier and name != carrier) or not os.path.isdir(directory):
+            continue
+        for filename in sorted(os.listdir(directory)):
+            if filename.endswith(".expected.json"):
+                number = filename[:-len(".expected.json")]
+                if not tracking_number or number == tracking_number:
+                    found.append((name, number, os.path.join(directory, filename)))
+    return found
+
+
+class FixtureStore:
+    """Các entry HAR của thư mục fixture, tra theo (method, host, path) rồi so khớp query/body."""
+    def __init__(self, fixtures_dir):
+        self.fixtures_dir = fixtures_dir
+        self._index = {}   # (method, host, path) -> [entry]
+        self._paths = {}   # (method, path) -> [entry], dùng khi request không mang host (URL tương đối)
+        self.hosts = set()
+        self.load()
+
+    def load(self):
+        self._index.clear()
+        self._paths.clear()
+        self.hosts.clear()
+        for path in sorted(glob.glob(os.path.join(self.fixtures_dir, "*", "*.har"))):
+            for entry in har.load_entries(path):
+                self.add(entry)
+        logger.info("[Replay] Đã nạp %d host từ %s", len(self.hosts), self.fixtures_dir)
+
+    def add(self, entry):
+        parts = urlsplit(entry["request"]["url"])
+        method = entry["request"]["method"].upper()
+        self.hosts.add(parts.netloc)
+        self._index.setdefault((method, parts.netloc, parts.path or "/"), []).append(entry)
+        self._paths.setdefault((method, parts.path or "/"), []).append(entry)
+
+    def find(self, method, host, path, query, body):
+        """
+        Entry khớp nhất: cùng query và body -> cùng query -> cùng path.
+        Nhiều entry khớp như nhau (vd: cùng URL được gọi nhiều lần) thì lấy entry ghi sau cùng.
+        """
+        if host:
+            candidates = self._index.get((method, host, path), [])
+        else:
+            candidates = self._paths.get((method, path), [])
+        if not candidates:
+            return None
+        query = sorted(parse_qsl(query, keep_blank_values=True))
+
+        def same_query(entry):
+            return sorted(parse_qsl(urlsplit(entry["request"]["url"]).query, keep_blank_values=True)) == query
+
+        for matches in (
+            lambda entry: same_query(entry) and har.request_body(entry) == body,
+            same_query,
+            lambda entry: True,
+        ):
+            found = [entry for entry in candidates if matches(entry)]
+            if found:
+                return found[-1]
+        return None
+
+
+def _rewrite_body(body, hosts, base_url):
+    """Đổi URL tuyệt đối tới các host đã ghi trong body text (HTML/JS/JSON) thành URL của server cục bộ."""
+    text = body.decode("utf-8")
+    for host in sorted(hosts, key=len, reverse=True):
+        local = f"{base_url}/{host}"
+        for scheme in ("https://", "http://"):
+            text = text.replace(f"{scheme}{host}", local)
+            text = text.replace(f"{scheme}{host}".replace("/", "\\/"), local.replace("/", "\\/"))
+        text = re.sub(rf"(?<=[\"'(=])//{re.escape(host)}", local, text)
+    return text.encode("utf-8")
+
+
+def _set_cookie(value):
+    # Cookie của domain gốc không hợp lệ với 127.0.0.1 -> bỏ thuộc tính Domain để trình duyệt vẫn lưu
+    return re.sub(r";\s*domain=[^;]*", "", value, flags=re.IGNORECASE)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def _serve(self):
+        store, base_url = self.server.store, self.server.base_url
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length).decode("utf-8", errors="replace") if length else ""
+        parts = urlsplit(self.path)
+        segments = parts.path.lstrip("/").split("/", 1)
+        if segments and _HOST_SEGMENT.match(segments[0]):
+            host, path = segments[0], "/" + (segments[1] if len(segments) > 1 else "")
+        else:
+            # URL tương đối của trang (vd: /api/...) -> lấy host từ Referer nếu có
+            referer = urlsplit(self.headers.get("Referer", "")).path.lstrip("/").split("/", 1)[0]
+            host, path = (referer if referer in store.hosts else None), parts.path
+
+        entry = store.find(self.command.upper(), host, path, parts.query, body)
+        if entry is None and host:
+            entry = store.find(self.command.upper(), None, path, parts.query, body)
+        if entry is None:
+            logger.warning("[Replay] Không có fixture cho %s %s", self.command, self.path)
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        response = entry["response"]
+        content = har.body_bytes(entry)
+        if content and not response["content"].get("encoding"):
+            content = _rewrite_body(content, store.hosts, base_url)
+        self.send_response(response["status"])
+        for header in response["headers"]:
+            name = header["name"].lower()
+            if name in har.SKIPPED_RESPONSE_HEADERS or name.startswith(":"):
+                continue
+            value = header["value"]
+            if name == "set-cookie":
+                value = _set_cookie(value)
+            elif name == "location":
+                value = rewrite_url(value, base_url)
+            self.send_header(header["name"], value)
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(content)
+
+    do_GET = do_POST = do_PUT = do_DELETE = do_HEAD = do_PATCH = _serve
+
+    def do_OPTIONS(self):
+        # Preflight CORS: fixture ghi từ trình duyệt thường không có -> luôn cho phép
+        self.send_response(204)
+        self.send_header("Access-Control-Allow-Origin", self.headers.get("Origin", "*"))
+        self.send_header("Access-Control-Allow-Credentials", "true")
+        self.send_header("Access-Control-Allow-Methods", "GET, POST, PUT, DELETE, PATCH, OPTIONS")
+        self.send_header("Access-Control-Allow-Headers", self.headers.get("Access-Control-Request-Headers", "*"))
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        logger.debug("[Replay] " + format, *args)
+
+
+class FixtureServer(ThreadingHTTPServer):
+    """Server HTTP cục bộ phát lại các fixture HAR (xem rewrite_url về cách đặt địa chỉ)."""
+    daemon_threads = True
+
+    def __init__(self, fixtures_dir, host="127.0.0.1", port=0):
+        super().__init__((host, port), _Handler)
+        self.store = FixtureStore(fixtures_dir)
+        self.base_url = f"http://{host}:{self.server_address[1]}"
+
+    def start(self):
+        """Chạy server trong thread nền. Trả về base_url."""
+        threading.Thread(target=self.serve_forever, name="replay-server", daemon=True).start()
+        logger.info("[Replay] Server fixture đang chạy tại %s", self.base_url)
+        return self.base_url
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
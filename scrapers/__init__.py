@@ -27,6 +27,10 @@ from .selenium.emc_scraper import EmcScraper
 
 from .playwright.maersk_scraper import MaerskScraper
 
+# Scraper HTTP phát lại phiên thu thập từ trình duyệt (session_vault) cho các hãng cần trình duyệt
+from .api.cosco_http_scraper import CoscoHttpScraper
+from .api.maersk_http_scraper import MaerskHttpScraper
+
 SCRAPERS = {
     "IAL": InterasiaScraper,
     "MSK": MaerskScraper,
@@ -81,6 +85,21 @@ SCRAPER_STRATEGY = {
     "ZIM": "api"
 }
 
+# Hãng tàu dùng trình duyệt nhưng có thể tra cứu qua HTTP khi session_vault còn phiên hợp lệ
+REPLAY_SCRAPERS = {
+    "COSCO": CoscoHttpScraper,
+    "MSK": MaerskHttpScraper,
+}
+
+def get_replay_scraper(name, config):
+    """Instance scraper HTTP phát lại phiên của hãng tàu (xem REPLAY_SCRAPERS)."""
+    scraper_class = REPLAY_SCRAPERS.get(name)
+    if not scraper_class:
+        raise ValueError(f"Không có scraper HTTP phát lại phiên cho '{name}'.")
+    scraper = scraper_class(driver=None, config=config)
+    scraper.carrier = name
+    return scraper
+
 def get_scraper(name, driver_or_page, config):
     """
     Factory function để lấy một instance của scraper dựa vào tên.
@@ -94,13 +113,16 @@ def get_scraper(name, driver_or_page, config):
 
     if strategy == "selenium":
         # SeleniumScraper yêu cầu (driver, config)
-        return scraper_class(driver=driver_or_page, config=config)
+        scraper = scraper_class(driver=driver_or_page, config=config)
     elif strategy == "playwright":
         # PlaywrightScraper yêu cầu (page, config)
-        return scraper_class(page=driver_or_page, config=config)
+        scraper = scraper_class(page=driver_or_page, config=config)
     elif strategy == "api":
         # ApiScraper chỉ yêu cầu (config)
         # Truyền driver=None để tương thích với lớp con (nếu nó ghi đè __init__)
-        return scraper_class(driver=None, config=config) 
+        scraper = scraper_class(driver=None, config=config)
     else:
-        raise ValueError(f"Chiến lược scraper không xác định cho: {name}")
\ No newline at end of file
+        raise ValueError(f"Chiến lược scraper không xác định cho: {name}")
+
+    scraper.carrier = name
+    return scraper
\ No newline at end of file
@@ -1,11 +1,12 @@
 import logging
 import requests
 import time
-from datetime import datetime
 from schemas import N8nTrackingInfo
+import metrics
 import json
 
 from ..api_scraper import ApiScraper
+from .. import date_normalizer
 
 logger = logging.getLogger(__name__)
 
@@ -18,18 +19,7 @@ class CordeliaScraper(ApiScraper):
 
     def _format_date(self, date_str):
         # Chuyển đổi chuỗi ngày từ 'DD/MM/YYYY HH:MM...' hoặc 'DD/MM/YYYY' sang 'DD/MM/YYYY'.
-        # Trả về "" nếu đầu vào không hợp lệ hoặc rỗng.
-        if not date_str or not isinstance(date_str, str):
-            return ""
-        try:
-            # Lấy phần ngày, bỏ qua phần giờ nếu có
-            date_part = date_str.split(' ')[0]
-            # Parse ngày theo định dạng DD/MM/YYYY
-            dt_obj = datetime.strptime(date_part, '%d/%m/%Y')
-            return dt_obj.strftime('%d/%m/%Y')
-        except (ValueError, IndexError):
-            logger.warning("Không thể phân tích định dạng ngày: %s", date_str)
-            return ""
+        return date_normalizer.format_date("CSL", date_str)
 
     def scrape(self, tracking_number):
         # Lấy dữ liệu cho một số theo dõi bằng cách gọi API trực tiếp của Cordelia Line và trả về JSON chuẩn hóa.
@@ -54,12 +44,12 @@ class CordeliaScraper(ApiScraper):
             #     print("Saving raw API response to cordelia_response.json")
             #     json.dump(response.json(), f, indent=2, ensure_ascii=False, default=str)
 
-            logger.info("-> (Thời gian) Gọi API: %.2fs", time.time() - t_request_start)
+            logger.info("-> (Thời gian) Gọi API: %.2fs", metrics.observe("http", t_request_start))
             response.raise_for_status() # Kiểm tra lỗi HTTP (4xx, 5xx)
 
             t_parse_start = time.time()
             data = response.json()
-            logger.debug("-> (Thời gian) Parse JSON: %.2fs", time.time() - t_parse_start)
+            logger.debug("-> (Thời gian) Parse JSON: %.2fs", metrics.observe("extract", t_parse_start))
 
 
             # Kiểm tra dữ liệu trả về có hợp lệ không
@@ -70,7 +60,7 @@ class CordeliaScraper(ApiScraper):
             # Trích xuất và chuẩn hóa dữ liệu
             t_extract_start = time.time()
             normalized_data = self._extract_and_normalize_data(data, tracking_number)
-            logger.info("-> (Thời gian) Trích xuất và chuẩn hóa: %.2fs", time.time() - t_extract_start)
+            logger.info("-> (Thời gian) Trích xuất và chuẩn hóa: %.2fs", metrics.observe("normalize", t_extract_start))
 
 
             if not normalized_data:
@@ -0,0 +1,39 @@
+import logging
+import time
+
+import metrics
+from session_vault import ReplayPayloadError
+from ..api_scraper import ApiScraper
+from ..selenium.cosco_scraper import CoscoPayloadNormalizer
+
+# Lấy logger cho module này
+logger = logging.getLogger(__name__)
+
+class CoscoHttpScraper(CoscoPayloadNormalizer, ApiScraper):
+    # Tra cứu COSCO bằng cách phát lại API JSON của iframe cargo tracking với phiên (cookie/header)
+    # thu thập từ trình duyệt (session_vault). URL là URL mà iframe đã gọi (/booking/ hoặc /bill/).
+    # Ném SessionExpiredError khi phiên bị từ chối, ReplayPayloadError khi payload không chuẩn hóa được.
+
+    def __init__(self, driver, config):
+        super().__init__(config=config)
+        self.session.headers.update({
+            'Referer': self.config['url'],
+        })
+
+    def scrape(self, tracking_number):
+        logger.info("[COSCO HTTP Scraper] Bắt đầu tra cứu bằng phiên đã thu thập cho mã: %s", tracking_number)
+        t_total_start = time.time()
+
+        t_request_start = time.time()
+        response = self.session.get(self.replay_url_template.format(tracking_number=tracking_number), timeout=20)
+        logger.info("-> (Thời gian) Gọi API: %.2fs", metrics.observe("http", t_request_start))
+        payload = self._session_json(response)
+
+        normalized_data = self._normalize_payload(payload, tracking_number)
+        if not normalized_data:
+            # Không kết luận 'không tìm thấy' từ request phát lại: trình duyệt tra cứu lại
+            raise ReplayPayloadError(self._carrier_name(), "payload không có lịch trình")
+
+        logger.info("[COSCO HTTP Scraper] Hoàn tất cho mã: %s (Tổng thời gian: %.2fs)",
+                    tracking_number, time.time() - t_total_start)
+        return normalized_data, None
@@ -1,11 +1,13 @@
 import logging
 import requests
 import time
-from datetime import datetime, date
+from datetime import date
 import json
 
 from ..api_scraper import ApiScraper
 from schemas import N8nTrackingInfo
+import metrics
+from .. import date_normalizer
 
 # Lấy logger cho module
 logger = logging.getLogger(__name__)
@@ -32,21 +34,6 @@ class GoldstarScraper(ApiScraper):
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/141.0.0.0 Safari/537.36',
         })
 
-    def _format_date(self, date_str):
-        # Chuyển đổi chuỗi ngày từ API format 'YYYY-MM-DDTHH:MM:SS' hoặc 'YYYY-MM-DDTHH:MM:SS.000' sang 'DD/MM/YYYY'.
-        # Trả về "" nếu đầu vào không hợp lệ hoặc rỗng.
-        if not date_str or not isinstance(date_str, str):
-            return ""
-        try:
-            date_part = date_str.split('T')[0]
-            if not date_part:
-                return ""
-            dt_obj = datetime.strptime(date_part, '%Y-%m-%d')
-            return dt_obj.strftime('%d/%m/%Y')
-        except (ValueError, IndexError):
-            logger.warning("[Goldstar API Scraper] Không thể phân tích định dạng ngày: %s", date_str)
-            return ""
-
     def scrape(self, tracking_number):
         # Phương thức scrape chính bằng API. Thực hiện gọi API tracking.
         logger.info("[Goldstar API Scraper] Bắt đầu scrape cho mã: %s", tracking_number)
@@ -62,7 +49,7 @@ class GoldstarScraper(ApiScraper):
             logger.info(f"[Goldstar API Scraper] Gửi POST request đến API: {self.api_url}")
             t_api_start = time.time()
             response = self.session.post(self.api_url, json=payload, timeout=30)
-            logger.info("-> (Thời gian) Gọi API tracking: %.2fs", time.time() - t_api_start)
+            logger.info("-> (Thời gian) Gọi API tracking: %.2fs", metrics.observe("http", t_api_start))
             response.raise_for_status()
 
             t_parse_start = time.time()
@@ -70,7 +57,7 @@ class GoldstarScraper(ApiScraper):
             # with open("output/goldstar_response.json", 'w', encoding='utf-8') as f:
             #     print("Saving raw API response to output/goldstar_response.json")
             #     json.dump(data, f, indent=2, ensure_ascii=False, default=str)
-            logger.info("-> (Thời gian) Parse JSON: %.2fs", time.time() - t_parse_start)
+            logger.info("-> (Thời gian) Parse JSON: %.2fs", metrics.observe("extract", t_parse_start))
 
             # Kiểm tra response thành công và có dữ liệu cần thiết
             if data.get("status") != "OK" or not data.get("data", {}).get("message", {}).get("response"):
@@ -87,7 +74,7 @@ class GoldstarScraper(ApiScraper):
             api_response_data = data["data"]["message"]["response"]
             t_extract_start = time.time()
             normalized_data = self._extract_and_normalize_data_api(api_response_data, tracking_number)
-            logger.info("-> (Thời gian) Trích xuất và chuẩn hóa: %.2fs", time.time() - t_extract_start)
+            logger.info("-> (Thời gian) Trích xuất và chuẩn hóa: %.2fs", metrics.observe("normalize", t_extract_start))
 
             if not normalized_data:
                 # Lỗi đã được log bên trong _extract_and_normalize_data_api
@@ -219,15 +206,17 @@ class GoldstarScraper(ApiScraper):
                     BookingStatus= booking_status, # ""
                     Pol= pol or "",
                     Pod= pod or "",
-                    Etd= self._format_date(etd) or "", # ""
-                    Atd= self._format_date(atd) or "",
-                    Eta= self._format_date(eta) or "",
-                    Ata= self._format_date(ata) or "",
+                    **date_normalizer.normalize_shipment_dates("GOLSTAR", {
+                        "Etd": etd, # ""
+                        "Atd": atd,
+                        "Eta": eta,
+                        "Ata": ata,
+                        "EtdTransit": etd_transit_final, # ""
+                        "AtdTransit": atd_transit,
+                        "EtaTransit": eta_transit,
+                        "AtaTransit": ata_transit,
+                    }),
                     TransitPort= ", ".join(transit_port_list) if transit_port_list else "",
-                    EtdTransit= self._format_date(etd_transit_final) or "", # ""
-                    AtdTransit= self._format_date(atd_transit) or "",
-                    EtaTransit= self._format_date(eta_transit) or "",
-                    AtaTransit= self._format_date(ata_transit) or ""
                 )
             logger.info("[Goldstar API Scraper] Đã tạo đối tượng N8nTrackingInfo thành công.")
             logger.debug("-> (Thời gian) Chuẩn hóa dữ liệu cuối cùng: %.2fs", time.time() - t_normalize_start)
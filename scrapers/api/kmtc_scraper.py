@@ -4,7 +4,10 @@ import time
 from datetime import datetime, date
 
 from ..api_scraper import ApiScraper
+from ..step_runner import Step, StepRunner, StepError, StepAbort
 from schemas import N8nTrackingInfo
+import metrics
+from .. import date_normalizer
 
 # Thiết lập logger cho module
 logger = logging.getLogger(__name__)
@@ -36,102 +39,91 @@ class KmtcScraper(ApiScraper):
 
     def _format_date(self, date_str):
         # Chuyển đổi chuỗi ngày từ API format 'YYYYMMDDHHMM' sang 'DD/MM/YYYY'. Trả về chuỗi rỗng nếu lỗi.
-        if not date_str or not isinstance(date_str, str) or len(date_str) < 8:
-            return ""
-        try:
-            # Chỉ lấy phần YYYYMMDD
-            date_part = date_str[:8]
-            dt_obj = datetime.strptime(date_part, '%Y%m%d')
-            return dt_obj.strftime('%d/%m/%Y')
-        except (ValueError, IndexError):
-            logger.warning("[KMTC API Scraper] Không thể phân tích định dạng ngày: %s", date_str)
-            return "" # Trả về chuỗi rỗng nếu lỗi
+        return date_normalizer.format_date("KMTC", date_str)
 
     def scrape(self, tracking_number):
-        # Phương thức scrape chính bằng API. Thực hiện 2 bước gọi API và trả về dữ liệu đã chuẩn hóa.
+        # Phương thức scrape chính bằng API. Thực hiện 2 bước gọi API (qua StepRunner) và trả về dữ liệu đã chuẩn hóa.
         logger.info("[KMTC API Scraper] Bắt đầu scrape cho mã: %s", tracking_number)
         t_total_start = time.time()
-        bkg_no = None
-        data_step1 = None
 
-        # --- BƯỚC 1: Lấy bkgNo ---
-        try:
-            logger.info("[KMTC API Scraper] Bước 1: Gửi POST request để lấy bkgNo...")
-            t_step1_start = time.time()
-            payload_step1 = {"dtKnd": "BL", "blNo": tracking_number}
-            response_step1 = self.session.post(self.step1_url, json=payload_step1, timeout=30)
-            
-            response_step1.raise_for_status()
-            data_step1 = response_step1.json()
-            logger.info("-> (Thời gian) Gọi API Bước 1: %.2fs", time.time() - t_step1_start)
-
-            # Trích xuất bkgNo
-            if data_step1 and "cntrList" in data_step1 and data_step1["cntrList"]:
-                bkg_no = data_step1["cntrList"][0].get("bkgNo")
-                if bkg_no:
-                    logger.info("[KMTC API Scraper] Bước 1: Trích xuất thành công bkgNo: %s", bkg_no)
-                else:
-                    logger.error("[KMTC API Scraper] Bước 1: Không tìm thấy 'bkgNo' trong 'cntrList'.")
-                    return None, f"Không tìm thấy dữ liệu chi tiết (bkgNo) cho B/L '{tracking_number}'."
-            else:
-                logger.error("[KMTC API Scraper] Bước 1: Response không chứa 'cntrList' hợp lệ.")
-                return None, f"Không tìm thấy dữ liệu (cntrList) cho B/L '{tracking_number}'."
-
-        except requests.exceptions.Timeout:
-            logger.error("[KMTC API Scraper] Bước 1: Request bị timeout.")
-            return None, f"Request timeout khi lấy thông tin ban đầu cho '{tracking_number}'."
-        except requests.exceptions.HTTPError as e:
-            logger.error(f"[KMTC API Scraper] Bước 1: Lỗi HTTP: {e.response.status_code} - {e.response.reason}")
-            return None, f"Lỗi HTTP {e.response.status_code} khi lấy thông tin ban đầu cho '{tracking_number}'."
-        except Exception as e:
-            logger.error(f"[KMTC API Scraper] Bước 1: Lỗi không xác định: {e}", exc_info=True)
-            return None, f"Lỗi không xác định khi lấy thông tin ban đầu cho '{tracking_number}': {e}"
+        runner = StepRunner([
+            Step("step1", lambda results, timeout: self._request_step1(tracking_number, timeout),
+                 timeout=30, retries=1),
+            Step("step2", self._request_step2, depends_on=("step1",), timeout=30, retries=1),
+        ], log_prefix="[KMTC API Scraper]")
 
-        # --- BƯỚC 2: Lấy thông tin chi tiết bằng bkgNo ---
-        if bkg_no:
-            try:
-                step2_url = self.step2_url_template.format(bkgNo=bkg_no)
-                logger.info("[KMTC API Scraper] Bước 2: Gửi GET request để lấy chi tiết...")
-                t_step2_start = time.time()
-                response_step2 = self.session.get(step2_url, timeout=30)
-                response_step2.raise_for_status()
-                data_step2 = response_step2.json()
-                
-                # with open("output/kmtc_step2_response.json", "w", encoding="utf-8") as f:
-                #     import json
-                #     json.dump(data_step2, f, ensure_ascii=False, indent=4)
-                
-                logger.info("-> (Thời gian) Gọi API Bước 2: %.2fs", time.time() - t_step2_start)
-
-                logger.info("[KMTC API Scraper] Bước 2: Request thành công.")
-
-                # --- BƯỚC 3: Trích xuất và chuẩn hóa ---
-                t_extract_start = time.time()
-                normalized_data = self._extract_and_normalize_data(data_step1, data_step2, tracking_number)
-                logger.info("-> (Thời gian) Trích xuất và chuẩn hóa: %.2fs", time.time() - t_extract_start)
-
-                if not normalized_data:
-                    logger.warning(f"[KMTC API Scraper] Lỗi: Không thể chuẩn hóa dữ liệu cho '{tracking_number}'.")
-                    return None, f"Không thể chuẩn hóa dữ liệu đã lấy từ API cho '{tracking_number}'."
-
-                t_total_end = time.time()
-                logger.info("[KMTC API Scraper] Hoàn tất scrape thành công. (Tổng thời gian: %.2fs)",
-                             time.time() - t_total_start)
-                return normalized_data, None
-
-            except requests.exceptions.Timeout:
-                logger.error("[KMTC API Scraper] Bước 2: Request bị timeout.")
-                return None, f"Request timeout khi lấy thông tin chi tiết cho '{tracking_number}' (bkgNo: {bkg_no})."
-            except requests.exceptions.HTTPError as e:
-                logger.error(f"[KMTC API Scraper] Bước 2: Lỗi HTTP: {e.response.status_code} - {e.response.reason}")
-                return None, f"Lỗi HTTP {e.response.status_code} khi lấy thông tin chi tiết cho '{tracking_number}' (bkgNo: {bkg_no})."
-            except Exception as e:
-                logger.error(f"[KMTC API Scraper] Bước 2: Lỗi không xác định: {e}", exc_info=True)
-                return None, f"Lỗi không xác định khi lấy thông tin chi tiết cho '{tracking_number}': {e}"
+        try:
+            results = runner.run()
+        except StepError as e:
+            return None, self._step_error_message(e, tracking_number)
+
+        # --- BƯỚC 3: Trích xuất và chuẩn hóa ---
+        t_extract_start = time.time()
+        normalized_data = self._extract_and_normalize_data(results["step1"], results["step2"], tracking_number)
+        logger.info("-> (Thời gian) Trích xuất và chuẩn hóa: %.2fs", metrics.observe("normalize", t_extract_start))
+
+        if not normalized_data:
+            logger.warning(f"[KMTC API Scraper] Lỗi: Không thể chuẩn hóa dữ liệu cho '{tracking_number}'.")
+            return None, f"Không thể chuẩn hóa dữ liệu đã lấy từ API cho '{tracking_number}'."
+
+        logger.info("[KMTC API Scraper] Hoàn tất scrape thành công. (Tổng thời gian: %.2fs)",
+                     time.time() - t_total_start)
+        return normalized_data, None
+
+    def _request_step1(self, tracking_number, timeout):
+        # Bước 1: POST để lấy bkgNo. Trả về JSON của bước 1 (đã kiểm tra có bkgNo).
+        logger.info("[KMTC API Scraper] Bước 1: Gửi POST request để lấy bkgNo...")
+        payload_step1 = {"dtKnd": "BL", "blNo": tracking_number}
+        response_step1 = self.session.post(self.step1_url, json=payload_step1, timeout=timeout)
+        response_step1.raise_for_status()
+        data_step1 = response_step1.json()
+
+        # Trích xuất bkgNo
+        if data_step1 and "cntrList" in data_step1 and data_step1["cntrList"]:
+            bkg_no = data_step1["cntrList"][0].get("bkgNo")
+            if bkg_no:
+                logger.info("[KMTC API Scraper] Bước 1: Trích xuất thành công bkgNo: %s", bkg_no)
+                return data_step1
+            logger.error("[KMTC API Scraper] Bước 1: Không tìm thấy 'bkgNo' trong 'cntrList'.")
+            raise StepAbort(f"Không tìm thấy dữ liệu chi tiết (bkgNo) cho B/L '{tracking_number}'.")
+        logger.error("[KMTC API Scraper] Bước 1: Response không chứa 'cntrList' hợp lệ.")
+        raise StepAbort(f"Không tìm thấy dữ liệu (cntrList) cho B/L '{tracking_number}'.")
+
+    def _request_step2(self, results, timeout):
+        # Bước 2: GET thông tin chi tiết (close-info) bằng bkgNo lấy từ bước 1.
+        bkg_no = results["step1"]["cntrList"][0].get("bkgNo")
+        step2_url = self.step2_url_template.format(bkgNo=bkg_no)
+        logger.info("[KMTC API Scraper] Bước 2: Gửi GET request để lấy chi tiết...")
+        response_step2 = self.session.get(step2_url, timeout=timeout)
+        response_step2.raise_for_status()
+        logger.info("[KMTC API Scraper] Bước 2: Request thành công.")
+        return response_step2.json()
+
+    def _step_error_message(self, error, tracking_number):
+        # Chuyển lỗi của StepRunner thành thông báo lỗi trả về cho người dùng.
+        cause = error.cause
+        if isinstance(cause, StepAbort):
+            return str(cause)
+
+        if error.step == "step1":
+            step_label = "Bước 1"
+            context = f"lấy thông tin ban đầu cho '{tracking_number}'"
         else:
-            # Trường hợp này không nên xảy ra do đã kiểm tra ở Bước 1
-            logger.error("[KMTC API Scraper] Lỗi logic: Không có bkgNo để thực hiện Bước 2.")
-            return None, f"Lỗi logic: Không có bkgNo cho '{tracking_number}'."
+            step_label = "Bước 2"
+            data_step1 = error.results.get("step1") or {}
+            bkg_no = (data_step1.get("cntrList") or [{}])[0].get("bkgNo")
+            context = f"lấy thông tin chi tiết cho '{tracking_number}'"
+            if isinstance(cause, (requests.exceptions.Timeout, requests.exceptions.HTTPError)):
+                context += f" (bkgNo: {bkg_no})"
+
+        if isinstance(cause, requests.exceptions.Timeout):
+            logger.error("[KMTC API Scraper] %s: Request bị timeout.", step_label)
+            return f"Request timeout khi {context}."
+        if isinstance(cause, requests.exceptions.HTTPError):
+            logger.error(f"[KMTC API Scraper] {step_label}: Lỗi HTTP: {cause.response.status_code} - {cause.response.reason}")
+            return f"Lỗi HTTP {cause.response.status_code} khi {context}."
+        logger.error(f"[KMTC API Scraper] {step_label}: Lỗi không xác định: {cause}", exc_info=cause)
+        return f"Lỗi không xác định khi {context}: {cause}"
 
 
     def _extract_and_normalize_data(self, data_step1, data_step2, tracking_number_input):
@@ -0,0 +1,44 @@
+import logging
+import time
+
+import metrics
+from session_vault import ReplayPayloadError
+from ..api_scraper import ApiScraper
+from ..playwright.maersk_scraper import MaerskEventNormalizer
+
+# Lấy logger cho module này
+logger = logging.getLogger(__name__)
+
+class MaerskHttpScraper(MaerskEventNormalizer, ApiScraper):
+    # Tra cứu Maersk bằng cách phát lại API tracking (synergy) với phiên (cookie/header, gồm
+    # Consumer-Key) thu thập từ trình duyệt (session_vault), tới đúng URL mà trang tracking đã gọi.
+    # Ném SessionExpiredError khi phiên bị từ chối, ReplayPayloadError khi payload không chuẩn hóa được.
+
+    def __init__(self, driver, config):
+        super().__init__(config=config)
+        self.session.headers.update({
+            'Origin': 'https://www.maersk.com',
+            'Referer': self.config['url'],
+        })
+
+    def scrape(self, tracking_number):
+        logger.info("[Maersk HTTP Scraper] Bắt đầu tra cứu bằng phiên đã thu thập cho mã: %s", tracking_number)
+        t_total_start = time.time()
+
+        t_request_start = time.time()
+        response = self.session.get(self.replay_url_template.format(tracking_number=tracking_number), timeout=20)
+        logger.info("-> (Thời gian) Gọi API: %.2fs", metrics.observe("http", t_request_start))
+        # Không kết luận 'không tìm thấy' từ request phát lại: trình duyệt tra cứu lại
+        if response.status_code == 404:
+            raise ReplayPayloadError(self._carrier_name(), "HTTP 404")
+        payload = self._session_json(response)
+
+        if not self._payload_has_containers(payload):
+            raise ReplayPayloadError(self._carrier_name(), "payload không có container")
+        normalized_data = self._normalize_payload(payload, tracking_number)
+        if not normalized_data:
+            raise ReplayPayloadError(self._carrier_name(), "không chuẩn hóa được payload")
+
+        logger.info("[Maersk HTTP Scraper] Hoàn tất cho mã: %s (Tổng thời gian: %.2fs)",
+                    tracking_number, time.time() - t_total_start)
+        return normalized_data, None
@@ -2,10 +2,12 @@ import logging
 import requests
 import json
 import time
-from datetime import datetime, date
+from datetime import date
 
 from ..api_scraper import ApiScraper
 from schemas import N8nTrackingInfo
+import metrics
+from .. import date_normalizer
 
 # Lấy logger cho module này
 logger = logging.getLogger(__name__)
@@ -36,14 +38,7 @@ class MscScraper(ApiScraper):
 
     def _format_date(self, date_str):
         # Chuyển đổi chuỗi ngày từ 'DD/MM/YYYY' sang 'DD/MM/YYYY'. Trả về chuỗi rỗng nếu định dạng không hợp lệ hoặc đầu vào là None/rỗng.
-        if not date_str or not isinstance(date_str, str):
-            return ""
-        try:
-            datetime.strptime(date_str, '%d/%m/%Y')
-            return date_str
-        except (ValueError, TypeError):
-            logger.warning("[MSC API Scraper] Không thể phân tích định dạng ngày: %s. Trả về chuỗi rỗng.", date_str)
-            return ""
+        return date_normalizer.format_date("MSC", date_str)
 
     def scrape(self, tracking_number):
         # Scrape dữ liệu cho một Booking Number bằng cách gọi API và trả về một đối tượng N8nTrackingInfo hoặc lỗi.
@@ -60,7 +55,7 @@ class MscScraper(ApiScraper):
             logger.info(f"[MSC API Scraper] Gửi POST request đến: {self.api_url}")
             t_request_start = time.time()
             response = self.session.post(self.api_url, json=payload, timeout=30)
-            logger.info("-> (Thời gian) Gọi API: %.2fs", time.time() - t_request_start)
+            logger.info("-> (Thời gian) Gọi API: %.2fs", metrics.observe("http", t_request_start))
             response.raise_for_status() # Kiểm tra lỗi HTTP (4xx, 5xx)
 
             t_parse_start = time.time()
@@ -69,7 +64,7 @@ class MscScraper(ApiScraper):
             # with open("output/msc_api_response.json", "w", encoding="utf-8") as f:
             #     json.dump(data, f, ensure_ascii=False, indent=4)
             
-            logger.debug("-> (Thời gian) Parse JSON: %.2fs", time.time() - t_parse_start)
+            logger.debug("-> (Thời gian) Parse JSON: %.2fs", metrics.observe("extract", t_parse_start))
 
             # Kiểm tra response thành công và có dữ liệu
             if not data or not data.get("IsSuccess") or not data.get("Data", {}).get("BillOfLadings"):
@@ -82,7 +77,7 @@ class MscScraper(ApiScraper):
             # Chỉ lấy dữ liệu từ Bill of Lading đầu tiên trong danh sách
             bill_of_lading_data = data["Data"]["BillOfLadings"][0]
             normalized_data = self._extract_and_normalize_data_api(bill_of_lading_data, tracking_number)
-            logger.info("-> (Thời gian) Trích xuất và chuẩn hóa: %.2fs", time.time() - t_extract_start)
+            logger.info("-> (Thời gian) Trích xuất và chuẩn hóa: %.2fs", metrics.observe("normalize", t_extract_start))
 
             if not normalized_data:
                 logger.warning("[MSC API Scraper] Không thể chuẩn hóa dữ liệu từ API cho mã: %s.", tracking_number)
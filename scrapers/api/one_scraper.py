@@ -5,7 +5,10 @@ import time
 from datetime import datetime, date
 
 from ..api_scraper import ApiScraper
+from ..step_runner import Step, StepRunner, StepError
 from schemas import N8nTrackingInfo
+import metrics
+from .. import date_normalizer
 
 # Lấy logger cho module
 logger = logging.getLogger(__name__)
@@ -28,113 +31,33 @@ class OneScraper(ApiScraper):
             # Các headers khác có thể cần thiết, ví dụ Authorization hoặc Cookies
         })
 
-    def _format_date(self, date_str):
-        # Chuyển đổi chuỗi ngày từ API format 'YYYY-MM-DDTHH:MM:SS.sssZ' sang 'DD/MM/YYYY'. Trả về "" nếu lỗi.
-        if not date_str or not isinstance(date_str, str):
-            return ""
-        try:
-            # Lấy phần ngày tháng năm, bỏ qua phần giờ và timezone
-            date_part = date_str.split('T')[0]
-            if not date_part:
-                return ""
-            dt_obj = datetime.strptime(date_part, '%Y-%m-%d')
-            return dt_obj.strftime('%d/%m/%Y')
-        except (ValueError, IndexError):
-            logger.warning("[ONE API Scraper] Không thể phân tích định dạng ngày: %s", date_str)
-            return "" # Trả về chuỗi rỗng nếu lỗi
-
     def scrape(self, tracking_number):
-        # Phương thức scrape chính cho ONE bằng API. Thực hiện 2 request: lấy container no và lấy events.
+        # Phương thức scrape chính cho ONE bằng API. Pipeline 2 step (qua StepRunner): search -> events.
         logger.info("[ONE API Scraper] Bắt đầu scrape cho mã: %s", tracking_number)
         t_total_start = time.time()
-        container_no = None
-        search_data = None
-        events_data = None
 
-        # --- Request 1: Lấy thông tin cơ bản và container number ---
+        runner = StepRunner([
+            # Request 1: Lấy thông tin cơ bản và container number
+            Step("search", lambda results, timeout: self._request_search(tracking_number, timeout),
+                 timeout=30, retries=1),
+            # Request 2: Lấy thông tin Events (không bắt buộc, lỗi thì chỉ dùng dữ liệu Search)
+            Step("events", lambda results, timeout: self._request_events(tracking_number, results["search"], timeout),
+                 depends_on=("search",), required=False),
+        ], log_prefix="[ONE API Scraper]")
+
         try:
-            current_timestamp_ms = int(time.time() * 1000)
-            payload_req1 = {
-                "page": 1,
-                "page_length": 10, # Lấy tối đa 10 container
-                "filters": {
-                    "search_text": tracking_number,
-                    "search_type": "BKG_NO" # Giả định input luôn là Booking No
-                },
-                "timestamp": current_timestamp_ms
-            }
-            logger.info(f"[ONE API Scraper] Gửi POST request đến: {self.search_url}")
-            t_req1_start = time.time()
-            response_req1 = self.session.post(self.search_url, json=payload_req1, timeout=30)
-            logger.info("-> (Thời gian) Gọi API Search: %.2fs", time.time() - t_req1_start)
-            response_req1.raise_for_status()
-            search_data = response_req1.json()
-
-            # Trích xuất containerNo từ container đầu tiên
-            if search_data.get("data") and isinstance(search_data["data"], list) and len(search_data["data"]) > 0:
-                first_container_info = search_data["data"][0]
-                container_no = first_container_info.get("containerNo")
-                if container_no:
-                    logger.info("[ONE API Scraper] Đã trích xuất containerNo: %s", container_no)
-                else:
-                    logger.warning("[ONE API Scraper] Không tìm thấy 'containerNo' trong dữ liệu container đầu tiên.")
-                    # Vẫn tiếp tục thử lấy dữ liệu chung nếu có thể
-            else:
-                logger.warning("[ONE API Scraper] Response Search không chứa danh sách 'data' hợp lệ hoặc danh sách rỗng.")
+            results = runner.run()
+        except StepError as e:
+            return None, self._search_error_message(e.cause, tracking_number)
 
-        except requests.exceptions.Timeout:
-            logger.error("[ONE API Scraper] Request Search bị timeout.")
-            return None, f"Request timeout khi tìm kiếm thông tin ban đầu cho '{tracking_number}'."
-        except requests.exceptions.HTTPError as e:
-            logger.error(f"[ONE API Scraper] Lỗi HTTP (Search): {e.response.status_code} - {e.response.reason}. Response: {e.response.text}")
-            return None, f"Lỗi HTTP {e.response.status_code} khi tìm kiếm '{tracking_number}'."
-        except requests.exceptions.RequestException as e:
-            logger.error(f"[ONE API Scraper] Lỗi Request (Search): {e}", exc_info=True)
-            return None, f"Lỗi kết nối khi tìm kiếm '{tracking_number}': {e}"
-        except json.JSONDecodeError:
-            logger.error("[ONE API Scraper] Không thể parse JSON từ Response Search. Response text: %s", response_req1.text)
-            return None, f"API Response (Search) không phải JSON hợp lệ cho '{tracking_number}'."
-        except Exception as e:
-            logger.error(f"[ONE API Scraper] Lỗi không xác định (Search): {e}", exc_info=True)
-            return None, f"Lỗi không xác định khi tìm kiếm '{tracking_number}': {e}"
-
-        # --- Request 2: Lấy thông tin Events (nếu có container_no) ---
-        if container_no:
-            try:
-                params_req2 = {
-                    "booking_no": tracking_number,
-                    "container_no": container_no
-                }
-                logger.info(f"[ONE API Scraper] Gửi GET request đến: {self.events_url} với params: {params_req2}")
-                t_req2_start = time.time()
-                response_req2 = self.session.get(self.events_url, params=params_req2, timeout=30)
-                logger.info("-> (Thời gian) Gọi API Events: %.2fs", time.time() - t_req2_start)
-                response_req2.raise_for_status()
-                events_data = response_req2.json()
-
-            except requests.exceptions.Timeout:
-                logger.warning("[ONE API Scraper] Request Events bị timeout. Sẽ chỉ xử lý dữ liệu từ request Search.")
-                events_data = None # Đặt lại để xử lý bên dưới
-            except requests.exceptions.HTTPError as e:
-                logger.warning(f"[ONE API Scraper] Lỗi HTTP (Events): {e.response.status_code} - {e.response.reason}. Sẽ chỉ xử lý dữ liệu từ request Search. Response: {e.response.text}")
-                events_data = None
-            except requests.exceptions.RequestException as e:
-                logger.warning(f"[ONE API Scraper] Lỗi Request (Events): {e}. Sẽ chỉ xử lý dữ liệu từ request Search.", exc_info=True)
-                events_data = None
-            except json.JSONDecodeError:
-                logger.warning("[ONE API Scraper] Không thể parse JSON từ Response Events. Sẽ chỉ xử lý dữ liệu từ request Search. Response text: %s", response_req2.text)
-                events_data = None
-            except Exception as e:
-                logger.warning(f"[ONE API Scraper] Lỗi không xác định (Events): {e}. Sẽ chỉ xử lý dữ liệu từ request Search.", exc_info=True)
-                events_data = None
-        else:
-            logger.warning("[ONE API Scraper] Không có container_no, bỏ qua request lấy Events.")
+        search_data = results["search"]
+        events_data = results["events"]
 
         # --- BƯỚC 3: Trích xuất và chuẩn hóa ---
         if search_data:
             t_extract_start = time.time()
             normalized_data = self._extract_and_normalize_data_api(search_data, events_data, tracking_number)
-            logger.info("-> (Thời gian) Trích xuất và chuẩn hóa: %.2fs", time.time() - t_extract_start)
+            logger.info("-> (Thời gian) Trích xuất và chuẩn hóa: %.2fs", metrics.observe("normalize", t_extract_start))
 
             if not normalized_data:
                 logger.warning(f"[ONE API Scraper] Không thể chuẩn hóa dữ liệu cho '{tracking_number}'.")
@@ -148,6 +71,127 @@ class OneScraper(ApiScraper):
              return None, f"Không lấy được dữ liệu ban đầu cho '{tracking_number}' từ API."
 
 
+    def _request_search(self, tracking_number, timeout):
+        # Gọi API Search, trả về JSON.
+        current_timestamp_ms = int(time.time() * 1000)
+        payload_req1 = {
+            "page": 1,
+            "page_length": 10, # Lấy tối đa 10 container
+            "filters": {
+                "search_text": tracking_number,
+                "search_type": "BKG_NO" # Giả định input luôn là Booking No
+            },
+            "timestamp": current_timestamp_ms
+        }
+        logger.info(f"[ONE API Scraper] Gửi POST request đến: {self.search_url}")
+        response_req1 = self.session.post(self.search_url, json=payload_req1, timeout=timeout)
+        response_req1.raise_for_status()
+        try:
+            return response_req1.json()
+        except ValueError:
+            logger.error("[ONE API Scraper] Không thể parse JSON từ Response Search. Response text: %s", response_req1.text)
+            raise
+
+    def _search_error_message(self, cause, tracking_number):
+        # Chuyển lỗi của request Search thành thông báo lỗi trả về.
+        if isinstance(cause, requests.exceptions.Timeout):
+            logger.error("[ONE API Scraper] Request Search bị timeout.")
+            return f"Request timeout khi tìm kiếm thông tin ban đầu cho '{tracking_number}'."
+        if isinstance(cause, requests.exceptions.HTTPError):
+            logger.error(f"[ONE API Scraper] Lỗi HTTP (Search): {cause.response.status_code} - {cause.response.reason}. Response: {cause.response.text}")
+            return f"Lỗi HTTP {cause.response.status_code} khi tìm kiếm '{tracking_number}'."
+        if isinstance(cause, ValueError):
+            # Lỗi parse JSON (requests.JSONDecodeError kế thừa ValueError)
+            return f"API Response (Search) không phải JSON hợp lệ cho '{tracking_number}'."
+        if isinstance(cause, requests.exceptions.RequestException):
+            logger.error(f"[ONE API Scraper] Lỗi Request (Search): {cause}", exc_info=cause)
+            return f"Lỗi kết nối khi tìm kiếm '{tracking_number}': {cause}"
+        logger.error(f"[ONE API Scraper] Lỗi không xác định (Search): {cause}", exc_info=cause)
+        return f"Lỗi không xác định khi tìm kiếm '{tracking_number}': {cause}"
+
+    def _request_events(self, tracking_number, search_data, timeout=30):
+        # Lấy Events cho container đầu tiên (hoặc tất cả container nếu bật fetch_all_containers) và gộp lại.
+        container_no = None
+        if search_data.get("data") and isinstance(search_data["data"], list) and len(search_data["data"]) > 0:
+            first_container_info = search_data["data"][0]
+            container_no = first_container_info.get("containerNo")
+            if container_no:
+                logger.info("[ONE API Scraper] Đã trích xuất containerNo: %s", container_no)
+            else:
+                logger.warning("[ONE API Scraper] Không tìm thấy 'containerNo' trong dữ liệu container đầu tiên.")
+        else:
+            logger.warning("[ONE API Scraper] Response Search không chứa danh sách 'data' hợp lệ hoặc danh sách rỗng.")
+
+        if not container_no:
+            logger.warning("[ONE API Scraper] Không có container_no, bỏ qua request lấy Events.")
+            return None
+
+        if self.config.get('fetch_all_containers', False):
+            container_nos = self._extract_container_nos(search_data) or [container_no]
+        else:
+            container_nos = [container_no]
+
+        t_events_start = time.time()
+        events_results = self._fetch_concurrently(
+            lambda cntr_no: self._fetch_events(tracking_number, cntr_no, timeout),
+            container_nos,
+            max_workers=self.config.get('max_container_workers', 4)
+        )
+        events_results = [result for result in events_results if result]
+        if not events_results:
+            return None
+        if len(container_nos) == 1:
+            return events_results[0]
+
+        # Gộp sự kiện của tất cả container thành một timeline
+        merged_events = self._merge_event_lists(
+            [result.get("data") if isinstance(result.get("data"), list) else [] for result in events_results],
+            key_func=lambda ev: (
+                ev.get("eventDate"), ev.get("eventName"), ev.get("triggerType"),
+                (ev.get("location") or {}).get("locationName")
+            )
+        )
+        logger.info("-> (Thời gian) Lấy Events của %d container: %.2fs (%d sự kiện sau khi gộp)",
+                    len(container_nos), time.time() - t_events_start, len(merged_events))
+        return {"data": merged_events}
+
+    def _extract_container_nos(self, search_data):
+        # Lấy danh sách containerNo (không trùng lặp) từ response Search.
+        container_nos = []
+        for container_info in search_data.get("data") or []:
+            cntr_no = container_info.get("containerNo") if isinstance(container_info, dict) else None
+            if cntr_no and cntr_no not in container_nos:
+                container_nos.append(cntr_no)
+        logger.info("[ONE API Scraper] Tìm thấy %d container: %s", len(container_nos), container_nos)
+        return container_nos
+
+    def _fetch_events(self, tracking_number, container_no, timeout=30):
+        # Gọi API Events cho một container. Trả về JSON hoặc None nếu lỗi (chỉ log cảnh báo).
+        response_req2 = None
+        try:
+            params_req2 = {
+                "booking_no": tracking_number,
+                "container_no": container_no
+            }
+            logger.info(f"[ONE API Scraper] Gửi GET request đến: {self.events_url} với params: {params_req2}")
+            t_req2_start = time.time()
+            response_req2 = self.session.get(self.events_url, params=params_req2, timeout=timeout)
+            logger.info("-> (Thời gian) Gọi API Events: %.2fs", time.time() - t_req2_start)
+            response_req2.raise_for_status()
+            return response_req2.json()
+
+        except requests.exceptions.Timeout:
+            logger.warning("[ONE API Scraper] Request Events bị timeout. Sẽ chỉ xử lý dữ liệu từ request Search.")
+        except requests.exceptions.HTTPError as e:
+            logger.warning(f"[ONE API Scraper] Lỗi HTTP (Events): {e.response.status_code} - {e.response.reason}. Sẽ chỉ xử lý dữ liệu từ request Search. Response: {e.response.text}")
+        except requests.exceptions.RequestException as e:
+            logger.warning(f"[ONE API Scraper] Lỗi Request (Events): {e}. Sẽ chỉ xử lý dữ liệu từ request Search.", exc_info=True)
+        except json.JSONDecodeError:
+            logger.warning("[ONE API Scraper] Không thể parse JSON từ Response Events. Sẽ chỉ xử lý dữ liệu từ request Search. Response text: %s", response_req2.text)
+        except Exception as e:
+            logger.warning(f"[ONE API Scraper] Lỗi không xác định (Events): {e}. Sẽ chỉ xử lý dữ liệu từ request Search.", exc_info=True)
+        return None
+
     def _extract_and_normalize_data_api(self, search_response, events_response, booking_no_input):
         """
         Trích xuất, xử lý và chuẩn hóa dữ liệu từ response JSON của API ONE.
@@ -292,15 +336,17 @@ class OneScraper(ApiScraper):
                 BookingStatus= booking_status.strip(),
                 Pol= pol.strip() or "",
                 Pod= pod.strip() or "",
-                Etd= self._format_date(etd) or "",
-                Atd= self._format_date(atd) or "",
-                Eta= self._format_date(eta) or "",
-                Ata= self._format_date(ata) or "",
+                **date_normalizer.normalize_shipment_dates("ONE", {
+                    "Etd": etd,
+                    "Atd": atd,
+                    "Eta": eta,
+                    "Ata": ata,
+                    "EtdTransit": etd_transit_final,
+                    "AtdTransit": atd_transit,
+                    "EtaTransit": eta_transit,
+                    "AtaTransit": ata_transit,
+                }),
                 TransitPort= ", ".join(transit_port_list) if transit_port_list else "",
-                EtdTransit= self._format_date(etd_transit_final) or "",
-                AtdTransit= self._format_date(atd_transit) or "",
-                EtaTransit= self._format_date(eta_transit) or "",
-                AtaTransit= self._format_date(ata_transit) or ""
             )
             logger.info("[ONE API Scraper] Đã tạo đối tượng N8nTrackingInfo thành công.")
             logger.debug("-> (Thời gian) Chuẩn hóa dữ liệu cuối cùng: %.2fs", time.time() - t_normalize_start)
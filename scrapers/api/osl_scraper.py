@@ -2,11 +2,12 @@ import logging
 import requests
 import json
 import time
-from datetime import datetime
 from bs4 import BeautifulSoup 
 
 from ..api_scraper import ApiScraper
 from schemas import N8nTrackingInfo
+import metrics
+from .. import date_normalizer
 logger = logging.getLogger(__name__)
 
 class OslScraper(ApiScraper):
@@ -35,15 +36,7 @@ class OslScraper(ApiScraper):
 
     def _format_date(self, date_str):
         # Chuyển đổi chuỗi ngày từ 'Weekday, DD-Mon-YYYY' sang 'DD/MM/YYYY'. Trả về "" nếu lỗi.
-        if not date_str or not isinstance(date_str, str):
-            return ""
-        try:
-            date_part = date_str.split(", ")[1]
-            dt_obj = datetime.strptime(date_part, '%d-%b-%Y')
-            return dt_obj.strftime('%d/%m/%Y')
-        except (ValueError, IndexError):
-            logger.warning("[OSL API Scraper] Cảnh báo: Không thể phân tích định dạng ngày: %s", date_str)
-            return ""
+        return date_normalizer.format_date("OSL", date_str)
 
     def scrape(self, tracking_number):
         # Phương thức scraping chính cho Oceanic Star Line bằng API.
@@ -61,12 +54,12 @@ class OslScraper(ApiScraper):
             logger.info(f"[OSL API Scraper] -> Gửi POST request đến: {self.api_url}")
             t_request_start = time.time()
             response = self.session.post(self.api_url, data=payload, timeout=30)
-            logger.info("-> (Thời gian) Gọi API: %.2fs", time.time() - t_request_start)
+            logger.info("-> (Thời gian) Gọi API: %.2fs", metrics.observe("http", t_request_start))
             response.raise_for_status()
 
             t_parse_start = time.time()
             api_response = response.json()
-            logger.info("-> (Thời gian) Parse JSON: %.2fs", time.time() - t_parse_start)
+            logger.info("-> (Thời gian) Parse JSON: %.2fs", metrics.observe("extract", t_parse_start))
 
             # Kiểm tra trạng thái và dữ liệu trả về từ API
             if api_response.get("status") == 1 and api_response.get("data"):
@@ -76,7 +69,7 @@ class OslScraper(ApiScraper):
 
                 t_extract_start = time.time()
                 normalized_data = self._extract_and_normalize_data(soup, tracking_number)
-                logger.info("-> (Thời gian) Trích xuất dữ liệu từ HTML: %.2fs", time.time() - t_extract_start)
+                logger.info("-> (Thời gian) Trích xuất dữ liệu từ HTML: %.2fs", metrics.observe("extract", t_extract_start))
 
                 if not normalized_data:
                     return None, f"Không thể trích xuất dữ liệu đã chuẩn hóa cho '{tracking_number}' từ HTML response."
@@ -5,6 +5,8 @@ from datetime import datetime, date
 
 from ..api_scraper import ApiScraper
 from schemas import N8nTrackingInfo
+import metrics
+from .. import date_normalizer
 
 logger = logging.getLogger(__name__)
 
@@ -31,20 +33,6 @@ class SitcScraper(ApiScraper):
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/141.0.0.0 Safari/537.36',
         })
 
-    def _format_date(self, date_str):
-        # Chuyển đổi chuỗi ngày từ 'YYYY-MM-DD HH:MM' sang 'DD/MM/YYYY'. Trả về "" nếu lỗi.
-        if not date_str or not isinstance(date_str, str):
-            return ""
-        try:
-            date_part = date_str.split(" ")[0]
-            if not date_part:
-                return ""
-            dt_obj = datetime.strptime(date_part, '%Y-%m-%d')
-            return dt_obj.strftime('%d/%m/%Y')
-        except (ValueError, IndexError):
-            logger.warning("[SITC API Scraper] Không thể phân tích định dạng ngày: %s", date_str)
-            return ""
-
     def scrape(self, tracking_number):
         # Phương thức scrape chính bằng API. Thực hiện lấy cookie và gọi API tracking.
         logger.info("[SITC API Scraper] Bắt đầu scrape cho mã: %s", tracking_number)
@@ -58,7 +46,7 @@ class SitcScraper(ApiScraper):
             t_init_start = time.time()
             initial_response = self.session.get(self.base_url, timeout=30)
             initial_response.raise_for_status()
-            logger.info("-> (Thời gian) Khởi tạo session: %.2fs", time.time() - t_init_start)
+            logger.info("-> (Thời gian) Khởi tạo session: %.2fs", metrics.observe("http", t_init_start))
 
             
             logger.info(f"[SITC API Scraper] Gửi GET request đến API: {self.api_url}")
@@ -66,7 +54,7 @@ class SitcScraper(ApiScraper):
             response = self.session.get(self.api_url, params=params, timeout=30)
             response.raise_for_status()
             data = response.json()
-            logger.info("-> (Thời gian) Gọi API tracking: %.2fs", time.time() - t_api_start)
+            logger.info("-> (Thời gian) Gọi API tracking: %.2fs", metrics.observe("http", t_api_start))
 
             # Kiểm tra response thành công và có dữ liệu
             if not data.get("success") or not data.get("data"):
@@ -77,7 +65,7 @@ class SitcScraper(ApiScraper):
             # Trích xuất và chuẩn hóa
             t_extract_start = time.time()
             normalized_data = self._extract_and_normalize_data_api(data["data"], tracking_number)
-            logger.info("-> (Thời gian) Trích xuất và chuẩn hóa: %.2fs", time.time() - t_extract_start)
+            logger.info("-> (Thời gian) Trích xuất và chuẩn hóa: %.2fs", metrics.observe("normalize", t_extract_start))
 
             if not normalized_data:
                 return None, f"Không thể chuẩn hóa dữ liệu từ API cho '{tracking_number}'."
@@ -224,15 +212,17 @@ class SitcScraper(ApiScraper):
                 BookingStatus= booking_status,
                 Pol= pol,
                 Pod= pod,
-                Etd= self._format_date(etd) or "",
-                Atd= self._format_date(atd) or "",
-                Eta= self._format_date(eta) or "",
-                Ata= self._format_date(ata) or "",
+                **date_normalizer.normalize_shipment_dates("SITC", {
+                    "Etd": etd,
+                    "Atd": atd,
+                    "Eta": eta,
+                    "Ata": ata,
+                    "EtdTransit": etd_transit_final,
+                    "AtdTransit": atd_transit,
+                    "EtaTransit": eta_transit,
+                    "AtaTransit": ata_transit,
+                }),
                 TransitPort= ", ".join(transit_port_list) if transit_port_list else "",
-                EtdTransit= self._format_date(etd_transit_final) or "",
-                AtdTransit= self._format_date(atd_transit) or "",
-                EtaTransit= self._format_date(eta_transit) or "",
-                AtaTransit= self._format_date(ata_transit) or ""
             )
             logger.info("[SITC API Scraper] Đã tạo đối tượng N8nTrackingInfo thành công.")
             logger.debug("-> (Thời gian) Chuẩn hóa dữ liệu cuối cùng: %.2fs", time.time() - t_normalize_start)
@@ -2,10 +2,11 @@ import logging
 import requests
 import json
 import time
-from datetime import datetime, date
 
 from ..api_scraper import ApiScraper
 from schemas import N8nTrackingInfo
+import metrics
+from .. import date_normalizer
 
 logger = logging.getLogger(__name__)
 
@@ -23,20 +24,6 @@ class TranslinerScraper(ApiScraper):
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/141.0.0.0 Safari/537.36',
         })
 
-    def _format_date(self, date_str):
-        # Chuyển đổi chuỗi ngày từ API format 'YYYY-MM-DDTHH:MM:SSZ' sang 'DD/MM/YYYY'. Trả về "" nếu lỗi.
-        if not date_str or not isinstance(date_str, str):
-            return ""
-        try:
-            date_part = date_str.split('T')[0]
-            if not date_part:
-                return ""
-            dt_obj = datetime.strptime(date_part, '%Y-%m-%d')
-            return dt_obj.strftime('%d/%m/%Y')
-        except (ValueError, IndexError):
-            logger.warning("[Transliner API Scraper] Không thể phân tích định dạng ngày: %s", date_str)
-            return ""
-
     def scrape(self, tracking_number):
         # Phương thức scraping chính cho Transliner bằng API.
         logger.info("[Transliner API Scraper] Bắt đầu scrape cho mã: %s", tracking_number)
@@ -55,13 +42,17 @@ class TranslinerScraper(ApiScraper):
         try:
             logger.info(f"[Transliner API Scraper] Gửi GET request đến: {api_url}")
             t_request_start = time.time()
-            response = self.session.get(api_url, params=params, timeout=30)
-            logger.info("-> (Thời gian) Gọi API: %.2fs", time.time() - t_request_start)
-            response.raise_for_status() # Kiểm tra lỗi HTTP (4xx, 5xx)
-
+            # GET có điều kiện: nếu dữ liệu không đổi (304) thì parse và chuẩn hóa lại body đã cache, không tải lại
+            response, cached_body = self._conditional_get(api_url, params=params, timeout=30)
+            logger.info("-> (Thời gian) Gọi API: %.2fs", metrics.observe("http", t_request_start))
             t_parse_start = time.time()
-            data = response.json()
-            logger.debug("-> (Thời gian) Parse JSON: %.2fs", time.time() - t_parse_start)
+            if cached_body is not None:
+                logger.info("[Transliner API Scraper] Dữ liệu không thay đổi, dùng body đã cache cho mã: %s", tracking_number)
+                data = json.loads(cached_body)
+            else:
+                response.raise_for_status() # Kiểm tra lỗi HTTP (4xx, 5xx)
+                data = response.json()
+            logger.debug("-> (Thời gian) Parse JSON: %.2fs", metrics.observe("extract", t_parse_start))
 
             # Kiểm tra response có dữ liệu cần thiết không (ví dụ: booking_number)
             if not data or "booking_number" not in data:
@@ -72,12 +63,14 @@ class TranslinerScraper(ApiScraper):
             # Trích xuất và chuẩn hóa dữ liệu từ response JSON
             t_extract_start = time.time()
             normalized_data = self._extract_and_normalize_data_api(data, tracking_number)
-            logger.info("-> (Thời gian) Trích xuất và chuẩn hóa: %.2fs", time.time() - t_extract_start)
+            logger.info("-> (Thời gian) Trích xuất và chuẩn hóa: %.2fs", metrics.observe("normalize", t_extract_start))
 
             if not normalized_data:
                 logger.warning("[Transliner API Scraper] Không thể chuẩn hóa dữ liệu từ API cho mã: %s.", tracking_number)
                 return None, f"Không thể chuẩn hóa dữ liệu từ API cho '{tracking_number}'."
 
+            self._store_cached_body(response)
+
             t_total_end = time.time()
             logger.info("[Transliner API Scraper] Hoàn tất thành công cho mã: %s (Tổng thời gian: %.2fs)",
                          tracking_number, t_total_end - t_total_start)
@@ -172,10 +165,12 @@ class TranslinerScraper(ApiScraper):
                 BookingStatus= booking_status or "",
                 Pol= pol or "",
                 Pod= pod or "",
-                Etd= self._format_date(etd) or "",
-                Atd= self._format_date(atd) or "",
-                Eta= self._format_date(eta) or "",
-                Ata= self._format_date(ata) or "",
+                **date_normalizer.normalize_shipment_dates("TRANSLINER", {
+                    "Etd": etd,
+                    "Atd": atd,
+                    "Eta": eta,
+                    "Ata": ata,
+                }),
                 TransitPort= transit_port or "",
                 EtdTransit= etd_transit or "",
                 AtdTransit= atd_transit or "",
@@ -6,6 +6,8 @@ from datetime import datetime, date
 
 from ..api_scraper import ApiScraper
 from schemas import N8nTrackingInfo
+import metrics
+from .. import date_normalizer
 
 # Thiết lập logger cho module này
 logger = logging.getLogger(__name__)
@@ -25,21 +27,6 @@ class UnifeederScraper(ApiScraper):
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/141.0.0.0 Safari/537.36',
         })
 
-    def _format_date(self, date_str):
-        # Chuyển đổi chuỗi ngày từ API format 'YYYY-MM-DDTHH:MM:SS' sang 'DD/MM/YYYY'. Trả về "" nếu lỗi.
-        if not date_str or not isinstance(date_str, str):
-            return ""
-        try:
-            # Lấy phần ngày tháng năm, bỏ qua phần giờ và timezone
-            date_part = date_str.split('T')[0]
-            if not date_part:
-                return ""
-            dt_obj = datetime.strptime(date_part, '%Y-%m-%d')
-            return dt_obj.strftime('%d/%m/%Y')
-        except (ValueError, IndexError):
-            logger.warning("[Unifeeder API Scraper] Không thể phân tích định dạng ngày: %s", date_str)
-            return "" # Trả về chuỗi rỗng nếu lỗi
-
     def scrape(self, tracking_number):
         # Phương thức scrape chính bằng API.
         logger.info("[Unifeeder API Scraper] Bắt đầu scrape cho mã: %s", tracking_number)
@@ -53,13 +40,17 @@ class UnifeederScraper(ApiScraper):
         try:
             logger.info(f"[Unifeeder API Scraper] Gửi GET request đến: {self.api_url}")
             t_request_start = time.time()
-            response = self.session.get(self.api_url, params=params, timeout=30)
-            logger.info("-> (Thời gian) Gọi API: %.2fs", time.time() - t_request_start)
-            response.raise_for_status()
-
+            # GET có điều kiện: nếu dữ liệu không đổi (304) thì parse và chuẩn hóa lại body đã cache, không tải lại
+            response, cached_body = self._conditional_get(self.api_url, params=params, timeout=30)
+            logger.info("-> (Thời gian) Gọi API: %.2fs", metrics.observe("http", t_request_start))
             t_parse_start = time.time()
-            data = response.json()
-            logger.debug("-> (Thời gian) Parse JSON: %.2fs", time.time() - t_parse_start)
+            if cached_body is not None:
+                logger.info("[Unifeeder API Scraper] Dữ liệu không thay đổi, dùng body đã cache cho mã: %s", tracking_number)
+                data = json.loads(cached_body)
+            else:
+                response.raise_for_status()
+                data = response.json()
+            logger.debug("-> (Thời gian) Parse JSON: %.2fs", metrics.observe("extract", t_parse_start))
 
             # Kiểm tra response có dữ liệu cần thiết không
             if not data or not data.get("bookingRelatedDetails") or not data.get("bookingTrackingEvents"):
@@ -70,12 +61,14 @@ class UnifeederScraper(ApiScraper):
             # Trích xuất và chuẩn hóa dữ liệu từ response JSON
             t_extract_start = time.time()
             normalized_data = self._extract_and_normalize_data_api(data, tracking_number)
-            logger.info("-> (Thời gian) Trích xuất và chuẩn hóa: %.2fs", time.time() - t_extract_start)
+            logger.info("-> (Thời gian) Trích xuất và chuẩn hóa: %.2fs", metrics.observe("normalize", t_extract_start))
 
             if not normalized_data:
                 logger.warning("[Unifeeder API Scraper] Không thể chuẩn hóa dữ liệu từ API cho mã: %s.", tracking_number)
                 return None, f"Không thể chuẩn hóa dữ liệu từ API cho '{tracking_number}'."
 
+            self._store_cached_body(response)
+
             t_total_end = time.time()
             logger.info("[Unifeeder API Scraper] Hoàn tất thành công cho mã: %s (Tổng thời gian: %.2fs)",
                          tracking_number, t_total_end - t_total_start)
@@ -226,15 +219,17 @@ class UnifeederScraper(ApiScraper):
                 BookingStatus= booking_status or "",
                 Pol= pol or "",
                 Pod= pod or "",
-                Etd= self._format_date(etd) or "",
-                Atd= self._format_date(atd) or "",
-                Eta= self._format_date(eta) or "",
-                Ata= self._format_date(ata) or "",
+                **date_normalizer.normalize_shipment_dates("UNIFEEDER", {
+                    "Etd": etd,
+                    "Atd": atd,
+                    "Eta": eta,
+                    "Ata": ata,
+                    "EtdTransit": etd_transit_final,
+                    "AtdTransit": atd_transit,
+                    "EtaTransit": eta_transit,
+                    "AtaTransit": ata_transit,
+                }),
                 TransitPort= ", ".join(transit_port_list) if transit_port_list else "",
-                EtdTransit= self._format_date(etd_transit_final) or "",
-                AtdTransit= self._format_date(atd_transit) or "",
-                EtaTransit= self._format_date(eta_transit) or "",
-                AtaTransit= self._format_date(ata_transit) or ""
             )
             logger.info("[Unifeeder API Scraper] Đã tạo đối tượng N8nTrackingInfo thành công.")
             logger.debug("-> (Thời gian) Chuẩn hóa dữ liệu cuối cùng: %.2fs", time.time() - t_normalize_start)
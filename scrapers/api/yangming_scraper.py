@@ -6,6 +6,7 @@ from datetime import datetime, date
 
 from ..api_scraper import ApiScraper
 from schemas import N8nTrackingInfo
+from .. import date_normalizer
 
 logger = logging.getLogger(__name__)
 
@@ -33,16 +34,7 @@ class YangmingScraper(ApiScraper):
 
     def _format_date(self, date_str):
         # Chuyển đổi 'YYYY/MM/DD HH:MM' -> 'DD/MM/YYYY'. Ví dụ: '2025/10/04 20:30' -> '04/10/2025'
-        if not date_str or not isinstance(date_str, str):
-            return ""
-        try:
-            # Lấy phần ngày, bỏ qua giờ
-            date_part = date_str.split(" ")[0]
-            dt_obj = datetime.strptime(date_part, '%Y/%m/%d')
-            return dt_obj.strftime('%d/%m/%Y')
-        except (ValueError, IndexError):
-            logger.warning("[YML API] Không thể format ngày: %s", date_str)
-            return ""
+        return date_normalizer.format_date("YML", date_str)
 
     def scrape(self, tracking_number):
         logger.info(f"[YML API] Bắt đầu scrape cho mã: {tracking_number}")
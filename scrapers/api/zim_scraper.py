@@ -1,10 +1,12 @@
 import logging
 import requests
 import time
-from datetime import datetime, date
+from datetime import date
 
 from ..api_scraper import ApiScraper
 from schemas import N8nTrackingInfo
+import metrics
+from .. import date_normalizer
 
 logger = logging.getLogger(__name__)
 
@@ -40,31 +42,14 @@ class ZimScraper(ApiScraper):
         })
 
     def _format_date(self, date_str):
-        """
-        Chuyển đổi chuỗi ngày từ ISO format '2025-08-11T19:55:00' sang 'DD/MM/YYYY'.
-        Trả về chuỗi rỗng nếu định dạng không hợp lệ hoặc đầu vào là None/rỗng.
-        """
-        if not date_str or not isinstance(date_str, str):
-            return ""
-        try:
-            # Parse ISO format và lấy phần ngày
-            dt_obj = datetime.fromisoformat(date_str.replace('Z', '+00:00'))
-            return dt_obj.strftime('%d/%m/%Y')
-        except (ValueError, TypeError):
-            logger.warning("[ZIM API Scraper] Không thể phân tích định dạng ngày: %s. Trả về chuỗi rỗng.", date_str)
-            return ""
+        # Chuyển đổi chuỗi ngày ISO (vd: '2025-08-11T19:55:00') sang 'DD/MM/YYYY'. Trả về "" nếu lỗi.
+        return date_normalizer.format_date("ZIM", date_str)
 
     def _parse_date(self, date_str):
         """
         Chuyển đổi chuỗi ngày thành đối tượng date để so sánh.
         """
-        if not date_str:
-            return None
-        try:
-            dt_obj = datetime.fromisoformat(date_str.replace('Z', '+00:00'))
-            return dt_obj.date()
-        except (ValueError, TypeError):
-            return None
+        return date_normalizer.parse_date("ZIM", date_str)
 
     def scrape(self, tracking_number):
         """
@@ -83,12 +68,12 @@ class ZimScraper(ApiScraper):
             logger.info(f"[ZIM API Scraper] Gửi GET request đến: {api_url}")
             t_request_start = time.time()
             response = self.session.get(api_url, params=params, timeout=30)
-            logger.info("-> (Thời gian) Gọi API: %.2fs", time.time() - t_request_start)
+            logger.info("-> (Thời gian) Gọi API: %.2fs", metrics.observe("http", t_request_start))
             response.raise_for_status()
 
             t_parse_start = time.time()
             data = response.json()
-            logger.debug("-> (Thời gian) Parse JSON: %.2fs", time.time() - t_parse_start)
+            logger.debug("-> (Thời gian) Parse JSON: %.2fs", metrics.observe("extract", t_parse_start))
 
             # Kiểm tra response thành công và có dữ liệu
             if not data or not data.get("isSuccess"):
@@ -105,7 +90,7 @@ class ZimScraper(ApiScraper):
             # Trích xuất và chuẩn hóa dữ liệu từ response JSON
             t_extract_start = time.time()
             normalized_data = self._extract_and_normalize_data_api(data["data"], tracking_number)
-            logger.info("-> (Thời gian) Trích xuất và chuẩn hóa: %.2fs", time.time() - t_extract_start)
+            logger.info("-> (Thời gian) Trích xuất và chuẩn hóa: %.2fs", metrics.observe("normalize", t_extract_start))
 
             if not normalized_data:
                 logger.warning("[ZIM API Scraper] Không thể chuẩn hóa dữ liệu từ API cho mã: %s.", tracking_number)
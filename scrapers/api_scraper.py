@@ -1,6 +1,10 @@
+import time
 import requests
 import logging
 from .base_scraper import BaseScraper
+from .http_cache import http_cache, response_wire_bytes, ACCEPT_ENCODING
+from session_vault import SessionExpiredError
+import tracing
 
 logger = logging.getLogger(__name__)
 
@@ -15,13 +19,113 @@ class ApiScraper(BaseScraper):
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/108.0.0.0 Safari/537.36',
             'Accept': 'application/json, text/plain, */*',
             'Accept-Language': 'en-US,en;q=0.9',
+            'Accept-Encoding': ACCEPT_ENCODING,
         })
+        # Mỗi request HTTP là một span trong trace của request hiện tại
+        tracing.trace_requests(self.session)
         logger.debug(f"[{self.__class__.__name__}] Đã khởi tạo ApiScraper.")
 
+    def _carrier_name(self):
+        return self.carrier or self.__class__.__name__
+
+    def _conditional_get(self, url, params=None, **kwargs):
+        """
+        GET có điều kiện: gửi If-None-Match/If-Modified-Since nếu URL này đã có validator
+        trong cache, và quảng bá nén brotli/gzip.
+        Trả về (response, cached_body); cached_body (bytes) khác None khi server trả 304, khi đó scraper
+        parse và chuẩn hóa lại body đã lưu thay vì đọc response.
+        """
+        cache_key = (self._carrier_name(), requests.Request('GET', url, params=params).prepare().url)
+        entry = http_cache.get(cache_key)
+
+        headers = dict(kwargs.pop('headers', None) or {})
+        headers.setdefault('Accept-Encoding', ACCEPT_ENCODING)
+        if entry is not None:
+            if entry.etag:
+                headers['If-None-Match'] = entry.etag
+            if entry.last_modified:
+                headers['If-Modified-Since'] = entry.last_modified
+
+        t_request_start = time.time()
+        response = self.session.get(url, params=params, headers=headers, **kwargs)
+        elapsed = time.time() - t_request_start
+
+        not_modified = response.status_code == 304 and entry is not None
+        wire_bytes = response_wire_bytes(response)
+        http_cache.record(self._carrier_name(), wire_bytes, len(response.content or b""), elapsed, not_modified)
+        logger.info(f"[{self.__class__.__name__}] HTTP {response.status_code}, nhận {wire_bytes} bytes "
+                    f"(Content-Encoding: {response.headers.get('Content-Encoding', 'none')}).")
+
+        if not_modified:
+            logger.info(f"[{self.__class__.__name__}] 304 Not Modified -> dùng body đã cache cho {cache_key[1]}")
+            return response, entry.body
+
+        if response.status_code == 200:
+            http_cache.record_full_time(self._carrier_name(), elapsed)
+        # Ghi nhớ để _store_cached_body biết key
+        self._pending_cache = cache_key
+        return response, None
+
+    def _store_cached_body(self, response):
+        """
+        Lưu ETag/Last-Modified cùng body gốc của response để parse và chuẩn hóa lại khi gặp 304
+        (chỉ gọi khi body đã chuẩn hóa thành công).
+        """
+        cache_key = getattr(self, '_pending_cache', None)
+        if not cache_key:
+            return
+        self._pending_cache = None
+        http_cache.store(
+            cache_key,
+            response.headers.get('ETag'),
+            response.headers.get('Last-Modified'),
+            response.content
+        )
+
+    def use_proxy(self, proxy_url, adapter=None):
+        """
+        Cho mọi request của session đi qua proxy. Nếu có `adapter` (connection pool dùng chung
+        của proxy đó) thì mount vào session để tái sử dụng kết nối giữa các request.
+        """
+        self.session.proxies.update({'http': proxy_url, 'https': proxy_url})
+        if adapter is not None:
+            self.session.mount('http://', adapter)
+            self.session.mount('https://', adapter)
+            self._shared_adapter = adapter
+
+    def use_session(self, harvested):
+        """
+        Nạp cookie/header của phiên thu thập từ trình duyệt (session_vault) vào session requests,
+        cùng mẫu URL của request API tracking đã bắt được (self.replay_url_template).
+        """
+        self.replay_url_template = harvested.url_template
+        for cookie in harvested.cookies:
+            self.session.cookies.set(cookie['name'], cookie['value'], domain=cookie['domain'] or '', path=cookie['path'])
+        self.session.headers.update(harvested.headers)
+
+    def _session_json(self, response):
+        """
+        Đọc JSON của request phát lại bằng phiên từ trình duyệt. Ném SessionExpiredError khi hãng tàu
+        từ chối phiên (401/403/429 hoặc trả trang HTML chống bot thay vì JSON).
+        """
+        if response.status_code in (401, 403, 429):
+            raise SessionExpiredError(self._carrier_name(), f"HTTP {response.status_code}")
+        try:
+            return response.json()
+        except ValueError:
+            content_type = response.headers.get('Content-Type', '')
+            raise SessionExpiredError(self._carrier_name(), f"không phải JSON (HTTP {response.status_code}, {content_type})")
+
     def close(self):
         # Đóng session requests để giải phóng tài nguyên
         if self.session:
             try:
+                # Không đóng connection pool dùng chung của proxy, chỉ gỡ khỏi session
+                shared_adapter = getattr(self, '_shared_adapter', None)
+                if shared_adapter is not None:
+                    for prefix, adapter in list(self.session.adapters.items()):
+                        if adapter is shared_adapter:
+                            del self.session.adapters[prefix]
                 self.session.close()
                 logger.debug(f"[{self.__class__.__name__}] Đã đóng session.")
             except Exception as e:
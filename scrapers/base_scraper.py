@@ -1,11 +1,26 @@
+import logging
+import contextvars
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
 from typing import Tuple, Optional
 from schemas import N8nTrackingInfo
+from profiler import profiler
+
+logger = logging.getLogger(__name__)
 
 class BaseScraper(ABC):
     """
     Abstract Base Class cho tất cả scraper
     """
+    # Mã hãng tàu (key trong SCRAPERS), được gán bởi get_scraper
+    carrier = None
+    # Header của request API tracking mà trình duyệt đã gửi (network capture), để phát lại bằng HTTP
+    captured_request_headers = None
+    # URL của request API tracking đó (session_vault.replay_url_template)
+    captured_request_url = None
+    # URL proxy (có xác thực) mà trình duyệt đang dùng, để request HTTP phụ đi cùng IP với trình duyệt
+    http_proxy = None
+
     def __init__(self, config, driver=None):
         """
         Khởi tạo scraper với config và driver (nếu có).
@@ -27,4 +42,46 @@ class BaseScraper(ABC):
                    - data (dict | N8nTrackingInfor | None): Dữ liệu tracking đã chuẩn hóa hoặc None nếu lỗi.
                    - error_message (str | None): Thông báo lỗi nếu có.
         """
-        pass
\ No newline at end of file
+        pass
+
+    def _merge_event_lists(self, event_lists, key_func):
+        """
+        Gộp danh sách sự kiện của nhiều container thành một timeline duy nhất.
+        Các sự kiện trùng nhau (cùng key_func) giữa các container chỉ giữ lại một lần,
+        thứ tự xuất hiện được giữ nguyên.
+        """
+        merged = []
+        seen = set()
+        for events in event_lists:
+            for event in events or []:
+                key = key_func(event)
+                if key in seen:
+                    continue
+                seen.add(key)
+                merged.append(event)
+        return merged
+
+    def _fetch_concurrently(self, func, items, max_workers=4):
+        """
+        Gọi func(item) song song cho từng item, tối đa max_workers luồng cùng lúc.
+        Trả về list kết quả theo đúng thứ tự của items (None nếu item đó bị lỗi).
+        """
+        items = list(items)
+        if not items:
+            return []
+        if len(items) == 1:
+            # Không cần tạo thread pool cho trường hợp một container
+            return [self._call_safely(func, items[0])]
+        workers = max(1, min(max_workers, len(items)))
+        # Mỗi item chạy trong bản sao context của request (nhãn metrics/log theo hãng tàu)
+        contexts = [contextvars.copy_context() for _ in items]
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix=self.__class__.__name__) as executor:
+            return list(executor.map(lambda ctx, item: ctx.run(self._call_safely, func, item), contexts, items))
+
+    def _call_safely(self, func, item):
+        try:
+            with profiler.attach():
+                return func(item)
+        except Exception as e:
+            logger.warning(f"[{self.__class__.__name__}] Lỗi khi xử lý '{item}': {e}", exc_info=True)
+            return None
@@ -0,0 +1,260 @@
+import re
+import logging
+from datetime import datetime
+from functools import lru_cache
+
+import config
+
+logger = logging.getLogger(__name__)
+
+# Định dạng đầu ra chuẩn của toàn bộ hệ thống
+OUTPUT_FORMAT = "%d/%m/%Y"
+
+# Các trường ngày của N8nTrackingInfo
+DATE_FIELDS = ("Etd", "Atd", "Eta", "Ata", "EtdTransit", "AtdTransit", "EtaTransit", "AtaTransit")
+
+# Giá trị đặc biệt cho on_error / on_invalid: trả về nguyên chuỗi đầu vào
+ORIGINAL = object()
+
+_MONTHS_ABBR = ("jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec")
+_MONTHS_FULL = ("january", "february", "march", "april", "may", "june", "july",
+                "august", "september", "october", "november", "december")
+_WEEKDAYS_ABBR = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+_WEEKDAYS_FULL = ("monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday")
+
+# Directive strptime -> (tên group, regex độ dài linh hoạt, regex độ dài cố định khi đứng liền directive khác)
+_DIRECTIVES = {
+    "Y": ("year", r"\d{4}", r"\d{4}"),
+    "m": ("month", r"\d{1,2}", r"\d{2}"),
+    "d": ("day", r"\d{1,2}", r"\d{2}"),
+    "H": ("hour", r"\d{1,2}", r"\d{2}"),
+    "I": ("hour12", r"\d{1,2}", r"\d{2}"),
+    "M": ("minute", r"\d{1,2}", r"\d{2}"),
+    "S": ("second", r"\d{1,2}", r"\d{2}"),
+    "p": ("ampm", r"am|pm", r"am|pm"),
+    "b": ("month_abbr", "|".join(_MONTHS_ABBR), "|".join(_MONTHS_ABBR)),
+    "B": ("month_full", "|".join(_MONTHS_FULL), "|".join(_MONTHS_FULL)),
+    "a": (None, "|".join(_WEEKDAYS_ABBR), "|".join(_WEEKDAYS_ABBR)),
+    "A": (None, "|".join(_WEEKDAYS_FULL), "|".join(_WEEKDAYS_FULL)),
+}
+
+
+def compile_format(fmt):
+    """
+    Biên dịch một chuỗi định dạng kiểu strptime (vd: '%d-%b-%Y %H:%M') thành regex.
+    Giống strptime: khoảng trắng khớp với một hoặc nhiều khoảng trắng, tên tháng không phân biệt hoa thường.
+    Directive số đứng liền nhau (vd: '%Y%m%d') được khớp với độ dài cố định.
+    """
+    parts = []
+    prev_directive = False
+    i = 0
+    while i < len(fmt):
+        char = fmt[i]
+        if char == "%" and i + 1 < len(fmt):
+            code = fmt[i + 1]
+            if code == "%":
+                parts.append("%")
+                prev_directive = False
+            else:
+                if code not in _DIRECTIVES:
+                    raise ValueError(f"Directive không được hỗ trợ: %{code}")
+                group, loose, fixed = _DIRECTIVES[code]
+                next_is_directive = fmt[i + 2:i + 3] == "%" and fmt[i + 3:i + 4] != "%"
+                pattern = fixed if (prev_directive or next_is_directive) else loose
+                parts.append(f"(?P<{group}>{pattern})" if group else f"(?:{pattern})")
+                prev_directive = True
+            i += 2
+            continue
+        parts.append(r"\s+" if char.isspace() else re.escape(char))
+        prev_directive = False
+        i += 1
+    return "".join(parts)
+
+
+class DateSpec:
+    """
+    Đặc tả định dạng ngày của một hãng tàu.
+
+    Args:
+        formats (tuple): Các định dạng kiểu strptime, thử theo thứ tự. Một phần tử có thể là cặp
+            (định dạng, suffix) khi phần bỏ qua phía sau khác nhau giữa các định dạng.
+        prefix (str): Regex cho phần bỏ qua phía trước ngày (vd: tiền tố 'ETD:', dấu '*').
+        suffix (str): Regex cho phần bỏ qua phía sau ngày (vd: phần giờ, timezone).
+        on_error: Giá trị trả về khi chuỗi không khớp định dạng nào (ORIGINAL = chuỗi gốc).
+        on_invalid: Giá trị trả về khi đầu vào rỗng/không phải chuỗi.
+        keep_input (bool): Trả nguyên chuỗi đầu vào khi hợp lệ thay vì định dạng lại (hãng đã trả 'DD/MM/YYYY').
+    """
+    def __init__(self, formats, prefix="", suffix="", on_error="", on_invalid="", keep_input=False):
+        self.formats = tuple(formats)
+        self.prefix = prefix
+        self.suffix = suffix
+        self.on_error = on_error
+        self.on_invalid = on_invalid
+        self.keep_input = keep_input
+        # Mỗi định dạng được biên dịch thành một regex riêng (tên group trùng nhau giữa các định dạng)
+        self._patterns = []
+        for fmt in self.formats:
+            fmt, fmt_suffix = fmt if isinstance(fmt, tuple) else (fmt, suffix)
+            self._patterns.append(
+                re.compile(f"(?:{prefix})(?:{compile_format(fmt)})(?:{fmt_suffix})", re.IGNORECASE)
+            )
+
+    def parse(self, date_str):
+        # Trả về datetime hoặc None nếu không khớp/không hợp lệ
+        for pattern in self._patterns:
+            match = pattern.fullmatch(date_str)
+            if match:
+                dt_obj = _build_datetime(match.groupdict())
+                if dt_obj is not None:
+                    return dt_obj
+        return None
+
+
+class IsoDateSpec(DateSpec):
+    """Đặc tả cho hãng trả ngày ISO 8601: dùng datetime.fromisoformat (chấp nhận 'YYYYMMDD', múi giờ, 'Z'...)."""
+    def __init__(self, on_error="", on_invalid=""):
+        super().__init__((), on_error=on_error, on_invalid=on_invalid)
+
+    def parse(self, date_str):
+        try:
+            return datetime.fromisoformat(date_str.replace("Z", "+00:00"))
+        except ValueError:
+            return None
+
+
+def _build_datetime(groups):
+    try:
+        if groups.get("month") is not None:
+            month = int(groups["month"])
+        elif groups.get("month_abbr") is not None:
+            month = _MONTHS_ABBR.index(groups["month_abbr"].lower()) + 1
+        else:
+            month = _MONTHS_FULL.index(groups["month_full"].lower()) + 1
+
+        if groups.get("hour12") is not None:
+            hour = int(groups["hour12"])
+            if not 1 <= hour <= 12:
+                return None
+            hour = hour % 12 + (12 if (groups.get("ampm") or "").lower() == "pm" else 0)
+        else:
+            hour = int(groups.get("hour") or 0)
+
+        return datetime(int(groups["year"]), month, int(groups["day"]), hour,
+                        int(groups.get("minute") or 0), int(groups.get("second") or 0))
+    except (ValueError, TypeError, KeyError):
+        return None
+
+
+# Các phần thường gặp
+_TIME_TAIL = r"(?:\s.*)?"       # bỏ qua phần giờ sau khoảng trắng: 'YYYY-MM-DD HH:MM:SS'
+_ISO_TAIL = r"(?:T.*)?"         # bỏ qua phần giờ ISO: 'YYYY-MM-DDTHH:MM:SS.sssZ'
+
+# Đặc tả định dạng ngày theo mã hãng tàu (key trong scrapers.SCRAPERS)
+CARRIER_SPECS = {
+    "IAL": DateSpec(("%Y/%m/%d",), suffix=_TIME_TAIL, on_error=ORIGINAL, on_invalid=None),
+    "Tailwind": DateSpec(("%d-%b-%Y %H:%M", "%d/%m/%Y %I:%M %p"),
+                         prefix=r"\s*(?:ET[DA]:)?\s*", suffix=r"\s*", on_error=ORIGINAL, on_invalid=None),
+    "COSCO": DateSpec(("%Y-%m-%d",), suffix=_TIME_TAIL, on_error=ORIGINAL, on_invalid=None),
+    "EMC": DateSpec(("%b-%d-%Y",), prefix=r"\s*", suffix=r"\s*", on_error=ORIGINAL, on_invalid=None),
+    "MSK": DateSpec(("%d %b %Y %H:%M", "%d %b %Y"),
+                    prefix=r"\s*", suffix=r"\s*(?:\(.*)?", on_error=ORIGINAL, on_invalid=None),
+    # strptime('%d') chấp nhận một dấu cách trước ngày một chữ số (' 5/10/2025')
+    "MSC": DateSpec(("%d/%m/%Y",), prefix=r"(?: (?=[1-9]/))?", keep_input=True),
+    "CSL": DateSpec(("%d/%m/%Y",), suffix=_TIME_TAIL),
+    "PIL": DateSpec(("%d-%b-%Y %H:%M:%S", "%d-%b-%Y"), prefix=r"[\s*]*", suffix=r"\s*", on_error=ORIGINAL),
+    "SNK": DateSpec(("%Y-%m-%d",), suffix=_TIME_TAIL),
+    "HEUNG-A": DateSpec(("%Y-%m-%d",), suffix=_TIME_TAIL),
+    "UNIFEEDER": DateSpec(("%Y-%m-%d",), suffix=_ISO_TAIL),
+    "KMTC": DateSpec(("%Y%m%d",), suffix=r".*"),
+    "SITC": DateSpec(("%Y-%m-%d",), suffix=_TIME_TAIL),
+    "GOLSTAR": DateSpec(("%Y-%m-%d",), suffix=_ISO_TAIL),
+    "YML": DateSpec(("%Y/%m/%d",), suffix=_TIME_TAIL),
+    "ONE": DateSpec(("%Y-%m-%d",), suffix=_ISO_TAIL),
+    "OSL": DateSpec(("%d-%b-%Y",), prefix=r"[^,]*, ", suffix=r"(?:, .*)?"),
+    "PAN": DateSpec(("%Y%m%d",), suffix=r".*"),
+    # 'Month DD, YYYY' không có phần sau; 'YYYY-MM-DD' bỏ qua phần sau dấu cách (giờ của bảng container)
+    "SEALEAD": DateSpec((("%B %d, %Y", r"\s*"), ("%Y-%m-%d", r"(?: [\s\S]*)?\s*")), prefix=r"\s*"),
+    "TRANSLINER": DateSpec(("%Y-%m-%d",), suffix=_ISO_TAIL),
+    "ZIM": IsoDateSpec(),
+}
+
+
+def get_spec(carrier):
+    spec = CARRIER_SPECS.get(carrier)
+    if spec is None:
+        raise ValueError(f"Không có đặc tả định dạng ngày cho hãng '{carrier}'.")
+    return spec
+
+
+@lru_cache(maxsize=config.DATE_NORMALIZER_CACHE_SIZE)
+def _parse_cached(carrier, date_str):
+    # Kết quả (datetime hoặc None) được nhớ theo (hãng, chuỗi): cùng một chuỗi ngày
+    # thường lặp lại nhiều lần trong timeline của một lô hàng và giữa các lần tra cứu.
+    dt_obj = get_spec(carrier).parse(date_str)
+    if dt_obj is None:
+        logger.warning("[%s] Không thể phân tích định dạng ngày: %s", carrier, date_str)
+    return dt_obj
+
+
+def parse_datetime(carrier, date_str):
+    """Chuyển chuỗi ngày của hãng tàu thành datetime. Trả về None nếu không hợp lệ."""
+    if not date_str or not isinstance(date_str, str):
+        return None
+    return _parse_cached(carrier, date_str)
+
+
+def parse_date(carrier, date_str):
+    """Chuyển chuỗi ngày của hãng tàu thành date (dùng để so sánh). Trả về None nếu không hợp lệ."""
+    dt_obj = parse_datetime(carrier, date_str)
+    return dt_obj.date() if dt_obj is not None else None
+
+
+def format_date(carrier, date_str):
+    """
+    Chuẩn hóa chuỗi ngày của hãng tàu sang 'DD/MM/YYYY'.
+    Khi lỗi, giá trị trả về tùy theo đặc tả của hãng (chuỗi rỗng, None hoặc chuỗi gốc).
+    """
+    spec = get_spec(carrier)
+    if not date_str or not isinstance(date_str, str):
+        return date_str if spec.on_invalid is ORIGINAL else spec.on_invalid
+    dt_obj = _parse_cached(carrier, date_str)
+    if dt_obj is None:
+        return date_str if spec.on_error is ORIGINAL else spec.on_error
+    if spec.keep_input:
+        return date_str
+    # Tương đương strftime(OUTPUT_FORMAT) nhưng nhanh hơn
+    return f"{dt_obj.day:02d}/{dt_obj.month:02d}/{dt_obj.year:04d}"
+
+
+def format_dates(carrier, values):
+    """Chuẩn hóa một danh sách chuỗi ngày trong một lượt, giữ nguyên thứ tự."""
+    return [format_date(carrier, value) for value in values]
+
+
+def normalize_shipment_dates(carrier, shipment, fields=DATE_FIELDS):
+    """
+    Chuẩn hóa toàn bộ các trường ngày của một lô hàng trong một lượt.
+
+    Args:
+        carrier (str): Mã hãng tàu.
+        shipment (dict | N8nTrackingInfo): Dữ liệu lô hàng với giá trị ngày thô.
+        fields (tuple): Các trường ngày cần chuẩn hóa.
+
+    Returns:
+        dict: Bản sao dữ liệu với các trường ngày ở dạng 'DD/MM/YYYY' ("" nếu không có/không hợp lệ).
+    """
+    data = dict(shipment) if isinstance(shipment, dict) else shipment.model_dump()
+    for field in fields:
+        if field in data:
+            data[field] = format_date(carrier, data[field]) or ""
+    return data
+
+
+def cache_info():
+    """Thống kê cache của bộ chuẩn hóa ngày (hits, misses, maxsize, currsize)."""
+    return _parse_cached.cache_info()._asdict()
+
+
+def cache_clear():
+    """Xóa cache của bộ chuẩn hóa ngày (vd: để benchmark đo thời gian khi cache trống)."""
+    _parse_cached.cache_clear()
@@ -0,0 +1,110 @@
+import json
+import time
+import logging
+
+from selenium.webdriver.common.by import By
+from selenium.common.exceptions import WebDriverException
+
+import config
+
+logger = logging.getLogger(__name__)
+
+
+class DomSpec:
+    """
+    Đặc tả các giá trị cần đọc từ trang đang mở trong WebDriver (Selenium).
+
+    Args:
+        name (str): Tên spec (dùng trong log).
+        fields (dict): {tên trường: XPath}. Giá trị là text (đã strip) của node đầu tiên khớp, None nếu không có.
+                       XPath đặt trong list ([xpath]) -> lấy text của mọi node khớp.
+        tables (dict): {tên bảng: (XPath các hàng, {tên cột: XPath tương đối so với hàng})}.
+                       Kết quả là list các dict {tên cột: giá trị}, cột khai báo giống fields.
+    XPath phải trỏ tới phần tử (không dùng @attr/text()) để hai chế độ đọc cho cùng kết quả.
+    """
+    def __init__(self, name, fields=None, tables=None):
+        self.name = name
+        self.fields = fields or {}
+        self.tables = tables or {}
+
+    def to_json(self):
+        return {
+            "fields": self.fields,
+            "tables": {name: {"rows": rows, "columns": columns} for name, (rows, columns) in self.tables.items()},
+        }
+
+
+# Đánh giá toàn bộ spec trong trình duyệt và trả về một chuỗi JSON: chỉ một round-trip WebDriver
+_SNAPSHOT_SCRIPT = """
+const spec = arguments[0];
+const all = (xpath, context) => {
+    const result = document.evaluate(xpath, context, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+    const nodes = [];
+    for (let i = 0; i < result.snapshotLength; i++) nodes.push(result.snapshotItem(i));
+    return nodes;
+};
+const text = (node) => {
+    if (node == null) return null;
+    const value = node.innerText !== undefined ? node.innerText : node.textContent;
+    return (value || "").trim();
+};
+const read = (xpath, context) => {
+    if (Array.isArray(xpath)) return all(xpath[0], context).map(text);
+    return text(document.evaluate(xpath, context, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue);
+};
+const snapshot = {};
+for (const [name, xpath] of Object.entries(spec.fields)) snapshot[name] = read(xpath, document);
+for (const [name, table] of Object.entries(spec.tables)) {
+    snapshot[name] = all(table.rows, document).map((row) => {
+        const values = {};
+        for (const [column, xpath] of Object.entries(table.columns)) values[column] = read(xpath, row);
+        return values;
+    });
+}
+return JSON.stringify(snapshot);
+"""
+
+
+def _read_with_elements(context, xpath):
+    # Chế độ cũ: mỗi XPath là một (hoặc nhiều) round-trip find_elements / .text
+    if isinstance(xpath, (list, tuple)):
+        return [element.text.strip() for element in context.find_elements(By.XPATH, xpath[0])]
+    elements = context.find_elements(By.XPATH, xpath)
+    return elements[0].text.strip() if elements else None
+
+
+def _snapshot_with_elements(driver, spec):
+    snapshot = {name: _read_with_elements(driver, xpath) for name, xpath in spec.fields.items()}
+    for name, (rows, columns) in spec.tables.items():
+        snapshot[name] = [
+            {column: _read_with_elements(row, xpath) for column, xpath in columns.items()}
+            for row in driver.find_elements(By.XPATH, rows)
+        ]
+    return snapshot
+
+
+def snapshot(driver, spec, log_prefix=""):
+    """
+    Đọc toàn bộ trường/bảng của spec từ trang (hoặc iframe) hiện tại của driver.
+
+    Mặc định chạy một execute_script duy nhất trả về JSON rồi xử lý trong Python;
+    nếu SELENIUM_JS_EXTRACTION_ENABLED tắt hoặc script lỗi thì đọc lần lượt bằng find_elements.
+
+    Returns:
+        dict: {tên trường: str | list | None, tên bảng: [dict, ...]}
+    """
+    t_start = time.time()
+    if config.SELENIUM_JS_EXTRACTION_ENABLED:
+        try:
+            result = json.loads(driver.execute_script(_SNAPSHOT_SCRIPT, spec.to_json()))
+            logger.info("%s -> (Thời gian) Đọc DOM '%s' bằng JavaScript: %.3fs",
+                        log_prefix, spec.name, time.time() - t_start)
+            return result
+        except (WebDriverException, TypeError, ValueError) as e:
+            logger.warning("%s -> Không đọc được DOM '%s' bằng JavaScript (%s), chuyển sang find_elements.",
+                           log_prefix, spec.name, e)
+            t_start = time.time()
+    result = _snapshot_with_elements(driver, spec)
+    logger.info("%s -> (Thời gian) Đọc DOM '%s' bằng find_elements: %.3fs",
+                log_prefix, spec.name, time.time() - t_start)
+    return result
@@ -0,0 +1,72 @@
+import logging
+
+from . import extraction
+from .extraction_specs import EBIZ_BL_DETAIL
+
+logger = logging.getLogger(__name__)
+
+
+def extract_bl_detail_response(response, log_prefix="[Ebiz]"):
+    """
+    Như extract_bl_detail nhưng đọc trực tiếp từ response (nên gửi request với stream=True):
+    ngừng tải trang ngay khi '#divSchedule' và '#divDetailInfo' đã đóng.
+    """
+    document = extraction.read_document(EBIZ_BL_DETAIL, response, log_prefix)
+    return extract_bl_detail(document, log_prefix=log_prefix)
+
+
+def extract_bl_detail(content, encoding=None, log_prefix="[Ebiz]"):
+    """
+    Trích xuất dữ liệu thô từ trang BL Detail của cổng ebiz theo spec EBIZ_BL_DETAIL.
+    Chỉ duyệt trong '#divSchedule' và '#divDetailInfo' (và label của thông tin chung).
+    content: HTML dạng bytes/str hoặc cây lxml đã parse.
+
+    Returns:
+        dict: {
+            "found": bool,              # Có panel '#divSchedule' hay không
+            "error_message": str,       # Nội dung '#e-alert-message' khi trang báo lỗi
+            "bl_no", "booking_status",
+            "etd_raw", "eta_raw",       # Text ô POL/POD (gồm vị trí và ngày giờ)
+            "pol_terminal", "pod_terminal",
+            "events": [{"description", "location", "date"}, ...]
+        }
+    """
+    if isinstance(content, (bytes, str)):
+        content = extraction.parse_html(content, encoding)
+    page = extraction.extract(EBIZ_BL_DETAIL, content)
+    rows = page.pop("rows")
+    if not page["found"]:
+        page["events"] = []
+        return page
+    page["error_message"] = ""
+    page["events"] = _group_events(rows, log_prefix)
+    return page
+
+
+def _group_events(rows, log_prefix):
+    # Gom các hàng của bảng Cargo Tracking thành sự kiện theo nhóm (hàng tiêu đề th.firstTh)
+    events = []
+    if not rows:
+        logger.warning("%s --> Không tìm thấy tbody của bảng lịch sử sự kiện.", log_prefix)
+        return events
+    logger.info("%s --> Tìm thấy %d hàng trong bảng lịch sử sự kiện.", log_prefix, len(rows))
+
+    current_event_group = ""
+    for row in rows:
+        if row["group"] is not None:
+            current_event_group = row["group"]
+            continue
+        cells = row["cells"]
+        if len(cells) < 3:
+            continue
+        # Nhóm sự kiện container: (Container No, Location, Date); nhóm tàu: (Vessel/Voyage, Location, Date)
+        first_col, location, date_text = cells[:3]
+        if date_text:
+            events.append({
+                "description": f"{current_event_group}: {first_col}",
+                "location": location,
+                "date": date_text,
+            })
+
+    logger.info("%s --> Trích xuất được %d sự kiện từ lịch sử.", log_prefix, len(events))
+    return events
@@ -0,0 +1,352 @@
+import re
+import logging
+import threading
+from functools import lru_cache
+
+from lxml import etree, html
+
+import config
+
+logger = logging.getLogger(__name__)
+
+
+def has_class(name):
+    """Điều kiện XPath tương đương CSS '.name' (dùng khi viết spec)."""
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+@lru_cache(maxsize=512)
+def compile_xpath(expression):
+    # XPath được biên dịch một lần và dùng lại giữa các request
+    return etree.XPath(expression, regexp=False, smart_strings=False)
+
+
+_TEXT_NODES = compile_xpath(".//text()")
+
+
+def _text_nodes(node):
+    # Các text node bên dưới một phần tử (bỏ qua comment). Kết quả XPath dạng chuỗi (vd: @class) giữ nguyên.
+    if node is None:
+        return []
+    if isinstance(node, str):
+        return [node]
+    return _TEXT_NODES(node)
+
+
+# --- Post-processor theo tên: 'tên' hoặc 'tên:tham_số', có thể xâu chuỗi trong một tuple ---
+
+def _pp_text(value, _arg):
+    # Tương đương ' '.join(element.stripped_strings) của BeautifulSoup
+    return " ".join(t.strip() for t in _text_nodes(value) if t.strip())
+
+
+def _pp_compact(value, _arg):
+    # Tương đương element.get_text(strip=True) của BeautifulSoup
+    return "".join(t.strip() for t in _text_nodes(value))
+
+
+def _pp_text_content(value, _arg):
+    # Tương đương element.text.strip() của BeautifulSoup
+    return "".join(_text_nodes(value)).strip()
+
+
+def _pp_lines(value, _arg):
+    # Tương đương các dòng khác rỗng của element.get_text(separator='\n')
+    return [line.strip() for line in "\n".join(_text_nodes(value)).split("\n") if line.strip()]
+
+
+def _pp_index(value, arg):
+    index = int(arg)
+    try:
+        return value[index]
+    except (IndexError, TypeError):
+        return ""
+
+
+def _pp_split_first(value, arg):
+    # Phần trước ký tự phân cách đầu tiên (mặc định ','), đã strip
+    return value.split(arg or ",")[0].strip() if value else ""
+
+
+def _pp_strip_prefix(value, arg):
+    return value.replace(arg, "", 1).strip() if value else ""
+
+
+def _pp_unique(value, _arg):
+    result = []
+    for item in value or []:
+        if item and item not in result:
+            result.append(item)
+    return result
+
+
+POST_PROCESSORS = {
+    "raw": lambda value, _arg: value,
+    "text": _pp_text,
+    "compact": _pp_compact,
+    "text_content": _pp_text_content,
+    "lines": _pp_lines,
+    "first": lambda value, _arg: _pp_index(value, 0),
+    "last": lambda value, _arg: _pp_index(value, -1),
+    "index": _pp_index,
+    "split_first": _pp_split_first,
+    "strip_prefix": _pp_strip_prefix,
+    "unique": _pp_unique,
+    "exists": lambda value, _arg: bool(value) if isinstance(value, (str, list)) else value is not None,
+}
+
+
+def register_post_processor(name, func):
+    """Đăng ký post-processor mới: func(value, arg) -> value."""
+    POST_PROCESSORS[name] = func
+
+
+def _compile_post(post):
+    # Chuyển khai báo post-processor thành danh sách (hàm, tham số)
+    steps = post if isinstance(post, (tuple, list)) else (post,)
+    compiled = []
+    for step in steps:
+        if callable(step):
+            compiled.append((lambda value, _arg, func=step: func(value), None))
+            continue
+        name, _, arg = step.partition(":")
+        if name not in POST_PROCESSORS:
+            raise ValueError(f"Post-processor không tồn tại: '{name}'")
+        compiled.append((POST_PROCESSORS[name], arg or None))
+    return compiled
+
+
+def _apply_post(steps, value):
+    for func, arg in steps:
+        value = func(value, arg)
+    return value
+
+
+class Field:
+    """
+    Khai báo một trường cần trích xuất.
+
+    Args:
+        xpath (str): Biểu thức XPath, tính tương đối so với scope (hoặc cả tài liệu).
+        post (str | tuple): Post-processor theo tên (vd: 'text', ('lines', 'last')).
+                            Với many=False, post áp dụng cho node đầu tiên; many=True áp dụng cho từng node.
+        many (bool): Lấy tất cả node khớp (list) thay vì node đầu tiên.
+        scope (str): Tên scope (khai báo trong ExtractionSpec.scopes) làm gốc cho XPath.
+        default: Giá trị khi không tìm thấy node (hoặc scope không tồn tại).
+        post_all (str | tuple): Post-processor áp dụng cho cả list (chỉ dùng với many=True).
+    """
+    def __init__(self, xpath, post="text", many=False, scope=None, default="", post_all=None):
+        self.xpath = xpath
+        self.post = post
+        self.many = many
+        self.scope = scope
+        self.default = default
+        self.post_all = post_all
+
+
+class Table:
+    """
+    Khai báo một bảng: mỗi node khớp `rows` là một hàng, các cột là Field tính tương đối so với hàng.
+    Kết quả là list các dict {tên cột: giá trị}.
+    """
+    def __init__(self, rows, columns, scope=None):
+        self.rows = rows
+        self.columns = columns
+        self.scope = scope
+
+
+class ExtractionSpec:
+    """
+    Đặc tả trích xuất của một trang: scope (vùng con của tài liệu) và các trường.
+
+    Args:
+        name (str): Tên spec (dùng trong log).
+        fields (dict): {tên trường: Field | Table}.
+        scopes (dict): {tên scope: XPath tuyệt đối}. Mỗi scope chỉ được tìm một lần cho mỗi tài liệu.
+        stop_after (tuple): Các section ('#id', 'tag#id', 'tag.class', ...) chứa toàn bộ dữ liệu cần lấy.
+                            Khi đọc response theo luồng, ngừng đọc ngay khi mọi section này đã đóng.
+    """
+    def __init__(self, name, fields, scopes=None, stop_after=()):
+        self.name = name
+        self.fields = fields
+        self.scopes = scopes or {}
+        self.stop_after = tuple(stop_after)
+        self._compiled = None
+
+
+class _CompiledField:
+    def __init__(self, field):
+        self.xpath = compile_xpath(field.xpath)
+        self.post = _compile_post(field.post)
+        self.post_all = _compile_post(field.post_all) if field.post_all else None
+        self.many = field.many
+        self.scope = field.scope
+        self.default = field.default
+
+    def evaluate(self, root):
+        if root is None:
+            return self.default
+        nodes = self.xpath(root)
+        if self.many:
+            values = [_apply_post(self.post, node) for node in nodes]
+            return _apply_post(self.post_all, values) if self.post_all else values
+        if not nodes:
+            return self.default
+        return _apply_post(self.post, nodes[0])
+
+
+class _CompiledTable:
+    def __init__(self, table):
+        self.rows = compile_xpath(table.rows)
+        self.columns = {name: _CompiledField(column) for name, column in table.columns.items()}
+        self.scope = table.scope
+
+    def evaluate(self, root):
+        if root is None:
+            return []
+        return [{name: column.evaluate(row) for name, column in self.columns.items()} for row in self.rows(root)]
+
+
+class CompiledExtractor:
+    """Spec đã biên dịch: toàn bộ XPath và post-processor được chuẩn bị sẵn, dùng lại cho mọi request."""
+    def __init__(self, spec):
+        self.name = spec.name
+        self.scopes = {name: compile_xpath(xpath) for name, xpath in spec.scopes.items()}
+        self.fields = {
+            name: _CompiledTable(field) if isinstance(field, Table) else _CompiledField(field)
+            for name, field in spec.fields.items()
+        }
+
+    def extract(self, document):
+        """
+        Tính toàn bộ các trường của spec trên một cây đã parse (hoặc HTML dạng bytes/str).
+        Mỗi scope được định vị một lần; các trường thuộc scope chỉ duyệt trong cây con đó.
+        """
+        if isinstance(document, (bytes, str)):
+            document = parse_html(document)
+        roots = {}
+        for name, xpath in self.scopes.items():
+            found = xpath(document)
+            roots[name] = found[0] if found else None
+        return {
+            name: field.evaluate(roots[field.scope] if field.scope else document)
+            for name, field in self.fields.items()
+        }
+
+
+_compile_lock = threading.Lock()
+
+
+def get_extractor(spec):
+    """Lấy (hoặc biên dịch lần đầu) extractor của một spec; bản biên dịch được giữ trên chính spec."""
+    extractor = spec._compiled
+    if extractor is None:
+        with _compile_lock:
+            if spec._compiled is None:
+                spec._compiled = CompiledExtractor(spec)
+                logger.debug("Đã biên dịch extraction spec '%s' (%d trường)", spec.name, len(spec.fields))
+            extractor = spec._compiled
+    return extractor
+
+
+def extract(spec, document):
+    """Trích xuất dữ liệu theo spec. document: cây lxml hoặc HTML dạng bytes/str."""
+    return get_extractor(spec).extract(document)
+
+
+def parse_html(content, encoding=None):
+    """Parse HTML (ưu tiên bytes để lxml tự giải mã). encoding: charset từ header nếu có."""
+    if isinstance(content, str):
+        # lxml không nhận str có khai báo encoding -> bỏ khai báo trong thẻ <?xml ...?>
+        content = re.sub(r"^\s*<\?xml[^>]*\?>", "", content)
+        return html.document_fromstring(content)
+    parser = html.HTMLParser(encoding=encoding) if encoding else None
+    return html.document_fromstring(content, parser=parser)
+
+
+_SECTION_SELECTOR = re.compile(r"([\w-]*)(?:#([\w-]+))?(?:\.([\w-]+))?")
+
+
+def _compile_section(selector):
+    # Selector đơn giản cho section: 'tag', '#id', '.class', 'tag#id', 'tag.class', 'tag#id.class'
+    match = _SECTION_SELECTOR.fullmatch(selector.strip())
+    if not match or not any(match.groups()):
+        raise ValueError(f"Selector section không hợp lệ: '{selector}'")
+    tag, element_id, class_name = match.groups()
+
+    def matches(element):
+        # Comment/processing instruction có tag không phải chuỗi -> không khớp tag nào (cũng không có id/class)
+        if tag and element.tag != tag:
+            return False
+        if element_id and element.get("id") != element_id:
+            return False
+        if class_name and class_name not in (element.get("class") or "").split():
+            return False
+        return True
+    return matches
+
+
+def parse_html_stream(response, stop_after, encoding=None, chunk_size=None):
+    """
+    Parse HTML theo luồng từ response (nên gửi request với stream=True): từng chunk được đưa
+    vào HTMLPullParser và ngừng đọc socket ngay khi mọi section trong `stop_after` đã đóng.
+    Phần còn lại của trang (footer, script...) không được tải cũng không được parse.
+
+    Returns:
+        tuple: (cây lxml của phần đã đọc, số byte đã đọc, đã dừng sớm hay không)
+    """
+    pending = [_compile_section(selector) for selector in stop_after]
+    parser = etree.HTMLPullParser(events=("end",), encoding=encoding)
+    bytes_read = 0
+    stopped_early = False
+    try:
+        for chunk in response.iter_content(chunk_size or config.HTML_STREAM_CHUNK_SIZE):
+            bytes_read += len(chunk)
+            parser.feed(chunk)
+            for _event, element in parser.read_events():
+                for matches in pending:
+                    if matches(element):
+                        pending.remove(matches)
+                        break
+            if not pending:
+                stopped_early = True
+                break
+    finally:
+        # Đóng kết nối: phần chưa đọc của body bị bỏ qua
+        response.close()
+    if not bytes_read:
+        raise etree.ParserError("Document is empty")
+    return parser.close(), bytes_read, stopped_early
+
+
+def read_document(spec, response, log_prefix=""):
+    """
+    Parse response HTML cho spec: đọc theo luồng nếu spec khai báo `stop_after`
+    (và HTML_STREAMING_ENABLED bật), ngược lại parse toàn bộ response.content.
+    """
+    encoding = response_charset(response)
+    if not (spec.stop_after and config.HTML_STREAMING_ENABLED):
+        return parse_html(response.content, encoding)
+    document, bytes_read, stopped_early = parse_html_stream(response, spec.stop_after, encoding)
+    if stopped_early:
+        logger.info("%s -> Dừng đọc response sau %d bytes (đã có đủ section của spec '%s').",
+                    log_prefix, bytes_read, spec.name)
+    else:
+        logger.debug("%s -> Đọc hết response (%d bytes), không thấy đủ section của spec '%s'.",
+                     log_prefix, bytes_read, spec.name)
+    return document
+
+
+def extract_response(spec, response, log_prefix=""):
+    """Trích xuất dữ liệu theo spec trực tiếp từ response (xem read_document)."""
+    return extract(spec, read_document(spec, response, log_prefix))
+
+
+def response_charset(response):
+    # Chỉ dùng charset khai báo trong header; nếu không có để lxml tự nhận từ thẻ <meta>
+    content_type = response.headers.get("Content-Type", "")
+    for part in content_type.split(";"):
+        key, _, value = part.strip().partition("=")
+        if key.lower() == "charset" and value:
+            return value.strip('"\'')
+    return None
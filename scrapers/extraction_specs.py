@@ -0,0 +1,118 @@
+"""
+Đặc tả trích xuất (trường -> XPath -> post-processor) cho các hãng tàu trả về HTML.
+Khi layout trang thay đổi, chỉ cần sửa XPath/post-processor tại đây.
+"""
+from .extraction import ExtractionSpec, Field, Table, has_class
+
+
+# --- Cổng ebiz (Sinokor, Heung-A): trang BL Detail ---
+# '#divSchedule li.col-sm-8 .col-sm-6:nth-child(n)': ô POL (n=1) và POD (n=2)
+_EBIZ_SCHEDULE_CELL = (
+    f"//*[@id='divSchedule']//li[{has_class('col-sm-8')}]"
+    f"//*[{has_class('col-sm-6')}][count(preceding-sibling::*) = %d]"
+)
+_EBIZ_LABELED_VALUE = (
+    "(//label[contains(text(), '%s')])[1]"
+    f"/ancestor::div[{has_class('form-group')}][1]/following-sibling::div[1]/descendant::span[1]"
+)
+
+EBIZ_BL_DETAIL = ExtractionSpec(
+    name="ebiz_bl_detail",
+    scopes={
+        "schedule": "//*[@id='divSchedule']",
+        "pol_cell": _EBIZ_SCHEDULE_CELL % 0,
+        "pod_cell": _EBIZ_SCHEDULE_CELL % 1,
+        "tracking": f"//*[@id='divDetailInfo']//*[{has_class('splitTable')}]//table//tbody",
+    },
+    # Thông tin chung (label B/L No., B/K Status) nằm trước hai panel này
+    stop_after=("#divSchedule", "#divDetailInfo"),
+    fields={
+        "found": Field("self::*", post="exists", scope="schedule", default=False),
+        "error_message": Field("//*[@id='e-alert-message']", post="compact"),
+        "bl_no": Field(_EBIZ_LABELED_VALUE % "B/L No."),
+        "booking_status": Field(_EBIZ_LABELED_VALUE % "B/K Status"),
+        "etd_raw": Field("self::*", scope="pol_cell"),
+        "eta_raw": Field("self::*", scope="pod_cell"),
+        "pol_terminal": Field(".//a", scope="pol_cell"),
+        "pod_terminal": Field(".//span[not(@class)]", scope="pod_cell"),
+        # Hàng tiêu đề nhóm (th.firstTh) hoặc hàng dữ liệu (Vessel/Container, Location, Date)
+        "rows": Table("./tr", scope="tracking", columns={
+            "group": Field(f".//th[{has_class('firstTh')}]", post="compact", default=None),
+            "cells": Field("./td", post="compact", many=True),
+        }),
+    },
+)
+
+
+# --- SeaLead: trang kết quả tìm kiếm B/L ---
+_SEALEAD_MAIN = f"//div[{has_class('single-container-main')}]"
+
+SEALEAD_RESULT = ExtractionSpec(
+    name="sealead_result",
+    scopes={
+        "info_table": f"//div[@id='custom-table-track']//table[{has_class('route-table-bill')}]",
+        "schedule_table": f"{_SEALEAD_MAIN}//div[@id='custom-table-track-full']//table[{has_class('route-table')}]",
+        # Bảng chi tiết container: bảng route-table (không phải bảng đầu tiên) có cột 'Container No.'
+        "container_table": f"({_SEALEAD_MAIN}//table[{has_class('route-table')}])"
+                           "[position() > 1][.//th[contains(text(), 'Container No.')]]",
+    },
+    # Header B/L nằm trước các bảng; bảng lịch trình và bảng container nằm trong div.single-container-main
+    stop_after=("div#custom-table-track", "div.single-container-main"),
+    fields={
+        "bl_header": Field("//h4[contains(text(), 'Bill of lading number:')]", post="exists", default=False),
+        "bl_number": Field("//h4[contains(text(), 'Bill of lading number')]",
+                           post=("compact", "strip_prefix:Bill of lading number:")),
+        "search_form": Field("//form//input[@id='bl_number']", post="exists", default=False),
+        "error_message": Field(f"//*[{has_class('error-message-class')}]", post="compact"),
+        "pol": Field("(.//th[normalize-space(.) = 'Port of Loading'])[1]/following-sibling::td[1]", scope="info_table"),
+        "pod": Field("(.//th[normalize-space(.) = 'Port of Discharge'])[1]/following-sibling::td[1]", scope="info_table"),
+        "has_schedule": Field("self::*", post="exists", scope="schedule_table", default=False),
+        # Mỗi hàng lịch trình: danh sách text các ô (cột 5: Origin, 6: ETD, 7: Destination, 8: ETA)
+        "schedule_rows": Table(".//tr", scope="schedule_table", columns={
+            "cells": Field("./td", many=True),
+        }),
+        # Cột 5 của hàng container đầu tiên: Latest Move Time
+        "container_cells": Field("(.//tbody//tr)[1]/td", many=True, scope="container_table", default=[]),
+    },
+)
+
+
+# --- PIL: HTML tóm tắt (API TrackTraceJob) ---
+_PIL_FIRST_TABLE_DIV = f"(//div[{has_class('mypil-table')}])[1]"
+
+PIL_SUMMARY = ExtractionSpec(
+    name="pil_summary",
+    scopes={
+        "summary_row": f"({_PIL_FIRST_TABLE_DIV}//table)[1]/descendant::tr[2]",
+        "container_div": f"{_PIL_FIRST_TABLE_DIV}/following-sibling::div[{has_class('mypil-table')}][1]",
+    },
+    fields={
+        "booking_no": Field("(//p[contains(text(), 'Booking Reference:')])[1]//b", post="text_content"),
+        # Mỗi ô của hàng dữ liệu: danh sách các dòng text (ô 1: ngày đến/đi, 2: POL, 4: POD + ETA)
+        "summary_cells": Field(".//td", post="lines", many=True, scope="summary_row", default=[]),
+        "container_nos": Field(f".//b[{has_class('cont-numb')}]", post="text_content", many=True,
+                               post_all="unique", scope="container_div", default=[]),
+    },
+)
+
+# --- PIL: các hàng sự kiện trong HTML chi tiết container ---
+PIL_EVENTS = ExtractionSpec(
+    name="pil_events",
+    fields={
+        "rows": Table("//tr", columns={
+            "cells": Field(".//td", post="text_content", many=True),
+            "first_cell_class": Field("(.//td)[1]/@class", post="raw", default=""),
+        }),
+    },
+)
+
+# --- EMC: bảng 'Container Moves' trong HTML popup container (tải bằng HTTP) ---
+# Cùng XPath với spec Selenium EMC_CONTAINER_MOVES (scrapers/selenium/emc_scraper.py)
+EMC_CONTAINER_MOVES_HTML = ExtractionSpec(
+    name="emc_container_moves_html",
+    fields={
+        "rows": Table("(//td[contains(text(), 'Container Moves')]/ancestor::table)[1]//tr[td]", columns={
+            "cells": Field(".//td", post="text", many=True),
+        }),
+    },
+)
@@ -0,0 +1,127 @@
+import time
+import logging
+import threading
+from collections import OrderedDict
+
+import config
+
+logger = logging.getLogger(__name__)
+
+# Chỉ quảng bá 'br' khi urllib3 có thể giải nén brotli (cần package brotli hoặc brotlicffi)
+try:
+    import brotli  # noqa: F401
+    ACCEPT_ENCODING = "br, gzip, deflate"
+except ImportError:
+    try:
+        import brotlicffi  # noqa: F401
+        ACCEPT_ENCODING = "br, gzip, deflate"
+    except ImportError:
+        ACCEPT_ENCODING = "gzip, deflate"
+
+
+class CacheEntry:
+    # Validator (ETag/Last-Modified) và body gốc (bytes, chưa chuẩn hóa) của một URL
+    __slots__ = ("etag", "last_modified", "body", "stored_at")
+
+    def __init__(self, etag, last_modified, body):
+        self.etag = etag
+        self.last_modified = last_modified
+        self.body = body
+        self.stored_at = time.time()
+
+
+class CarrierHttpStats:
+    # Thống kê HTTP theo từng hãng tàu
+    def __init__(self):
+        self.requests = 0
+        self.not_modified = 0
+        self.bytes_in = 0          # Số byte thực nhận qua mạng (đã nén)
+        self.bytes_decoded = 0     # Số byte sau khi giải nén
+        self.time_saved = 0.0      # Ước tính thời gian tiết kiệm nhờ 304 (giây)
+        self.avg_full_time = None  # Thời gian trung bình (EWMA) của một lượt tải đầy đủ (status 200)
+
+    def as_dict(self):
+        return {
+            "requests": self.requests,
+            "not_modified": self.not_modified,
+            "hit_rate": round(self.not_modified / self.requests, 3) if self.requests else 0.0,
+            "bytes_in": self.bytes_in,
+            "bytes_decoded": self.bytes_decoded,
+            "time_saved_seconds": round(self.time_saved, 3),
+        }
+
+
+class ConditionalHttpCache:
+    """
+    Cache có điều kiện cho các API JSON của hãng tàu.
+    Lưu ETag/Last-Modified và body gốc theo từng URL; khi server trả 304 thì scraper parse và chuẩn hóa lại
+    body đã lưu thay vì tải lại. Không lưu kết quả đã chuẩn hóa: một số hãng tàu (vd: Unifeeder chọn
+    EtdTransit theo date.today()) cho kết quả khác nhau theo ngày dù dữ liệu gốc không đổi.
+    """
+    def __init__(self, max_entries=1000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def store(self, key, etag, last_modified, body):
+        if not etag and not last_modified:
+            return
+        with self._lock:
+            self._entries[key] = CacheEntry(etag, last_modified, body)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def record(self, carrier, bytes_in, bytes_decoded, elapsed, not_modified):
+        """Ghi nhận một request: byte nhận về và thời gian tiết kiệm được (nếu là 304)."""
+        with self._lock:
+            stats = self._stats.setdefault(carrier, CarrierHttpStats())
+            stats.requests += 1
+            stats.bytes_in += bytes_in
+            stats.bytes_decoded += bytes_decoded
+            if not_modified:
+                stats.not_modified += 1
+                if stats.avg_full_time is not None:
+                    stats.time_saved += max(0.0, stats.avg_full_time - elapsed)
+
+    def record_full_time(self, carrier, elapsed):
+        """Cập nhật thời gian trung bình của một lượt tải đầy đủ (status 200)."""
+        with self._lock:
+            stats = self._stats.setdefault(carrier, CarrierHttpStats())
+            if stats.avg_full_time is None:
+                stats.avg_full_time = elapsed
+            else:
+                stats.avg_full_time = 0.8 * stats.avg_full_time + 0.2 * elapsed
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "carriers": {carrier: s.as_dict() for carrier, s in self._stats.items()},
+            }
+
+
+def response_wire_bytes(response):
+    # Số byte thực nhận qua mạng (trước khi giải nén) của một response requests
+    raw = getattr(response, "raw", None)
+    try:
+        wire_bytes = raw.tell() if raw is not None else 0
+    except Exception:
+        wire_bytes = 0
+    if not wire_bytes:
+        content_length = response.headers.get("Content-Length")
+        wire_bytes = int(content_length) if content_length and content_length.isdigit() else len(response.content or b"")
+    return wire_bytes
+
+
+# Khởi tạo một instance toàn cục (Singleton), dùng chung giữa các request
+http_cache = ConditionalHttpCache(max_entries=config.HTTP_CACHE_MAX_ENTRIES)
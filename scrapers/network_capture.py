@@ -0,0 +1,165 @@
+import re
+import json
+import time
+import base64
+import asyncio
+import logging
+
+import config
+
+logger = logging.getLogger(__name__)
+
+
+def _matches(url_re, predicate, url, payload):
+    return bool(url_re.search(url)) and (predicate is None or predicate(payload))
+
+
+class SeleniumNetworkCapture:
+    """
+    Bắt payload JSON của API tracking mà trang gọi, qua performance log (sự kiện CDP Network.*) của Chrome.
+    Driver phải được tạo với 'goog:loggingPrefs' = {'performance': 'ALL'} (xem driver_setup.create_driver);
+    nếu không có performance log thì capture tự tắt (enabled = False) và scraper đọc DOM như cũ.
+
+    Cách dùng:
+        capture = SeleniumNetworkCapture(driver, r"/ebtracking/public/")
+        capture.start()           # bỏ qua các sự kiện cũ trước khi gửi tìm kiếm
+        ... click tìm kiếm ...
+        payload = capture.poll()  # gọi lặp lại (vd: trong WebDriverWait) cho tới khi khác None
+    """
+    def __init__(self, driver, url_pattern, predicate=None, log_prefix=""):
+        self.driver = driver
+        self.url_re = re.compile(url_pattern)
+        self.predicate = predicate
+        self.log_prefix = log_prefix
+        self.enabled = config.BROWSER_NETWORK_CAPTURE_ENABLED
+        self.payload = None
+        self.url = None
+        self.request_headers = {}  # Header của request đã trả về payload (để phát lại bằng HTTP)
+        self._pending = {}  # requestId -> url của response khớp pattern, chờ tải xong body
+        self._requests = {}  # requestId -> header của request khớp pattern
+        self._t_start = None
+
+    def start(self):
+        """Xóa performance log hiện có; chỉ các response sau thời điểm này được xét."""
+        if not self.enabled:
+            return
+        try:
+            self.driver.get_log("performance")
+        except Exception as e:
+            logger.info("%s -> Driver không có performance log (%s), tắt network capture.", self.log_prefix, e)
+            self.enabled = False
+        self._t_start = time.time()
+
+    def poll(self):
+        """Đọc các sự kiện Network mới. Trả về payload (dict/list) khi đã bắt được, ngược lại None."""
+        if self.payload is not None or not self.enabled:
+            return self.payload
+        try:
+            entries = self.driver.get_log("performance")
+        except Exception as e:
+            logger.warning("%s -> Không đọc được performance log: %s", self.log_prefix, e)
+            self.enabled = False
+            return None
+
+        for entry in entries:
+            message = json.loads(entry["message"])["message"]
+            method, params = message.get("method"), message.get("params", {})
+            if method == "Network.requestWillBeSent":
+                request = params.get("request", {})
+                if self.url_re.search(request.get("url", "")):
+                    self._requests[params.get("requestId")] = request.get("headers", {})
+            elif method == "Network.responseReceived":
+                url = params.get("response", {}).get("url", "")
+                if self.url_re.search(url):
+                    self._pending[params.get("requestId")] = url
+            elif method == "Network.loadingFinished" and params.get("requestId") in self._pending:
+                url = self._pending.pop(params["requestId"])
+                payload = self._read_body(params["requestId"], url)
+                if payload is not None and _matches(self.url_re, self.predicate, url, payload):
+                    self.payload, self.url = payload, url
+                    self.request_headers = self._requests.get(params["requestId"], {})
+                    logger.info("%s -> (Thời gian) Bắt được payload JSON từ %s: %.2fs",
+                                self.log_prefix, url, time.time() - self._t_start)
+                    return payload
+        return None
+
+    def _read_body(self, request_id, url):
+        try:
+            body = self.driver.execute_cdp_cmd("Network.getResponseBody", {"requestId": request_id})
+            text = body.get("body", "")
+            if body.get("base64Encoded"):
+                text = base64.b64decode(text).decode("utf-8")
+            return json.loads(text)
+        except Exception as e:
+            logger.debug("%s -> Bỏ qua response %s (không đọc được JSON): %s", self.log_prefix, url, e)
+            return None
+
+
+class PlaywrightNetworkCapture:
+    """
+    Bắt payload JSON của API tracking qua listener page.on("response") của Playwright (Async).
+    start() phải được gọi trước khi điều hướng/gửi tìm kiếm; wait() trả về payload ngay khi response
+    khớp pattern (và predicate) tải xong, không cần chờ trang render.
+    """
+    def __init__(self, page, url_pattern, predicate=None, log_prefix=""):
+        self.page = page
+        self.url_re = re.compile(url_pattern)
+        self.predicate = predicate
+        self.log_prefix = log_prefix
+        self.enabled = config.BROWSER_NETWORK_CAPTURE_ENABLED
+        self.payload = None
+        self.url = None
+        self.request_headers = {}
+        self._future = None
+        self._tasks = set()
+        self._t_start = None
+
+    def start(self):
+        if not self.enabled:
+            return
+        self._future = asyncio.get_running_loop().create_future()
+        self._t_start = time.time()
+        self.page.on("response", self._on_response)
+
+    def stop(self):
+        if self._future is None:
+            return
+        self.page.remove_listener("response", self._on_response)
+        for task in self._tasks:
+            task.cancel()
+        if not self._future.done():
+            self._future.cancel()
+
+    def _on_response(self, response):
+        if self._future.done() or not self.url_re.search(response.url):
+            return
+        task = asyncio.ensure_future(self._read(response))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _read(self, response):
+        try:
+            payload = await response.json()
+        except Exception as e:
+            logger.debug("%s -> Bỏ qua response %s (không đọc được JSON): %s", self.log_prefix, response.url, e)
+            return
+        if not self._future.done() and _matches(self.url_re, self.predicate, response.url, payload):
+            try:
+                self.request_headers = await response.request.all_headers()
+            except Exception:
+                self.request_headers = dict(response.request.headers)
+            if self._future.done():
+                return
+            self.payload, self.url = payload, response.url
+            logger.info("%s -> (Thời gian) Bắt được payload JSON từ %s: %.2fs",
+                        self.log_prefix, response.url, time.time() - self._t_start)
+            self._future.set_result(payload)
+
+    async def wait(self, timeout=None):
+        """Chờ payload (tối đa timeout giây). Trả về None khi capture tắt hoặc hết thời gian."""
+        if self._future is None:
+            return None
+        try:
+            return await asyncio.wait_for(asyncio.shield(self._future), timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            return None
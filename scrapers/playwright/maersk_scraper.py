@@ -1,161 +1,83 @@
 from datetime import datetime, date
 from playwright.async_api import Page, TimeoutError, expect
 import time
+import asyncio
 import logging
 from ..playwright_scraper import PlaywrightScraper
 from schemas import N8nTrackingInfo
+import metrics
+from .. import date_normalizer, network_capture
 
 # Lấy logger cho module này
 logger = logging.getLogger(__name__)
 
-class MaerskScraper(PlaywrightScraper):
-    # Triển khai logic scraping cho Maersk sử dụng Playwright và playwright-stealth (Async).
-    def __init__(self, page: Page, config: dict):
-        super().__init__(page=page, config=config)
+_RESULT_SELECTOR = "div[data-test='search-summary-ocean']"
 
-    def _format_date(self, date_str):
-        # Chuyển đổi chuỗi ngày từ 'DD Mon YYYY HH:MM' sang 'DD/MM/YYYY'. Ví dụ: '24 Oct 2025 09:00' -> '24/10/2025'
-        if not date_str:
-            return None
-        try:
-            # Tách chuỗi để xử lý các định dạng có thể có
-            clean_date_str = date_str.split('(')[0].strip()
-            # Định dạng chính là 'DD Mon YYYY HH:MM'
-            dt_obj = datetime.strptime(clean_date_str, '%d %b %Y %H:%M')
-            return dt_obj.strftime('%d/%m/%Y')
-        except (ValueError, IndexError):
-            # Thử định dạng không có giờ
-            try:
-                dt_obj = datetime.strptime(clean_date_str, '%d %b %Y')
-                return dt_obj.strftime('%d/%m/%Y')
-            except (ValueError, IndexError):
-                logger.warning("Không thể phân tích định dạng ngày: %s", date_str)
-                return date_str # Trả về chuỗi gốc nếu không phân tích được
+# activity trong payload API tracking -> loại sự kiện hiển thị trên trang ('Vessel departure', 'Feeder arrival'...)
+_PAYLOAD_ACTIVITIES = {"CONTAINER DEPARTURE": "departure", "CONTAINER ARRIVAL": "arrival"}
+# transport_mode của tàu feeder
+_FEEDER_MODES = ("FEF", "FEO")
 
-    
-    async def scrape(self, tracking_number):
-        # Phương thức scrape chính, truy cập URL trực tiếp và trả về một dictionary JSON duy nhất.
-        logger.info("Bắt đầu scrape cho mã: %s", tracking_number)
-        t_total_start = time.time() # Tổng thời gian bắt đầu
-        
-        # Đặt timeout mặc định cho page
-        self.page.set_default_timeout(20000) # 20 giây
 
-        try:
-            direct_url = f"{self.config['url']}{tracking_number}"
-            logger.info(f"Đang truy cập URL: {direct_url}")
-            t_nav_start = time.time()
-            
-            # 1. Tải trang (dùng await)
-            await self.page.goto(direct_url, wait_until="domcontentloaded")
-            logger.info("-> (Thời gian) Tải trang: %.2fs", time.time() - t_nav_start)
-            
-            # 3. Chờ trang kết quả tải
-            t_wait_result_start = time.time()
-            try:
-                logger.info("Chờ trang kết quả tải...")
-                
-                await self.page.wait_for_selector("div[data-test='search-summary-ocean']", state="visible")
-                logger.info("Trang kết quả đã tải. (Thời gian chờ: %.2fs)", time.time() - t_wait_result_start)
+class MaerskEventNormalizer:
+    # Chuẩn hóa sự kiện Maersk (từ DOM hoặc payload JSON của API tracking); dùng chung cho scraper Playwright và HTTP.
 
-                # 4. Trích xuất và chuẩn hóa dữ liệu (dùng await)
-                t_extract_start = time.time()
-                normalized_data = await self._extract_and_normalize_data(tracking_number)
-                logger.info("-> (Thời gian) Trích xuất dữ liệu: %.2fs", time.time() - t_extract_start)
+    def _format_date(self, date_str):
+        # Chuyển đổi chuỗi ngày từ 'DD Mon YYYY HH:MM' sang 'DD/MM/YYYY'. Ví dụ: '24 Oct 2025 09:00' -> '24/10/2025'
+        return date_normalizer.format_date("MSK", date_str)
 
-                if not normalized_data:
-                    logger.warning("Không thể trích xuất dữ liệu đã chuẩn hóa cho '%s'.", tracking_number)
-                    return None, f"Could not extract normalized data for '{tracking_number}'."
+    def _payload_has_containers(self, payload):
+        # Payload kết quả tra cứu: có origin/destination và danh sách container
+        return isinstance(payload, dict) and bool(payload.get("containers"))
 
-                t_total_end = time.time()
-                logger.info("Hoàn tất scrape thành công cho mã: %s (Tổng thời gian: %.2fs)",
-                             tracking_number, t_total_end - t_total_start)
-                return normalized_data, None
+    def _payload_date(self, value):
+        # '2025-10-24T09:00:00.000' -> '24 Oct 2025 09:00' (cùng định dạng với ngày hiển thị trên trang)
+        try:
+            return datetime.fromisoformat(value[:19]).strftime("%d %b %Y %H:%M")
+        except (TypeError, ValueError):
+            return value
 
-            except TimeoutError:
-                logger.error("Trang kết quả không tải kịp (Timeout) cho mã: %s (Thời gian chờ: %.2fs)",
-                             tracking_number, time.time() - t_wait_result_start)
-                # Kiểm tra lỗi tracking number sai (pierce shadow DOM)
-                try:
-                    error_locator = self.page.locator("mc-input[data-test='track-input'] >> .mds-helper-text--negative")
-                    
-                    error_message = await error_locator.text_content(timeout=1000)
-                    if error_message and "Incorrect format" in error_message:
-                        logger.warning("Lỗi định dạng tracking number '%s': %s", tracking_number, error_message.strip())
-                        return None, f"Không tìm thấy kết quả cho '{tracking_number}': {error_message.strip()}"
-                except Exception:
-                    pass
-                raise TimeoutError("Results page did not load.")
+    def _payload_events(self, container):
+        # Chuyển các location/event của một container trong payload thành sự kiện giống khi đọc DOM.
+        events = []
+        for location_data in container.get("locations") or []:
+            location = ", ".join(part for part in (location_data.get("city"), location_data.get("terminal")) if part)
+            for event in location_data.get("events") or []:
+                activity = (event.get("activity") or "").strip().upper()
+                if activity in _PAYLOAD_ACTIVITIES:
+                    vessel_type = "Feeder" if event.get("transport_mode") in _FEEDER_MODES else "Vessel"
+                    description = f"{vessel_type} {_PAYLOAD_ACTIVITIES[activity]}"
+                else:
+                    description = activity.capitalize()
+                if event.get("vessel_name"):
+                    description += f" ({event['vessel_name']} / {event.get('voyage_num') or ''})"
+                events.append({
+                    "location": location,
+                    "description": description,
+                    "date": self._payload_date(event.get("event_time")),
+                    "type": "ngay_thuc_te" if event.get("event_time_type") == "ACTUAL" else "ngay_du_kien",
+                })
+        return events
 
-        except TimeoutError:
-            t_total_fail = time.time()
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            screenshot_path = f"output/maersk_timeout_{tracking_number}_{timestamp}.png"
-            try:
-                
-                await self.page.screenshot(path=screenshot_path, full_page=True)
-                logger.warning("Timeout khi scrape mã '%s'. Đã lưu ảnh chụp màn hình vào %s (Tổng thời gian: %.2fs)",
-                             tracking_number, screenshot_path, t_total_fail - t_total_start)
-            except Exception as ss_e:
-                logger.error("Không thể lưu ảnh chụp màn hình khi bị timeout cho mã '%s': %s", tracking_number, ss_e)
-            return None, f"Không tìm thấy kết quả cho '{tracking_number}' (Timeout)."
+    def _normalize_payload(self, payload, tracking_number):
+        # Chuẩn hóa trực tiếp từ payload JSON của API tracking. Chỉ xử lý container đầu tiên (như khi đọc DOM).
+        try:
+            pol = (payload.get("origin") or {}).get("city")
+            pod = (payload.get("destination") or {}).get("city")
+            container = payload["containers"][0]
+            logger.info("Payload JSON: POL=%s, POD=%s, container=%s (%d container)",
+                        pol, pod, container.get("container_num"), len(payload["containers"]))
+            all_events = self._payload_events(container)
+            if not all_events:
+                return None
+            return self._build_tracking_info(tracking_number, pol, pod, all_events)
         except Exception as e:
-            t_total_fail = time.time()
-            logger.error("Đã xảy ra lỗi không mong muốn khi scrape mã '%s': %s (Tổng thời gian: %.2fs)",
-                         tracking_number, e, t_total_fail - t_total_start, exc_info=True)
-            return None, f"Đã xảy ra lỗi không mong muốn cho '{tracking_number}': {e}"
+            logger.warning("Lỗi khi chuẩn hóa payload JSON cho mã '%s': %s", tracking_number, e, exc_info=True)
+            return None
 
-    
-    async def _extract_and_normalize_data(self, tracking_number):
-        # Trích xuất, xử lý và chuẩn hóa dữ liệu thành một dictionary duy nhất. Chỉ xử lý container đầu tiên.
+    def _build_tracking_info(self, tracking_number, pol, pod, all_events):
+        # Tìm các mốc ATD/ATA/transit từ danh sách sự kiện và tạo N8nTrackingInfo (dùng chung cho payload JSON và DOM).
         try:
-            # 1. Trích xuất thông tin tóm tắt chung
-            logger.info("Bắt đầu trích xuất thông tin tóm tắt...")
-            summary_element = self.page.locator("div[data-test='search-summary-ocean']").first
-
-            try:
-                
-                pol = await summary_element.locator("dd[data-test='track-from-value']").text_content(timeout=5000)
-                logger.info("Đã tìm thấy POL: %s", pol)
-            except Exception:
-                pol = None
-                logger.warning("Không tìm thấy POL cho mã: %s", tracking_number)
-
-            try:
-                
-                pod = await summary_element.locator("dd[data-test='track-to-value']").text_content(timeout=5000)
-                logger.info("Đã tìm thấy POD: %s", pod)
-            except Exception:
-                pod = None
-                logger.warning("Không tìm thấy POD cho mã: %s", tracking_number)
-
-            # 2. Mở rộng và thu thập các sự kiện từ container ĐẦU TIÊN
-            logger.info("Bắt đầu xử lý container đầu tiên...")
-            all_events = []
-            
-            containers = await self.page.locator("div.container--ocean").all()
-            logger.info("Tìm thấy %d container. Sẽ chỉ xử lý container đầu tiên.", len(containers))
-
-            if containers:
-                container = containers[0]
-                container_name = ""
-                try:
-                    
-                    container_name = await container.locator("span.mds-text--medium-bold").text_content(timeout=5000)
-                    logger.info("Đang xử lý container: %s", container_name)
-                    
-                    events = await self._extract_events_from_container(container)
-                    all_events.extend(events)
-
-                except (TimeoutError, Exception) as toggle_e:
-                    logger.warning("Không thể mở rộng hoặc không tìm thấy nút toggle cho container '%s'. Lỗi: %s", container_name, toggle_e)
-                    pass # Vẫn tiếp tục xử lý
-            else:
-                 logger.warning("Không tìm thấy container nào trên trang.")
-
-            if not all_events:
-                logger.warning("Không trích xuất được sự kiện nào từ container cho mã: %s", tracking_number)
-            
             # 3. Tìm các sự kiện quan trọng
             logger.info("Tìm kiếm các sự kiện quan trọng và transit...")
             departure_event_actual = self._find_event(all_events, "Vessel departure", pol, event_type="ngay_thuc_te")
@@ -269,7 +191,196 @@ class MaerskScraper(PlaywrightScraper):
             logger.error("Lỗi trong quá trình trích xuất chi tiết cho mã '%s': %s", tracking_number, e, exc_info=True)
             return None
 
-    
+    def _find_event(self, events, description_keyword, location_keyword, event_type=None):
+        """
+        Tìm một sự kiện cụ thể, có thể lọc theo loại (thực tế/dự kiến).
+        Tìm kiếm ngược để lấy sự kiện cuối cùng (gần nhất)
+        """
+        if not location_keyword:
+            logger.info("Bỏ qua _find_event vì location_keyword rỗng.")
+            return {}
+
+        logger.info("-> _find_event: Tìm '%s' tại '%s', type '%s'", description_keyword, location_keyword, event_type)
+        for event in reversed(events):
+            desc_match = description_keyword.lower() in event.get("description", "").lower()
+            event_location = event.get("location") or ""
+            loc_match = location_keyword.lower() in event_location.lower()
+            type_match = True
+            if event_type:
+                type_match = (event.get("type") == event_type)
+
+            if desc_match and loc_match and type_match:
+                logger.info("--> Khớp: %s", event)
+                return event
+
+        logger.info("--> Không khớp.")
+        return {}
+
+
+class MaerskScraper(MaerskEventNormalizer, PlaywrightScraper):
+    # Triển khai logic scraping cho Maersk sử dụng Playwright và playwright-stealth (Async).
+    def __init__(self, page: Page, config: dict):
+        super().__init__(page=page, config=config)
+
+    async def scrape(self, tracking_number):
+        # Phương thức scrape chính, truy cập URL trực tiếp và trả về một dictionary JSON duy nhất.
+        logger.info("Bắt đầu scrape cho mã: %s", tracking_number)
+        t_total_start = time.time() # Tổng thời gian bắt đầu
+        
+        # Đặt timeout mặc định cho page
+        self.page.set_default_timeout(20000) # 20 giây
+
+        # Bắt payload JSON của API tracking ngay khi trang gọi (đăng ký trước khi điều hướng)
+        capture = network_capture.PlaywrightNetworkCapture(
+            self.page, self.config['capture_url_pattern'], predicate=self._payload_has_containers,
+            log_prefix="[Maersk Scraper]"
+        )
+        capture.start()
+
+        try:
+            direct_url = f"{self.config['url']}{tracking_number}"
+            logger.info(f"Đang truy cập URL: {direct_url}")
+            t_nav_start = time.time()
+            
+            # 1. Tải trang (dùng await)
+            await self.page.goto(direct_url, wait_until="domcontentloaded")
+            logger.info("-> (Thời gian) Tải trang: %.2fs", metrics.observe("navigation", t_nav_start))
+            
+            # 3. Chờ trang kết quả tải
+            t_wait_result_start = time.time()
+            try:
+                logger.info("Chờ trang kết quả tải...")
+                
+                source = await self._wait_for_result(capture)
+                logger.info("Trang kết quả đã tải (%s). (Thời gian chờ: %.2fs)", source, metrics.observe("wait", t_wait_result_start))
+
+                # 4. Trích xuất và chuẩn hóa dữ liệu (dùng await): ưu tiên payload JSON, DOM là phương án dự phòng
+                t_extract_start = time.time()
+                normalized_data = None
+                if source == "payload":
+                    normalized_data = self._normalize_payload(capture.payload, tracking_number)
+                    if normalized_data:
+                        # Chỉ request đã cho ra kết quả mới được phát lại bằng HTTP (session_vault)
+                        self.captured_request_headers, self.captured_request_url = capture.request_headers, capture.url
+                if not normalized_data:
+                    if source == "payload":
+                        logger.warning("Không chuẩn hóa được payload JSON, chuyển sang đọc trang kết quả.")
+                        await self.page.wait_for_selector(_RESULT_SELECTOR, state="visible")
+                    normalized_data = await self._extract_and_normalize_data(tracking_number)
+                logger.info("-> (Thời gian) Trích xuất dữ liệu: %.2fs", metrics.observe("extract", t_extract_start))
+
+                if not normalized_data:
+                    logger.warning("Không thể trích xuất dữ liệu đã chuẩn hóa cho '%s'.", tracking_number)
+                    return None, f"Could not extract normalized data for '{tracking_number}'."
+
+                t_total_end = time.time()
+                logger.info("Hoàn tất scrape thành công cho mã: %s (Tổng thời gian: %.2fs)",
+                             tracking_number, t_total_end - t_total_start)
+                return normalized_data, None
+
+            except TimeoutError:
+                logger.error("Trang kết quả không tải kịp (Timeout) cho mã: %s (Thời gian chờ: %.2fs)",
+                             tracking_number, metrics.observe("wait", t_wait_result_start))
+                # Kiểm tra lỗi tracking number sai (pierce shadow DOM)
+                try:
+                    error_locator = self.page.locator("mc-input[data-test='track-input'] >> .mds-helper-text--negative")
+                    
+                    error_message = await error_locator.text_content(timeout=1000)
+                    if error_message and "Incorrect format" in error_message:
+                        logger.warning("Lỗi định dạng tracking number '%s': %s", tracking_number, error_message.strip())
+                        return None, f"Không tìm thấy kết quả cho '{tracking_number}': {error_message.strip()}"
+                except Exception:
+                    pass
+                raise TimeoutError("Results page did not load.")
+
+        except TimeoutError:
+            t_total_fail = time.time()
+            # Ảnh chụp + DOM được lấy nhanh, ghi file chạy nền (có lấy mẫu và giới hạn dung lượng)
+            artifact_path = await self._save_failure_artifacts(tracking_number)
+            logger.warning("Timeout khi scrape mã '%s'. Artifact: %s (Tổng thời gian: %.2fs)",
+                           tracking_number, artifact_path or "bỏ qua", t_total_fail - t_total_start)
+            return None, f"Không tìm thấy kết quả cho '{tracking_number}' (Timeout)."
+        except Exception as e:
+            t_total_fail = time.time()
+            logger.error("Đã xảy ra lỗi không mong muốn khi scrape mã '%s': %s (Tổng thời gian: %.2fs)",
+                         tracking_number, e, t_total_fail - t_total_start, exc_info=True)
+            return None, f"Đã xảy ra lỗi không mong muốn cho '{tracking_number}': {e}"
+        finally:
+            capture.stop()
+
+    async def _wait_for_result(self, capture):
+        """
+        Chờ payload JSON của API tracking hoặc trang kết quả hiển thị, cái nào có trước.
+        Returns: "payload" hoặc "dom". Ném TimeoutError nếu không có cả hai.
+        """
+        selector_task = asyncio.ensure_future(self.page.wait_for_selector(_RESULT_SELECTOR, state="visible"))
+        payload_task = asyncio.ensure_future(capture.wait())
+        done, _ = await asyncio.wait({selector_task, payload_task}, return_when=asyncio.FIRST_COMPLETED)
+        if payload_task in done and payload_task.result() is not None:
+            selector_task.cancel()
+            return "payload"
+        try:
+            await selector_task
+        finally:
+            payload_task.cancel()
+        return "dom"
+
+    async def _extract_and_normalize_data(self, tracking_number):
+        # Trích xuất, xử lý và chuẩn hóa dữ liệu thành một dictionary duy nhất. Chỉ xử lý container đầu tiên.
+        try:
+            # 1. Trích xuất thông tin tóm tắt chung
+            logger.info("Bắt đầu trích xuất thông tin tóm tắt...")
+            summary_element = self.page.locator("div[data-test='search-summary-ocean']").first
+
+            try:
+                
+                pol = await summary_element.locator("dd[data-test='track-from-value']").text_content(timeout=5000)
+                logger.info("Đã tìm thấy POL: %s", pol)
+            except Exception:
+                pol = None
+                logger.warning("Không tìm thấy POL cho mã: %s", tracking_number)
+
+            try:
+                
+                pod = await summary_element.locator("dd[data-test='track-to-value']").text_content(timeout=5000)
+                logger.info("Đã tìm thấy POD: %s", pod)
+            except Exception:
+                pod = None
+                logger.warning("Không tìm thấy POD cho mã: %s", tracking_number)
+
+            # 2. Mở rộng và thu thập các sự kiện từ container ĐẦU TIÊN
+            logger.info("Bắt đầu xử lý container đầu tiên...")
+            all_events = []
+            
+            containers = await self.page.locator("div.container--ocean").all()
+            logger.info("Tìm thấy %d container. Sẽ chỉ xử lý container đầu tiên.", len(containers))
+
+            if containers:
+                container = containers[0]
+                container_name = ""
+                try:
+                    
+                    container_name = await container.locator("span.mds-text--medium-bold").text_content(timeout=5000)
+                    logger.info("Đang xử lý container: %s", container_name)
+                    
+                    events = await self._extract_events_from_container(container)
+                    all_events.extend(events)
+
+                except (TimeoutError, Exception) as toggle_e:
+                    logger.warning("Không thể mở rộng hoặc không tìm thấy nút toggle cho container '%s'. Lỗi: %s", container_name, toggle_e)
+                    pass # Vẫn tiếp tục xử lý
+            else:
+                 logger.warning("Không tìm thấy container nào trên trang.")
+
+            if not all_events:
+                logger.warning("Không trích xuất được sự kiện nào từ container cho mã: %s", tracking_number)
+
+            return self._build_tracking_info(tracking_number, pol, pod, all_events)
+
+        except Exception as e:
+            logger.error("Lỗi trong quá trình trích xuất chi tiết cho mã '%s': %s", tracking_number, e, exc_info=True)
+            return None
+
     async def _extract_events_from_container(self, container_element):
         """
         Trích xuất lịch sử sự kiện từ một khối container (Transport Plan). (Async)
@@ -327,28 +438,3 @@ class MaerskScraper(PlaywrightScraper):
 
         logger.info("--> Kết thúc trích xuất %d sự kiện từ container.", len(events))
         return events
-
-    def _find_event(self, events, description_keyword, location_keyword, event_type=None):
-        """
-        Tìm một sự kiện cụ thể, có thể lọc theo loại (thực tế/dự kiến).
-        Tìm kiếm ngược để lấy sự kiện cuối cùng (gần nhất)
-        """
-        if not location_keyword:
-            logger.info("Bỏ qua _find_event vì location_keyword rỗng.")
-            return {}
-
-        logger.info("-> _find_event: Tìm '%s' tại '%s', type '%s'", description_keyword, location_keyword, event_type)
-        for event in reversed(events):
-            desc_match = description_keyword.lower() in event.get("description", "").lower()
-            event_location = event.get("location") or ""
-            loc_match = location_keyword.lower() in event_location.lower()
-            type_match = True
-            if event_type:
-                type_match = (event.get("type") == event_type)
-
-            if desc_match and loc_match and type_match:
-                logger.info("--> Khớp: %s", event)
-                return event
-
-        logger.info("--> Không khớp.")
-        return {}
\ No newline at end of file
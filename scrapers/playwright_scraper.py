@@ -1,6 +1,7 @@
 import logging
 from playwright.async_api import Page # Import từ async_api
 from .base_scraper import BaseScraper
+from artifacts import artifact_store
 
 logger = logging.getLogger(__name__)
 
@@ -23,5 +24,9 @@ class PlaywrightScraper(BaseScraper):
         self.page = page        
         logger.debug(f"[{self.__class__.__name__}] PlaywrightScraper initialized.")
 
+    async def _save_failure_artifacts(self, tracking_number, reason="timeout"):
+        """Như SeleniumScraper._save_failure_artifacts, với Playwright Page."""
+        return await artifact_store.capture_playwright(self.carrier or self.__class__.__name__, tracking_number, self.page, reason)
+
     async def scrape(self, tracking_number: str):
         raise NotImplementedError("Phương thức scrape() phải được triển khai trong lớp con của PlaywrightScraper.")
\ No newline at end of file
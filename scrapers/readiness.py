@@ -0,0 +1,117 @@
+import time
+import logging
+
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.common.exceptions import TimeoutException, WebDriverException
+
+import config
+import metrics
+
+logger = logging.getLogger(__name__)
+
+
+# Kiểm tra mọi selector của một lượt chờ trong một execute_script (một round-trip WebDriver mỗi lần poll).
+# Trả về [tên điều kiện, phần tử] của điều kiện đầu tiên thỏa mãn (theo thứ tự khai báo), hoặc null.
+_RACE_SCRIPT = """
+const selectors = arguments[0];
+const visible = (el) => !!(el && (el.offsetWidth || el.offsetHeight || el.getClientRects().length));
+for (const [name, selector, mustBeVisible] of selectors) {
+    let nodes;
+    if (selector.startsWith("/") || selector.startsWith("(")) {
+        const result = document.evaluate(selector, document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+        nodes = [];
+        for (let i = 0; i < result.snapshotLength; i++) nodes.push(result.snapshotItem(i));
+    } else {
+        nodes = Array.from(document.querySelectorAll(selector));
+    }
+    const found = mustBeVisible ? nodes.find(visible) : nodes[0];
+    if (found) return [name, found];
+}
+return null;
+"""
+
+
+class Visible:
+    """Điều kiện: có phần tử hiển thị khớp selector (CSS, hoặc XPath nếu bắt đầu bằng '/' hay '(')."""
+    def __init__(self, selector):
+        self.selector = selector
+        self.visible = True
+
+
+class Present(Visible):
+    """Điều kiện: có phần tử khớp selector trong DOM (không cần hiển thị)."""
+    def __init__(self, selector):
+        super().__init__(selector)
+        self.visible = False
+
+
+def new_window(existing_handles):
+    """Điều kiện: có cửa sổ/tab mới ngoài existing_handles. Giá trị trả về là handle của cửa sổ mới."""
+    existing_handles = set(existing_handles)
+
+    def condition(driver):
+        handles = [handle for handle in driver.window_handles if handle not in existing_handles]
+        return handles[0] if handles else None
+    return condition
+
+
+def first_match(driver, condition):
+    """Kiểm tra một lần (không chờ) điều kiện Visible/Present. Trả về phần tử khớp hoặc None."""
+    try:
+        found = driver.execute_script(_RACE_SCRIPT, [["match", condition.selector, condition.visible]])
+    except WebDriverException:
+        return None
+    return found[1] if found else None
+
+
+def wait_for_any(driver, conditions, timeout, phase="", log_prefix="", poll_frequency=None):
+    """
+    Chờ điều kiện đầu tiên thỏa mãn trong nhiều điều kiện cùng lúc (vd: banner cookie / kết quả / thông báo lỗi),
+    thay cho nhiều WebDriverWait nối tiếp hoặc time.sleep cố định.
+
+    Args:
+        conditions (dict): {tên: Visible | Present | callable(driver)}. Callable (vd: new_window, network capture)
+                           được kiểm tra trước; các selector được kiểm tra chung trong một execute_script mỗi lần poll,
+                           theo thứ tự khai báo.
+        timeout (float): Thời gian chờ tối đa (giây).
+        phase (str): Tên giai đoạn, dùng trong log thời gian.
+        poll_frequency (float): Chu kỳ poll; mặc định SELENIUM_READINESS_POLL_SECONDS.
+
+    Returns:
+        tuple: (tên điều kiện, giá trị) - giá trị là WebElement với Visible/Present, hoặc kết quả của callable.
+
+    Raises:
+        TimeoutException: Không điều kiện nào thỏa mãn sau timeout giây.
+    """
+    selectors = [
+        [name, condition.selector, condition.visible]
+        for name, condition in conditions.items() if isinstance(condition, Visible)
+    ]
+    callables = [(name, condition) for name, condition in conditions.items() if not isinstance(condition, Visible)]
+
+    def any_ready(d):
+        for name, condition in callables:
+            value = condition(d)
+            if value:
+                return name, value
+        if selectors:
+            try:
+                found = d.execute_script(_RACE_SCRIPT, selectors)
+            except WebDriverException:
+                # Trang đang chuyển hướng (document chưa sẵn sàng) -> thử lại ở lần poll sau
+                found = None
+            if found:
+                return tuple(found)
+        return None
+
+    t_start = time.time()
+    try:
+        name, value = WebDriverWait(
+            driver, timeout, poll_frequency=poll_frequency or config.SELENIUM_READINESS_POLL_SECONDS
+        ).until(any_ready)
+    except TimeoutException:
+        logger.info("%s -> (Thời gian) Chờ %s: không có điều kiện nào (%s) sau %.2fs",
+                    log_prefix, phase, ", ".join(conditions), metrics.observe("wait", t_start, detail=phase, timeout=True))
+        raise
+    logger.info("%s -> (Thời gian) Chờ %s: '%s' sau %.2fs", log_prefix, phase, name, metrics.observe("wait", t_start, detail=phase, condition=name))
+    return name, value
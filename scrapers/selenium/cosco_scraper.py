@@ -1,41 +1,128 @@
 import logging
-import pandas as pd
-from datetime import datetime, date
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, NoSuchElementException
+from selenium.common.exceptions import TimeoutException
 import re
 import time
 
 from ..selenium_scraper import SeleniumScraper
 from schemas import N8nTrackingInfo
+import metrics
+from .. import date_normalizer, dom_snapshot, network_capture, readiness, timeline
+from ..extraction import has_class
 
 logger = logging.getLogger(__name__)
 
-class CoscoScraper(SeleniumScraper):
-    # Triển khai logic scraping cho COSCO Shipping Lines và chuẩn hóa kết quả theo template JSON.
-
-    def _format_date(self, date_str):
-        # Chuyển đổi chuỗi ngày từ 'YYYY-MM-DD HH:MM:SS...' sang 'DD/MM/YYYY'.
-        if not date_str or not isinstance(date_str, str):
+# Ô ngày của bảng lịch trình: '<span>Expected:</span><span>2025-01-01 10:00:00</span>'
+_COSCO_SCHEDULE_DATE = "(.//td)[%d]//span[contains(text(), '%s')]/following-sibling::span"
+
+# Toàn bộ dữ liệu trang kết quả (trong iframe) đọc bằng một lần execute_script
+COSCO_RESULT = dom_snapshot.DomSpec(
+    name="cosco_result",
+    fields={
+        "bkg_title": f"//div[{has_class('ct-side-bar')}]//span[{has_class('side-bar-title')}]//span",
+        "booking_status": f"//div[{has_class('booking-status')}]",
+    },
+    tables={
+        # Cột 3: POL, 4: ngày rời, 5: POD, 6: ngày đến
+        "schedule": (f"(//div[{has_class('ant-table-content')}])[1]//tbody//tr", {
+            "cells": [".//td"],
+            "etd": _COSCO_SCHEDULE_DATE % (4, "Expected"),
+            "atd": _COSCO_SCHEDULE_DATE % (4, "Actual"),
+            "eta": _COSCO_SCHEDULE_DATE % (6, "Expected"),
+            "ata": _COSCO_SCHEDULE_DATE % (6, "Actual"),
+        }),
+    },
+)
+
+# Điều kiện readiness của trang tìm kiếm
+_COOKIE_BUTTON = readiness.Visible(".btnBlue.ivu-btn-primary")
+# Thông báo lỗi (toast của Ant Design) khi mã không tồn tại
+_SEARCH_ERROR = readiness.Visible(".ant-message-notice .ant-message-error, .ant-message-notice .ant-message-warning")
+
+class CoscoPayloadNormalizer:
+    # Chuẩn hóa dữ liệu COSCO (chặng lịch trình, payload JSON của API tracking); dùng chung cho scraper Selenium và HTTP.
+
+    def _clean_schedule_date(self, date_str):
+        # Helper: Chuẩn hóa ngày Expected/Actual đọc từ ô lịch trình ('Not yet' -> None).
+        if not date_str or "Not yet" in str(date_str):
             return None
+        return str(date_str).strip()
+
+    def _payload_content(self, payload):
+        # Phần dữ liệu của payload API tracking ({'data': {'content': {...}}}); None nếu không phải kết quả tra cứu
+        content = ((payload or {}).get("data") or {}).get("content") if isinstance(payload, dict) else None
+        return content if isinstance(content, dict) and self._payload_legs(content) else None
+
+    def _payload_legs(self, content):
+        # Các chặng lịch trình trong payload: cảng xếp/dỡ và ngày dự kiến/thực tế rời/đến
+        schedules = content.get("cargoTrackingSchedules") or content.get("schedules") or []
+        return [{
+            'pol': (leg.get("pol") or "").strip(),
+            'pod': (leg.get("pod") or "").strip(),
+            'etd': self._clean_schedule_date(leg.get("etd")),
+            'atd': self._clean_schedule_date(leg.get("atd")),
+            'eta': self._clean_schedule_date(leg.get("eta")),
+            'ata': self._clean_schedule_date(leg.get("ata")),
+        } for leg in schedules if isinstance(leg, dict)]
+
+    def _normalize_payload(self, payload, tracking_number):
+        # Chuẩn hóa trực tiếp từ payload JSON của API tracking (không cần trang render).
         try:
-            date_part = date_str.split(' ')[0]
-            dt_obj = datetime.strptime(date_part, '%Y-%m-%d')
-            return dt_obj.strftime('%d/%m/%Y')
-        except (ValueError, IndexError):
-            logger.warning("Không thể phân tích định dạng ngày: %s", date_str)
-            return date_str
-
-    def _extract_date_from_text(self, text, date_type):
-        # Trích xuất ngày 'Actual' hoặc 'Expected' từ một chuỗi.
-        if not text or date_type not in text:
+            content = self._payload_content(payload)
+            if not content:
+                return None
+            booking_no = str(content.get("bookingNo") or content.get("blNo") or tracking_number)
+            booking_status = str(content.get("bookingStatus") or "")
+            logger.info("Payload JSON: booking=%s, status=%s", booking_no, booking_status)
+            return self._build_tracking_info(booking_no, booking_status, self._payload_legs(content))
+        except Exception as e:
+            logger.warning("Lỗi khi chuẩn hóa payload JSON cho mã '%s': %s", tracking_number, e, exc_info=True)
             return None
-        match = re.search(fr'{date_type}:\s*(\d{{4}}-\d{{2}}-\d{{2}}\s*\d{{2}}:\d{{2}}:\d{{2}})', text)
-        if match:
-            return match.group(1).strip()
-        return None
+
+    def _build_tracking_info(self, booking_no, booking_status, legs):
+        # Tạo N8nTrackingInfo từ các chặng lịch trình (dùng chung cho payload JSON và trang kết quả).
+        pol = legs[0]['pol']
+        logger.info("Đã tìm thấy POL: %s", pol)
+        pod = legs[-1]['pod']
+        logger.info("Đã tìm thấy POD: %s", pod)
+
+        # Suy ra ETD/ATD (chặng đầu), ETA/ATA (chặng cuối) và thông tin transit bằng timeline engine:
+        # cảng dỡ của chặng này trùng cảng xếp của chặng sau là cảng transit; EtdTransit là ngày
+        # rời transit (Expected) gần nhất sau hôm nay.
+        logger.info("Bắt đầu xử lý thông tin transit...")
+        derived = timeline.derive_legs("COSCO", legs)
+        if derived["EtdTransit"]:
+            logger.info("ETD transit gần nhất trong tương lai được chọn: %s", derived["EtdTransit"])
+        else:
+             logger.info("Không tìm thấy ETD transit nào trong tương lai.")
+
+        # === BƯỚC 3: TẠO ĐỐI TƯỢNG JSON CHUẨN HÓA ===
+        shipment_data = N8nTrackingInfo(
+            BookingNo= booking_no.strip(),
+            BlNumber= booking_no.strip(),
+            BookingStatus= booking_status.strip(),
+            Pol= pol.strip(),
+            Pod= pod.strip(),
+            **date_normalizer.normalize_shipment_dates("COSCO", {
+                "Etd": derived["Etd"],
+                "Atd": derived["Atd"],
+                "Eta": derived["Eta"],
+                "Ata": derived["Ata"],
+                "EtdTransit": derived["EtdTransit"],
+                "AtdTransit": derived["AtdTransit"],
+                "EtaTransit": derived["EtaTransit"],
+                "AtaTransit": derived["AtaTransit"],
+            }),
+            TransitPort= derived["TransitPort"],
+        )
+        logger.info("Đã tạo đối tượng N8nTrackingInfo thành công.")
+        return shipment_data
+
+
+class CoscoScraper(CoscoPayloadNormalizer, SeleniumScraper):
+    # Triển khai logic scraping cho COSCO Shipping Lines và chuẩn hóa kết quả theo template JSON.
 
     def scrape(self, tracking_number):
         # Phương thức scrape chính. Thực hiện tìm kiếm và trả về dữ liệu đã chuẩn hóa.
@@ -46,22 +133,18 @@ class CoscoScraper(SeleniumScraper):
             t_nav_start = time.time()
             self.driver.get(self.config['url'])
             self.wait = WebDriverWait(self.driver, 45)
-            logger.info("-> (Thời gian) Tải trang: %.2fs", time.time() - t_nav_start)
+            logger.info("-> (Thời gian) Tải trang: %.2fs", metrics.observe("navigation", t_nav_start))
 
-            # 1. Xử lý cookie nếu có
-            t_cookie_start = time.time()
-            try:
-                cookie_button = WebDriverWait(self.driver, 3).until(
-                    EC.element_to_be_clickable((By.CSS_SELECTOR, ".btnBlue.ivu-btn-primary"))
-                )
-                cookie_button.click()
-                logger.info("Đã chấp nhận cookies. (Thời gian xử lý cookie: %.2fs)", time.time() - t_cookie_start)
-            except TimeoutException:
-                logger.info("Banner cookie không xuất hiện hoặc đã được chấp nhận. (Thời gian kiểm tra: %.2fs)", time.time() - t_cookie_start)
+            # 1. Chờ banner cookie hoặc iframe tìm kiếm (cái nào có trước), không chờ cố định khi không có banner
+            state, element = readiness.wait_for_any(self.driver, {
+                "cookie": _COOKIE_BUTTON,
+                "iframe": readiness.Present("#scctCargoTracking"),
+            }, timeout=45, phase="banner cookie / iframe tìm kiếm", log_prefix="[COSCO Scraper]")
+            self._accept_cookies(element if state == "cookie" else None)
 
             # 2. Tìm kiếm
             t_search_start = time.time()
-            iframe = self.wait.until(EC.presence_of_element_located((By.ID, "scctCargoTracking")))
+            iframe = element if state == "iframe" else self.wait.until(EC.presence_of_element_located((By.ID, "scctCargoTracking")))
             self.driver.switch_to.frame(iframe)
             logger.info("Đã chuyển vào iframe tìm kiếm. (Thời gian tìm iframe: %.2fs)", time.time() - t_search_start)
 
@@ -69,19 +152,41 @@ class CoscoScraper(SeleniumScraper):
             search_input.clear()
             search_input.send_keys(tracking_number)
 
+            # Bắt payload JSON mà iframe gọi sau khi tìm kiếm (bỏ qua các response trước đó)
+            capture = network_capture.SeleniumNetworkCapture(
+                self.driver, self.config['capture_url_pattern'], predicate=self._payload_content,
+                log_prefix="[COSCO Scraper]"
+            )
+            capture.start()
+
             search_button = self.driver.find_element(By.CSS_SELECTOR, "button.css-1tiubaq")
             search_button.click()
-            logger.info("Đang tìm kiếm mã: %s. (Thời gian tìm kiếm: %.2fs)", tracking_number, time.time() - t_search_start)
+            logger.info("Đang tìm kiếm mã: %s. (Thời gian tìm kiếm: %.2fs)", tracking_number, metrics.observe("search", t_search_start))
 
-            # 3. Chờ kết quả và trích xuất
+            # 3. Chờ payload JSON, trang kết quả hoặc thông báo lỗi (cái nào có trước) và trích xuất
             logger.info("Chờ trang kết quả tải...")
-            t_wait_result_start = time.time()
-            self.wait.until(EC.visibility_of_element_located((By.CSS_SELECTOR, "div#rc-tabs-0-panel-ocean")))
-            logger.info("Trang kết quả đã tải. (Thời gian chờ kết quả: %.2fs)", time.time() - t_wait_result_start)
+            result_panel = EC.visibility_of_element_located((By.CSS_SELECTOR, "div#rc-tabs-0-panel-ocean"))
+            source, _ = readiness.wait_for_any(self.driver, {
+                "payload": lambda d: capture.poll() is not None,
+                "dom": readiness.Visible("div#rc-tabs-0-panel-ocean"),
+                "error": _SEARCH_ERROR,
+            }, timeout=45, phase="kết quả tìm kiếm", log_prefix="[COSCO Scraper]")
+            if source == "error":
+                return None, f"Không tìm thấy kết quả cho '{tracking_number}'."
 
             t_extract_start = time.time()
-            normalized_data = self._extract_and_normalize_data(tracking_number)
-            logger.info("-> (Thời gian) Trích xuất dữ liệu: %.2fs", time.time() - t_extract_start)
+            normalized_data = None
+            if source == "payload":
+                normalized_data = self._normalize_payload(capture.payload, tracking_number)
+                if normalized_data:
+                    # Chỉ request đã cho ra kết quả mới được phát lại bằng HTTP (session_vault)
+                    self.captured_request_headers, self.captured_request_url = capture.request_headers, capture.url
+            if not normalized_data:
+                if source == "payload":
+                    logger.warning("Không chuẩn hóa được payload JSON, chuyển sang đọc trang kết quả.")
+                    self.wait.until(result_panel)
+                normalized_data = self._extract_and_normalize_data(tracking_number)
+            logger.info("-> (Thời gian) Trích xuất dữ liệu: %.2fs", metrics.observe("extract", t_extract_start))
 
             if not normalized_data:
                 return None, f"Không thể trích xuất dữ liệu đã chuẩn hóa cho '{tracking_number}'."
@@ -93,14 +198,10 @@ class CoscoScraper(SeleniumScraper):
 
         except TimeoutException:
             t_total_fail = time.time()
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            screenshot_path = f"output/cosco_timeout_{tracking_number}_{timestamp}.png"
-            try:
-                self.driver.save_screenshot(screenshot_path)
-                logger.warning("Timeout khi scrape mã '%s'. Đã lưu ảnh chụp màn hình vào %s (Tổng thời gian: %.2fs)", 
-                             tracking_number, screenshot_path, t_total_fail - t_total_start)
-            except Exception as ss_e:
-                logger.error("Không thể lưu ảnh chụp màn hình khi bị timeout cho mã '%s': %s", tracking_number, ss_e)
+            # Ảnh chụp + DOM được lấy nhanh, ghi file chạy nền (có lấy mẫu và giới hạn dung lượng)
+            artifact_path = self._save_failure_artifacts(tracking_number)
+            logger.warning("Timeout khi scrape mã '%s'. Artifact: %s (Tổng thời gian: %.2fs)",
+                           tracking_number, artifact_path or "bỏ qua", t_total_fail - t_total_start)
             return None, f"Không tìm thấy kết quả cho '{tracking_number}' (Timeout)."
         except Exception as e:
             t_total_fail = time.time()
@@ -114,129 +215,52 @@ class CoscoScraper(SeleniumScraper):
                  logger.error("Lỗi khi chuyển về default content: %s", switch_err)
 
 
-    def _extract_schedule_date(self, cell, date_type):
-        # Helper: Trích xuất ngày từ cấu trúc table cell của trang kết quả.
-        try:
-            xpath_selector = f".//span[contains(text(), '{date_type}')]/following-sibling::span"
-            date_str = cell.find_element(By.XPATH, xpath_selector).text
-            if "Not yet" in date_str:
-                return None
-            return date_str.strip()
-        except NoSuchElementException:
-            return None
+    def _accept_cookies(self, cookie_button):
+        # Banner có thể hiện sau iframe: khi iframe có trước, chỉ kiểm tra banner một lần (không chờ)
+        t_cookie_start = time.time()
+        if cookie_button is None:
+            cookie_button = readiness.first_match(self.driver, _COOKIE_BUTTON)
+        if cookie_button is None:
+            logger.info("Banner cookie không xuất hiện hoặc đã được chấp nhận.")
+            return
+        cookie_button.click()
+        logger.info("Đã chấp nhận cookies. (Thời gian xử lý cookie: %.2fs)", metrics.observe("cookie", t_cookie_start))
 
     def _extract_and_normalize_data(self, tracking_number):
         # Trích xuất và chuẩn hóa dữ liệu từ trang kết quả của COSCO. Đã cập nhật logic tìm EtdTransit gần nhất > hôm nay.
         try:
+            # Chờ tiêu đề booking và bảng lịch trình, sau đó đọc toàn bộ trang trong một lần
+            self.wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, "div.ct-side-bar span.side-bar-title span")))
+            self.wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, "div.ant-table-content")))
+            page = dom_snapshot.snapshot(self.driver, COSCO_RESULT, log_prefix="[COSCO Scraper]")
+
             # === BƯỚC 1: LẤY THÔNG TIN TÓM TẮT ===
-            bkg_no_text = self.wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, "div.ct-side-bar span.side-bar-title span"))).text
+            bkg_no_text = page["bkg_title"]
             logger.info("Đã tìm thấy booking number text: %s", bkg_no_text)
             booking_no = re.search(r'BKG#"(\d+)"', bkg_no_text).group(1) if bkg_no_text else tracking_number
-            bl_number = booking_no
 
-            booking_status = self.driver.find_element(By.CSS_SELECTOR, "div.booking-status").text
+            booking_status = page["booking_status"] or ""
             logger.info("Đã tìm thấy booking status: %s", booking_status)
 
             # === BƯỚC 2: LẤY THÔNG TIN TỪ BẢNG "SCHEDULE DETAIL" ===
-            schedule_table = self.wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, "div.ant-table-content")))
-            logger.info("Đã tìm thấy schedule_table")
-            rows = schedule_table.find_elements(By.CSS_SELECTOR, "tbody tr")
-
+            rows = [row for row in page["schedule"] if len(row["cells"]) > 5]
             if not rows:
                 logger.warning("Không tìm thấy chặng nào trong Schedule Detail cho mã: %s", tracking_number)
                 return None
 
-            pol = rows[0].find_elements(By.TAG_NAME, "td")[2].text
-            logger.info("Đã tìm thấy POL: %s", pol)
-            pod = rows[-1].find_elements(By.TAG_NAME, "td")[4].text
-            logger.info("Đã tìm thấy POD: %s", pod)
-
-            etd, atd, eta, ata = None, None, None, None
-            etd_transit_final, atd_transit, transit_port_list, eta_transit, ata_transit = None, None, [], None, None
-
-            # Xử lý chặng đầu tiên
-            first_leg_cells = rows[0].find_elements(By.TAG_NAME, "td")
-            departure_cell = first_leg_cells[3]
-            etd = self._extract_schedule_date(departure_cell, 'Expected')
-            atd = self._extract_schedule_date(departure_cell, 'Actual')
-
-            # Xử lý chặng cuối
-            last_leg_cells = rows[-1].find_elements(By.TAG_NAME, "td")
-            arrival_cell = last_leg_cells[5]
-            eta = self._extract_schedule_date(arrival_cell, 'Expected')
-            ata = self._extract_schedule_date(arrival_cell, 'Actual')
-            
-            # Xử lý các chặng trung chuyển
-            future_etd_transits = []
-            today = date.today()
-            logger.info("Bắt đầu xử lý thông tin transit...")
-
-            for i in range(len(rows) - 1):
-                current_leg_cells = rows[i].find_elements(By.TAG_NAME, "td")
-                next_leg_cells = rows[i+1].find_elements(By.TAG_NAME, "td")
-
-                current_pod = current_leg_cells[4].text.strip()
-                next_pol = next_leg_cells[2].text.strip()
-
-                if current_pod == next_pol and current_pod:
-                    logger.debug("Tìm thấy cảng transit '%s' giữa chặng %d và %d", current_pod, i, i+1)
-                    if current_pod not in transit_port_list:
-                         transit_port_list.append(current_pod)
-
-                    arrival_at_transit_cell = current_leg_cells[5]
-                    temp_eta_transit = self._extract_schedule_date(arrival_at_transit_cell, 'Expected')
-                    temp_ata_transit = self._extract_schedule_date(arrival_at_transit_cell, 'Actual')
-                    if temp_ata_transit and not ata_transit:
-                         ata_transit = temp_ata_transit
-                         logger.debug("Tìm thấy AtaTransit đầu tiên: %s", ata_transit)
-                    elif temp_eta_transit and not ata_transit and not eta_transit:
-                         eta_transit = temp_eta_transit
-                         logger.debug("Tìm thấy EtaTransit đầu tiên: %s", eta_transit)
-
-                    departure_from_transit_cell = next_leg_cells[3]
-                    temp_etd_transit_str = self._extract_schedule_date(departure_from_transit_cell, 'Expected')
-                    temp_atd_transit = self._extract_schedule_date(departure_from_transit_cell, 'Actual')
-                    if temp_atd_transit:
-                         atd_transit = temp_atd_transit
-                         logger.debug("Cập nhật AtdTransit cuối cùng: %s", atd_transit)
-
-                    if temp_etd_transit_str:
-                        try:
-                            etd_transit_date = datetime.strptime(temp_etd_transit_str.split(' ')[0], '%Y-%m-%d').date()
-                            if etd_transit_date > today:
-                                future_etd_transits.append((etd_transit_date, current_pod, temp_etd_transit_str))
-                                logger.debug("Thêm ETD transit trong tương lai: %s (%s)", temp_etd_transit_str, current_pod)
-                        except (ValueError, IndexError):
-                            logger.warning("Không thể parse ETD transit: %s", temp_etd_transit_str)
-
-            if future_etd_transits:
-                future_etd_transits.sort()
-                etd_transit_final = future_etd_transits[0][2]
-                logger.info("ETD transit gần nhất trong tương lai được chọn: %s", etd_transit_final)
-            else:
-                 logger.info("Không tìm thấy ETD transit nào trong tương lai.")
-
-            # === BƯỚC 3: TẠO ĐỐI TƯỢNG JSON CHUẨN HÓA ===
-            shipment_data = N8nTrackingInfo(
-                BookingNo= booking_no.strip(),
-                BlNumber= bl_number.strip(),
-                BookingStatus= booking_status.strip(),
-                Pol= pol.strip(),
-                Pod= pod.strip(),
-                Etd= self._format_date(etd) or "",
-                Atd= self._format_date(atd) or "",
-                Eta= self._format_date(eta) or "",
-                Ata= self._format_date(ata) or "",
-                TransitPort= ", ".join(transit_port_list) if transit_port_list else "",
-                EtdTransit= self._format_date(etd_transit_final) or "",
-                AtdTransit= self._format_date(atd_transit) or "",
-                EtaTransit= self._format_date(eta_transit) or "",
-                AtaTransit= self._format_date(ata_transit) or ""
-            )
-            logger.info("Đã tạo đối tượng N8nTrackingInfo thành công.")
-            return shipment_data
+            # Mỗi chặng: cảng xếp/dỡ và ngày Expected/Actual của ô rời/đến
+            legs = [{
+                'pol': row["cells"][2],
+                'pod': row["cells"][4],
+                'etd': self._clean_schedule_date(row["etd"]),
+                'atd': self._clean_schedule_date(row["atd"]),
+                'eta': self._clean_schedule_date(row["eta"]),
+                'ata': self._clean_schedule_date(row["ata"]),
+            } for row in rows]
+
+            return self._build_tracking_info(booking_no, booking_status, legs)
 
         except Exception as e:
             # Log lỗi cụ thể khi trích xuất
             logger.error("Lỗi trong quá trình trích xuất chi tiết cho mã '%s': %s", tracking_number, e, exc_info=True)
-            return None
\ No newline at end of file
+            return None
@@ -1,35 +1,89 @@
+import json
 import logging
+import requests
 import pandas as pd
-from datetime import datetime, date
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, NoSuchElementException
+from selenium.common.exceptions import TimeoutException, NoSuchElementException, WebDriverException
 import time
 
 from ..selenium_scraper import SeleniumScraper
 from schemas import N8nTrackingInfo
+import metrics
+import tracing
+from .. import date_normalizer, dom_snapshot, extraction, readiness, timeline
+from ..extraction_specs import EMC_CONTAINER_MOVES_HTML
 
 # Lấy logger cho module này
 logger = logging.getLogger(__name__)
 
+# Thông tin B/L trên trang kết quả, đọc bằng một lần execute_script
+EMC_RESULT = dom_snapshot.DomSpec(
+    name="emc_result",
+    fields={
+        "bl_number": "//th[contains(text(), 'B/L No.')]/following-sibling::td",
+        "pol": "//th[contains(text(), 'Port of Loading')]/following-sibling::td",
+        "pod": "//th[contains(text(), 'Port of Discharge')]/following-sibling::td",
+        "etd": "//th[contains(text(), 'Estimated On Board Date')]/following-sibling::td",
+        "eta": "//td[contains(., 'Estimated Date of Arrival at Destination')]/font",
+    },
+)
+
+# Bảng 'Container Moves' trong popup container: mỗi hàng (Date, Moves, Location)
+EMC_CONTAINER_MOVES = dom_snapshot.DomSpec(
+    name="emc_container_moves",
+    tables={
+        "rows": ("(//td[contains(text(), 'Container Moves')]/ancestor::table)[1]//tr[td]", {"cells": [".//td"]}),
+    },
+)
+
+# Điều kiện readiness của trang tìm kiếm
+_COOKIE_BUTTON = readiness.Visible("#btn_cookie_accept_all")
+# Trang kết quả báo không có dữ liệu cho mã đã nhập
+_NO_DATA = readiness.Visible(
+    "//*[self::td or self::font or self::span][contains(text(), 'No data found') or contains(text(), 'No Data Found')]"
+)
+
+# Đọc đích của các link popup container (javascript:frmCntrMoveDetail(...)) mà không mở cửa sổ:
+# tạm thay window.open / HTMLFormElement.submit bằng hàm ghi lại URL, method và tham số form rồi chạy href của từng link
+_POPUP_TARGETS_SCRIPT = """
+const links = Array.from(document.querySelectorAll("a[href*='frmCntrMoveDetail']"));
+const absolute = (url) => new URL(url || location.href, location.href).href;
+const originalOpen = window.open;
+const originalSubmit = HTMLFormElement.prototype.submit;
+let requests = [];
+window.open = function (url) {
+    if (url && url !== "about:blank") requests.push({method: "GET", url: absolute(url), data: []});
+    return {closed: false, focus() {}, close() {}, document: {open() {}, write() {}, close() {}}};
+};
+HTMLFormElement.prototype.submit = function () {
+    const data = Array.from(new FormData(this).entries()).filter(([, value]) => typeof value === "string");
+    requests.push({method: (this.getAttribute("method") || "GET").toUpperCase(), url: absolute(this.getAttribute("action")), data: data});
+};
+const targets = [];
+try {
+    for (const link of links) {
+        requests = [];
+        const href = link.getAttribute("href");
+        if (/^javascript:/i.test(href)) {
+            try { (0, eval)(decodeURIComponent(href.replace(/^javascript:/i, ""))); } catch (e) {}
+        } else {
+            requests.push({method: "GET", url: absolute(href), data: []});
+        }
+        // Request cuối cùng là request tải nội dung popup (window.open('') rồi form.submit())
+        targets.push({container: link.innerText.trim(), request: requests.length ? requests[requests.length - 1] : null});
+    }
+} finally {
+    window.open = originalOpen;
+    HTMLFormElement.prototype.submit = originalSubmit;
+}
+return JSON.stringify(targets);
+"""
+
 class EmcScraper(SeleniumScraper):
     # Triển khai logic scraping cho Evergreen (EMC) và chuẩn hóa kết quả theo template JSON yêu cầu.
 
-    def _format_date(self, date_str):
-        # Chuyển đổi chuỗi ngày từ 'MON-DD-YYYY' (ví dụ: SEP-21-2025) sang 'DD/MM/YYYY'.
-        if not date_str or not isinstance(date_str, str):
-            return None
-        try:
-            # Đảm bảo tháng viết hoa chữ cái đầu để parse
-            date_str_title = date_str.strip().title()
-            # Định dạng của EMC là %b-%d-%Y (ví dụ: Sep-21-2025)
-            dt_obj = datetime.strptime(date_str_title, '%b-%d-%Y')
-            return dt_obj.strftime('%d/%m/%Y')
-        except (ValueError, IndexError):
-            logger.warning("Không thể phân tích định dạng ngày: %s", date_str)
-            return date_str
-
     def scrape(self, tracking_number):
         # Phương thức scraping chính cho Evergreen.
         logger.info("Bắt đầu scrape cho mã: %s", tracking_number)
@@ -39,17 +93,21 @@ class EmcScraper(SeleniumScraper):
             t_nav_start = time.time()
             self.driver.get(self.config['url'])
             self.wait = WebDriverWait(self.driver, 30)
-            logger.info("-> (Thời gian) Tải trang: %.2fs", time.time() - t_nav_start)
+            logger.info("-> (Thời gian) Tải trang: %.2fs", metrics.observe("navigation", t_nav_start))
             
-            t_cookie_start = time.time()
-            try:
-                cookie_button = WebDriverWait(self.driver, 3).until(
-                    EC.element_to_be_clickable((By.ID, "btn_cookie_accept_all"))
-                )
+            # Chờ banner cookie hoặc form tìm kiếm (cái nào có trước), không chờ cố định khi không có banner
+            state, element = readiness.wait_for_any(self.driver, {
+                "cookie": _COOKIE_BUTTON,
+                "form": readiness.Visible("#s_bl"),
+            }, timeout=30, phase="banner cookie / form tìm kiếm", log_prefix="[EMC Scraper]")
+            # Banner có thể hiện sau form: khi form có trước, chỉ kiểm tra banner một lần (không chờ)
+            cookie_button = element if state == "cookie" else readiness.first_match(self.driver, _COOKIE_BUTTON)
+            if cookie_button is not None:
+                t_cookie_start = time.time()
                 cookie_button.click()
-                logger.info("-> Đã chấp nhận cookies. (Thời gian xử lý: %.2fs)", time.time() - t_cookie_start)
-            except TimeoutException:
-                logger.info("-> Banner cookie không xuất hiện. (Thời gian kiểm tra: %.2fs)", time.time() - t_cookie_start)
+                logger.info("-> Đã chấp nhận cookies. (Thời gian xử lý: %.2fs)", metrics.observe("cookie", t_cookie_start))
+            else:
+                logger.info("-> Banner cookie không xuất hiện.")
 
             # --- 1. Thực hiện tìm kiếm ---
             logger.info("-> Điền thông tin tìm kiếm...")
@@ -63,18 +121,20 @@ class EmcScraper(SeleniumScraper):
 
             submit_button = self.driver.find_element(By.CSS_SELECTOR, "#nav-quick > table > tbody > tr:nth-child(1) > td > table > tbody > tr:nth-child(1) > td.ec-text-start > table > tbody > tr > td > div:nth-child(2) > input")
             submit_button.click()
-            logger.info("-> (Thời gian) Gửi form tìm kiếm: %.2fs", time.time() - t_search_start)
+            logger.info("-> (Thời gian) Gửi form tìm kiếm: %.2fs", metrics.observe("search", t_search_start))
 
-            # --- 2. Chờ trang kết quả và trích xuất dữ liệu ---
+            # --- 2. Chờ trang kết quả (hoặc thông báo không có dữ liệu) và trích xuất dữ liệu ---
             logger.info("-> Chờ trang kết quả tải...")
-            t_wait_result_start = time.time()
-            # Đợi một phần tử đáng tin cậy trên trang kết quả xuất hiện
-            self.wait.until(EC.visibility_of_element_located((By.XPATH, "//th[contains(text(), 'B/L No.')]")))
-            logger.info("-> Trang kết quả đã tải. (Thời gian chờ: %.2fs)", time.time() - t_wait_result_start)
+            state, _ = readiness.wait_for_any(self.driver, {
+                "result": readiness.Visible("//th[contains(text(), 'B/L No.')]"),
+                "error": _NO_DATA,
+            }, timeout=30, phase="kết quả tìm kiếm", log_prefix="[EMC Scraper]")
+            if state == "error":
+                return None, f"Không tìm thấy kết quả cho '{tracking_number}'."
             
             t_extract_start = time.time()
             normalized_data = self._extract_and_normalize_data(tracking_number, main_window)
-            logger.info("-> (Thời gian) Trích xuất dữ liệu: %.2fs", time.time() - t_extract_start)
+            logger.info("-> (Thời gian) Trích xuất dữ liệu: %.2fs", metrics.observe("extract", t_extract_start))
 
             if not normalized_data:
                 return None, f"Không thể trích xuất dữ liệu đã chuẩn hóa cho '{tracking_number}'."
@@ -86,14 +146,10 @@ class EmcScraper(SeleniumScraper):
 
         except TimeoutException:
             t_total_fail = time.time()
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            screenshot_path = f"output/emc_timeout_{tracking_number}_{timestamp}.png"
-            try:
-                self.driver.save_screenshot(screenshot_path)
-                logger.warning("Timeout khi scrape mã '%s'. Đã lưu ảnh chụp màn hình vào %s (Tổng thời gian: %.2fs)", 
-                             tracking_number, screenshot_path, t_total_fail - t_total_start)
-            except Exception as ss_e:
-                logger.error("Không thể lưu ảnh chụp màn hình khi bị timeout cho mã '%s': %s", tracking_number, ss_e)
+            # Ảnh chụp + DOM được lấy nhanh, ghi file chạy nền (có lấy mẫu và giới hạn dung lượng)
+            artifact_path = self._save_failure_artifacts(tracking_number)
+            logger.warning("Timeout khi scrape mã '%s'. Artifact: %s (Tổng thời gian: %.2fs)",
+                           tracking_number, artifact_path or "bỏ qua", t_total_fail - t_total_start)
             return None, f"Không tìm thấy kết quả cho '{tracking_number}' (Timeout)."
         except Exception as e:
             t_total_fail = time.time()
@@ -110,186 +166,237 @@ class EmcScraper(SeleniumScraper):
                  logger.error("Lỗi khi chuyển về cửa sổ chính: %s", switch_err)
 
 
+    def _return_to_main_window(self, main_window):
+        # Đóng cửa sổ hiện tại (nếu là popup) và quay lại cửa sổ chính
+        if self.driver.current_window_handle != main_window:
+            try:
+                self.driver.close()
+            except: pass
+            self.driver.switch_to.window(main_window)
+
+    def _collect_events_sequentially(self, container_links, main_window):
+        # Mở lần lượt từng popup container, trích xuất sự kiện rồi đóng lại.
+        all_events = []
+        for link in container_links:
+            try:
+                container_no = link.text.strip()
+                logger.info(f"Đang xử lý container: {container_no}")
+                link.click()
+
+                # Chờ cửa sổ mới mở ra và chuyển sang nó
+                self.wait.until(EC.number_of_windows_to_be(2))
+                new_window = [window for window in self.driver.window_handles if window != main_window][0]
+                self.driver.switch_to.window(new_window)
+                logger.debug("-> Đã chuyển sang cửa sổ popup.")
+
+                events = self._extract_events_from_popup()
+                all_events.extend(events)
+
+                # Đóng cửa sổ popup và quay lại cửa sổ chính
+                self.driver.close()
+                logger.debug("-> Đã đóng popup.")
+                self.driver.switch_to.window(main_window)
+                logger.debug("-> Đã chuyển về cửa sổ chính.")
+            except Exception as e:
+                logger.warning(f"Không thể xử lý popup cho container. Lỗi: {e}", exc_info=True)
+                # Cố gắng quay lại cửa sổ chính nếu có lỗi
+                self._return_to_main_window(main_window)
+        return all_events
+
+    def _collect_events_concurrently(self, container_links, main_window):
+        """
+        Mở popup của nhiều container cùng lúc (theo từng nhóm tối đa max_container_workers)
+        để trình duyệt tải song song, sau đó lần lượt đọc và đóng từng popup.
+        Nếu trang dùng chung một cửa sổ popup cho mọi container thì quay về xử lý tuần tự.
+        """
+        batch_size = max(1, self.config.get('max_container_workers', 4))
+        event_lists = []
+        for i in range(0, len(container_links), batch_size):
+            batch = container_links[i:i + batch_size]
+            t_batch_start = time.time()
+            existing_windows = set(self.driver.window_handles)
+            for link in batch:
+                logger.info(f"Đang mở popup container: {link.text.strip()}")
+                link.click()
+
+            new_windows = []
+            try:
+                # Chờ ít nhất một popup mở ra, sau đó chờ ngắn để các popup còn lại xuất hiện
+                self.wait.until(lambda d: len(set(d.window_handles) - existing_windows) >= 1)
+                WebDriverWait(self.driver, 2).until(lambda d: len(set(d.window_handles) - existing_windows) >= len(batch))
+            except TimeoutException:
+                pass
+            new_windows = [w for w in self.driver.window_handles if w not in existing_windows]
+
+            if len(new_windows) < len(batch):
+                # Các popup ghi đè lên nhau -> đóng popup đã mở và xử lý tuần tự nhóm này
+                logger.warning("Chỉ mở được %d/%d popup cùng lúc, chuyển sang xử lý tuần tự.", len(new_windows), len(batch))
+                for window in new_windows:
+                    self.driver.switch_to.window(window)
+                    self._return_to_main_window(main_window)
+                event_lists.append(self._collect_events_sequentially(batch, main_window))
+                continue
+
+            for window in new_windows:
+                try:
+                    self.driver.switch_to.window(window)
+                    event_lists.append(self._extract_events_from_popup())
+                except Exception as e:
+                    logger.warning(f"Không thể xử lý popup cho container. Lỗi: {e}", exc_info=True)
+                finally:
+                    self._return_to_main_window(main_window)
+            logger.info("-> (Thời gian) Xử lý %d popup container: %.2fs", len(batch), time.time() - t_batch_start)
+        return event_lists
+
+    def _read_popup_targets(self):
+        """Đích (method, URL, tham số form) của popup từng container, theo thứ tự các link; [] nếu không đọc được."""
+        try:
+            targets = json.loads(self.driver.execute_script(_POPUP_TARGETS_SCRIPT))
+        except (WebDriverException, TypeError, ValueError) as e:
+            logger.warning("Không đọc được đích popup container bằng JavaScript: %s", e)
+            return []
+        return targets
+
+    def _create_http_session(self):
+        # Session requests dùng lại cookie, User-Agent và proxy của trình duyệt
+        session = tracing.trace_requests(requests.Session())
+        session.headers.update({
+            'User-Agent': self.driver.execute_script("return navigator.userAgent;"),
+            'Referer': self.driver.current_url,
+        })
+        for cookie in self.driver.get_cookies():
+            session.cookies.set(cookie['name'], cookie['value'], domain=cookie.get('domain', ''), path=cookie.get('path', '/'))
+        if self.http_proxy:
+            session.proxies.update({'http': self.http_proxy, 'https': self.http_proxy})
+        return session
+
+    def _collect_events_over_http(self, container_links, main_window):
+        """
+        Tải trang 'Container Moves' của các container song song bằng HTTP (cookie của driver) và parse bằng lxml,
+        thay vì mở từng popup. Container nào không tải được thì quay về mở popup cho riêng container đó.
+        """
+        targets = self._read_popup_targets()[:len(container_links)]
+        if len(targets) != len(container_links) or not all(target["request"] for target in targets):
+            logger.warning("Không xác định được đích popup của mọi container, chuyển sang mở popup.")
+            return None
+
+        session = self._create_http_session()
+
+        def fetch(target):
+            request = target["request"]
+            if request["method"] == "POST":
+                response = session.post(request["url"], data=request["data"], timeout=20)
+            else:
+                response = session.get(request["url"], params=request["data"] or None, timeout=20)
+            response.raise_for_status()
+            document = extraction.parse_html(response.content, extraction.response_charset(response))
+            events = self._events_from_rows(extraction.extract(EMC_CONTAINER_MOVES_HTML, document)["rows"])
+            if not events:
+                raise ValueError("Không có bảng 'Container Moves' trong response")
+            logger.info(f"-> Container {target['container']}: {len(events)} sự kiện (HTTP).")
+            return events
+
+        t_fetch_start = time.time()
+        try:
+            event_lists = self._fetch_concurrently(fetch, targets, max_workers=self.config.get('max_container_workers', 4))
+        finally:
+            session.close()
+        logger.info("-> (Thời gian) Tải %d trang container bằng HTTP: %.2fs", len(targets), time.time() - t_fetch_start)
+
+        failed = [link for link, events in zip(container_links, event_lists) if events is None]
+        if failed:
+            logger.warning("%d/%d container không tải được bằng HTTP, mở popup cho các container này.",
+                           len(failed), len(container_links))
+            event_lists.append(self._collect_events_sequentially(failed, main_window))
+        return [events for events in event_lists if events is not None]
+
+    def _events_from_rows(self, rows):
+        # Mỗi hàng của bảng 'Container Moves' cần ít nhất 3 cột: Date, Moves, Location
+        return [
+            {"date": row["cells"][0], "description": row["cells"][1], "location": row["cells"][2]}
+            for row in rows if len(row["cells"]) >= 3
+        ]
+
     def _extract_events_from_popup(self):
         # Trích xuất lịch sử di chuyển từ cửa sổ popup của container.
         events = []
         try:
-            # Chờ bảng trong popup xuất hiện
-            event_table = self.wait.until(EC.visibility_of_element_located((By.XPATH, "//td[contains(text(), 'Container Moves')]/ancestor::table")))
-            # Tìm tất cả các hàng trong tbody (bỏ qua hàng header)
-            rows = event_table.find_elements(By.XPATH, ".//tr[td]")
-            
-            for row in rows:
-                cells = row.find_elements(By.TAG_NAME, "td")
-                if len(cells) >= 3: # Cần ít nhất 3 cột: Date, Moves, Location
-                    events.append({
-                        "date": cells[0].text.strip(),
-                        "description": cells[1].text.strip(),
-                        "location": cells[2].text.strip(),
-                    })
+            # Chờ bảng trong popup xuất hiện, sau đó đọc cả bảng trong một lần
+            self.wait.until(EC.visibility_of_element_located((By.XPATH, "//td[contains(text(), 'Container Moves')]/ancestor::table")))
+            rows = dom_snapshot.snapshot(self.driver, EMC_CONTAINER_MOVES, log_prefix="[EMC Scraper]")["rows"]
+            events = self._events_from_rows(rows)
             logger.info(f"-> Đã trích xuất được {len(events)} sự kiện từ popup.")
         except (NoSuchElementException, TimeoutException):
             logger.warning("Không tìm thấy bảng sự kiện trong popup hoặc popup không tải kịp.")
         return events
 
-    def _find_event_by_keywords(self, events, desc_keyword, loc_keyword):
-        # Tìm một sự kiện cụ thể trong danh sách, trả về sự kiện đầu tiên khớp.
-        if not events or not loc_keyword:
-            return {}
-        
-        # Làm sạch loc_keyword để so sánh (ví dụ: "HAIPHONG, VIETNAM (VN)" -> "HAIPHONG")
-        simple_loc_keyword = loc_keyword.split(",")[0].strip().lower()
-
-        for event in events:
-            desc_match = desc_keyword.lower() in event.get("description", "").lower()
-            
-            # So sánh địa điểm đã làm sạch
-            event_loc = event.get("location", "")
-            simple_event_loc = event_loc.split(",")[0].strip().lower()
-            loc_match = simple_loc_keyword in simple_event_loc
-
-            if desc_match and loc_match:
-                return event
-        return {}
-    
-    def _parse_sortable_date(self, date_str):
-        # Helper: Chuyển ngày 'Sep-21-2025' thành đối tượng datetime để sort.
-        if not date_str:
-            return datetime.min
-        try:
-            return datetime.strptime(date_str.strip().title(), '%b-%d-%Y')
-        except ValueError:
-            logger.warning("Không thể parse ngày để sort: %s", date_str)
-            return datetime.min # Đẩy các ngày lỗi về đầu
-
     def _extract_and_normalize_data(self, tracking_number, main_window):
         # Hàm chính để trích xuất dữ liệu từ trang kết quả và các popup.
         try:
             # --- LẤY THÔNG TIN CƠ BẢN TỪ TRANG CHÍNH ---
-            bl_number = None
-            pol = None
-            pod = None
-            etd_str = None
-            eta_str = None
-            
-            try:
-                bl_number = self.driver.find_element(By.XPATH, "//th[contains(text(), 'B/L No.')]/following-sibling::td").text.strip()
-                pol = self.driver.find_element(By.XPATH, "//th[contains(text(), 'Port of Loading')]/following-sibling::td").text.strip()
-                pod = self.driver.find_element(By.XPATH, "//th[contains(text(), 'Port of Discharge')]/following-sibling::td").text.strip()
-                etd_str = self.driver.find_element(By.XPATH, "//th[contains(text(), 'Estimated On Board Date')]/following-sibling::td").text.strip()
-                eta_str = self.driver.find_element(By.XPATH, "//td[contains(., 'Estimated Date of Arrival at Destination')]/font").text.strip()
-            except NoSuchElementException as e:
-                logger.error("Không thể tìm thấy một số trường thông tin cơ bản trên trang kết quả: %s", e, exc_info=True)
-                # Tiếp tục với các trường trống nếu không tìm thấy
-                if bl_number is None:
-                    bl_number = ""
-                if pol is None:
-                    pol = ""
-                if pod is None:
-                    pod = ""
-                if etd_str is None:
-                    etd_str = ""
+            page = dom_snapshot.snapshot(self.driver, EMC_RESULT, log_prefix="[EMC Scraper]")
+            missing = [name for name, value in page.items() if value is None]
+            if missing:
+                logger.error("Không thể tìm thấy một số trường thông tin cơ bản trên trang kết quả: %s", ", ".join(missing))
+            # Tiếp tục với các trường trống nếu không tìm thấy
+            bl_number = page["bl_number"] or ""
+            pol = page["pol"] or ""
+            pod = page["pod"] or ""
+            etd_str = page["etd"] or ""
+            eta_str = page["eta"]
             
             logger.info(f"Thông tin cơ bản: B/L={bl_number}, POL={pol}, POD={pod}, ETD={etd_str}, ETA={eta_str}")
 
-            # --- LẤY SỰ KIỆN TỪ 1 CONTAINER ĐẦU TIÊN ---
-            all_events = []
+            # --- LẤY SỰ KIỆN TỪ CÁC CONTAINER ---
             container_links = self.driver.find_elements(By.XPATH, "//a[contains(@href, 'frmCntrMoveDetail')]")
-            
-            logger.info(f"Tìm thấy {len(container_links)} container. Sẽ chỉ xử lý 1 container đầu tiên theo yêu cầu.")
-            
-            # Chỉ lặp qua 1 link đầu tiên
-            for link in container_links[:1]:
-                try:
-                    container_no = link.text.strip()
-                    logger.info(f"Đang xử lý container: {container_no}")
-                    link.click()
-                    
-                    # Chờ cửa sổ mới mở ra và chuyển sang nó
-                    self.wait.until(EC.number_of_windows_to_be(2))
-                    new_window = [window for window in self.driver.window_handles if window != main_window][0]
-                    self.driver.switch_to.window(new_window)
-                    logger.debug("-> Đã chuyển sang cửa sổ popup.")
-
-                    events = self._extract_events_from_popup()
-                    all_events.extend(events)
-
-                    # Đóng cửa sổ popup và quay lại cửa sổ chính
-                    self.driver.close()
-                    logger.debug("-> Đã đóng popup.")
-                    self.driver.switch_to.window(main_window)
-                    logger.debug("-> Đã chuyển về cửa sổ chính.")
-                except Exception as e:
-                    logger.warning(f"Không thể xử lý popup cho container. Lỗi: {e}", exc_info=True)
-                    # Cố gắng quay lại cửa sổ chính nếu có lỗi
-                    if self.driver.current_window_handle != main_window:
-                        try:
-                            self.driver.close()
-                        except: pass
-                        self.driver.switch_to.window(main_window)
-
-            logger.info(f"Tổng cộng đã thu thập được {len(all_events)} sự kiện (từ 1 container).")
+            fetch_all_containers = self.config.get('fetch_all_containers', False)
+            if not fetch_all_containers:
+                logger.info(f"Tìm thấy {len(container_links)} container. Sẽ chỉ xử lý 1 container đầu tiên theo yêu cầu.")
+                container_links = container_links[:1]
+            else:
+                logger.info(f"Tìm thấy {len(container_links)} container. Sẽ xử lý tất cả container.")
+
+            event_lists = None
+            if self.config.get('popup_http_fetch', False) and container_links:
+                event_lists = self._collect_events_over_http(container_links, main_window)
+            if event_lists is None:
+                if fetch_all_containers:
+                    event_lists = self._collect_events_concurrently(container_links, main_window)
+                else:
+                    event_lists = [self._collect_events_sequentially(container_links, main_window)]
+
+            all_events = self._merge_event_lists(
+                event_lists,
+                key_func=lambda ev: (ev.get("date"), ev.get("description"), ev.get("location"))
+            )
+            logger.info(f"Tổng cộng đã thu thập được {len(all_events)} sự kiện (từ {len(event_lists)} nhóm container).")
             if not all_events:
                  logger.warning("Không thu thập được sự kiện nào từ các popup.")
 
-            # --- TÌM CÁC SỰ KIỆN QUAN TRỌNG ---
-            # Thêm "parsed_date" vào mỗi sự kiện và sort
-            sorted_events = sorted(
-                [{**event, "parsed_date": self._parse_sortable_date(event.get("date"))} for event in all_events],
-                key=lambda x: x["parsed_date"]
-            )
-            
-            atd_event = self._find_event_by_keywords(sorted_events, "Loaded", pol)
-            ata_event = self._find_event_by_keywords(sorted_events, "Discharged", pod)
+            # --- TÌM CÁC SỰ KIỆN QUAN TRỌNG VÀ THÔNG TIN TRUNG CHUYỂN ---
+            # Timeline engine (quy tắc 'EMC'): sắp xếp theo ngày, ATD = 'Loaded' đầu tiên tại POL,
+            # ATA = 'Discharged' đầu tiên tại POD; tại cảng transit: AtaTransit = 'Discharged' đầu tiên, AtdTransit = 'Loaded' cuối cùng
+            derived = timeline.derive("EMC", all_events, pol, pod)
+            logger.info(f"Timeline: ATD={derived['Atd']}, ATA={derived['Ata']}, Transit={derived['TransitPort']}, "
+                        f"AtaTransit={derived['AtaTransit']}, AtdTransit={derived['AtdTransit']}")
 
-            # --- TÌM THÔNG TIN TRUNG CHUYỂN ---
-            transit_ports = []
-            ata_transit_event = None
-            atd_transit_event = None
-            
-            # Đơn giản hóa POL/POD để so sánh
-            simple_pol = pol.split(",")[0].strip().lower()
-            simple_pod = pod.split(",")[0].strip().lower()
-
-            for event in sorted_events:
-                loc = event.get("location", "")
-                simple_loc = loc.split(",")[0].strip().lower()
-                desc = event.get("description", "").lower()
-                
-                # Bỏ qua nếu không có địa điểm hoặc là POL/POD
-                if not simple_loc or simple_loc == simple_pol or simple_loc == simple_pod:
-                    continue
-                
-                # Sự kiện dỡ hàng tại cảng transit
-                if "discharged" in desc:
-                    if loc not in transit_ports: 
-                        transit_ports.append(loc)
-                    if not ata_transit_event: # Chỉ lấy sự kiện đầu tiên
-                        ata_transit_event = event
-                        logger.info(f"Tìm thấy sự kiện AtaTransit: {event}")
-                
-                # Sự kiện xếp hàng lên tàu transit
-                if "loaded on outbound vessel" in desc or "transship container loaded" in desc:
-                    if loc not in transit_ports: 
-                        transit_ports.append(loc)
-                    atd_transit_event = event # Lấy sự kiện cuối cùng
-                    logger.info(f"Tìm thấy sự kiện AtdTransit: {event}")
-            
             shipment_data = N8nTrackingInfo(
                 BookingNo= tracking_number,
                 BlNumber= bl_number,
                 BookingStatus= "", 
                 Pol= pol,
                 Pod= pod,
-                Etd= self._format_date(etd_str) or "",
-                Atd= self._format_date(atd_event.get("date")) if atd_event else "",
-                Eta= self._format_date(eta_str) or "",
-                Ata= self._format_date(ata_event.get("date")) if ata_event else "",
-                TransitPort= ", ".join(transit_ports) if transit_ports else "",
+                **date_normalizer.normalize_shipment_dates("EMC", {
+                    "Etd": etd_str,
+                    "Atd": derived["Atd"],
+                    "Eta": eta_str,
+                    "Ata": derived["Ata"],
+                    "AtdTransit": derived["AtdTransit"],
+                    "AtaTransit": derived["AtaTransit"],
+                }),
+                TransitPort= derived["TransitPort"],
                 EtdTransit= "",
-                AtdTransit= self._format_date(atd_transit_event.get("date")) if atd_transit_event else "",
                 EtaTransit= "",
-                AtaTransit= self._format_date(ata_transit_event.get("date")) if ata_transit_event else ""
             )
             
             return shipment_data
@@ -1,35 +1,48 @@
 import logging
 import pandas as pd
-from datetime import datetime, date
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import NoSuchElementException, TimeoutException
+from selenium.common.exceptions import TimeoutException
 import re
 import time
 
 from ..selenium_scraper import SeleniumScraper
 from schemas import N8nTrackingInfo
+import metrics
+from .. import date_normalizer, dom_snapshot, readiness
+from ..extraction import has_class
 
 # Thiết lập logger cho module này
 logger = logging.getLogger(__name__)
 
+_IAL_MAIN_GROUP = f"(//*[{has_class('main-group')}])[1]"
+# Các khối container: <div> con của main-group chứa <p> có text 'Container No'
+_IAL_CONTAINER_BLOCKS = f"{_IAL_MAIN_GROUP}/div[.//p[contains(text(), 'Container No')]]"
+
+# Trang chi tiết B/L, đọc bằng một lần execute_script
+IAL_DETAIL = dom_snapshot.DomSpec(
+    name="ial_detail",
+    fields={
+        # Bảng tóm tắt (m-table-group đầu tiên): POL, POD, ETD, ETA
+        "summary_cells": [f"({_IAL_MAIN_GROUP}//*[{has_class('m-table-group')}])[1]//tbody//tr//td"],
+    },
+    tables={
+        "containers": (_IAL_CONTAINER_BLOCKS, {"title": f".//p[{has_class('title')}]"}),
+        # Chỉ xử lý container đầu tiên. Cột 1: Event Date, 2: Depot, 3: Port, 4: Event Description
+        "event_rows": (f"(({_IAL_CONTAINER_BLOCKS})[1]//*[{has_class('m-table-group')}])[1]//tbody//tr",
+                       {"cells": [".//td"]}),
+    },
+)
+
+# Dòng báo không có dữ liệu trong bảng kết quả tìm kiếm
+_NO_DATA = readiness.Visible(
+    "//*[contains(@class, 'm-table-group')]//td[contains(., 'No data') or contains(., 'No Data') or contains(., 'no record')]"
+)
+
 class InterasiaScraper(SeleniumScraper):
     # Triển khai logic scraping cho Interasia (đã cập nhật) và chuẩn hóa kết quả theo template JSON yêu cầu, sử dụng logging.
 
-    def _format_date(self, date_str):
-        # Chuyển đổi chuỗi ngày từ 'YYYY/MM/DD HH:MM:SS' sang 'DD/MM/YYYY'.
-        if not date_str or not isinstance(date_str, str):
-            return None
-        try:
-            # Lấy phần ngày tháng năm, bỏ qua phần giờ
-            date_part = date_str.split(" ")[0]
-            dt_obj = datetime.strptime(date_part, '%Y/%m/%d')
-            return dt_obj.strftime('%d/%m/%Y')
-        except (ValueError, IndexError):
-            logger.warning("Không thể phân tích định dạng ngày: %s", date_str)
-            return date_str # Trả về chuỗi gốc nếu không parse được
-
     def scrape(self, tracking_number):
         # Phương thức scrape chính cho Interasia. Thực hiện tìm kiếm, click vào link chi tiết và trích xuất dữ liệu.
         logger.info("Bắt đầu scrape cho mã: %s (Interasia)", tracking_number)
@@ -38,7 +51,7 @@ class InterasiaScraper(SeleniumScraper):
             t_nav_start = time.time()
             self.driver.get(self.config['url'])
             self.wait = WebDriverWait(self.driver, 20)
-            logger.info("-> (Thời gian) Tải trang: %.2fs", time.time() - t_nav_start)
+            logger.info("-> (Thời gian) Tải trang: %.2fs", metrics.observe("navigation", t_nav_start))
 
 
             # --- 1. Thực hiện tìm kiếm ---
@@ -48,17 +61,21 @@ class InterasiaScraper(SeleniumScraper):
             search_input.clear()
             search_input.send_keys(tracking_number)
             self.driver.find_element(By.CSS_SELECTOR, "#containerSumbit").click()
-            logger.info("Đã gửi yêu cầu tìm kiếm cho: %s. (Thời gian tìm kiếm: %.2fs)", tracking_number, time.time() - t_search_start)
+            logger.info("Đã gửi yêu cầu tìm kiếm cho: %s. (Thời gian tìm kiếm: %.2fs)", tracking_number, metrics.observe("search", t_search_start))
 
             # --- 2. Lấy link chi tiết B/L và truy cập ---
             t_wait_link_start = time.time()
             logger.debug("Chờ link chi tiết B/L từ trang kết quả...")
             detail_link = None
             try:
-                # Chờ cho đến khi bảng kết quả ban đầu xuất hiện
-                detail_link_element = self.wait.until(
-                    EC.presence_of_element_located((By.CSS_SELECTOR, ".m-table-group tbody tr:first-child td:first-child a[href*='/Service/ContainerDetail']"))
-                )
+                # Chờ link chi tiết trong bảng kết quả hoặc dòng báo không có dữ liệu (cái nào có trước)
+                state, detail_link_element = readiness.wait_for_any(self.driver, {
+                    "result": readiness.Present(".m-table-group tbody tr:first-child td:first-child a[href*='/Service/ContainerDetail']"),
+                    "empty": _NO_DATA,
+                }, timeout=20, phase="bảng kết quả", log_prefix="[Interasia Scraper]")
+                if state == "empty":
+                    logger.warning("Bảng kết quả không có dữ liệu cho '%s'.", tracking_number)
+                    return None, f"Không tìm thấy dữ liệu cho '{tracking_number}' trên trang kết quả chính."
                 detail_link = detail_link_element.get_attribute('href')
                 logger.info("Đã tìm thấy link chi tiết: %s. (Thời gian chờ link: %.2fs)", detail_link, time.time() - t_wait_link_start)
             except TimeoutException:
@@ -83,14 +100,10 @@ class InterasiaScraper(SeleniumScraper):
 
         except TimeoutException:
             t_total_fail = time.time()
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            screenshot_path = f"output/interasia_timeout_{tracking_number}_{timestamp}.png"
-            try:
-                self.driver.save_screenshot(screenshot_path)
-                logger.warning("Timeout khi scrape mã '%s'. Đã lưu ảnh chụp màn hình vào %s (Tổng thời gian: %.2fs)",
-                             tracking_number, screenshot_path, t_total_fail - t_total_start)
-            except Exception as ss_e:
-                logger.error("Không thể lưu ảnh chụp màn hình khi bị timeout cho mã '%s': %s", tracking_number, ss_e)
+            # Ảnh chụp + DOM được lấy nhanh, ghi file chạy nền (có lấy mẫu và giới hạn dung lượng)
+            artifact_path = self._save_failure_artifacts(tracking_number)
+            logger.warning("Timeout khi scrape mã '%s'. Artifact: %s (Tổng thời gian: %.2fs)",
+                           tracking_number, artifact_path or "bỏ qua", t_total_fail - t_total_start)
             return None, f"Không tìm thấy kết quả cho '{tracking_number}' (Timeout)."
         except Exception as e:
             t_total_fail = time.time()
@@ -106,39 +119,38 @@ class InterasiaScraper(SeleniumScraper):
             t_nav_detail_start = time.time()
             self.driver.get(detail_url)
             # Chờ phần tử chính của trang chi tiết
-            main_group = self.wait.until(EC.presence_of_element_located((By.CLASS_NAME, "main-group")))
-            logger.info("-> (Thời gian) Tải trang chi tiết: %.2fs", time.time() - t_nav_detail_start)
+            self.wait.until(EC.presence_of_element_located((By.CLASS_NAME, "main-group")))
+            logger.info("-> (Thời gian) Tải trang chi tiết: %.2fs", metrics.observe("navigation", t_nav_detail_start))
 
 
             # 1. Trích xuất thông tin tóm tắt chung (từ bảng đầu tiên)
             t_summary_start = time.time()
             logger.debug("Trích xuất thông tin tóm tắt (POL, POD, ETD, ETA)...")
-            summary_table = main_group.find_element(By.CSS_SELECTOR, ".m-table-group")
-            cells = summary_table.find_elements(By.CSS_SELECTOR, "tbody tr td")
+            page = dom_snapshot.snapshot(self.driver, IAL_DETAIL, log_prefix="[Interasia Scraper]")
+            cells = page["summary_cells"]
 
-            pol = cells[0].text.strip() if len(cells) > 0 else None
-            pod = cells[1].text.strip() if len(cells) > 1 else None
-            etd = cells[2].text.strip() if len(cells) > 2 else None
-            eta = cells[3].text.strip() if len(cells) > 3 else None
+            pol = cells[0] if len(cells) > 0 else None
+            pod = cells[1] if len(cells) > 1 else None
+            etd = cells[2] if len(cells) > 2 else None
+            eta = cells[3] if len(cells) > 3 else None
             logger.info(f"Summary: POL={pol}, POD={pod}, ETD={etd}, ETA={eta}")
-            logger.debug("-> (Thời gian) Trích xuất tóm tắt: %.2fs", time.time() - t_summary_start)
+            logger.debug("-> (Thời gian) Trích xuất tóm tắt: %.2fs", metrics.observe("extract", t_summary_start))
 
 
             # 2. Lặp qua container ĐẦU TIÊN để tổng hợp sự kiện
             t_event_start = time.time()
             logger.debug("Tổng hợp sự kiện từ container đầu tiên...")
             all_events = []
-            # Selector này tìm các thẻ <div> chứa <p> có text 'Container No'
-            container_blocks = main_group.find_elements(By.XPATH, "./div[.//p[contains(text(), 'Container No')]]")
+            container_blocks = page["containers"]
             logger.info(f"Tìm thấy {len(container_blocks)} khối container. Sẽ chỉ xử lý container đầu tiên.")
 
             # Chỉ xử lý block đầu tiên
             if container_blocks:
-                events = self._extract_events_from_container(container_blocks[0]) # Chỉ lấy block đầu tiên
+                events = self._extract_events_from_container(container_blocks[0], page["event_rows"])
                 all_events.extend(events)
 
             logger.info(f"Tổng cộng {len(all_events)} sự kiện đã được thu thập (từ container đầu tiên).")
-            logger.debug("-> (Thời gian) Thu thập sự kiện: %.2fs", time.time() - t_event_start)
+            logger.debug("-> (Thời gian) Thu thập sự kiện: %.2fs", metrics.observe("extract", t_event_start))
 
 
             # 3. Tìm các sự kiện quan trọng (ATD, ATA) từ danh sách đã tổng hợp
@@ -191,7 +203,7 @@ class InterasiaScraper(SeleniumScraper):
             atd_transit = transit_departure_events[-1].get('date') if transit_departure_events else None
 
             logger.info(f"Transit: Ports={transit_ports}, AtaTransit={ata_transit}, AtdTransit={atd_transit}")
-            logger.debug("-> (Thời gian) Tìm sự kiện và xử lý transit: %.2fs", time.time() - t_find_event_start)
+            logger.debug("-> (Thời gian) Tìm sự kiện và xử lý transit: %.2fs", metrics.observe("normalize", t_find_event_start))
 
 
             # QUAN TRỌNG: Interasia không cung cấp ETD/ETA cho cảng transit.
@@ -207,18 +219,20 @@ class InterasiaScraper(SeleniumScraper):
                 BookingStatus= "",
                 Pol= pol or "",
                 Pod= pod or "",
-                Etd= self._format_date(etd) or "",
-                Atd= self._format_date(atd) or "",
-                Eta= self._format_date(eta) or "",
-                Ata= self._format_date(ata) or "",
+                **date_normalizer.normalize_shipment_dates("IAL", {
+                    "Etd": etd,
+                    "Atd": atd,
+                    "Eta": eta,
+                    "Ata": ata,
+                    "AtdTransit": atd_transit,
+                    "AtaTransit": ata_transit,
+                }),
                 TransitPort= ", ".join(transit_ports) if transit_ports else "",
                 EtdTransit= etd_transit, # Sẽ là ""
-                AtdTransit= self._format_date(atd_transit) or "",
                 EtaTransit= eta_transit, # Sẽ là ""
-                AtaTransit= self._format_date(ata_transit) or ""
             )
             logger.info("Đã tạo đối tượng N8nTrackingInfo thành công.")
-            logger.debug("-> (Thời gian) Chuẩn hóa dữ liệu: %.2fs", time.time() - t_normalize_start)
+            logger.debug("-> (Thời gian) Chuẩn hóa dữ liệu: %.2fs", metrics.observe("normalize", t_normalize_start))
             logger.info("-> (Thời gian) Tổng thời gian trích xuất trang chi tiết: %.2fs", time.time() - t_extract_detail_start)
             return shipment_data
 
@@ -227,38 +241,30 @@ class InterasiaScraper(SeleniumScraper):
             logger.info("-> (Thời gian) Tổng thời gian trích xuất trang chi tiết (lỗi): %.2fs", time.time() - t_extract_detail_start)
             return None
 
-    def _extract_events_from_container(self, container_block):
-        # Trích xuất tất cả sự kiện từ một khối container được cung cấp.
+    def _extract_events_from_container(self, container_block, rows):
+        # Chuyển các hàng bảng sự kiện (đã đọc từ DOM) của một khối container thành danh sách sự kiện.
         events = []
-        try:
-            # Lấy số container để logging
-            try:
-                container_no = container_block.find_element(By.CSS_SELECTOR, "p.title").text.replace("Container No |", "").strip()
-                logger.debug(f"-> Trích xuất sự kiện cho container: {container_no}")
-            except Exception:
-                logger.debug("-> Trích xuất sự kiện từ một khối container...")
-
-            # Tìm bảng sự kiện bên trong khối container này
-            event_table = container_block.find_element(By.CLASS_NAME, "m-table-group")
-            rows = event_table.find_elements(By.CSS_SELECTOR, "tbody tr")
-            logger.debug(f"--> Tìm thấy {len(rows)} hàng sự kiện trong container.")
-            for row in rows:
-                cells = row.find_elements(By.TAG_NAME, "td")
-    
-                # 0: Event Date, 1: Depot, 2: Port, 3: Event Description
-                if len(cells) >= 4:
-                    event_data = {
-                        "date": cells[0].text.strip(),        # Event Date
-                        "description": cells[3].text.strip(), # Event Description
-                        "location": cells[2].text.strip()     # Port
-                    }
-                    events.append(event_data)
-                    logger.debug(f"---> Trích xuất: {event_data}")
-                else:
-                     logger.warning(f"---> Bỏ qua hàng không đủ cột: {[c.text for c in cells]}")
-        except NoSuchElementException:
+        container_no = (container_block["title"] or "").replace("Container No |", "").strip()
+        logger.debug(f"-> Trích xuất sự kiện cho container: {container_no}")
+        if not rows:
             logger.warning("-> Không tìm thấy bảng sự kiện (m-table-group) trong một khối container.")
-            pass # Bỏ qua nếu không tìm thấy bảng sự kiện
+            return events
+
+        logger.debug(f"--> Tìm thấy {len(rows)} hàng sự kiện trong container.")
+        for row in rows:
+            cells = row["cells"]
+
+            # 0: Event Date, 1: Depot, 2: Port, 3: Event Description
+            if len(cells) >= 4:
+                event_data = {
+                    "date": cells[0],        # Event Date
+                    "description": cells[3], # Event Description
+                    "location": cells[2]     # Port
+                }
+                events.append(event_data)
+                logger.debug(f"---> Trích xuất: {event_data}")
+            else:
+                 logger.warning(f"---> Bỏ qua hàng không đủ cột: {cells}")
         return events
 
     def _find_event(self, events, description_keyword, location_keyword):
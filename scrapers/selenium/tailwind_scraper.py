@@ -1,6 +1,5 @@
 import logging
 import pandas as pd
-from datetime import datetime, date
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
@@ -9,45 +8,18 @@ import time
 
 from ..selenium_scraper import SeleniumScraper
 from schemas import N8nTrackingInfo
+import metrics
+from .. import date_normalizer, readiness
 
 # Thiết lập logger cho module này
 logger = logging.getLogger(__name__)
 
+# Nút chấp nhận cookie (OneTrust)
+_COOKIE_BUTTON = readiness.Visible("#onetrust-accept-btn-handler")
+
 class TailwindScraper(SeleniumScraper):
     # Triển khai logic scraping cho Tailwind Shipping. Sử dụng Selenium để trích xuất dữ liệu và chuẩn hóa.
 
-    def _format_date(self, date_str):
-        # Chuyển đổi các định dạng ngày tháng khác nhau sang 'DD/MM/YYYY'. Ví dụ: '14-Oct-2025 06:51' hoặc 'ETD: 01/10/2025 11:18 am'
-        if not date_str or not isinstance(date_str, str):
-            return None
-        
-        month_to_number = {
-            'Jan': '01', 'Feb': '02', 'Mar': '03', 'Apr': '04',
-            'May': '05', 'Jun': '06', 'Jul': '07', 'Aug': '08',
-            'Sep': '09', 'Oct': '10', 'Nov': '11', 'Dec': '12'
-        }
-        
-        # Thay thế tháng chữ bằng số
-        for mon_str, mon_num in month_to_number.items():
-            if mon_str in date_str:
-                date_str = date_str.replace(mon_str, mon_num)
-                break
-
-        # Loại bỏ các tiền tố không cần thiết
-        if "ETD:" in date_str: date_str = date_str.replace("ETD:", "").strip()
-        if "ETA:" in date_str: date_str = date_str.replace("ETA:", "").strip()
-
-        # Thử các định dạng phổ biến mà trang web này sử dụng
-        for fmt in ('%d-%b-%Y %H:%M', '%d/%m/%Y %I:%M %p'):
-            try:
-                dt_obj = datetime.strptime(date_str, fmt)
-                return dt_obj.strftime('%d/%m/%Y')
-            except ValueError:
-                continue
-
-        logger.warning("Không thể phân tích định dạng ngày: %s. Trả về chuỗi gốc.", date_str)
-        return date_str # Trả về chuỗi gốc nếu không parse được
-
     def scrape(self, tracking_number):
         # Phương thức scrape chính. Thực hiện điều hướng, tìm kiếm, xử lý popup và trả về dữ liệu.
         logger.info("Bắt đầu scrape cho mã: %s", tracking_number)
@@ -58,17 +30,22 @@ class TailwindScraper(SeleniumScraper):
             t_nav_start = time.time()
             self.driver.get(self.config['url'])
             self.wait = WebDriverWait(self.driver, 30)
-            logger.info("-> (Thời gian) Tải trang ban đầu: %.2fs", time.time() - t_nav_start)
-
-            # 1. Xử lý cookie
-            t_cookie_start = time.time()
-            try:
-                cookie_button = self.wait.until(EC.element_to_be_clickable((By.ID, "onetrust-accept-btn-handler")))
+            logger.info("-> (Thời gian) Tải trang ban đầu: %.2fs", metrics.observe("navigation", t_nav_start))
+
+            # 1. Chờ banner cookie hoặc ô tìm kiếm (cái nào có trước), không chờ cố định khi không có banner
+            state, element = readiness.wait_for_any(self.driver, {
+                "cookie": _COOKIE_BUTTON,
+                "search": readiness.Present("#booking-number"),
+            }, timeout=30, phase="banner cookie / ô tìm kiếm", log_prefix="[Tailwind Scraper]")
+            # Banner có thể hiện sau ô tìm kiếm: khi ô tìm kiếm có trước, chỉ kiểm tra banner một lần (không chờ)
+            cookie_button = element if state == "cookie" else readiness.first_match(self.driver, _COOKIE_BUTTON)
+            if cookie_button is not None:
+                t_cookie_start = time.time()
+                # Click bằng JavaScript nên không cần chờ banner biến mất trước khi tìm kiếm
                 self.driver.execute_script("arguments[0].click();", cookie_button)
-                self.wait.until(EC.invisibility_of_element_located((By.ID, "onetrust-banner-sdk")))
-                logger.info("-> Đã chấp nhận cookies. (Thời gian xử lý: %.2fs)", time.time() - t_cookie_start)
-            except TimeoutException:
-                logger.info("[Tailwind] Không tìm thấy banner cookie hoặc đã được chấp nhận. (Thời gian kiểm tra: %.2fs)", time.time() - t_cookie_start)
+                logger.info("-> Đã chấp nhận cookies. (Thời gian xử lý: %.2fs)", metrics.observe("cookie", t_cookie_start))
+            else:
+                logger.info("[Tailwind] Không tìm thấy banner cookie hoặc đã được chấp nhận.")
 
 
             # 2. Nhập liệu và tìm kiếm (sử dụng selector từ HTML)
@@ -77,36 +54,28 @@ class TailwindScraper(SeleniumScraper):
             search_input.clear()
             search_input.send_keys(tracking_number)
 
+            # Click bằng JavaScript không phụ thuộc vị trí cuộn -> không cần scrollIntoView + sleep
             search_button = self.wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, "button.search-icon")))
-            self.driver.execute_script("arguments[0].scrollIntoView(true);", search_button)
-            time.sleep(0.5)
+            existing_windows = self.driver.window_handles
             self.driver.execute_script("arguments[0].click();", search_button)
-            logger.info("Đang tìm kiếm Booking Number: %s. (Thời gian tìm kiếm: %.2fs)", tracking_number, time.time() - t_search_start)
-
-
-            # 3. Chờ và chuyển sang tab/window mới
-            t_wait_tab_start = time.time()
-            self.wait.until(EC.number_of_windows_to_be(2))
-            new_window = None
-            for window_handle in self.driver.window_handles:
-                if window_handle != original_window:
-                    new_window = window_handle
-                    self.driver.switch_to.window(window_handle)
-                    break
-            if new_window:
-                 logger.info("Đã chuyển sang tab kết quả. (Thời gian chờ tab: %.2fs)", time.time() - t_wait_tab_start)
-            else:
-                 logger.warning("Không tìm thấy tab kết quả mới.")
+            logger.info("Đang tìm kiếm Booking Number: %s. (Thời gian tìm kiếm: %.2fs)", tracking_number, metrics.observe("search", t_search_start))
 
-            t_wait_result_start = time.time()
-            self.wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, "div.stepwizard")))
-            logger.info("Trang kết quả đã tải thành công. (Thời gian chờ kết quả: %.2fs)", time.time() - t_wait_result_start)
+
+            # 3. Chờ tab kết quả mở ra và chuyển sang tab đó
+            _, new_window = readiness.wait_for_any(self.driver, {
+                "tab": readiness.new_window(existing_windows),
+            }, timeout=30, phase="tab kết quả", log_prefix="[Tailwind Scraper]")
+            self.driver.switch_to.window(new_window)
+
+            readiness.wait_for_any(self.driver, {
+                "result": readiness.Present("div.stepwizard"),
+            }, timeout=30, phase="trang kết quả", log_prefix="[Tailwind Scraper]")
 
 
             # 4. Trích xuất và chuẩn hóa dữ liệu
             t_extract_start = time.time()
             normalized_data = self._extract_and_normalize_data(tracking_number) # Truyền tracking_number vào
-            logger.info("-> (Thời gian) Trích xuất dữ liệu: %.2fs", time.time() - t_extract_start)
+            logger.info("-> (Thời gian) Trích xuất dữ liệu: %.2fs", metrics.observe("extract", t_extract_start))
 
 
             if not normalized_data:
@@ -119,14 +88,10 @@ class TailwindScraper(SeleniumScraper):
 
         except TimeoutException:
             t_total_fail = time.time()
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            screenshot_path = f"output/tailwind_timeout_{tracking_number}_{timestamp}.png"
-            try:
-                self.driver.save_screenshot(screenshot_path)
-                logger.warning("Timeout khi scrape mã '%s'. Đã lưu ảnh chụp màn hình vào %s (Tổng thời gian: %.2fs)",
-                             tracking_number, screenshot_path, t_total_fail - t_total_start)
-            except Exception as ss_e:
-                logger.error("Không thể lưu ảnh chụp màn hình khi bị timeout cho mã '%s': %s", tracking_number, ss_e)
+            # Ảnh chụp + DOM được lấy nhanh, ghi file chạy nền (có lấy mẫu và giới hạn dung lượng)
+            artifact_path = self._save_failure_artifacts(tracking_number)
+            logger.warning("Timeout khi scrape mã '%s'. Artifact: %s (Tổng thời gian: %.2fs)",
+                           tracking_number, artifact_path or "bỏ qua", t_total_fail - t_total_start)
             return None, f"Không tìm thấy kết quả cho '{tracking_number}' (Timeout)."
         except Exception as e:
             t_total_fail = time.time()
@@ -205,9 +170,9 @@ class TailwindScraper(SeleniumScraper):
                 logger.info("Đã mở popup 'View details'.")
 
                 # Chờ popup xuất hiện
-                t_wait_popup_start = time.time()
-                self.wait.until(EC.visibility_of_element_located((By.CSS_SELECTOR, ".fancybox-container .timeline-small")))
-                logger.info("Popup đã tải. (Thời gian chờ popup: %.2fs)", time.time() - t_wait_popup_start)
+                readiness.wait_for_any(self.driver, {
+                    "popup": readiness.Visible(".fancybox-container .timeline-small"),
+                }, timeout=30, phase="popup 'View details'", log_prefix="[Tailwind Scraper]")
 
                 t_extract_popup_start = time.time()
                 events = self._extract_events_from_popup()
@@ -243,8 +208,8 @@ class TailwindScraper(SeleniumScraper):
                 # Đóng popup
                 t_close_popup_start = time.time()
                 close_button = self.driver.find_element(By.CSS_SELECTOR, ".fancybox-container .fancybox-close-small")
+                # Không chờ popup đóng hẳn: trang kết quả không còn được dùng sau bước này
                 close_button.click()
-                self.wait.until(EC.invisibility_of_element_located((By.CSS_SELECTOR, ".fancybox-container")))
                 logger.info("Đã đóng popup. (Thời gian đóng: %.2fs)", time.time() - t_close_popup_start)
 
 
@@ -262,15 +227,17 @@ class TailwindScraper(SeleniumScraper):
                 BookingStatus= booking_status.strip(),
                 Pol= pol.strip(),
                 Pod= pod.strip(),
-                Etd= self._format_date(etd_raw) or "",
-                Atd= self._format_date(atd) or "",
-                Eta= self._format_date(eta_raw) or "",
-                Ata= self._format_date(ata) or "",
+                **date_normalizer.normalize_shipment_dates("Tailwind", {
+                    "Etd": etd_raw,
+                    "Atd": atd,
+                    "Eta": eta_raw,
+                    "Ata": ata,
+                    "EtdTransit": etd_transit,
+                    "AtdTransit": atd_transit,
+                    "EtaTransit": eta_transit,
+                    "AtaTransit": ata_transit,
+                }),
                 TransitPort= transit_ports_str,
-                EtdTransit= self._format_date(etd_transit) or "",
-                AtdTransit= self._format_date(atd_transit) or "",
-                EtaTransit= self._format_date(eta_transit) or "",
-                AtaTransit= self._format_date(ata_transit) or ""
             )
 
             logger.info("Đã tạo đối tượng N8nTrackingInfo thành công.")
@@ -1,6 +1,7 @@
 import logging
 from selenium.webdriver.support.ui import WebDriverWait
 from .base_scraper import BaseScraper
+from artifacts import artifact_store
 
 logger = logging.getLogger(__name__)
 
@@ -19,6 +20,13 @@ class SeleniumScraper(BaseScraper):
         self.wait = WebDriverWait(self.driver, 30) # 30 giây là thời gian chờ mặc định
         logger.debug(f"[{self.__class__.__name__}] SeleniumScraper initialized.")
 
+    def _save_failure_artifacts(self, tracking_number, reason="timeout"):
+        """
+        Chụp nhanh ảnh màn hình + DOM khi scrape lỗi; việc ghi file chạy nền (artifacts.py).
+        Trả về tiền tố đường dẫn artifact, hoặc None nếu bị bỏ qua do lấy mẫu/giới hạn.
+        """
+        return artifact_store.capture_selenium(self.carrier or self.__class__.__name__, tracking_number, self.driver, reason)
+
     def scrape(self, tracking_number: str):
         # Vẫn là abstract, các lớp con tự định nghĩa
         raise NotImplementedError
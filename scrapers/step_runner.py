@@ -0,0 +1,145 @@
+import time
+import logging
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import requests
+
+import config
+import metrics
+from profiler import profiler
+
+logger = logging.getLogger(__name__)
+
+# Các lỗi mạng tạm thời được phép retry mặc định
+TRANSIENT_ERRORS = (requests.exceptions.Timeout, requests.exceptions.ConnectionError)
+
+
+class StepAbort(Exception):
+    """Step chủ động dừng toàn bộ pipeline với một thông báo cho người dùng (vd: không tìm thấy dữ liệu)."""
+    pass
+
+
+class StepError(Exception):
+    """Một step bắt buộc bị lỗi (hoặc bị bỏ qua do step phụ thuộc lỗi)."""
+    def __init__(self, step, cause, results=None):
+        self.step = step
+        self.cause = cause
+        self.results = results or {}
+        super().__init__(f"Step '{step}' lỗi: {cause}")
+
+
+class Step:
+    """
+    Khai báo một bước HTTP trong pipeline.
+
+    Args:
+        name (str): Tên step (dùng làm key trong kết quả và log thời gian).
+        func (callable): func(results, timeout) -> kết quả. `results` chứa kết quả của các step đã xong.
+        depends_on (tuple): Tên các step phải hoàn tất trước.
+        timeout (float): Timeout (giây) truyền vào func cho request HTTP.
+        retries (int): Số lần thử lại khi gặp lỗi thuộc retry_on.
+        retry_on (tuple): Các loại exception được retry.
+        required (bool): Step bắt buộc; lỗi sẽ dừng pipeline. Step không bắt buộc lỗi -> kết quả None.
+        phase (str): Giai đoạn ghi vào histogram scraper_phase_seconds (metrics.PHASES); None -> không ghi.
+    """
+    def __init__(self, name, func, depends_on=(), timeout=30, retries=0,
+                 retry_on=TRANSIENT_ERRORS, required=True, phase="http"):
+        self.name = name
+        self.func = func
+        self.depends_on = tuple(depends_on)
+        self.timeout = timeout
+        self.retries = retries
+        self.retry_on = retry_on
+        self.required = required
+        self.phase = phase
+
+
+class StepRunner:
+    """
+    Chạy một đồ thị các Step: step nào đã đủ phụ thuộc sẽ được chạy ngay,
+    các step độc lập chạy song song trên thread pool.
+    """
+    def __init__(self, steps, log_prefix="", max_workers=4):
+        self.steps = {step.name: step for step in steps}
+        self.log_prefix = log_prefix
+        self.max_workers = max_workers
+        self.timings = {}
+        for step in steps:
+            for dep in step.depends_on:
+                if dep not in self.steps:
+                    raise ValueError(f"Step '{step.name}' phụ thuộc vào step không tồn tại: '{dep}'")
+
+    def _run_step(self, step, results):
+        attempt = 0
+        t_step_start = time.time()
+        try:
+            while True:
+                try:
+                    with profiler.attach():
+                        return step.func(results, step.timeout)
+                except step.retry_on as e:
+                    if attempt >= step.retries:
+                        raise
+                    delay = config.RETRY_DELAY_EXPONENT_BASE ** attempt * 0.5
+                    attempt += 1
+                    logger.warning("%s Step '%s' lỗi tạm thời (%s). Thử lại lần %d sau %.1fs...",
+                                   self.log_prefix, step.name, e, attempt, delay)
+                    time.sleep(delay)
+        finally:
+            self.timings[step.name] = metrics.observe(step.phase, t_step_start) if step.phase else time.time() - t_step_start
+            logger.info("-> (Thời gian) %s Step '%s': %.2fs", self.log_prefix, step.name, self.timings[step.name])
+
+    def run(self):
+        """
+        Chạy toàn bộ pipeline. Trả về dict {tên step: kết quả}.
+        Raise StepError nếu một step bắt buộc lỗi hoặc các step còn lại có phụ thuộc vòng.
+        """
+        results = {}
+        failed = set()
+        pending = dict(self.steps)
+        running = {}
+
+        executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="step")
+        try:
+            while pending or running:
+                # Khởi chạy các step đã đủ phụ thuộc
+                for name, step in list(pending.items()):
+                    if any(dep in failed for dep in step.depends_on):
+                        del pending[name]
+                        failed.add(name)
+                        results[name] = None
+                        logger.warning("%s Bỏ qua step '%s' do step phụ thuộc bị lỗi.", self.log_prefix, name)
+                        if step.required:
+                            raise StepError(name, "step phụ thuộc bị lỗi", results)
+                        continue
+                    if all(dep in results for dep in step.depends_on):
+                        del pending[name]
+                        # Giữ nguyên context (log/tracing) của request khi chạy trong thread khác
+                        ctx = contextvars.copy_context()
+                        future = executor.submit(ctx.run, self._run_step, step, dict(results))
+                        running[future] = step
+
+                if not running:
+                    if pending:
+                        # Phụ thuộc vòng: không step nào còn lại có thể chạy
+                        raise StepError(", ".join(pending), "phụ thuộc vòng, không thể chạy", results)
+                    break
+
+                done, _ = wait(list(running.keys()), return_when=FIRST_COMPLETED)
+                for future in done:
+                    step = running.pop(future)
+                    try:
+                        results[step.name] = future.result()
+                    except Exception as e:
+                        failed.add(step.name)
+                        if step.required:
+                            raise StepError(step.name, e, results) from e
+                        logger.warning("%s Step không bắt buộc '%s' lỗi: %s", self.log_prefix, step.name, e)
+                        results[step.name] = None
+        except BaseException:
+            # Fail-fast: không chờ các step đang chạy, hủy các step chưa bắt đầu
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+        executor.shutdown(wait=True)
+        return results
@@ -0,0 +1,431 @@
+"""
+Engine timeline sự kiện: suy ra Atd/Ata, cảng transit và các ngày transit từ danh sách sự kiện thô.
+
+Sự kiện được giữ dạng cột và mã hóa theo giá trị khác nhau: ngày chỉ được parse một lần cho mỗi
+chuỗi khác nhau, loại sự kiện (rời/đến) và vai trò địa điểm (POL/POD/transit) chỉ được phân loại
+một lần cho mỗi mô tả/địa điểm khác nhau, sau đó mọi trường của N8nTrackingInfo được suy ra trong
+một lượt. Timeline lớn (gộp sự kiện của nhiều container) dùng mask numpy; timeline nhỏ dùng vòng
+lặp Python vì chi phí tạo mảng numpy lớn hơn phần tiết kiệm được.
+
+Quy tắc riêng của từng hãng (từ khóa mô tả, cách so khớp địa điểm, chọn sự kiện đầu/cuối...)
+khai báo trong CARRIER_RULES.
+"""
+import re
+import logging
+from datetime import date
+
+import numpy as np
+
+from . import date_normalizer
+
+logger = logging.getLogger(__name__)
+
+# Loại sự kiện
+OTHER, DEPARTURE, ARRIVAL = 0, 1, 2
+# Vai trò địa điểm của sự kiện
+ROLE_NONE, ROLE_POL, ROLE_POD, ROLE_TRANSIT = 0, 1, 2, 3
+# Cờ thực tế/dự kiến tường minh (UNKNOWN: suy ra từ ngày so với hôm nay)
+UNKNOWN, ESTIMATED, ACTUAL = -1, 0, 1
+
+_NAT = np.datetime64("NaT", "D")
+_MIN_DAY = np.datetime64("0001-01-01", "D")
+_LOCATION_CODE = re.compile(r"\((.*?)\)")
+# Từ số sự kiện này trở lên mới suy luận bằng numpy: dưới ngưỡng, vòng lặp Python nhanh hơn (benchmarks/timeline_bench.py)
+NUMPY_MIN_EVENTS = 500
+
+# Các trường timeline suy ra (giá trị là chuỗi ngày thô, scraper tự chuẩn hóa bằng _format_date)
+TIMELINE_FIELDS = ("Etd", "Atd", "Eta", "Ata", "TransitPort", "EtdTransit", "AtdTransit", "EtaTransit", "AtaTransit")
+
+
+def location_key(location, mode):
+    """
+    Khóa so khớp địa điểm (chữ thường).
+    mode: 'lower' (toàn bộ chuỗi), 'city' (phần trước dấu ','), 'code' (mã trong ngoặc đơn nếu có).
+    """
+    if not location:
+        return ""
+    if mode == "city":
+        return location.split(",")[0].strip().lower()
+    if mode == "code":
+        match = _LOCATION_CODE.search(location)
+        if match:
+            return match.group(1).strip().lower()
+    return location.strip().lower()
+
+
+class TimelineRules:
+    """
+    Quy tắc phân loại và suy luận timeline của một hãng.
+
+    Args:
+        departure (tuple): Từ khóa (chữ thường) trong mô tả của sự kiện rời cảng.
+        arrival (tuple): Từ khóa trong mô tả của sự kiện đến cảng.
+        description_sep (str): Chỉ xét phần mô tả trước ký tự này (vd: 'Departure: VSL 001' -> 'departure').
+        location_match (str): Cách so khớp địa điểm với POL/POD ('lower' | 'city' | 'code', xem location_key).
+        sort_by_date (bool): Sắp xếp sự kiện theo ngày (ổn định, ngày lỗi lên đầu) trước khi suy luận.
+        atd (str): Chọn sự kiện rời POL thực tế 'first' hay 'last' làm Atd.
+        ata_transit (str): Chọn sự kiện đến cảng transit thực tế 'first' hay 'last' làm AtaTransit.
+        update_etd_eta (bool): Sự kiện dự kiến rời POL/đến POD cập nhật Etd/Eta.
+        eta_transit (bool): Suy ra EtaTransit (đến transit dự kiến đầu tiên, khi chưa có AtaTransit).
+        etd_transit (bool): Suy ra EtdTransit (rời transit dự kiến gần nhất sau hôm nay).
+        transit_ports_from (str): 'movements' (chỉ sự kiện rời/đến) | 'all' (mọi sự kiện ngoài POL/POD).
+        port_name (str): Tên cảng transit: 'full' (nguyên chuỗi) | 'city' (phần trước dấu ',').
+    """
+    def __init__(self, departure=("departure",), arrival=("arrival",), description_sep=None,
+                 location_match="lower", sort_by_date=False, atd="first", ata_transit="first",
+                 update_etd_eta=True, eta_transit=True, etd_transit=True,
+                 transit_ports_from="movements", port_name="full"):
+        self.departure = tuple(departure)
+        self.arrival = tuple(arrival)
+        self.description_sep = description_sep
+        self.location_match = location_match
+        self.sort_by_date = sort_by_date
+        self.atd = atd
+        self.ata_transit = ata_transit
+        self.update_etd_eta = update_etd_eta
+        self.eta_transit = eta_transit
+        self.etd_transit = etd_transit
+        self.transit_ports_from = transit_ports_from
+        self.port_name = port_name
+        # Từ khóa được gộp thành một regex cho mỗi loại sự kiện
+        self._departure_re = re.compile("|".join(map(re.escape, self.departure)))
+        self._arrival_re = re.compile("|".join(map(re.escape, self.arrival)))
+
+    def classify(self, description):
+        """Loại sự kiện (DEPARTURE/ARRIVAL/OTHER) theo mô tả."""
+        text = description.lower()
+        if self.description_sep:
+            text = text.split(self.description_sep, 1)[0]
+        if self._departure_re.search(text):
+            return DEPARTURE
+        return ARRIVAL if self._arrival_re.search(text) else OTHER
+
+
+# Quy tắc theo mã hãng tàu (key trong scrapers.SCRAPERS)
+CARRIER_RULES = {
+    # Cổng ebiz: 'Departure: <tàu>' / 'Arrival: <tàu>', địa điểm so khớp theo mã trong ngoặc
+    "SNK": TimelineRules(description_sep=":", location_match="code"),
+    "HEUNG-A": TimelineRules(description_sep=":", location_match="code"),
+    # PIL: cờ Actual/Estimated theo dấu '*', ATD là lần xếp hàng cuối cùng tại POL
+    "PIL": TimelineRules(departure=("vessel loading",), arrival=("vessel discharge",), sort_by_date=True,
+                         atd="last", update_etd_eta=False, eta_transit=False,
+                         transit_ports_from="all", port_name="city"),
+    # EMC: lịch sử di chuyển container (đều là thực tế), so khớp theo tên thành phố
+    "EMC": TimelineRules(departure=("loaded",), arrival=("discharged",), location_match="city",
+                         sort_by_date=True, update_etd_eta=False, eta_transit=False, etd_transit=False),
+    # Các hãng dạng chặng tàu (Timeline.from_legs): vai trò địa điểm xác định theo vị trí chặng
+    "PAN": TimelineRules(),
+    "COSCO": TimelineRules(),
+    "SEALEAD": TimelineRules(),
+}
+
+
+def get_rules(carrier):
+    rules = CARRIER_RULES.get(carrier)
+    if rules is None:
+        raise ValueError(f"Không có quy tắc timeline cho hãng '{carrier}'.")
+    return rules
+
+
+def _factorize(values):
+    """
+    Mã hóa một cột chuỗi thành (list mã số nguyên, list giá trị khác nhau).
+    Ngày, mô tả và địa điểm lặp lại rất nhiều khi gộp sự kiện của nhiều container: mọi xử lý
+    chuỗi (parse ngày, so khớp từ khóa/địa điểm) chỉ chạy trên các giá trị khác nhau, phần
+    còn lại làm trên mã số nguyên.
+    """
+    index = {}
+    setdefault = index.setdefault
+    codes = [setdefault(value or "", len(index)) for value in values]
+    return codes, list(index)
+
+
+def _pick(mask, which="first"):
+    indices = np.flatnonzero(mask)
+    if not len(indices):
+        return None
+    return int(indices[0] if which == "first" else indices[-1])
+
+
+class Timeline:
+    """
+    Danh sách sự kiện dạng cột.
+
+    Args:
+        carrier (str): Mã hãng (dùng để parse ngày theo date_normalizer).
+        dates, descriptions, locations (list[str]): Các cột của sự kiện.
+        kinds (list[int]): Loại sự kiện tường minh (DEPARTURE/ARRIVAL/OTHER); None = phân loại theo mô tả.
+        roles (list[int]): Vai trò địa điểm tường minh (ROLE_*); None = so khớp địa điểm với POL/POD.
+        actual (list[int]): Cờ ACTUAL/ESTIMATED/UNKNOWN; None = suy ra từ ngày so với hôm nay.
+    """
+    def __init__(self, carrier, dates, descriptions=None, locations=None, kinds=None, roles=None, actual=None):
+        size = len(dates)
+        self.carrier = carrier
+        self.date_codes, self.date_values = _factorize(dates)
+        self.description_codes, self.description_values = _factorize(descriptions if descriptions is not None else [""] * size)
+        self.location_codes, self.location_values = _factorize(
+            [(value or "").strip() for value in locations] if locations is not None else [""] * size)
+        self.kinds = None if kinds is None else list(kinds)
+        self.roles = None if roles is None else list(roles)
+        self.actual = None if actual is None else list(actual)
+        # Mỗi chuỗi ngày khác nhau chỉ parse một lần
+        self.day_values = [date_normalizer.parse_date(carrier, value) if value else None for value in self.date_values]
+
+    def __len__(self):
+        return len(self.date_codes)
+
+    @classmethod
+    def from_events(cls, carrier, events, type_key="type"):
+        """
+        Tạo timeline từ list dict {'date', 'description', 'location'} (như các scraper thu thập).
+        Nếu sự kiện có trường `type_key` ('Actual'/'Estimated') thì dùng làm cờ tường minh.
+        """
+        actual = None
+        if any(type_key in event for event in events):
+            flags = {"actual": ACTUAL, "estimated": ESTIMATED}
+            actual = [flags.get(str(event.get(type_key, "")).lower(), UNKNOWN) for event in events]
+        return cls(
+            carrier,
+            [event.get("date") for event in events],
+            [event.get("description") for event in events],
+            [event.get("location") for event in events],
+            actual=actual,
+        )
+
+    @classmethod
+    def from_legs(cls, carrier, legs):
+        """
+        Tạo timeline từ các chặng tàu (theo thứ tự). Mỗi chặng là dict với 'pol', 'pod' và các ngày:
+        'departure'/'arrival' (thực tế hay dự kiến suy ra từ ngày), 'etd'/'eta' (dự kiến), 'atd'/'ata' (thực tế).
+
+        Vai trò theo vị trí: rời chặng đầu là POL, đến chặng cuối là POD; cảng dỡ của một chặng
+        trùng cảng xếp của chặng sau là cảng transit.
+        """
+        columns = {"dates": [], "locations": [], "kinds": [], "roles": [], "actual": []}
+
+        def add(value, location, kind, role, flag):
+            if value:
+                columns["dates"].append(value)
+                columns["locations"].append(location)
+                columns["kinds"].append(kind)
+                columns["roles"].append(role)
+                columns["actual"].append(flag)
+
+        last = len(legs) - 1
+        for i, leg in enumerate(legs):
+            pol, pod = (leg.get("pol") or "").strip(), (leg.get("pod") or "").strip()
+            prev_pod = (legs[i - 1].get("pod") or "").strip() if i > 0 else ""
+            next_pol = (legs[i + 1].get("pol") or "").strip() if i < last else ""
+            dep_role = ROLE_POL if i == 0 else (ROLE_TRANSIT if pol and pol == prev_pod else ROLE_NONE)
+            arr_role = ROLE_POD if i == last else (ROLE_TRANSIT if pod and pod == next_pol else ROLE_NONE)
+            for key, flag in (("atd", ACTUAL), ("etd", ESTIMATED), ("departure", UNKNOWN)):
+                add(leg.get(key), pol, DEPARTURE, dep_role, flag)
+            for key, flag in (("ata", ACTUAL), ("eta", ESTIMATED), ("arrival", UNKNOWN)):
+                add(leg.get(key), pod, ARRIVAL, arr_role, flag)
+
+        return cls(carrier, columns["dates"], locations=columns["locations"],
+                   kinds=columns["kinds"], roles=columns["roles"], actual=columns["actual"])
+
+    def _distinct_kinds(self, rules):
+        # Loại sự kiện của từng mô tả khác nhau (trải ra theo description_codes). Với description_sep,
+        # mô tả khác nhau ở phần sau dấu phân cách (số container, tên tàu) chỉ được phân loại một lần.
+        if not rules.description_sep:
+            return [rules.classify(description) for description in self.description_values]
+        kinds, sep = {}, rules.description_sep
+        return [kinds[head] if head in kinds else kinds.setdefault(head, rules.classify(head))
+                for head in (description.split(sep, 1)[0] for description in self.description_values)]
+
+    def _distinct_roles(self, rules, pol, pod, first_departure):
+        """
+        Vai trò của từng địa điểm khác nhau (trải ra theo location_codes).
+        POL trống hoặc không khớp địa điểm nào của timeline (vd: chỉ có tên terminal không kèm mã):
+        địa điểm của sự kiện rời cảng đầu tiên (mã first_departure) được coi là POL, để POL không
+        bị tính là cảng transit và Atd vẫn được suy ra. POD không được suy đoán như vậy: với lô hàng
+        đang đi, sự kiện đến cuối cùng có thể là cảng transit.
+        """
+        keys = [location_key(location, rules.location_match) for location in self.location_values]
+        pol_key = location_key(pol, rules.location_match)
+        pod_key = location_key(pod, rules.location_match)
+        if not any(pol_key and pol_key in key for key in keys) and first_departure is not None:
+            pol_key = keys[first_departure]
+        return [ROLE_POL if pol_key and pol_key in key
+                else ROLE_POD if pod_key and pod_key in key
+                else ROLE_TRANSIT if key else ROLE_NONE
+                for key in keys]
+
+    def _port_names(self, rules):
+        if rules.port_name == "city":
+            return [location.split(",")[0].strip() for location in self.location_values]
+        return self.location_values
+
+    def derive(self, rules, pol="", pod="", today=None):
+        """
+        Suy ra các trường timeline trong một lượt.
+
+        Timeline nhỏ (dưới NUMPY_MIN_EVENTS sự kiện, vd: một B/L) chạy bằng vòng lặp Python; timeline lớn
+        (gộp sự kiện của nhiều container) dùng mask numpy. Hai cách cho cùng kết quả.
+
+        Returns:
+            dict: {field: chuỗi ngày thô | ""} cho các trường trong TIMELINE_FIELDS
+                  (TransitPort là các cảng nối bằng ', '). Etd/Eta chỉ có giá trị khi
+                  rules.update_etd_eta và timeline có sự kiện dự kiến tương ứng.
+        """
+        result = dict.fromkeys(TIMELINE_FIELDS, "")
+        if not len(self):
+            return result
+        today = today or date.today()
+        if len(self) >= NUMPY_MIN_EVENTS:
+            self._derive_arrays(rules, pol, pod, today, result)
+        else:
+            self._derive_events(rules, pol, pod, today, result)
+        return result
+
+    def _derive_events(self, rules, pol, pod, today, result):
+        date_codes, location_codes, day_values, flags = self.date_codes, self.location_codes, self.day_values, self.actual
+        if self.kinds is not None:
+            kinds = self.kinds
+        else:
+            kind_values = self._distinct_kinds(rules)
+            kinds = [kind_values[code] for code in self.description_codes]
+        # sorted ổn định, ngày lỗi lên đầu: giống argsort(kind="stable") của nhánh numpy
+        order = range(len(self))
+        if rules.sort_by_date:
+            order = sorted(order, key=lambda i: day_values[date_codes[i]] or date.min)
+
+        if self.roles is not None:
+            roles = self.roles
+        else:
+            first_departure = next((location_codes[i] for i in order
+                                    if kinds[i] == DEPARTURE and self.location_values[location_codes[i]]), None)
+            role_values = self._distinct_roles(rules, pol, pod, first_departure)
+            roles = [role_values[code] for code in location_codes]
+
+        # Một lượt: gom sự kiện rời/đến theo (vai trò, loại) và lấy cảng transit theo thứ tự xuất hiện
+        buckets = {}
+        names, ports = self._port_names(rules), []
+        for i in order:
+            role, kind = roles[i], kinds[i]
+            if kind != OTHER:
+                buckets.setdefault((role, kind), []).append(i)
+            if role == ROLE_TRANSIT and (kind != OTHER or rules.transit_ports_from == "all"):
+                name = names[location_codes[i]]
+                if name not in ports:
+                    ports.append(name)
+        result["TransitPort"] = ", ".join(ports)
+
+        def is_actual(i):
+            flag = flags[i] if flags is not None else UNKNOWN
+            if flag != UNKNOWN:
+                return flag == ACTUAL
+            day = day_values[date_codes[i]]
+            return day is not None and day <= today
+
+        def is_estimated(i):
+            flag = flags[i] if flags is not None else UNKNOWN
+            if flag != UNKNOWN:
+                return flag == ESTIMATED
+            day = day_values[date_codes[i]]
+            return day is not None and day > today
+
+        def pick(role, kind, test, which="first"):
+            matches = [i for i in buckets.get((role, kind), ()) if test(i)]
+            if not matches:
+                return None
+            return matches[0] if which == "first" else matches[-1]
+
+        def date_at(index):
+            return self.date_values[date_codes[index]] if index is not None else ""
+
+        # POL / POD
+        result["Atd"] = date_at(pick(ROLE_POL, DEPARTURE, is_actual, rules.atd))
+        result["Ata"] = date_at(pick(ROLE_POD, ARRIVAL, is_actual))
+        if rules.update_etd_eta:
+            result["Etd"] = date_at(pick(ROLE_POL, DEPARTURE, is_estimated))
+            result["Eta"] = date_at(pick(ROLE_POD, ARRIVAL, is_estimated))
+
+        # Ngày transit
+        result["AtaTransit"] = date_at(pick(ROLE_TRANSIT, ARRIVAL, is_actual, rules.ata_transit))
+        result["AtdTransit"] = date_at(pick(ROLE_TRANSIT, DEPARTURE, is_actual, "last"))
+        if rules.eta_transit and not result["AtaTransit"]:
+            result["EtaTransit"] = date_at(pick(ROLE_TRANSIT, ARRIVAL, is_estimated))
+        if rules.etd_transit:
+            candidates = [i for i in buckets.get((ROLE_TRANSIT, DEPARTURE), ())
+                          if is_estimated(i) and day_values[date_codes[i]] is not None and day_values[date_codes[i]] > today]
+            if candidates:
+                result["EtdTransit"] = date_at(min(candidates, key=lambda i: day_values[date_codes[i]]))
+
+    def _derive_arrays(self, rules, pol, pod, today, result):
+        today = np.datetime64(today, "D")
+        date_codes = np.asarray(self.date_codes, dtype=np.int32)
+        location_codes = np.asarray(self.location_codes, dtype=np.int32)
+        days = np.array([day or _NAT for day in self.day_values], dtype="datetime64[D]")[date_codes]
+        if self.kinds is not None:
+            kinds = np.asarray(self.kinds, dtype=np.int8)
+        else:
+            kinds = np.array(self._distinct_kinds(rules), dtype=np.int8)[np.asarray(self.description_codes, dtype=np.int32)]
+        has_day = ~np.isnat(days)
+        is_actual = has_day & (days <= today)
+        is_estimated = has_day & (days > today)
+        if self.actual is not None:
+            actual = np.asarray(self.actual, dtype=np.int8)
+            is_actual = np.where(actual == UNKNOWN, is_actual, actual == ACTUAL)
+            is_estimated = np.where(actual == UNKNOWN, is_estimated, actual == ESTIMATED)
+        roles = None if self.roles is None else np.asarray(self.roles, dtype=np.int8)
+
+        if rules.sort_by_date:
+            order = np.argsort(np.where(has_day, days, _MIN_DAY), kind="stable")
+            kinds, days, is_actual, is_estimated, date_codes, location_codes = (
+                kinds[order], days[order], is_actual[order], is_estimated[order],
+                date_codes[order], location_codes[order])
+            if roles is not None:
+                roles = roles[order]
+
+        departure, arrival = kinds == DEPARTURE, kinds == ARRIVAL
+        if roles is None:
+            has_location = np.array([bool(location) for location in self.location_values])[location_codes]
+            first = _pick(departure & has_location)
+            role_values = self._distinct_roles(rules, pol, pod, int(location_codes[first]) if first is not None else None)
+            roles = np.array(role_values, dtype=np.int8)[location_codes]
+        at_pol, at_pod, transit = roles == ROLE_POL, roles == ROLE_POD, roles == ROLE_TRANSIT
+
+        def date_at(index):
+            return self.date_values[date_codes[index]] if index is not None else ""
+
+        # POL / POD
+        result["Atd"] = date_at(_pick(departure & at_pol & is_actual, rules.atd))
+        result["Ata"] = date_at(_pick(arrival & at_pod & is_actual))
+        if rules.update_etd_eta:
+            result["Etd"] = date_at(_pick(departure & at_pol & is_estimated))
+            result["Eta"] = date_at(_pick(arrival & at_pod & is_estimated))
+
+        # Cảng transit (giữ thứ tự xuất hiện, không trùng lặp)
+        port_mask = transit if rules.transit_ports_from == "all" else transit & (kinds != OTHER)
+        port_codes = location_codes[port_mask]
+        if len(port_codes):
+            names = self._port_names(rules)
+            _, first_seen = np.unique(port_codes, return_index=True)
+            ports = []
+            for code in port_codes[np.sort(first_seen)]:
+                if names[code] not in ports:
+                    ports.append(names[code])
+            result["TransitPort"] = ", ".join(ports)
+
+        # Ngày transit
+        result["AtaTransit"] = date_at(_pick(transit & arrival & is_actual, rules.ata_transit))
+        result["AtdTransit"] = date_at(_pick(transit & departure & is_actual, "last"))
+        if rules.eta_transit and not result["AtaTransit"]:
+            result["EtaTransit"] = date_at(_pick(transit & arrival & is_estimated))
+        if rules.etd_transit:
+            candidates = np.flatnonzero(transit & departure & is_estimated & (days > today))
+            if len(candidates):
+                result["EtdTransit"] = date_at(int(candidates[np.argmin(days[candidates])]))
+
+
+def derive(carrier, events, pol="", pod="", today=None):
+    """Tiện ích: suy ra các trường timeline từ list sự kiện dạng dict theo quy tắc của hãng."""
+    return Timeline.from_events(carrier, events).derive(get_rules(carrier), pol, pod, today)
+
+
+def derive_legs(carrier, legs, today=None):
+    """Tiện ích: suy ra các trường timeline từ các chặng tàu theo quy tắc của hãng."""
+    return Timeline.from_legs(carrier, legs).derive(get_rules(carrier), today=today)
@@ -0,0 +1,220 @@
+import threading
+import time
+import logging
+from urllib.parse import urlsplit
+
+import config
+
+logger = logging.getLogger(__name__)
+
+# Header không được phát lại (do requests tự tạo hoặc gắn với request cụ thể)
+_SKIPPED_HEADERS = {"cookie", "host", "content-length", "connection", "accept-encoding", "content-type"}
+
+
+class SessionExpiredError(Exception):
+    """Hãng tàu từ chối phiên đã thu thập (cookie/token hết hạn hoặc bị chặn) -> cần quay lại dùng trình duyệt."""
+    def __init__(self, carrier, reason):
+        self.carrier = carrier
+        self.reason = reason
+        super().__init__(f"Phiên HTTP của hãng tàu '{carrier}' không còn hợp lệ: {reason}")
+
+
+class ReplayPayloadError(Exception):
+    """
+    Hãng tàu nhận phiên nhưng response của request phát lại không chuẩn hóa được (404, sai endpoint,
+    schema khác) -> không coi là 'không tìm thấy', quay lại trình duyệt và bỏ phiên.
+    """
+    def __init__(self, carrier, reason):
+        self.carrier = carrier
+        self.reason = reason
+        super().__init__(f"Không dùng được kết quả phát lại của hãng tàu '{carrier}': {reason}")
+
+
+class HarvestedSession:
+    # Cookie và header (User-Agent, token chống bot...) thu thập từ trình duyệt cho một cặp (hãng tàu, proxy)
+    def __init__(self, cookies, headers, harvested_at, expires_at, url_template):
+        self.cookies = cookies      # [{'name', 'value', 'domain', 'path'}, ...]
+        self.headers = headers      # {tên header: giá trị}
+        self.url_template = url_template  # URL API tracking đã bắt được, mã tra cứu thay bằng '{tracking_number}'
+        self.harvested_at = harvested_at
+        self.expires_at = expires_at
+        self.replays = 0
+
+    def as_dict(self, now):
+        return {
+            "cookies": len(self.cookies),
+            "headers": sorted(self.headers),
+            "url_template": self.url_template,
+            "age": round(now - self.harvested_at, 1),
+            "expires_in": round(self.expires_at - now, 1),
+            "replays": self.replays,
+        }
+
+
+def cookies_expiry(cookies, now, ttl, min_cookie_ttl=0):
+    """
+    Thời điểm phiên hết hạn: sớm nhất giữa now + ttl và hạn của các cookie có 'expiry'/'expires'.
+    Cookie hết hạn trong vòng min_cookie_ttl giây (analytics, token chống bot sống ngắn) được bỏ qua.
+    """
+    expires_at = now + ttl
+    for cookie in cookies:
+        expiry = cookie.get("expiry", cookie.get("expires"))
+        if expiry and float(expiry) > now + min_cookie_ttl:
+            expires_at = min(expires_at, float(expiry))
+    return expires_at
+
+
+def _cookie_matches(domain, hosts):
+    # Cookie '.coscoshipping.com' được gửi tới 'elines.coscoshipping.com' (và chính domain đó)
+    domain = (domain or "").lstrip(".").lower()
+    return bool(domain) and any(host == domain or host.endswith("." + domain) for host in hosts)
+
+
+def carrier_cookies(cookies, urls):
+    """
+    Chỉ giữ cookie của các host trong urls (API tracking đã bắt được, trang của hãng tàu). Driver trong pool
+    dùng chung cho nhiều hãng tàu và Network.getAllCookies trả cookie của mọi domain (hãng khác, analytics).
+    """
+    hosts = {urlsplit(url).hostname for url in urls if url}
+    hosts.discard(None)
+    return [cookie for cookie in cookies if _cookie_matches(cookie.get("domain"), hosts)]
+
+
+def replayable_headers(headers):
+    """Lọc header của request đã bắt được từ trình duyệt thành header có thể phát lại bằng requests."""
+    return {
+        name: value for name, value in (headers or {}).items()
+        if not name.startswith(":") and name.lower() not in _SKIPPED_HEADERS
+    }
+
+
+def replay_url_template(url, tracking_number):
+    """
+    Mẫu URL phát lại từ URL của request API tracking mà trình duyệt đã gửi (vd: COSCO gọi
+    /booking/ hoặc /bill/ tùy loại mã): mã tra cứu được thay bằng '{tracking_number}'.
+    Trả về None nếu không có URL hoặc URL không chứa mã tra cứu.
+    """
+    if not url or not tracking_number or tracking_number not in url:
+        return None
+    return url.replace("{", "{{").replace("}", "}}").replace(tracking_number, "{tracking_number}")
+
+
+class SessionVault:
+    """
+    Kho phiên dùng chung: trình duyệt thu thập cookie/header của hãng tàu, các lượt tra cứu sau
+    phát lại qua HTTP client (connection pool) cho tới khi phiên hết hạn hoặc bị từ chối.
+    Khóa theo (hãng tàu, proxy) vì cookie chống bot thường gắn với IP.
+    """
+    def __init__(self, ttl=900, refresh_margin=120, min_cookie_ttl=300):
+        self.ttl = ttl
+        self.refresh_margin = refresh_margin
+        self.min_cookie_ttl = min_cookie_ttl
+        self._lock = threading.Lock()
+        self._sessions = {}   # (carrier, proxy_key) -> HarvestedSession
+        self._stats = {}      # carrier -> {"harvests", "replays", "rejections"}
+
+    def _count(self, carrier, name):
+        stats = self._stats.setdefault(carrier, {"harvests": 0, "replays": 0, "rejections": 0})
+        stats[name] += 1
+
+    def store(self, carrier, proxy_key, cookies, headers=None, url_template=None):
+        """
+        Lưu phiên vừa thu thập. Header mới được gộp vào header đã có và mẫu URL cũ được giữ lại khi làm
+        mới phiên (trang chủ không gọi API tracking). Không lưu phiên chưa từng bắt được request API.
+        Chỉ giữ cookie thuộc host của mẫu URL hoặc trang của hãng tàu (SCRAPER_CONFIGS[carrier]['url']).
+        """
+        now = time.time()
+        # Cookie Selenium dùng 'expiry', Playwright dùng 'expires'
+        cookies = [
+            {
+                "name": cookie.get("name"),
+                "value": cookie.get("value"),
+                "domain": cookie.get("domain"),
+                "path": cookie.get("path") or "/",
+                "expiry": cookie.get("expiry", cookie.get("expires")),
+            }
+            for cookie in cookies or [] if cookie.get("name")
+        ]
+        with self._lock:
+            previous = self._sessions.get((carrier, proxy_key))
+            merged_headers = dict(previous.headers) if previous else {}
+            merged_headers.update(replayable_headers(headers))
+            url_template = url_template or (previous.url_template if previous else None)
+            if not url_template:
+                logger.info("[SessionVault] Bỏ qua phiên '%s' (proxy %s): chưa bắt được request API tracking.",
+                            carrier, proxy_key)
+                return None
+            cookies = carrier_cookies(cookies, (url_template, config.SCRAPER_CONFIGS.get(carrier, {}).get("url")))
+            if not cookies:
+                return None
+            expires_at = cookies_expiry(cookies, now, self.ttl, self.min_cookie_ttl)
+            session = HarvestedSession(cookies, merged_headers, now, expires_at, url_template)
+            self._sessions[(carrier, proxy_key)] = session
+            self._count(carrier, "harvests")
+        logger.info("[SessionVault] Đã lưu phiên '%s' (proxy %s): %d cookie, %d header, hết hạn sau %.0fs",
+                    carrier, proxy_key, len(cookies), len(merged_headers), session.expires_at - now)
+        return session
+
+    def get(self, carrier, proxy_key):
+        """Phiên còn hạn của (hãng tàu, proxy), hoặc None."""
+        with self._lock:
+            session = self._sessions.get((carrier, proxy_key))
+            if session is None:
+                return None
+            if session.expires_at <= time.time():
+                del self._sessions[(carrier, proxy_key)]
+                logger.info("[SessionVault] Phiên '%s' (proxy %s) đã hết hạn.", carrier, proxy_key)
+                return None
+            session.replays += 1
+            self._count(carrier, "replays")
+            return session
+
+    def invalidate(self, carrier, proxy_key, reason):
+        with self._lock:
+            if self._sessions.pop((carrier, proxy_key), None) is not None:
+                self._count(carrier, "rejections")
+        logger.warning("[SessionVault] Hủy phiên '%s' (proxy %s): %s", carrier, proxy_key, reason)
+
+    def due_for_refresh(self):
+        """
+        Các cặp (hãng tàu, proxy) có phiên sắp hết hạn (trong refresh_margin giây) và đã được dùng
+        -> cần trình duyệt làm mới. Phiên không ai dùng được để hết hạn tự nhiên.
+        """
+        deadline = time.time() + self.refresh_margin
+        with self._lock:
+            return [
+                key for key, session in self._sessions.items()
+                if session.expires_at <= deadline and session.replays > 0
+            ]
+
+    def harvest_selenium(self, carrier, proxy_key, driver, headers=None, url_template=None):
+        """Thu thập cookie từ driver Selenium (mọi domain qua CDP, nếu lỗi thì chỉ domain hiện tại)."""
+        try:
+            cookies = driver.execute_cdp_cmd("Network.getAllCookies", {}).get("cookies", [])
+        except Exception:
+            cookies = driver.get_cookies()
+        return self.store(carrier, proxy_key, cookies, headers, url_template)
+
+    async def harvest_playwright(self, carrier, proxy_key, page, headers=None, url_template=None):
+        """Thu thập cookie từ context của page Playwright."""
+        cookies = await page.context.cookies()
+        return self.store(carrier, proxy_key, cookies, headers, url_template)
+
+    def snapshot(self):
+        now = time.time()
+        with self._lock:
+            sessions = {}
+            for (carrier, proxy_key), session in self._sessions.items():
+                sessions.setdefault(carrier, {})[str(proxy_key)] = session.as_dict(now)
+            return {
+                "sessions": sessions,
+                "stats": {carrier: dict(stats) for carrier, stats in self._stats.items()},
+            }
+
+
+# Khởi tạo một instance toàn cục (Singleton)
+session_vault = SessionVault(
+    ttl=config.SESSION_VAULT_TTL_SECONDS,
+    refresh_margin=config.SESSION_VAULT_REFRESH_MARGIN_SECONDS,
+    min_cookie_ttl=config.SESSION_VAULT_MIN_COOKIE_TTL_SECONDS,
+)
@@ -0,0 +1,210 @@
+import os
+import json
+import time
+import uuid
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+
+import config
+
+logger = logging.getLogger(__name__)
+
+
+class Span:
+    # Một khoảng thời gian trong trace (mô hình giống OpenTelemetry: trace_id / span_id / parent_id)
+    def __init__(self, trace, name, parent_id, start, attributes):
+        self.trace = trace
+        self.name = name
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.start = start
+        self.end = None
+        self.attributes = attributes
+        self.status = "ok"
+        self.error = None
+
+    def set_attribute(self, name, value):
+        self.attributes[name] = value
+
+    def set_error(self, error):
+        self.status = "error"
+        self.error = str(error)
+
+    def to_dict(self):
+        return {
+            "trace_id": self.trace.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start,
+            "duration_ms": round((self.end - self.start) * 1000, 2),
+            "status": self.status,
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+
+class _Trace:
+    # Các span đã kết thúc của một trace; span con có thể kết thúc ở thread khác (driver pool, executor)
+    def __init__(self):
+        self.trace_id = uuid.uuid4().hex
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def add(self, span):
+        with self._lock:
+            self.spans.append(span)
+
+
+# Span hiện tại của request; asyncio.to_thread, StepRunner và _fetch_concurrently sao chép context sang thread
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+# --- Exporter: nhận toàn bộ span của một trace khi span gốc kết thúc ---
+
+class ConsoleExporter:
+    """Ghi mỗi trace thành một dòng log (cây span thụt lề theo cấp)."""
+    def export(self, spans):
+        children = {}
+        for span in spans:
+            children.setdefault(span.parent_id, []).append(span)
+        lines = []
+
+        def walk(parent_id, depth):
+            for span in sorted(children.get(parent_id, []), key=lambda s: s.start):
+                status = "" if span.status == "ok" else f" [LỖI: {span.error}]"
+                lines.append(f"{'  ' * depth}{span.name}: {(span.end - span.start) * 1000:.1f}ms{status}")
+                walk(span.span_id, depth + 1)
+        walk(None, 0)
+        logger.info("[Trace %s]\n%s", spans[0].trace.trace_id, "\n".join(lines))
+
+
+class FileExporter:
+    """Ghi mỗi span thành một dòng JSON (JSONL) vào file, dùng để phân tích offline."""
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def export(self, spans):
+        lines = "".join(json.dumps(span.to_dict(), ensure_ascii=False, default=str) + "\n" for span in spans)
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(lines)
+
+
+# Registry exporter theo tên (TRACING_EXPORTER); có thể đăng ký thêm (vd: OTLP) bằng register_exporter
+EXPORTERS = {
+    "console": lambda: ConsoleExporter(),
+    "file": lambda: FileExporter(config.TRACING_FILE),
+}
+
+_exporter = None
+
+
+def register_exporter(name, factory):
+    """Đăng ký exporter mới: factory() -> đối tượng có phương thức export(spans)."""
+    EXPORTERS[name] = factory
+
+
+def set_exporter(exporter):
+    """Dùng exporter cho các trace kết thúc sau thời điểm này (None -> tắt tracing)."""
+    global _exporter
+    _exporter = exporter
+
+
+def configure(name):
+    """Chọn exporter theo tên trong EXPORTERS ('none' hoặc rỗng -> tắt tracing)."""
+    if not name or name == "none":
+        set_exporter(None)
+        return
+    if name not in EXPORTERS:
+        raise ValueError(f"Exporter tracing không tồn tại: '{name}'. Có sẵn: {list(EXPORTERS)}")
+    set_exporter(EXPORTERS[name]())
+    logger.info("[Tracing] Đã bật exporter '%s'.", name)
+
+
+def enabled():
+    return _exporter is not None
+
+
+def current_trace_id():
+    span = _current_span.get()
+    return span.trace.trace_id if span else None
+
+
+def _finish(span, token):
+    span.end = time.time()
+    _current_span.reset(token)
+    span.trace.add(span)
+
+
+@contextmanager
+def start_trace(name, **attributes):
+    """Bắt đầu trace mới (span gốc) cho một request. Không làm gì khi tracing tắt."""
+    if _exporter is None:
+        yield None
+        return
+    exporter = _exporter
+    span = Span(_Trace(), name, None, time.time(), attributes)
+    token = _current_span.set(span)
+    try:
+        yield span
+    except BaseException as e:
+        span.set_error(e)
+        raise
+    finally:
+        _finish(span, token)
+        try:
+            exporter.export(span.trace.spans)
+        except Exception as e:
+            logger.warning("[Tracing] Lỗi khi export trace %s: %s", span.trace.trace_id, e)
+
+
+@contextmanager
+def span(name, **attributes):
+    """Span con của span hiện tại. Không làm gì khi không nằm trong trace nào."""
+    parent = _current_span.get()
+    if parent is None:
+        yield None
+        return
+    child = Span(parent.trace, name, parent.span_id, time.time(), attributes)
+    token = _current_span.set(child)
+    try:
+        yield child
+    except BaseException as e:
+        child.set_error(e)
+        raise
+    finally:
+        _finish(child, token)
+
+
+def record_span(name, start, end=None, **attributes):
+    """Ghi span đã đo sẵn (start/end theo time.time()) làm con của span hiện tại, vd: thời gian chờ trong hàng đợi."""
+    parent = _current_span.get()
+    if parent is None:
+        return
+    child = Span(parent.trace, name, parent.span_id, start, attributes)
+    child.end = end if end is not None else time.time()
+    parent.trace.add(child)
+
+
+def trace_requests(session):
+    """Ghi một span cho mỗi request HTTP của session requests (thời gian tới khi nhận header response)."""
+    def on_response(response, *args, **kwargs):
+        if _current_span.get() is not None:
+            end = time.time()
+            record_span(
+                f"http {response.request.method}", end - response.elapsed.total_seconds(), end,
+                url=response.url.split("?")[0], status=response.status_code,
+            )
+        return response
+    session.hooks["response"].append(on_response)
+    return session
+
+
+configure(config.TRACING_EXPORTER)